@@ -0,0 +1,167 @@
+"""
+Run a local hash-slot cluster and move slots between its nodes.
+
+    python -m app.cluster_launcher start --nodes 3 --base-port 7000
+    python -m app.cluster_launcher reshard --source 127.0.0.1:7000 --target 127.0.0.1:7001 --slots 100
+
+`start` spawns one server process per node, splits the 16384 slots evenly
+and introduces the nodes to each other, then keeps them running until
+interrupted. `reshard` moves slots the way redis-cli does: mark the slot
+importing/migrating, MIGRATE its keys in batches, then hand it over. Slots
+go in rounds of --round, and each step of a round is sent to a node as one
+pipeline over a connection kept open for the whole reshard.
+"""
+import argparse
+import socket
+import subprocess
+import sys
+import time
+
+from app.parsers.reply_parser import ReplyError, read_reply
+from app.utils.resp import encode_array
+from app.utils.slots import CLUSTER_SLOTS
+
+
+class NodeClient:
+    def __init__(self, address, timeout=10.0):
+        host, _, port = address.rpartition(":")
+        self.host, self.port = host, int(port)
+        self.sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def call(self, *args):
+        self.sock.sendall(encode_array(args))
+        reply = read_reply(self.reader)
+        if isinstance(reply, ReplyError):
+            raise reply
+        return reply
+
+    def pipeline(self, commands):
+        """Send commands in one write and read every reply; raises the first error after reading them all."""
+        self.sock.sendall(b"".join(encode_array(command) for command in commands))
+        replies = [read_reply(self.reader) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, ReplyError):
+                raise reply
+        return replies
+
+    def close(self):
+        self.sock.close()
+
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"node {host}:{port} did not start")
+
+
+def wait_for_cluster(clients, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        infos = [client.call("CLUSTER", "INFO").decode() for client in clients]
+        if all("cluster_state:ok" in info and f"cluster_known_nodes:{len(clients)}" in info for info in infos):
+            return
+        time.sleep(0.1)
+    raise TimeoutError("cluster did not converge")
+
+
+def start_cluster(args, server_args):
+    ports = [args.base_port + i for i in range(args.nodes)]
+    processes = [subprocess.Popen([sys.executable, "-m", "app.main", "--port", str(port),
+                                   "--cluster-enabled", "yes", "--cluster-announce-ip", args.host, *server_args])
+                 for port in ports]
+    try:
+        for port in ports:
+            wait_for_port(args.host, port)
+        clients = [NodeClient(f"{args.host}:{port}") for port in ports]
+        for i, client in enumerate(clients):
+            start = i * CLUSTER_SLOTS // len(clients)
+            end = (i + 1) * CLUSTER_SLOTS // len(clients) - 1
+            client.call("CLUSTER", "ADDSLOTSRANGE", start, end)
+        for client in clients[1:]:
+            client.call("CLUSTER", "MEET", args.host, ports[0])
+        wait_for_cluster(clients)
+        print(clients[0].call("CLUSTER", "NODES").decode(), end="", flush=True)
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+def node_ids(client):
+    """Map host:port -> node id from a node's CLUSTER NODES view."""
+    ids = {}
+    for line in client.call("CLUSTER", "NODES").decode().splitlines():
+        fields = line.split()
+        ids[fields[1].split("@")[0]] = fields[0]
+    return ids
+
+
+def move_slots(slots, source, target, others, ids, batch):
+    """Move a run of slots together; each step is one pipeline per node instead of a round-trip per slot."""
+    target.pipeline([("CLUSTER", "SETSLOT", slot, "IMPORTING", ids[source.address]) for slot in slots])
+    source.pipeline([("CLUSTER", "SETSLOT", slot, "MIGRATING", ids[target.address]) for slot in slots])
+    moved = 0
+    pending = slots
+    while pending:
+        replies = source.pipeline([("CLUSTER", "GETKEYSINSLOT", slot, batch) for slot in pending])
+        pending = [slot for slot, keys in zip(pending, replies) if keys]
+        # The target checks and deletes each batch with one multi-key command, so a batch stays within a slot
+        source.pipeline([("MIGRATE", target.host, target.port, "", 0, 5000, "KEYS", *keys) for keys in replies if keys])
+        moved += sum(len(keys) for keys in replies)
+    for client in [target, source] + others:
+        client.pipeline([("CLUSTER", "SETSLOT", slot, "NODE", ids[target.address]) for slot in slots])
+    return moved
+
+
+def reshard(args):
+    source, target = NodeClient(args.source), NodeClient(args.target)
+    ids = node_ids(source)
+    others = [NodeClient(address) for address in ids if address not in (source.address, target.address)]
+    owned = []
+    for start, end, *nodes in source.call("CLUSTER", "SLOTS"):
+        if nodes[0][2].decode() == ids[source.address]:
+            owned.extend(range(start, end + 1))
+    slots = owned[-args.slots:] if args.slots else []
+    moved = sum(move_slots(slots[i:i + args.round], source, target, others, ids, args.batch)
+                for i in range(0, len(slots), args.round))
+    print(f"Moved {len(slots)} slots ({moved} keys) from {source.address} to {target.address}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local hash-slot cluster helper")
+    commands = parser.add_subparsers(dest="command", required=True)
+    start = commands.add_parser("start", help="Spawn a local cluster; extra arguments go to every node")
+    start.add_argument("--nodes", type=int, default=3)
+    start.add_argument("--base-port", type=int, default=7000)
+    start.add_argument("--host", default="127.0.0.1")
+    move = commands.add_parser("reshard", help="Move slots from one node to another")
+    move.add_argument("--source", required=True, help="host:port of the node giving up slots")
+    move.add_argument("--target", required=True, help="host:port of the node receiving them")
+    move.add_argument("--slots", type=int, required=True, help="Number of slots to move")
+    move.add_argument("--batch", type=int, default=100, help="Keys per MIGRATE call")
+    move.add_argument("--round", type=int, default=500, help="Slots moved together, each step pipelined")
+    args, server_args = parser.parse_known_args()
+
+    if args.command == "start":
+        start_cluster(args, server_args)
+    else:
+        if server_args:
+            parser.error(f"unrecognized arguments: {' '.join(server_args)}")
+        reshard(args)
+
+
+if __name__ == "__main__":
+    main()
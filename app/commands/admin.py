@@ -0,0 +1,168 @@
+import os
+import time
+
+from app.utils.memory import format_bytes, process_rss
+from app.utils.resp import NULL_BULK, encode_array, encode_array_header, encode_bulk, encode_integer
+
+REDIS_VERSION = "7.2.0"
+
+
+class AdminCommandsMixin:
+    INFO_SECTIONS = ("server", "clients", "memory", "persistence", "stats", "replication", "cluster", "keyspace")
+    # Only reported when asked for by name or with INFO all/everything
+    EXTRA_INFO_SECTIONS = ("commandstats", "latencystats", "locks")
+
+    def used_memory(self):
+        used = sum(store.used_memory for store in self.stores)
+        if used > self.used_memory_peak:
+            self.used_memory_peak = used
+        return used
+
+    def _info_server(self):
+        return {
+            "redis_version": REDIS_VERSION,
+            "process_id": os.getpid(),
+            "tcp_port": self.args.port,
+            "uptime_in_seconds": int(time.time() - self.start_time),
+            "hz": self.config["hz"],
+            "config_file": self.config_file or "",
+        }
+
+    def _info_clients(self):
+        return {
+            "connected_clients": self.connected_clients,
+            "blocked_clients": 0,
+            "tracking_clients": len(self.tracking.clients),
+        }
+
+    def _info_memory(self):
+        used = self.used_memory()
+        rss = process_rss()
+        fields = {
+            "used_memory": used,
+            "used_memory_human": format_bytes(used),
+            "used_memory_rss": rss,
+            "used_memory_rss_human": format_bytes(rss),
+            "used_memory_peak": self.used_memory_peak,
+            "used_memory_peak_human": format_bytes(self.used_memory_peak),
+            "used_memory_dataset": used,
+            "maxmemory": self.evictor.maxmemory,
+            "maxmemory_human": format_bytes(self.evictor.maxmemory),
+            "maxmemory_policy": self.evictor.policy,
+            "lazyfree_pending_objects": self.lazyfree.pending_objects,
+        }
+        for type_name, store in self.type_stores.items():
+            fields[f"used_memory_{type_name}"] = store.used_memory
+        return fields
+
+    def _info_stats(self):
+        fields = dict(self.stats)
+        fields["expired_keys"] = self.string_store.expired_keys
+        fields["expire_cycle_cpu_milliseconds"] = self.string_store.expire_cycle_usec // 1000
+        fields["evicted_keys"] = self.evictor.evicted_keys
+        fields["lazyfreed_objects"] = self.lazyfree.freed_objects
+        fields["tracking_total_keys"] = len(self.tracking.table)
+        fields["tracking_total_items"] = self.tracking.items
+        fields["tracking_total_prefixes"] = len(self.tracking.prefixes)
+        fields["total_error_replies"] = sum(stats.failed_calls + stats.rejected_calls
+                                            for stats in self.command_stats.values())
+        return fields
+
+    def _info_replication(self):
+        return {
+            "role": "slave" if self.replica_of else "master",
+            "connected_slaves": len(self.replicas),
+            "master_replid": "8371b4fb1155b71f4a04d3e1bc3e18c4a990aeeb",
+            "master_repl_offset": self.master_repl_offset,
+        }
+
+    def _info_cluster(self):
+        return {"cluster_enabled": 1 if self.cluster else 0}
+
+    def _info_keyspace(self):
+        keys = self.dbsize()
+        if not keys:
+            return {}
+        expires, avg_ttl = self.string_store.expire_stats()
+        return {"db0": f"keys={keys},expires={expires},avg_ttl={avg_ttl}"}
+
+    def _info_locks(self):
+        fields = {"lock_stripes": len(self.string_store.locks.stripes),
+                  "lock_shared_reads": int(self.string_store.locks.shared_reads)}
+        for type_name, store in self.type_stores.items():
+            stats = store.lock_stats()
+            fields[f"{type_name}_lock_contended"] = sum(contended for _, contended in stats)
+            for i, (acquired, contended) in enumerate(stats):
+                fields[f"{type_name}_stripe_{i}"] = f"acquired={acquired},contended={contended}"
+        return fields
+
+    def handle_info(self, connection, command):
+        sections = [arg.decode(errors="replace").lower() for arg in command] or ["default"]
+        known = self.INFO_SECTIONS + self.EXTRA_INFO_SECTIONS
+        if any(section in ("all", "everything") for section in sections):
+            sections = known
+        elif "default" in sections:
+            sections = self.INFO_SECTIONS
+
+        blocks = []
+        for section in sections:
+            if section not in known:
+                continue
+            fields = getattr(self, f"_info_{section}")()
+            lines = [f"# {section.capitalize()}"] + [f"{name}:{value}" for name, value in fields.items()]
+            blocks.append("\r\n".join(lines) + "\r\n")
+        return connection.sendall(encode_bulk("\r\n".join(blocks)))
+
+    def _memory_usage(self, connection, args):
+        if len(args) not in (1, 3):
+            return connection.sendall(b"-ERR syntax error\r\n")
+        samples = None
+        if len(args) == 3:
+            if args[1].upper() != b"SAMPLES":
+                return connection.sendall(b"-ERR syntax error\r\n")
+            try:
+                samples = int(args[2])
+            except ValueError:
+                return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+            if samples < 0:
+                return connection.sendall(b"-ERR syntax error\r\n")
+        for store in self.stores:
+            usage = store.memory_usage(args[0], samples)
+            if usage is not None:
+                return connection.sendall(encode_integer(usage))
+        return connection.sendall(NULL_BULK)
+
+    def _memory_stats(self, connection):
+        used = self.used_memory()
+        keys = 0
+        stats = [("peak.allocated", self.used_memory_peak), ("total.allocated", used)]
+        for type_name, store in self.type_stores.items():
+            count, type_bytes = store.memory_stats()
+            keys += count
+            stats.append((f"{type_name}.keys", count))
+            stats.append((f"{type_name}.bytes", type_bytes))
+        stats += [("keys.count", keys), ("keys.bytes-per-key", used // keys if keys else 0),
+                  ("dataset.bytes", used), ("rss.bytes", process_rss())]
+
+        response = encode_array_header(len(stats) * 2)
+        for name, value in stats:
+            response += encode_bulk(name) + encode_integer(value)
+        return connection.sendall(response)
+
+    def handle_memory(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'MEMORY' command\r\n")
+        subcommand = command[0].upper()
+        if subcommand == b"USAGE":
+            return self._memory_usage(connection, command[1:])
+        if subcommand == b"STATS":
+            return self._memory_stats(connection)
+        return connection.sendall(f"-ERR unknown subcommand '{command[0].decode(errors='replace')}'\r\n".encode())
+
+    def dbsize(self):
+        return sum(len(store.data) for store in self.stores)
+
+    def handle_dbsize(self, connection, command):
+        if len(command) != 0:
+            return connection.sendall(b"-ERR wrong number of arguments for 'DBSIZE' command\r\n")
+        return connection.sendall(encode_integer(self.dbsize()))
@@ -0,0 +1,164 @@
+from app.utils.bitops import MAX_BIT_OFFSET
+from app.utils.resp import encode_integer, encode_reply
+
+BITOP_OPERATIONS = ("AND", "OR", "XOR", "NOT")
+BITFIELD_OVERFLOWS = ("WRAP", "SAT", "FAIL")
+BITFIELD_TYPE_ERROR = "Invalid bitfield type. Use something like i16 u8. Note that u64 is not supported but i64 is."
+
+
+def parse_bit_offset(arg, bits=1):
+    """A bit offset argument; BITFIELD's "#N" form means N fields of `bits` bits in."""
+    multiply = arg[:1] == b"#"
+    try:
+        offset = int(arg[1:] if multiply else arg)
+    except ValueError:
+        offset = -1
+    if multiply:
+        offset *= bits
+    if not 0 <= offset <= MAX_BIT_OFFSET:
+        raise ValueError("bit offset is not an integer or out of range")
+    return offset
+
+
+def parse_bitfield_type(arg):
+    """(signed, bits) for a type such as i16 or u8."""
+    kind, width = arg[:1].lower(), arg[1:]
+    if kind not in (b"i", b"u") or not width.isdigit():
+        raise ValueError(BITFIELD_TYPE_ERROR)
+    signed, bits = kind == b"i", int(width)
+    if not 1 <= bits <= (64 if signed else 63):
+        raise ValueError(BITFIELD_TYPE_ERROR)
+    return signed, bits
+
+
+def parse_bitfield(args, read_only=False):
+    """BITFIELD subcommands as operations for StringStore.bitfield; OVERFLOW applies to those after it."""
+    operations = []
+    overflow = "WRAP"
+    i = 0
+    while i < len(args):
+        subcommand = args[i].upper().decode(errors="replace")
+        if subcommand == "OVERFLOW" and i + 1 < len(args) and not read_only:
+            overflow = args[i + 1].upper().decode(errors="replace")
+            if overflow not in BITFIELD_OVERFLOWS:
+                raise ValueError("Invalid OVERFLOW type specified")
+            i += 2
+            continue
+        if subcommand == "GET" and i + 2 < len(args):
+            signed, bits = parse_bitfield_type(args[i + 1])
+            operations.append(("GET", signed, bits, parse_bit_offset(args[i + 2], bits)))
+            i += 3
+            continue
+        if subcommand in ("SET", "INCRBY") and i + 3 < len(args):
+            if read_only:
+                raise ValueError("BITFIELD_RO only supports the GET subcommand")
+            signed, bits = parse_bitfield_type(args[i + 1])
+            offset = parse_bit_offset(args[i + 2], bits)
+            try:
+                value = int(args[i + 3])
+            except ValueError as e:
+                raise ValueError("value is not an integer or out of range") from e
+            operations.append((subcommand, signed, bits, offset, value, overflow))
+            i += 4
+            continue
+        if read_only and subcommand in ("SET", "INCRBY", "OVERFLOW"):
+            raise ValueError("BITFIELD_RO only supports the GET subcommand")
+        raise ValueError("syntax error")
+    return operations
+
+
+def parse_range_args(args):
+    """[start end [BYTE|BIT]] for BITCOUNT, or [start [end [BYTE|BIT]]] for BITPOS: (start, end, bit_mode)."""
+    try:
+        start = int(args[0]) if args else 0
+        end = int(args[1]) if len(args) > 1 else None
+    except ValueError as e:
+        raise ValueError("value is not an integer or out of range") from e
+    bit_mode = False
+    if len(args) > 2:
+        unit = args[2].upper()
+        if unit not in (b"BYTE", b"BIT") or len(args) > 3:
+            raise ValueError("syntax error")
+        bit_mode = unit == b"BIT"
+    return start, end, bit_mode
+
+
+class BitmapCommandsMixin:
+    def handle_setbit(self, connection, command):
+        if len(command) != 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SETBIT' command\r\n")
+        try:
+            offset = parse_bit_offset(command[1])
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        if command[2] not in (b"0", b"1"):
+            return connection.sendall(b"-ERR bit is not an integer or out of range\r\n")
+        old = self.string_store.setbit(command[0], offset, command[2] == b"1")
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(old))
+        return None
+
+    def handle_getbit(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'GETBIT' command\r\n")
+        try:
+            offset = parse_bit_offset(command[1])
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        return connection.sendall(encode_integer(self.string_store.getbit(command[0], offset)))
+
+    def handle_bitcount(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'BITCOUNT' command\r\n")
+        if len(command) == 2:
+            return connection.sendall(b"-ERR syntax error\r\n")
+        try:
+            start, end, bit_mode = parse_range_args(command[1:])
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        count = self.string_store.bitcount(command[0], start, -1 if end is None else end, bit_mode)
+        return connection.sendall(encode_integer(count))
+
+    def handle_bitpos(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'BITPOS' command\r\n")
+        if command[1] not in (b"0", b"1"):
+            return connection.sendall(b"-ERR The bit argument must be 1 or 0.\r\n")
+        try:
+            start, end, bit_mode = parse_range_args(command[2:])
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        position = self.string_store.bitpos(command[0], int(command[1]), start, end, bit_mode)
+        return connection.sendall(encode_integer(position))
+
+    def handle_bitop(self, connection, command):
+        if len(command) < 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'BITOP' command\r\n")
+        operation = command[0].upper().decode(errors="replace")
+        if operation not in BITOP_OPERATIONS:
+            return connection.sendall(b"-ERR syntax error\r\n")
+        if operation == "NOT" and len(command) != 3:
+            return connection.sendall(b"-ERR BITOP NOT must be called with a single source key.\r\n")
+        length = self.string_store.bitop(operation, command[1], command[2:])
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(length))
+        return None
+
+    def _handle_bitfield(self, connection, command, read_only):
+        name = "BITFIELD_RO" if read_only else "BITFIELD"
+        if len(command) < 1:
+            return connection.sendall(f"-ERR wrong number of arguments for '{name}' command\r\n".encode())
+        try:
+            operations = parse_bitfield(command[1:], read_only)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        replies = self.string_store.bitfield(command[0], operations)
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_reply(replies))
+        return None
+
+    def handle_bitfield(self, connection, command):
+        return self._handle_bitfield(connection, command, read_only=False)
+
+    def handle_bitfield_ro(self, connection, command):
+        return self._handle_bitfield(connection, command, read_only=True)
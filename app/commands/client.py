@@ -0,0 +1,200 @@
+from app.commands.admin import REDIS_VERSION
+from app.utils.resp import OK, encode_integer, encode_reply
+from app.utils.slots import KEY_SPECS, command_keys
+from app.utils.tracking import TrackedClient
+
+TRACKING_FLAGS = {b"BCAST": "bcast", b"OPTIN": "optin", b"OPTOUT": "optout", b"NOLOOP": "noloop"}
+# Subcommand -> (method, argument count; -1 for one or more)
+CLIENT_SUBCOMMANDS = {
+    b"ID": ("_client_id", 0), b"SETNAME": ("_client_setname", 1), b"GETNAME": ("_client_getname", 0),
+    b"TRACKING": ("_client_tracking", -1), b"CACHING": ("_client_caching", 1),
+    b"GETREDIR": ("_client_getredir", 0), b"TRACKINGINFO": ("_client_trackinginfo", 0),
+}
+
+
+def valid_client_name(name):
+    """Client names are printable ASCII without spaces, as in Redis."""
+    return all(0x21 <= byte <= 0x7E for byte in name)
+
+
+class ClientCommandsMixin:
+    def handle_hello(self, connection, command):
+        resp = connection.resp
+        if command:
+            try:
+                resp = int(command[0])
+            except ValueError:
+                return connection.sendall(b"-ERR Protocol version is not an integer or out of range\r\n")
+            if resp not in (2, 3):
+                return connection.sendall(b"-NOPROTO unsupported protocol version\r\n")
+        name = None
+        options = list(command[1:])
+        while options:
+            option = options.pop(0).upper()
+            if option == b"AUTH" and len(options) >= 2:
+                # There are no ACL users: only the default one, which has no password, so any password will do
+                if options[0] != b"default":
+                    return connection.sendall(b"-WRONGPASS invalid username-password pair or user is disabled.\r\n")
+                del options[:2]
+            elif option == b"SETNAME" and options and valid_client_name(options[0]):
+                name = options.pop(0)
+            else:
+                return connection.sendall(f"-ERR Syntax error in HELLO option '{option.decode(errors='replace')}'"
+                                          f"\r\n".encode())
+        connection.resp = resp
+        if name is not None:
+            connection.name = name
+        return connection.sendall(encode_reply({
+            "server": "redis", "version": REDIS_VERSION, "proto": resp, "id": connection.id,
+            "mode": "cluster" if self.cluster else "standalone", "role": "replica" if self.replica_of else "master",
+            "modules": [],
+        }, resp))
+
+    def handle_client(self, connection, command):
+        subcommand, arity = CLIENT_SUBCOMMANDS.get(command[0].upper() if command else None, (None, 0))
+        if subcommand is None or (len(command) - 1 != arity if arity >= 0 else len(command) < 2):
+            name = command[0].decode(errors="replace") if command else ""
+            return connection.sendall(f"-ERR unknown subcommand or wrong number of arguments for '{name}'\r\n"
+                                      .encode())
+        return getattr(self, subcommand)(connection, command[1:])
+
+    def _client_id(self, connection, _args):
+        return connection.sendall(encode_integer(connection.id))
+
+    def _client_setname(self, connection, args):
+        if not valid_client_name(args[0]):
+            return connection.sendall(b"-ERR Client names cannot contain spaces, newlines or special characters.\r\n")
+        connection.name = args[0]
+        return connection.sendall(OK)
+
+    def _client_getname(self, connection, _args):
+        return connection.sendall(encode_reply(connection.name or None, connection.resp))
+
+    def _tracking_options(self, args):
+        """The TrackedClient options CLIENT TRACKING ON asks for, as (options, prefixes), or an error message."""
+        options = {}
+        prefixes = set()
+        args = list(args)
+        while args:
+            option = args.pop(0).upper()
+            if option in TRACKING_FLAGS:
+                options[TRACKING_FLAGS[option]] = True
+            elif option == b"PREFIX" and args:
+                prefixes.add(args.pop(0))
+            elif option == b"REDIRECT" and args:
+                redirect = args.pop(0)
+                if not redirect.isdigit():
+                    return "value is not an integer or out of range"
+                if int(redirect) not in self.clients_by_id:
+                    return "The client ID you want redirect to does not exist"
+                options["redirect"] = int(redirect)
+            else:
+                return "syntax error"
+        return options, prefixes
+
+    @staticmethod
+    def _tracking_conflict(tracked, old):
+        """Why the options in `tracked` can't be used, given the client's current ones `old`, or None."""
+        checks = (
+            (tracked.prefixes and not tracked.bcast, "PREFIX option requires BCAST mode to be enabled"),
+            (tracked.bcast and (tracked.optin or tracked.optout), "OPTIN and OPTOUT are not compatible with BCAST"),
+            (tracked.optin and tracked.optout, "You can't use both OPTIN and OPTOUT"),
+            (old is not None and old.bcast != tracked.bcast,
+             "You can't switch BCAST mode on/off before disabling tracking for this client, and then re-enabling it "
+             "with a different mode."),
+            (old is not None and (old.optin, old.optout) != (tracked.optin, tracked.optout),
+             "You can't switch OPTIN/OPTOUT mode before disabling tracking for this client, and then re-enabling it "
+             "with a different mode."),
+        )
+        for failed, message in checks:
+            if failed:
+                return message
+        taken = old.prefixes if old is not None else set()
+        for prefix in tracked.prefixes:
+            for other in tracked.prefixes - {prefix} | taken - {prefix}:
+                if other.startswith(prefix) or prefix.startswith(other):
+                    return (f"Prefix '{prefix.decode(errors='replace')}' overlaps with an existing prefix "
+                            f"'{other.decode(errors='replace')}'. Prefixes for a single client must not overlap.")
+        return None
+
+    def _client_tracking(self, connection, args):
+        switch = args[0].lower()
+        if switch == b"off":
+            self.tracking.disable(connection.id)
+            return connection.sendall(OK)
+        parsed = self._tracking_options(args[1:])
+        if switch != b"on" or isinstance(parsed, str):
+            return connection.sendall(f"-ERR {parsed if isinstance(parsed, str) else 'syntax error'}\r\n".encode())
+        options, prefixes = parsed
+        old = self.tracking.clients.get(connection.id)
+        if options.get("bcast") and not prefixes and old is None:
+            prefixes.add(b"")  # BCAST without PREFIX: every key
+        tracked = TrackedClient(connection, prefixes=prefixes, **options)
+        error = self._tracking_conflict(tracked, old)
+        if error:
+            return connection.sendall(f"-ERR {error}\r\n".encode())
+        if old is not None:
+            tracked.prefixes |= old.prefixes
+        self.tracking.enable(connection.id, tracked)
+        return connection.sendall(OK)
+
+    def _client_caching(self, connection, args):
+        tracked = self.tracking.clients.get(connection.id)
+        if tracked is None or not (tracked.optin or tracked.optout):
+            return connection.sendall(b"-ERR CLIENT CACHING can be called only when the client is in tracking mode "
+                                      b"with OPTIN or OPTOUT mode enabled\r\n")
+        answer = args[0].lower()
+        if answer not in (b"yes", b"no"):
+            return connection.sendall(b"-ERR syntax error\r\n")
+        if (answer == b"yes") != tracked.optin:
+            mode = "OPTIN" if answer == b"yes" else "OPTOUT"
+            return connection.sendall(f"-ERR CLIENT CACHING {answer.upper().decode()} is only valid when tracking is "
+                                      f"enabled in {mode} mode.\r\n".encode())
+        tracked.caching = answer == b"yes"
+        return connection.sendall(OK)
+
+    def _client_getredir(self, connection, _args):
+        tracked = self.tracking.clients.get(connection.id)
+        return connection.sendall(encode_integer(-1 if tracked is None else tracked.redirect))
+
+    def _client_trackinginfo(self, connection, _args):
+        tracked = self.tracking.clients.get(connection.id)
+        if tracked is None:
+            info = {"flags": ["off"], "redirect": -1, "prefixes": []}
+        else:
+            flags = ["on"] + [flag for flag in ("bcast", "optin", "optout", "noloop") if getattr(tracked, flag)]
+            if tracked.caching is not None:
+                flags.append("caching-yes" if tracked.caching else "caching-no")
+            if tracked.redirect and tracked.redirect not in self.clients_by_id:
+                flags.append("broken_redirect")
+            info = {"flags": flags, "redirect": tracked.redirect, "prefixes": sorted(tracked.prefixes)}
+        return connection.sendall(encode_reply(info, connection.resp))
+
+    def call_tracked(self, connection, cmd, command, handler):
+        """
+        call_handler while clients track keys for client-side caching. A
+        write invalidates every key it names, whether or not it changed it:
+        an extra invalidation only costs the client a cache miss. A tracking
+        client's read of keys remembers them, and any invalidation that
+        races with its reply is repeated after it.
+        """
+        client_id = getattr(connection, "id", 0)  # The master link has none
+        tracked = self.tracking.clients.get(client_id)
+        if cmd in ("FLUSHALL", "FLUSHDB"):
+            self.call_handler(connection, cmd, command, handler)
+            self.tracking.flush()
+        elif cmd in self.keyspace_writes:
+            self.call_handler(connection, cmd, command, handler)
+            self.tracking.invalidate(command_keys(cmd, command[1:]), client_id)
+        elif tracked is not None and cmd in KEY_SPECS:
+            self.tracking.begin_read(client_id, tracked, command_keys(cmd, command[1:]),
+                                     self.config["tracking-table-max-keys"])
+            try:
+                self.call_handler(connection, cmd, command, handler)
+            finally:
+                self.tracking.end_read(tracked)
+        else:
+            self.call_handler(connection, cmd, command, handler)
+        # CLIENT CACHING only applies to the command after it
+        if tracked is not None and not (cmd == "CLIENT" and [arg.upper() for arg in command[1:2]] == [b"CACHING"]):
+            tracked.caching = None
@@ -0,0 +1,294 @@
+from app.parsers.reply_parser import ReplyError, read_reply
+from app.utils.resp import OK, encode_array, encode_bulk, encode_integer, encode_reply
+from app.utils.slots import CLUSTER_SLOTS, command_keys, key_hash_slot
+
+
+class ClusterCommandsMixin:
+    def cluster_redirect(self, connection, cmd, args):
+        """
+        Return the -MOVED/-ASK/... error for a command whose keys this node
+        doesn't serve, or None to execute it here.
+        """
+        asking = connection in self.asking_clients
+        if cmd != "ASKING":
+            self.asking_clients.discard(connection)
+        keys = command_keys(cmd, args)
+        if not keys:
+            return None
+        slot = key_hash_slot(keys[0])
+        if any(key_hash_slot(key) != slot for key in keys[1:]):
+            return b"-CROSSSLOT Keys in request don't hash to the same slot\r\n"
+
+        cluster = self.cluster
+        owner = cluster.slots[slot]
+        if owner is None:
+            return b"-CLUSTERDOWN Hash slot not served\r\n"
+        target = cluster.migrating.get(slot) if owner is cluster.myself else None
+        importing = owner is not cluster.myself and asking and slot in cluster.importing
+        if target is None and not importing:
+            if owner is cluster.myself:
+                return None
+            return f"-MOVED {slot} {owner.address}\r\n".encode()
+
+        existing = set()
+        for store in self.stores:
+            existing |= store.existing(keys)
+        missing = sum(1 for key in keys if key not in existing)
+        if missing and len(keys) > 1 and missing < len(keys):
+            return b"-TRYAGAIN Multiple keys request during rehashing of slot\r\n"
+        if target is not None and missing:
+            # Keys that already left for the importing node are served there
+            return f"-ASK {slot} {target.address}\r\n".encode()
+        return None
+
+    def handle_asking(self, connection, command):
+        if len(command) != 0:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ASKING' command\r\n")
+        if self.cluster is None:
+            return connection.sendall(b"-ERR This instance has cluster support disabled\r\n")
+        self.asking_clients.add(connection)
+        return connection.sendall(OK)
+
+    def _parse_slot(self, value):
+        try:
+            slot = int(value)
+        except ValueError:
+            slot = -1
+        if not 0 <= slot < CLUSTER_SLOTS:
+            raise ValueError("Invalid or out of range slot")
+        return slot
+
+    def _cluster_info(self, args):
+        if args:
+            raise ValueError("wrong number of arguments for 'CLUSTER|INFO' command")
+        cluster = self.cluster
+        assigned = sum(1 for owner in cluster.slots if owner is not None)
+        fields = {
+            "cluster_enabled": 1,
+            "cluster_state": "ok" if assigned == CLUSTER_SLOTS else "fail",
+            "cluster_slots_assigned": assigned,
+            "cluster_slots_ok": assigned,
+            "cluster_slots_pfail": 0,
+            "cluster_slots_fail": 0,
+            "cluster_known_nodes": len(cluster.nodes),
+            "cluster_size": len({owner.node_id for owner in cluster.slots if owner is not None}),
+            "cluster_current_epoch": cluster.current_epoch,
+            "cluster_my_epoch": cluster.myself.config_epoch,
+        }
+        return encode_bulk("".join(f"{name}:{value}\r\n" for name, value in fields.items()))
+
+    def _cluster_myid(self, args):
+        if args:
+            raise ValueError("wrong number of arguments for 'CLUSTER|MYID' command")
+        return encode_bulk(self.cluster.myself.node_id)
+
+    def _cluster_nodes(self, args):
+        if args:
+            raise ValueError("wrong number of arguments for 'CLUSTER|NODES' command")
+        return encode_bulk(self.cluster.describe())
+
+    def _cluster_slots(self, args):
+        if args:
+            raise ValueError("wrong number of arguments for 'CLUSTER|SLOTS' command")
+        return encode_reply([[start, end, [node.host, node.port, node.node_id]]
+                             for start, end, node in self.cluster.slots_by_node()])
+
+    def _cluster_shards(self, args):
+        if args:
+            raise ValueError("wrong number of arguments for 'CLUSTER|SHARDS' command")
+        ranges = {}
+        for start, end, node in self.cluster.slots_by_node():
+            ranges.setdefault(node.node_id, []).extend([start, end])
+        shards = []
+        for node in list(self.cluster.nodes.values()):
+            offset = self.master_repl_offset if node is self.cluster.myself else 0
+            health = "online" if node.link_state == "connected" else "fail"
+            shards.append(["slots", ranges.get(node.node_id, []), "nodes", [[
+                "id", node.node_id, "port", node.port, "ip", node.host, "endpoint", node.host,
+                "role", "master", "replication-offset", offset, "health", health]]])
+        return encode_reply(shards)
+
+    def _cluster_keyslot(self, args):
+        if len(args) != 1:
+            raise ValueError("wrong number of arguments for 'CLUSTER|KEYSLOT' command")
+        return encode_integer(key_hash_slot(args[0]))
+
+    def _cluster_countkeysinslot(self, args):
+        if len(args) != 1:
+            raise ValueError("wrong number of arguments for 'CLUSTER|COUNTKEYSINSLOT' command")
+        slot = self._parse_slot(args[0])
+        return encode_integer(sum(store.count_in_slot(slot) for store in self.stores))
+
+    def _cluster_getkeysinslot(self, args):
+        if len(args) != 2:
+            raise ValueError("wrong number of arguments for 'CLUSTER|GETKEYSINSLOT' command")
+        slot = self._parse_slot(args[0])
+        try:
+            count = int(args[1])
+        except ValueError:
+            count = -1
+        if count < 0:
+            raise ValueError("Invalid number of keys")
+        keys = []
+        for store in self.stores:
+            keys += store.keys_in_slot(slot, count - len(keys))
+        return encode_array(keys)
+
+    def _cluster_meet(self, args):
+        if len(args) not in (2, 3):
+            raise ValueError("wrong number of arguments for 'CLUSTER|MEET' command")
+        try:
+            port = int(args[1])
+        except ValueError as e:
+            raise ValueError(f"Invalid base port specified: {args[1].decode(errors='replace')}") from e
+        try:
+            self.cluster.meet(args[0].decode(), port)
+        except (OSError, ReplyError) as e:
+            raise ValueError(f"Can't meet {args[0].decode(errors='replace')}:{port}: {e}") from e
+        return OK
+
+    def _cluster_hello(self, args):
+        # Node-to-node exchange: the caller's own CLUSTER NODES line in, our view of the cluster out
+        if len(args) != 1:
+            raise ValueError("wrong number of arguments for 'CLUSTER|HELLO' command")
+        self.cluster.apply_node_line(args[0].decode(), authoritative=True)
+        return encode_bulk(self.cluster.describe())
+
+    def _cluster_addslots(self, args):
+        if not args:
+            raise ValueError("wrong number of arguments for 'CLUSTER|ADDSLOTS' command")
+        self.cluster.add_slots([self._parse_slot(arg) for arg in args])
+        self.cluster.broadcast()
+        return OK
+
+    def _slot_range_args(self, args, name):
+        if not args or len(args) % 2:
+            raise ValueError(f"wrong number of arguments for 'CLUSTER|{name}' command")
+        slots = []
+        for i in range(0, len(args), 2):
+            start, end = self._parse_slot(args[i]), self._parse_slot(args[i + 1])
+            if start > end:
+                raise ValueError(f"start slot number {start} is greater than end slot number {end}")
+            slots.extend(range(start, end + 1))
+        return slots
+
+    def _cluster_addslotsrange(self, args):
+        self.cluster.add_slots(self._slot_range_args(args, "ADDSLOTSRANGE"))
+        self.cluster.broadcast()
+        return OK
+
+    def _cluster_delslots(self, args):
+        if not args:
+            raise ValueError("wrong number of arguments for 'CLUSTER|DELSLOTS' command")
+        self.cluster.del_slots([self._parse_slot(arg) for arg in args])
+        return OK
+
+    def _cluster_setslot(self, args):
+        if len(args) < 2:
+            raise ValueError("wrong number of arguments for 'CLUSTER|SETSLOT' command")
+        slot, action = self._parse_slot(args[0]), args[1].upper()
+        node_id = args[2].decode(errors="replace") if len(args) > 2 else None
+        if action == b"STABLE":
+            self.cluster.set_stable(slot)
+            return OK
+        if node_id is None or len(args) != 3:
+            raise ValueError("syntax error")
+        if action == b"MIGRATING":
+            self.cluster.set_migrating(slot, node_id)
+        elif action == b"IMPORTING":
+            self.cluster.set_importing(slot, node_id)
+        elif action == b"NODE":
+            if (node_id != self.cluster.myself.node_id and self.cluster.slots[slot] is self.cluster.myself
+                    and any(store.count_in_slot(slot) for store in self.stores)):
+                raise ValueError(f"Can't assign hashslot {slot} to a different node while I still hold keys "
+                                 "for this hash slot.")
+            self.cluster.set_node(slot, node_id)
+            self.cluster.broadcast()
+        else:
+            raise ValueError("Invalid CLUSTER SETSLOT action or number of arguments. Try CLUSTER HELP")
+        return OK
+
+    def handle_cluster(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'CLUSTER' command\r\n")
+        if self.cluster is None:
+            return connection.sendall(b"-ERR This instance has cluster support disabled\r\n")
+        subcommands = {
+            b"INFO": self._cluster_info, b"MYID": self._cluster_myid, b"NODES": self._cluster_nodes,
+            b"SLOTS": self._cluster_slots, b"SHARDS": self._cluster_shards, b"KEYSLOT": self._cluster_keyslot,
+            b"COUNTKEYSINSLOT": self._cluster_countkeysinslot, b"GETKEYSINSLOT": self._cluster_getkeysinslot,
+            b"MEET": self._cluster_meet, b"HELLO": self._cluster_hello, b"ADDSLOTS": self._cluster_addslots,
+            b"ADDSLOTSRANGE": self._cluster_addslotsrange, b"DELSLOTS": self._cluster_delslots,
+            b"SETSLOT": self._cluster_setslot,
+        }
+        handler = subcommands.get(command[0].upper())
+        if handler is None:
+            return connection.sendall(f"-ERR unknown subcommand '{command[0].decode(errors='replace')}'. "
+                                      "Try CLUSTER HELP.\r\n".encode())
+        try:
+            return connection.sendall(handler(command[1:]))
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+
+    def _migrate_transfer(self, sock, reader, replace):
+        def send(commands):
+            # ASKING is one-shot, so each command gets its own; the target is importing the slot
+            sock.sendall(b"".join(encode_array(["ASKING"]) + encode_array(command) for command in commands))
+            replies = [read_reply(reader) for _ in range(len(commands) * 2)]
+            for reply in replies:
+                if isinstance(reply, ReplyError):
+                    raise reply
+            return replies[-1]
+
+        def transfer(batch):
+            if replace:
+                send([["DEL", *batch]])
+            elif send([["EXISTS", *batch]]):
+                raise ReplyError("BUSYKEY Target key name already exists.")
+            send([command for commands in batch.values() for command in commands])
+
+        return transfer
+
+    def handle_migrate(self, connection, command):
+        if len(command) < 5:
+            return connection.sendall(b"-ERR wrong number of arguments for 'MIGRATE' command\r\n")
+        host, port, key, db, timeout = command[:5]
+        copy = replace = False
+        keys = [key]
+        i = 5
+        while i < len(command):
+            option = command[i].upper()
+            if option == b"COPY":
+                copy = True
+            elif option == b"REPLACE":
+                replace = True
+            elif option == b"KEYS" and key == b"":
+                keys = command[i + 1:]
+                break
+            else:
+                return connection.sendall(b"-ERR syntax error\r\n")
+            i += 1
+        try:
+            port, timeout = int(port), int(timeout)
+        except ValueError:
+            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+        if db != b"0":
+            return connection.sendall(b"-ERR Target database must be 0\r\n")
+
+        moved = []
+        try:
+            with self.migrate_connections.connection(host.decode(), port, max(timeout, 1) / 1000) as (sock, reader):
+                transfer = self._migrate_transfer(sock, reader, replace)
+                for store in self.stores:
+                    moved += store.migrate(keys, transfer, copy)
+        except ReplyError as e:
+            if str(e).startswith("BUSYKEY"):
+                return connection.sendall(f"-{e}\r\n".encode())
+            return connection.sendall(f"-ERR Target instance replied with error: {e}\r\n".encode())
+        except OSError as e:
+            return connection.sendall(f"-IOERR error or timeout connecting to the client: {e}\r\n".encode())
+        if not moved:
+            return connection.sendall(b"+NOKEY\r\n")
+        if not copy and not self.replica_of:
+            self.propagate_to_replicas(["DEL", *moved])
+        return connection.sendall(OK)
@@ -0,0 +1,123 @@
+from app.utils.config import CONFIG_PARAMS, NO_EFFECT, parse_value, render_value, rewrite_config_file, without_effect
+from app.utils.glob import compile_pattern
+from app.utils.logger import NOTICE, log, set_loglevel
+from app.utils.resp import OK, encode_array
+
+
+class ConfigCommandsMixin:
+    def _apply_config(self, name, value):
+        """Hand a new value to the component using it; parameters read from self.config on use need nothing."""
+        if name == "maxmemory":
+            self.evictor.maxmemory = value
+        elif name == "maxmemory-policy":
+            self.evictor.set_policy(value)
+        elif name == "maxmemory-samples":
+            self.evictor.samples = value
+        elif name == "slowlog-log-slower-than":
+            self.slowlog.slower_than = value
+        elif name == "slowlog-max-len":
+            self.slowlog.set_max_len(value)
+        elif name == "latency-monitor-threshold":
+            self.latency_monitor.threshold = value
+        elif name == "lazyfree-lazy-eviction":
+            self.evictor.lazy = value
+        elif name == "lazyfree-lazy-expire":
+            self.string_store.lazy_expire = value
+        elif name == "loglevel":
+            set_loglevel(value)
+        elif name == "dir":
+            self.dir = value
+        elif name == "dbfilename":
+            self.dbfilename = value
+        elif name == "hash-max-listpack-entries":
+            self.hash_store.max_listpack_entries = value
+        elif name == "hash-max-listpack-value":
+            self.hash_store.max_listpack_value = value
+        elif name == "set-max-intset-entries":
+            self.set_store.max_intset_entries = value
+        elif name == "set-max-listpack-entries":
+            self.set_store.max_listpack_entries = value
+        elif name == "set-max-listpack-value":
+            self.set_store.max_listpack_value = value
+        elif name == "stream-node-max-bytes":
+            self.stream_store.node_max_bytes = value
+        elif name == "stream-node-max-entries":
+            self.stream_store.node_max_entries = value
+        elif name == "hll-sparse-max-bytes":
+            self.string_store.hll_sparse_max_bytes = value
+        elif name == "client-output-buffer-limit" and self.executor:
+            self.executor.set_output_buffer_limits(value)
+
+    def _config_get(self, connection, args):
+        matchers = [compile_pattern(arg.decode(errors="replace").lower()) for arg in args]
+        reply = []
+        for name in CONFIG_PARAMS:
+            if any(match(name) for match in matchers):
+                reply += [name, render_value(name, self.config[name])]
+        return connection.sendall(encode_array(reply))
+
+    def _config_set(self, connection, args):
+        if len(args) % 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'CONFIG|SET' command\r\n")
+        # Validate every pair before applying any, so a bad one leaves the configuration untouched
+        updates = {}
+        for i in range(0, len(args), 2):
+            name = args[i].decode(errors="replace").lower()
+            param = CONFIG_PARAMS.get(name)
+            if param is None:
+                return connection.sendall(
+                    f"-ERR Unknown option or number of arguments for CONFIG SET - '{name}'\r\n".encode())
+            try:
+                if not param.mutable:
+                    raise ValueError("can't set immutable config")
+                if name in updates:
+                    raise ValueError("duplicate parameter")
+                updates[name] = parse_value(name, args[i + 1].decode(errors="replace"), self.config[name])
+            except ValueError as e:
+                return connection.sendall(
+                    f"-ERR CONFIG SET failed (possibly related to argument '{name}') - {e}\r\n".encode())
+        for name, value in updates.items():
+            self.config[name] = value
+            self._apply_config(name, value)
+        for name in without_effect(updates):
+            log.warning("CONFIG SET %s %s", name, NO_EFFECT)
+        return connection.sendall(OK)
+
+    def _config_rewrite(self, connection):
+        if not self.config_file:
+            return connection.sendall(b"-ERR The server is running without a config file\r\n")
+        try:
+            rewrite_config_file(self.config_file, self.config)
+        except OSError as e:
+            log.warning("CONFIG REWRITE failed: %s", e)
+            return connection.sendall(f"-ERR Rewriting config file: {e.strerror}\r\n".encode())
+        log.log(NOTICE, "CONFIG REWRITE executed with success.")
+        return connection.sendall(OK)
+
+    def reset_stats(self):
+        """CONFIG RESETSTAT: zero the INFO stats, commandstats and lock counters; SLOWLOG and LATENCY keep theirs."""
+        self.stats = dict.fromkeys(self.stats, 0)
+        self.command_stats.clear()
+        self.string_store.expired_keys = 0
+        self.string_store.expire_cycle_usec = 0
+        self.evictor.evicted_keys = 0
+        self.lazyfree.freed_objects = 0
+        self.used_memory_peak = 0
+        for store in self.stores:
+            store.locks.reset_stats()
+
+    def handle_config(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'CONFIG' command\r\n")
+        subcommand = command[0].upper()
+        if subcommand == b"GET" and len(command) >= 2:
+            return self._config_get(connection, command[1:])
+        if subcommand == b"SET" and len(command) >= 3:
+            return self._config_set(connection, command[1:])
+        if subcommand == b"REWRITE" and len(command) == 1:
+            return self._config_rewrite(connection)
+        if subcommand == b"RESETSTAT" and len(command) == 1:
+            self.reset_stats()
+            return connection.sendall(OK)
+        return connection.sendall(f"-ERR unknown subcommand or wrong number of arguments for "
+                                  f"'{command[0].decode(errors='replace')}'\r\n".encode())
@@ -0,0 +1,19 @@
+from app.utils.resp import PONG, encode_array, encode_bulk
+
+
+class ConnectionCommandsMixin:
+    def handle_ping(self, connection, command):
+        if len(command) != 0:
+            return connection.sendall(b"-ERR wrong number of arguments for 'PING' command\r\n")
+        if connection == self.master_connection_socket:
+            return None
+        with self.subscriptions_lock:
+            is_subscribed = connection in self.subscriptions and self.subscriptions[connection]
+        if is_subscribed:
+            return connection.sendall(encode_array([b"pong", b""]))
+        return connection.sendall(PONG)
+
+    def handle_echo(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ECHO' command\r\n")
+        return connection.sendall(encode_bulk(command[0]))
@@ -0,0 +1,71 @@
+import time
+from contextlib import ExitStack
+
+from app.utils.profiler import collapsed, sample_stacks
+from app.utils.resp import OK, encode_bulk
+
+POPULATE_BATCH = 1000
+
+
+class DebugCommandsMixin:
+    def _debug_sleep(self, connection, args):
+        if len(args) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'DEBUG|SLEEP' command\r\n")
+        try:
+            seconds = float(args[0])
+        except ValueError:
+            return connection.sendall(b"-ERR value is not a valid float\r\n")
+        # Hold every stripe so the whole keyspace stalls, as a blocked Redis event loop would
+        with ExitStack() as stack:
+            for store in self.stores:
+                stack.enter_context(store.locks.write_all())
+            time.sleep(seconds)
+        return connection.sendall(OK)
+
+    def _debug_populate(self, connection, args):
+        if not 1 <= len(args) <= 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'DEBUG|POPULATE' command\r\n")
+        try:
+            count = int(args[0])
+            size = int(args[2]) if len(args) == 3 else None
+        except ValueError:
+            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+        if count < 0 or (size is not None and size < 0):
+            return connection.sendall(b"-ERR value is out of range, must be positive\r\n")
+        prefix = args[1] if len(args) >= 2 else b"key"
+        for first in range(0, count, POPULATE_BATCH):
+            keys = [b"%s:%d" % (prefix, i) for i in range(first, min(first + POPULATE_BATCH, count))]
+            # Like Redis, keys that already exist (of any type) are left alone
+            existing = set().union(*(store.existing(keys) for store in self.stores))
+            pairs = []
+            for key in keys:
+                if key not in existing:
+                    value = b"value:" + key[len(prefix) + 1:]
+                    if size is not None:
+                        value = value[:size].ljust(size, b"\0")
+                    pairs.append((key, value))
+            if pairs:
+                self.string_store.mset(pairs)
+        return connection.sendall(OK)
+
+    def _debug_profile(self, connection, args):
+        if not 1 <= len(args) <= 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'DEBUG|PROFILE' command\r\n")
+        try:
+            seconds = float(args[0])
+            hz = int(args[1]) if len(args) == 2 else 100
+        except ValueError:
+            return connection.sendall(b"-ERR value is not a valid float\r\n")
+        if seconds <= 0 or not 1 <= hz <= 10000:
+            return connection.sendall(b"-ERR seconds must be positive and hz between 1 and 10000\r\n")
+        return connection.sendall(encode_bulk(collapsed(sample_stacks(seconds, hz))))
+
+    def handle_debug(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'DEBUG' command\r\n")
+        subcommands = {b"SLEEP": self._debug_sleep, b"POPULATE": self._debug_populate,
+                       b"PROFILE": self._debug_profile}
+        subcommand = subcommands.get(command[0].upper())
+        if subcommand is None:
+            return connection.sendall(f"-ERR unknown subcommand '{command[0].decode(errors='replace')}'\r\n".encode())
+        return subcommand(connection, command[1:])
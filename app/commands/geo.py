@@ -0,0 +1,78 @@
+from app.utils.geohash import encode as encode_geohash, decode as decode_geohash, haversine
+from app.utils.resp import NULL_BULK, encode_array, encode_bulk, encode_integer
+
+
+class GeoCommandsMixin:
+    def handle_geoadd(self, connection, command):
+        if len(command) < 4 or len(command) % 3 != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'GEOADD' command\r\n")
+
+        key = command[0]
+        locations = command[1:]
+        added_count = 0
+        for i in range(0, len(locations), 3):
+            try:
+                longitude = float(locations[i])
+                latitude = float(locations[i + 1])
+                location = locations[i + 2]
+                if not -180 <= longitude <= 180 or not -85.05112878 <= latitude <= 85.05112878:
+                    raise ValueError
+            except (ValueError, IndexError):
+                return connection.sendall(
+                    b"-ERR invalid longitude, latitude pair for '%s'\r\n" % locations[i + 2])
+
+            score = encode_geohash(longitude, latitude)
+            added_count += self.sorted_set_store.zadd(key, [str(score), location])
+
+        return connection.sendall(encode_integer(added_count))
+
+    def handle_geopos(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'GEOPOS' command\r\n")
+        key, locations = command[0], command[1:]
+        response = b"*%d\r\n" % len(locations)
+        for loc in locations:
+            score = self.sorted_set_store.zscore(key, loc)
+            if score is None:
+                response += b"*-1\r\n"
+            else:
+                longitude, latitude = decode_geohash(int(score))
+                response += encode_array([longitude, latitude])
+
+        return connection.sendall(response)
+
+    def handle_geodist(self, connection, command):
+        if len(command) != 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'GEODIST' command\r\n")
+        key, loc1, loc2 = command[0], command[1], command[2]
+        score1 = self.sorted_set_store.zscore(key, loc1)
+        score2 = self.sorted_set_store.zscore(key, loc2)
+
+        if score1 is None or score2 is None:
+            return connection.sendall(NULL_BULK)
+
+        lon1, lat1 = decode_geohash(int(score1))
+        lon2, lat2 = decode_geohash(int(score2))
+
+        distance = haversine(lon1, lat1, lon2, lat2)
+
+        return connection.sendall(encode_bulk(distance))
+
+    def handle_geosearch(self, connection, command):
+        if len(command) < 7 or command[1].upper() != b'FROMLONLAT' or command[4].upper() != b'BYRADIUS':
+            return connection.sendall(b"-ERR syntax error\r\n")
+
+        key = command[0]
+        try:
+            longitude = float(command[2])
+            latitude = float(command[3])
+            radius = float(command[5])
+            unit = command[6].decode().upper()
+        except ValueError:
+            return connection.sendall(b"-ERR invalid number formats\r\n")
+
+        try:
+            results = self.sorted_set_store.geosearch(key, longitude, latitude, radius, unit)
+            return connection.sendall(encode_array(results))
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
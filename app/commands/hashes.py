@@ -0,0 +1,81 @@
+from app.utils.resp import encode_array, encode_bulk, encode_integer, encode_map, encode_null
+
+
+class HashCommandsMixin:
+    def handle_hset(self, connection, command):
+        if len(command) < 3 or len(command) % 2 != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HSET' command\r\n")
+        pairs = [(command[i], command[i + 1]) for i in range(1, len(command), 2)]
+        added = self.hash_store.hset(command[0], pairs)
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(added))
+        return None
+
+    def handle_hget(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HGET' command\r\n")
+        value = self.hash_store.hget(command[0], command[1])
+        if value is None:
+            return connection.sendall(encode_null(connection.resp))
+        return connection.sendall(encode_bulk(value))
+
+    def handle_hmget(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HMGET' command\r\n")
+        return connection.sendall(encode_array(self.hash_store.hmget(command[0], command[1:])))
+
+    def handle_hdel(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HDEL' command\r\n")
+        deleted = self.hash_store.hdel(command[0], command[1:])
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(deleted))
+        return None
+
+    def handle_hgetall(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HGETALL' command\r\n")
+        return connection.sendall(encode_map(self.hash_store.hgetall(command[0]), connection.resp))
+
+    def handle_hincrby(self, connection, command):
+        if len(command) != 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HINCRBY' command\r\n")
+        try:
+            increment = int(command[2])
+        except ValueError:
+            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+        try:
+            result = self.hash_store.hincrby(command[0], command[1], increment)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(result))
+        return None
+
+    def handle_hlen(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HLEN' command\r\n")
+        return connection.sendall(encode_integer(self.hash_store.hlen(command[0])))
+
+    def handle_hexists(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HEXISTS' command\r\n")
+        return connection.sendall(encode_integer(1 if self.hash_store.hexists(command[0], command[1]) else 0))
+
+    def handle_hscan(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'HSCAN' command\r\n")
+        cursor = self._parse_cursor(command[1])
+        if cursor is None:
+            return connection.sendall(b"-ERR invalid cursor\r\n")
+        try:
+            match, count, _ = self._parse_scan_options(command[2:], allow_type=False)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+
+        cursor, items = self.hash_store.hscan(command[0], cursor, count)
+        flattened = []
+        for field, value in items:
+            if match is None or match(field):
+                flattened.extend((field, value))
+        return connection.sendall(encode_array([cursor, flattened]))
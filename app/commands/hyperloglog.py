@@ -0,0 +1,34 @@
+from app.utils.hyperloglog import InvalidHLLError
+from app.utils.resp import OK, encode_integer
+
+
+class HyperLogLogCommandsMixin:
+    def handle_pfadd(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'PFADD' command\r\n")
+        try:
+            changed = self.string_store.pfadd(command[0], command[1:])
+        except InvalidHLLError as e:
+            return connection.sendall(f"-WRONGTYPE {e}\r\n".encode())
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(1 if changed else 0))
+        return None
+
+    def handle_pfcount(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'PFCOUNT' command\r\n")
+        try:
+            return connection.sendall(encode_integer(self.string_store.pfcount(command)))
+        except InvalidHLLError as e:
+            return connection.sendall(f"-WRONGTYPE {e}\r\n".encode())
+
+    def handle_pfmerge(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'PFMERGE' command\r\n")
+        try:
+            self.string_store.pfmerge(command[0], command[1:])
+        except InvalidHLLError as e:
+            return connection.sendall(f"-WRONGTYPE {e}\r\n".encode())
+        if connection != self.master_connection_socket:
+            return connection.sendall(OK)
+        return None
@@ -0,0 +1,182 @@
+from contextlib import ExitStack
+
+from app.utils.eviction import idle_seconds, lfu_decayed_counter
+from app.utils.glob import compile_pattern
+from app.utils.resp import NULL_BULK, OK, encode_array, encode_array_chunks, encode_bulk, encode_integer, encode_simple
+from app.utils.scan_dict import scan
+
+
+class KeyspaceCommandsMixin:
+    def _delete(self, connection, command, name, lazy):
+        if len(command) < 1:
+            return connection.sendall(f"-ERR wrong number of arguments for '{name}' command\r\n".encode())
+        deleted = set()
+        for store in self.stores:
+            deleted |= store.delete_many(command, lazy)
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(len(deleted)))
+        return None
+
+    def handle_del(self, connection, command):
+        return self._delete(connection, command, "DEL", self.config["lazyfree-lazy-user-del"])
+
+    def handle_unlink(self, connection, command):
+        """DEL that leaves freeing big values to the lazyfree thread; the keys are gone before it replies."""
+        return self._delete(connection, command, "UNLINK", lazy=True)
+
+    def _flush(self, connection, command, name):
+        if len(command) > 1:
+            return connection.sendall(f"-ERR wrong number of arguments for '{name}' command\r\n".encode())
+        lazy = self.config["lazyfree-lazy-user-flush"]
+        if command:
+            mode = command[0].upper()
+            if mode not in (b"ASYNC", b"SYNC"):
+                return connection.sendall(b"-ERR syntax error\r\n")
+            lazy = mode == b"ASYNC"
+        for store in self.stores:
+            store.flush(lazy)
+        if connection != self.master_connection_socket:
+            return connection.sendall(OK)
+        return None
+
+    def handle_flushall(self, connection, command):
+        return self._flush(connection, command, "FLUSHALL")
+
+    def handle_flushdb(self, connection, command):
+        """FLUSHALL under another name: there is a single database."""
+        return self._flush(connection, command, "FLUSHDB")
+
+    def handle_exists(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'EXISTS' command\r\n")
+        existing = set()
+        for store in self.stores:
+            existing |= store.existing(command)
+        count = sum(1 for key in command if key in existing)
+        return connection.sendall(encode_integer(count))
+
+    def handle_touch(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'TOUCH' command\r\n")
+        touched = set()
+        for store in self.stores:
+            touched |= store.touch(command)
+        return connection.sendall(encode_integer(sum(1 for key in command if key in touched)))
+
+    def handle_type(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'TYPE' command\r\n")
+        key = command[0]
+        for type_name, store in self.type_stores.items():
+            if store.exists(key):
+                return connection.sendall(encode_simple(type_name))
+        return connection.sendall(b"+none\r\n")
+
+    def _object_access(self, connection, subcommand, key):
+        lfu = self.evictor.policy.endswith("-lfu")
+        if subcommand == b"IDLETIME" and lfu:
+            return connection.sendall(
+                b"-ERR An LFU maxmemory policy is selected, idle time not tracked.\r\n")
+        if subcommand == b"FREQ" and not lfu:
+            return connection.sendall(
+                b"-ERR An LFU maxmemory policy is not selected, access frequency not tracked.\r\n")
+        for store in self.stores:
+            value = store.access_value(key)
+            if value is not None:
+                if subcommand == b"FREQ":
+                    return connection.sendall(encode_integer(lfu_decayed_counter(value)))
+                return connection.sendall(encode_integer(idle_seconds(value)))
+        return connection.sendall(NULL_BULK)
+
+    def handle_object(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'OBJECT' command\r\n")
+        subcommand = command[0].upper()
+        if subcommand not in (b"ENCODING", b"IDLETIME", b"FREQ"):
+            return connection.sendall(f"-ERR unknown subcommand '{command[0].decode(errors='replace')}'\r\n".encode())
+        if len(command) != 2:
+            return connection.sendall(
+                f"-ERR wrong number of arguments for 'OBJECT|{subcommand.decode()}' command\r\n".encode())
+        if subcommand != b"ENCODING":
+            return self._object_access(connection, subcommand, command[1])
+        for store in self.stores:
+            encoding = store.encoding(command[1])
+            if encoding is not None:
+                return connection.sendall(encode_bulk(encoding))
+        return connection.sendall(NULL_BULK)
+
+    def _scan_keyspace(self, cursor, count, stores):
+        with ExitStack() as stack:
+            for store in stores:
+                stack.enter_context(store.locks.read_all())
+            cursor, keys = scan([store.data for store in stores], cursor, count)
+        # Keys past their deadline are expired as the scan meets them, not returned
+        expired = self.string_store.expire_if_needed(keys)
+        return cursor, [key for key in keys if key not in expired] if expired else keys
+
+    def handle_keys(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'KEYS' command\r\n")
+        match = None if command[0] == b"*" else compile_pattern(command[0])
+        keys = {}
+        cursor = 0
+        while True:
+            # Walk the keyspace in chunks so writers can interleave with a long KEYS call
+            cursor, chunk = self._scan_keyspace(cursor, 1000, self.stores)
+            for key in chunk:
+                if match is None or match(key):
+                    keys[key] = None
+            if cursor == 0:
+                break
+        for chunk in encode_array_chunks(keys):
+            connection.sendall(chunk)
+        return None
+
+    def _parse_scan_options(self, args, allow_type):
+        match, count, key_type = None, 10, None
+        if len(args) % 2 != 0:
+            raise ValueError("syntax error")
+        for i in range(0, len(args), 2):
+            option, value = args[i].upper(), args[i + 1]
+            if option == b"MATCH":
+                match = None if value == b"*" else compile_pattern(value)
+            elif option == b"COUNT":
+                try:
+                    count = int(value)
+                except ValueError as e:
+                    raise ValueError("value is not an integer or out of range") from e
+                if count < 1:
+                    raise ValueError("syntax error")
+            elif option == b"TYPE" and allow_type:
+                key_type = value.decode(errors="replace").lower()
+            else:
+                raise ValueError("syntax error")
+        return match, count, key_type
+
+    def _parse_cursor(self, cursor):
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            return None
+        return cursor if cursor >= 0 else None
+
+    def handle_scan(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SCAN' command\r\n")
+        cursor = self._parse_cursor(command[0])
+        if cursor is None:
+            return connection.sendall(b"-ERR invalid cursor\r\n")
+        try:
+            match, count, key_type = self._parse_scan_options(command[1:], allow_type=True)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+
+        if key_type is None:
+            stores = self.stores
+        elif key_type in self.type_stores:
+            stores = [self.type_stores[key_type]]
+        else:
+            stores = []
+        cursor, keys = self._scan_keyspace(cursor, count, stores)
+        keys = [key for key in dict.fromkeys(keys) if match is None or match(key)]
+        return connection.sendall(encode_array([cursor, keys]))
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from app.utils.resp import NULL_ARRAY, NULL_BULK, encode_array, encode_array_chunks, encode_bulk, encode_integer
+
+
+class ListCommandsMixin:
+    def handle_rpush(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'RPUSH' command\r\n")
+        key, values = command[0], command[1:]
+        count = self.list_store.rpush(key, values)
+        return connection.sendall(encode_integer(count))
+
+    def handle_lrange(self, connection, command):
+        if len(command) != 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'LRANGE' command\r\n")
+        key, start, end = command[0], command[1], command[2]
+        try:
+            start, end = int(start), int(end)
+        except ValueError:
+            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+
+        # The store lock is released before anything is encoded; the reply goes out a chunk at a time
+        for chunk in encode_array_chunks(self.list_store.lrange(key, start, end)):
+            connection.sendall(chunk)
+        return None
+
+    def handle_lpush(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'LPUSH' command\r\n")
+        key, values = command[0], command[1:]
+        count = self.list_store.lpush(key, values)
+        return connection.sendall(encode_integer(count))
+
+    def handle_llen(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'LLEN' command\r\n")
+        key = command[0]
+        count = self.list_store.llen(key)
+        return connection.sendall(encode_integer(count))
+
+    def handle_lpop(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'LPOP' command\r\n")
+        key = command[0]
+        count = 1
+        if len(command) > 1:
+            try:
+                count = int(command[1])
+            except ValueError:
+                return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+
+        items = self.list_store.lpop(key, count)
+        if not items:
+            return connection.sendall(NULL_BULK)
+        if len(items) == 1:
+            return connection.sendall(encode_bulk(items[0]))
+        return connection.sendall(encode_array(items))
+
+    def handle_blpop(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'BLPOP' command\r\n")
+        key, timeout = command[0], command[1]
+        timeout = float(timeout)
+        start_time = time.time() if timeout > 0 else None
+
+        while True:
+            popped = self.list_store.lpop(key, 1)
+            if popped:
+                return connection.sendall(encode_array([key, popped[0]]))
+
+            if timeout is not None and start_time and (time.time() - start_time) >= timeout:
+                return connection.sendall(NULL_ARRAY)
+            threading.Event().wait(0.1)
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+from app.parsers.rdb_parser import load_chunks
+from app.utils.logger import NOTICE, log
+
+# Commands answered while the dataset is still loading; everything else gets -LOADING
+LOADING_OK_COMMANDS = {"INFO", "CONFIG", "PING", "ECHO", "SUBSCRIBE", "PUBLISH", "MONITOR", "SLOWLOG", "LATENCY",
+                       "REPLCONF", "DEBUG", "HELLO", "CLIENT"}
+LOADING_ERROR = b"-LOADING Redis is loading the dataset in memory\r\n"
+# Files this small load before the first client is accepted, rather than answering -LOADING meanwhile
+INLINE_LOAD_BYTES = 1024 * 1024
+
+
+class LoadProgress:
+    __slots__ = ("start_time", "total_bytes", "loaded_bytes", "keys")
+
+    def __init__(self, total_bytes):
+        self.start_time = time.time()
+        self.total_bytes = total_bytes
+        self.loaded_bytes = 0
+        self.keys = 0
+
+
+class PersistenceCommandsMixin:
+    def start_loading(self, path):
+        """
+        Load the RDB file on a background thread; clients get -LOADING until
+        it's done. A file under INLINE_LOAD_BYTES is loaded right away instead,
+        so clients connecting at start-up never see -LOADING for it.
+        """
+        try:
+            total_bytes = os.path.getsize(path)
+        except OSError:
+            return
+        self.loading = LoadProgress(total_bytes)
+        if total_bytes < INLINE_LOAD_BYTES:
+            self._load_rdb(path)
+            return
+        threading.Thread(target=self._load_rdb, args=(path,), name="rdb-loader", daemon=True).start()
+
+    def _load_rdb(self, path):
+        """
+        Merge the file's chunks into the stores. The first chunk replaces
+        their contents and later ones add to them, so nothing may write to
+        the stores before the first chunk is in. -LOADING holds clients back;
+        commands from a master are not held back, so a replica must not be
+        given a file to load.
+        """
+        progress = self.loading
+        start = time.perf_counter_ns()
+        try:
+            first = True
+            for data, loaded_bytes, total_bytes in load_chunks(path, self.args.rdb_load_workers):
+                # Strings are the bulk of most files, so only the other types get moved out
+                hashes = {key: value for key, value in data.items() if isinstance(value, dict)}
+                sets = {key: value for key, value in data.items() if isinstance(value, set)}
+                for key in [*hashes, *sets]:
+                    del data[key]
+                self.string_store.load_from_rdb(data, replace=first)
+                self.hash_store.load_from_rdb(hashes, replace=first)
+                self.set_store.load_from_rdb(sets, replace=first)
+                first = False
+                progress.keys += len(data) + len(hashes) + len(sets)
+                progress.loaded_bytes, progress.total_bytes = loaded_bytes, total_bytes
+        except (OSError, ValueError, EOFError) as e:
+            log.warning("Failed loading RDB file %s: %s", path, e)
+        finally:
+            elapsed_usec = (time.perf_counter_ns() - start) // 1000
+            self.latency_monitor.observe("rdb-load", elapsed_usec)
+            seconds = elapsed_usec / 1e6
+            self.rdb_last_load_keys_loaded = progress.keys
+            self.loading = None
+            log.log(NOTICE, "DB loaded from disk: %.3f seconds, %d keys (%.0f keys/sec)", seconds, progress.keys,
+                    progress.keys / seconds if seconds else 0)
+
+    def _info_persistence(self):
+        progress = self.loading
+        fields = {"loading": 1 if progress else 0}
+        if progress:
+            elapsed = time.time() - progress.start_time
+            fraction = progress.loaded_bytes / progress.total_bytes if progress.total_bytes else 0
+            fields.update({
+                "loading_start_time": int(progress.start_time),
+                "loading_total_bytes": progress.total_bytes,
+                "loading_loaded_bytes": progress.loaded_bytes,
+                "loading_loaded_perc": f"{fraction * 100:.2f}",
+                "loading_eta_seconds": int(elapsed / fraction - elapsed) if fraction else 1,
+                "loading_keys_loaded": progress.keys,
+            })
+        fields["rdb_last_load_keys_loaded"] = self.rdb_last_load_keys_loaded
+        return fields
@@ -0,0 +1,63 @@
+from app.utils.logger import log
+from app.utils.resp import encode_array, encode_array_header, encode_bulk, encode_integer, to_push
+
+
+class PubSubCommandsMixin:
+    def handle_subscribe(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SUBSCRIBE' command\r\n")
+        channel = command[0]
+        log.debug("Subscribing to channel: %s", channel)
+        with self.subscriptions_lock:
+            if connection not in self.subscriptions:
+                self.subscriptions[connection] = set()
+            if channel not in self.subscriptions[connection]:
+                self.subscriptions[connection].add(channel)
+        response = encode_array_header(3) + encode_bulk(b"subscribe") + encode_bulk(channel) + \
+            encode_integer(len(self.subscriptions[connection]))
+        return connection.sendall(to_push(response) if connection.resp == 3 else response)
+
+    def handle_unsubscribe(self, connection, channel):
+        if not channel:
+            return connection.sendall(b"-ERR wrong number of arguments for 'UNSUBSCRIBE' command\r\n")
+        with self.subscriptions_lock:
+            if connection in self.subscriptions and channel in self.subscriptions[connection]:
+                self.subscriptions[connection].remove(channel)
+                response = encode_array_header(3) + encode_bulk(b"unsubscribe") + encode_bulk(channel) + \
+                    encode_integer(len(self.subscriptions[connection]))
+                connection.sendall(to_push(response) if connection.resp == 3 else response)
+            if not self.subscriptions[connection]:
+                del self.subscriptions[connection]
+            return None
+
+    def _handle_subscription_command(self, connection, command, cmd):
+        if cmd == "SUBSCRIBE":
+            self.handle_subscribe(connection, command[1:])
+        elif cmd == "UNSUBSCRIBE" and len(command) == 2:
+            self.handle_unsubscribe(connection, command[1])
+        elif cmd == "PING":
+            self.handle_ping(connection, command[1:])
+        elif cmd in ("PSUBSCRIBE", "PUNSUBSCRIBE"):
+            raise NotImplementedError
+        elif cmd == "QUIT":
+            return
+        else:
+            response = f"-ERR Can't execute '{cmd.lower()}' in subscribed mode\r\n"
+            connection.sendall(response.encode())
+
+    def handle_publish(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'PUBLISH' command\r\n")
+        channel, message = command[0], command[1]
+        subscriber_count = 0
+        response = encode_array([b"message", channel, message])
+        push = to_push(response)  # For RESP3 subscribers
+        with self.subscriptions_lock:
+            for conn, channels in self.subscriptions.items():
+                if channel in channels:
+                    try:
+                        conn.sendall(push if conn.resp == 3 else response)
+                        subscriber_count += 1
+                    except OSError:
+                        pass  # Ignore failures to send
+        return connection.sendall(encode_integer(subscriber_count))
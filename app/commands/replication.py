@@ -0,0 +1,196 @@
+import socket
+import threading
+import time
+
+from app.utils.logger import VERBOSE, log
+from app.utils.resp import OK, encode_array, encode_integer
+
+
+class MasterReader:
+    """The replica's end of the master link until the command stream starts: replies read a line at a time."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()  # Received and not yet consumed
+
+    def _fill(self):
+        chunk = self.sock.recv(4096)
+        self.buffer += chunk
+        return bool(chunk)
+
+    def read_line(self):
+        """The next line without its \\r\\n, waiting for as many reads as it takes; b"" if the master hung up."""
+        start = 0
+        while (crlf_pos := self.buffer.find(b"\r\n", start)) == -1:
+            start = max(len(self.buffer) - 1, 0)  # A \r at the end may be followed by the \n
+            if not self._fill():
+                return b""
+        line = bytes(self.buffer[:crlf_pos])
+        del self.buffer[:crlf_pos + 2]
+        return line
+
+    def skip(self, size):
+        """Consume the next `size` bytes; False if the master hung up first."""
+        while len(self.buffer) < size:
+            if not self._fill():
+                return False
+        del self.buffer[:size]
+        return True
+
+
+class ReplicationCommandsMixin:
+    EMPTY_RDB_FILE = "524544495330303131fa0972656469732d76657205372e" \
+    "322e30fa0a72656469732d62697473c040fa056374696d65c26d08bc65fa087" \
+    "57365642d6d656dc2b0c41000fa08616f662d62617365c000fff06e3bfec0ff5aa2"
+
+    def _handle_master_command(self, connection, command, cmd, command_bytes):
+        if cmd == "REPLCONF" and len(command) > 1 and command[1].upper() == b"GETACK":
+            connection.sendall(encode_array([b"REPLCONF", b"ACK", self.replica_offset]))
+        else:
+            self.execute_command(connection, command)
+        self.replica_offset += command_bytes
+
+    def _perform_handshake(self, reader, replica_port):
+        # Each reply is read up to its \r\n: it may arrive split over several reads, or with the next one
+        steps = (
+            (b"*1\r\n$4\r\nPING\r\n", b"+PONG", "Failed to receive PONG from master"),
+            (encode_array([b"REPLCONF", b"listening-port", str(replica_port).encode()]), b"+OK",
+             "Failed to receive OK from master for REPLCONF"),
+            (b"*3\r\n$8\r\nREPLCONF\r\n$4\r\ncapa\r\n$6\r\npsync2\r\n", b"+OK",
+             "Failed to receive OK from master for REPLCONF capa"),
+        )
+        for request, expected, failure in steps:
+            reader.sock.sendall(request)
+            if reader.read_line() != expected:
+                log.warning(failure)
+                return False
+
+        psync_command = b"*3\r\n$5\r\nPSYNC\r\n$1\r\n?\r\n$2\r\n-1\r\n"
+        reader.sock.sendall(psync_command)
+        return True
+
+    @staticmethod
+    def _receive_rdb_file(reader):
+        # Read +FULLRESYNC line
+        fullresync_line = reader.read_line()
+        if not fullresync_line.startswith(b"+FULLRESYNC"):
+            log.warning("Failed to receive FULLRESYNC from master")
+            return None
+
+        # Read RDB file length header ($<length>)
+        rdb_header = reader.read_line()
+        if not rdb_header.startswith(b"$"):
+            log.warning("Failed to receive RDB header")
+            return None
+
+        rdb_length = int(rdb_header[1:])
+        log.log(VERBOSE, "RDB file length: %d", rdb_length)
+
+        # Read the exact RDB file content; what follows it is the start of the command stream
+        if not reader.skip(rdb_length):
+            log.warning("Master closed the connection during the RDB transfer")
+            return None
+        log.log(VERBOSE, "RDB file consumed completely")
+        return reader.buffer
+
+    def connect_to_master(self, host, port, replica_port):
+        try:
+            master_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            master_socket.connect((host, port))
+
+            reader = MasterReader(master_socket)
+            if not self._perform_handshake(reader, replica_port):
+                master_socket.close()
+                return None, b""
+
+            buffer = self._receive_rdb_file(reader)
+            if buffer is None:
+                master_socket.close()
+                return None, b""
+
+            log.log(VERBOSE, "Connected to master at %s:%s", host, port)
+            return master_socket, buffer  # Return remaining buffer
+        except OSError as e:
+            log.warning("Failed to connect to master at %s:%s: %s", host, port, e)
+            return None, b""
+
+    def handle_psync(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'PSYNC' command\r\n")
+        connection.sendall(b"+FULLRESYNC 8371b4fb1155b71f4a04d3e1bc3e18c4a990aeeb 0\r\n")
+        rdb_file_encoded = bytes.fromhex(self.EMPTY_RDB_FILE)
+        connection.sendall(f"${len(rdb_file_encoded)}\r\n".encode() + rdb_file_encoded)
+
+        with self.replicas_lock:
+            self.replicas.append(connection)
+        return None
+
+    def propagate_to_replicas(self, command_array):
+        encoded_bytes = encode_array(command_array)
+        with self.master_repl_offset_lock:
+            self.master_repl_offset += len(encoded_bytes)
+
+        with self.replicas_lock:
+            current_replicas = list(self.replicas)
+
+        for replica in current_replicas:
+            try:
+                replica.sendall(encoded_bytes)
+            except OSError as e:
+                log.warning("Failed to propagate to replica %s: %s", replica, e)
+                with self.replicas_lock:
+                    if replica in self.replicas:
+                        self.replicas.remove(replica)
+                with self.replica_offsets_lock:
+                    if replica in self.replica_offsets:
+                        del self.replica_offsets[replica]
+
+    def handle_replconf(self, connection, command):
+        if len(command) >= 1 and command[0].upper() == b"GETACK":
+            connection.sendall(encode_array([b"REPLCONF", b"ACK", self.replica_offset]))
+        elif len(command) >= 2 and command[0].upper() == b"ACK":
+            with self.replica_offsets_lock:
+                self.replica_offsets[connection] = int(command[1])
+        else:
+            connection.sendall(OK)
+
+    def handle_wait(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'WAIT' command\r\n")
+        num_replicas, timeout = command[0], command[1]
+        try:
+            num_replicas = int(num_replicas)
+            timeout = int(timeout)
+        except ValueError:
+            return connection.sendall(b"-ERR invalid WAIT arguments\r\n")
+
+        with self.master_repl_offset_lock:
+            current_master_offset = self.master_repl_offset
+
+        if current_master_offset == 0:
+            with self.replicas_lock:
+                num_connected_replicas = len(self.replicas)
+            return connection.sendall(encode_integer(num_connected_replicas))
+
+        getack_command = ["REPLCONF", "GETACK", "*"]
+        self.propagate_to_replicas(getack_command)
+
+        start_time = time.time()
+        acked_replicas = 0
+
+        while True:
+            with self.replica_offsets_lock:
+                current_acks = sum(1 for offset in self.replica_offsets.values() if offset >= current_master_offset)
+            if current_acks >= num_replicas:
+                acked_replicas = current_acks
+                break
+
+            if (time.time() - start_time) * 1000 >= timeout and timeout != 0:
+                with self.replica_offsets_lock:
+                    acked_replicas = sum(
+                        1 for offset in self.replica_offsets.values() if offset >= current_master_offset)
+                break
+
+            threading.Event().wait(0.01)
+
+        return connection.sendall(encode_integer(acked_replicas))
@@ -0,0 +1,146 @@
+from app.utils.resp import NULL_BULK, encode_array, encode_bulk, encode_integer, encode_reply, encode_set
+
+SET_OPERATIONS = {b"SINTER": "inter", b"SUNION": "union", b"SDIFF": "diff"}
+
+
+class SetCommandsMixin:
+    def handle_sadd(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SADD' command\r\n")
+        added = self.set_store.sadd(command[0], command[1:])
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(added))
+        return None
+
+    def handle_srem(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SREM' command\r\n")
+        removed = self.set_store.srem(command[0], command[1:])
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(removed))
+        return None
+
+    def handle_sismember(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SISMEMBER' command\r\n")
+        return connection.sendall(encode_integer(1 if self.set_store.sismember(command[0], command[1]) else 0))
+
+    def handle_smismember(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SMISMEMBER' command\r\n")
+        found = self.set_store.smismember(command[0], command[1:])
+        return connection.sendall(encode_reply([1 if member else 0 for member in found]))
+
+    def handle_smembers(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SMEMBERS' command\r\n")
+        return connection.sendall(encode_set(self.set_store.smembers(command[0]), connection.resp))
+
+    def handle_scard(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SCARD' command\r\n")
+        return connection.sendall(encode_integer(self.set_store.scard(command[0])))
+
+    def handle_spop(self, connection, command):
+        if len(command) not in (1, 2):
+            return connection.sendall(b"-ERR wrong number of arguments for 'SPOP' command\r\n")
+        count = 1
+        if len(command) == 2:
+            try:
+                count = int(command[1])
+            except ValueError:
+                return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+            if count < 0:
+                return connection.sendall(b"-ERR value is out of range, must be positive\r\n")
+        popped = self.set_store.spop(command[0], count)
+        # Replicas would pick other members, so they get the members that went instead of the SPOP
+        if popped and not self.replica_of:
+            self.propagate_to_replicas(["SREM", command[0], *popped])
+        if connection == self.master_connection_socket:
+            return None
+        if len(command) == 2:
+            return connection.sendall(encode_array(popped))
+        return connection.sendall(encode_bulk(popped[0]) if popped else NULL_BULK)
+
+    def handle_srandmember(self, connection, command):
+        if len(command) not in (1, 2):
+            return connection.sendall(b"-ERR wrong number of arguments for 'SRANDMEMBER' command\r\n")
+        if len(command) == 1:
+            members = self.set_store.srandmember(command[0], 1)
+            return connection.sendall(encode_bulk(members[0]) if members else NULL_BULK)
+        try:
+            count = int(command[1])
+        except ValueError:
+            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+        return connection.sendall(encode_array(self.set_store.srandmember(command[0], count)))
+
+    def _handle_set_operation(self, connection, name, command):
+        """SINTER, SUNION, SDIFF and their *STORE forms, which take the destination first."""
+        store = name.endswith(b"STORE")
+        if len(command) < (2 if store else 1):
+            return connection.sendall(f"-ERR wrong number of arguments for '{name.decode()}' command\r\n".encode())
+        op = SET_OPERATIONS[name.removesuffix(b"STORE")]
+        if not store:
+            return connection.sendall(encode_array(self.set_store.combine(op, command)))
+        size = self.set_store.combine_store(op, command[0], command[1:])
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(size))
+        return None
+
+    def handle_sinter(self, connection, command):
+        return self._handle_set_operation(connection, b"SINTER", command)
+
+    def handle_sunion(self, connection, command):
+        return self._handle_set_operation(connection, b"SUNION", command)
+
+    def handle_sdiff(self, connection, command):
+        return self._handle_set_operation(connection, b"SDIFF", command)
+
+    def handle_sinterstore(self, connection, command):
+        return self._handle_set_operation(connection, b"SINTERSTORE", command)
+
+    def handle_sunionstore(self, connection, command):
+        return self._handle_set_operation(connection, b"SUNIONSTORE", command)
+
+    def handle_sdiffstore(self, connection, command):
+        return self._handle_set_operation(connection, b"SDIFFSTORE", command)
+
+    def handle_sintercard(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SINTERCARD' command\r\n")
+        try:
+            numkeys = int(command[0])
+        except ValueError:
+            return connection.sendall(b"-ERR numkeys should be greater than 0\r\n")
+        if numkeys <= 0:
+            return connection.sendall(b"-ERR numkeys should be greater than 0\r\n")
+        keys, options = command[1:1 + numkeys], command[1 + numkeys:]
+        if len(keys) < numkeys:
+            return connection.sendall(b"-ERR Number of keys can't be greater than number of args\r\n")
+        limit = 0
+        if options:
+            if len(options) != 2 or options[0].upper() != b"LIMIT":
+                return connection.sendall(b"-ERR syntax error\r\n")
+            try:
+                limit = int(options[1])
+            except ValueError:
+                limit = -1
+            if limit < 0:
+                return connection.sendall(b"-ERR LIMIT can't be negative\r\n")
+        return connection.sendall(encode_integer(self.set_store.sintercard(keys, limit)))
+
+    def handle_sscan(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SSCAN' command\r\n")
+        cursor = self._parse_cursor(command[1])
+        if cursor is None:
+            return connection.sendall(b"-ERR invalid cursor\r\n")
+        try:
+            match, count, _ = self._parse_scan_options(command[2:], allow_type=False)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+
+        cursor, members = self.set_store.sscan(command[0], cursor, count)
+        if match is not None:
+            members = [member for member in members if match(member)]
+        return connection.sendall(encode_array([cursor, members]))
@@ -0,0 +1,80 @@
+from app.utils.resp import (NULL_BULK, encode_array, encode_array_chunks, encode_bulk, encode_double, encode_integer,
+                            encode_null)
+
+
+class SortedSetCommandsMixin:
+    def handle_zadd(self, connection, command):
+        if len(command) < 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ZADD' command\r\n")
+        key, args = command[0], command[1:]
+        try:
+            added_count = self.sorted_set_store.zadd(key, args)
+            return connection.sendall(encode_integer(added_count))
+        except ValueError as e:
+            return connection.sendall(f"-ERR {str(e)}\r\n".encode())
+
+    def handle_zrank(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ZRANK' command\r\n")
+        key, member = command[0], command[1]
+        rank = self.sorted_set_store.zrank(key, member)
+        if rank is not None:
+            return connection.sendall(encode_integer(rank))
+        return connection.sendall(NULL_BULK)
+
+    def handle_zrange(self, connection, command):
+        if len(command) != 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ZRANGE' command\r\n")
+        key, start, end = command[0], command[1], command[2]
+
+        try:
+            start = int(start)
+            end = int(end)
+        except ValueError:
+            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+
+        for chunk in encode_array_chunks(self.sorted_set_store.zrange(key, start, end)):
+            connection.sendall(chunk)
+        return None
+
+    def handle_zcard(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ZCARD' command\r\n")
+        key = command[0]
+        cardinality = self.sorted_set_store.zcard(key)
+        return connection.sendall(encode_integer(cardinality))
+
+    def handle_zscore(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ZSCORE' command\r\n")
+        key, member = command[0], command[1]
+        score = self.sorted_set_store.zscore(key, member)
+        if score is None:
+            return connection.sendall(encode_null(connection.resp))
+        return connection.sendall(encode_double(score) if connection.resp == 3 else encode_bulk(score))
+
+    def handle_zrem(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ZREM' command\r\n")
+        key, member = command[0], command[1]
+        removed_count = self.sorted_set_store.zrem(key, member)
+        return connection.sendall(encode_integer(removed_count))
+
+    def handle_zscan(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'ZSCAN' command\r\n")
+        key = command[0]
+        cursor = self._parse_cursor(command[1])
+        if cursor is None:
+            return connection.sendall(b"-ERR invalid cursor\r\n")
+        try:
+            match, count, _ = self._parse_scan_options(command[2:], allow_type=False)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+
+        cursor, items = self.sorted_set_store.zscan(key, cursor, count)
+        flattened = []
+        for member, score in items:
+            if match is None or match(member):
+                flattened.extend((member, score))
+        return connection.sendall(encode_array([cursor, flattened]))
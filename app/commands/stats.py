@@ -0,0 +1,167 @@
+import time
+
+from app.utils.logger import VERBOSE, log
+from app.utils.resp import OK, encode_bulk, encode_integer, encode_reply, encode_simple
+from app.utils.stats import LATENCY_PERCENTILES, CommandStats, monitor_line, peer_address
+
+# Commands whose run time includes waiting on other clients; only their calls are counted
+BLOCKING_COMMANDS = {"BLPOP", "WAIT", "XREAD", "XREADGROUP", "DEBUG"}
+
+LATENCY_ADVICE = {
+    "command": "Check your Slow Log to understand what are the commands you are running which are too slow "
+               "to execute. Please check SLOWLOG GET for more information.",
+    "expire-del": "Deleting expired keys is slow: large keys are expiring. Prefer smaller values for keys "
+                  "with a TTL, or spread their expiration times.",
+    "eviction-cycle": "Evicting keys to stay under maxmemory is slow. Consider a larger maxmemory, fewer "
+                      "maxmemory-samples, or a cheaper policy such as allkeys-random.",
+    "eviction-del": "Deleting evicted keys is slow: big keys are being evicted.",
+    "rdb-load": "Loading the RDB file at start-up is slow; the server does not serve clients meanwhile.",
+}
+
+
+class StatsCommandsMixin:
+    def call_handler(self, connection, cmd, command, handler):
+        """
+        Run a command handler, timing it for commandstats, latency histograms
+        and the slow log. MONITOR clients see the command once it has run, so
+        a transaction shows up as MULTI, its commands, then EXEC.
+        """
+        errors = getattr(connection, "error_replies", 0)
+        start = time.perf_counter_ns()
+        try:
+            handler(connection, command[1:])
+        except Exception:
+            self._record_call(connection, cmd, command, start, True)
+            raise
+        self._record_call(connection, cmd, command, start, getattr(connection, "error_replies", 0) != errors)
+        if self.monitors:
+            self._feed_monitors(connection, command)
+
+    def _record_call(self, connection, cmd, command, start, failed):
+        usec = (time.perf_counter_ns() - start) // 1000
+        stats = self.command_stats.get(cmd) or self.command_stats.setdefault(cmd, CommandStats())
+        if cmd in BLOCKING_COMMANDS and self.is_blocking_command(connection, command):
+            stats.count_call(failed)
+            return
+        stats.record(usec, failed)
+        if self.latency_monitor.threshold:
+            self.latency_monitor.observe("command", usec)
+        if usec >= self.slowlog.slower_than >= 0:
+            self.slowlog.add(command, usec, peer_address(connection))
+
+    def _feed_monitors(self, connection, command):
+        line = encode_simple(monitor_line(command, peer_address(connection)))
+        with self.monitors_lock:
+            monitors = list(self.monitors)
+        for monitor in monitors:
+            if monitor is connection:
+                continue
+            try:
+                monitor.sendall(line)
+            except OSError as e:
+                log.log(VERBOSE, "Dropping MONITOR client: %s", e)
+                with self.monitors_lock:
+                    self.monitors.discard(monitor)
+
+    def handle_monitor(self, connection, command):
+        if len(command) != 0:
+            return connection.sendall(b"-ERR wrong number of arguments for 'MONITOR' command\r\n")
+        connection.sendall(OK)
+        with self.monitors_lock:
+            self.monitors.add(connection)
+        return None
+
+    def reject_call(self, cmd):
+        """Count a command refused before its handler ran (redirect, OOM)."""
+        stats = self.command_stats.get(cmd) or self.command_stats.setdefault(cmd, CommandStats())
+        stats.reject()
+
+    def _info_commandstats(self):
+        fields = {}
+        for cmd, stats in sorted(self.command_stats.items()):
+            per_call = stats.usec / stats.calls if stats.calls else 0.0
+            fields[f"cmdstat_{cmd.lower()}"] = (f"calls={stats.calls},usec={stats.usec},usec_per_call={per_call:.2f},"
+                                                f"rejected_calls={stats.rejected_calls},"
+                                                f"failed_calls={stats.failed_calls}")
+        return fields
+
+    def _info_latencystats(self):
+        fields = {}
+        for cmd, stats in sorted(self.command_stats.items()):
+            if not stats.histogram.total:
+                continue
+            percentiles = ",".join(f"p{percent:g}={stats.histogram.percentile(percent):.3f}"
+                                   for percent in LATENCY_PERCENTILES)
+            fields[f"latency_percentiles_usec_{cmd.lower()}"] = percentiles
+        return fields
+
+    def _latency_histogram(self, connection, args):
+        names = [arg.decode(errors="replace").upper() for arg in args] or sorted(self.command_stats)
+        reply = []
+        for cmd in names:
+            stats = self.command_stats.get(cmd)
+            if stats is None or not stats.histogram.total:
+                continue
+            buckets = [value for bucket in stats.histogram.power_of_two_buckets() for value in bucket]
+            reply += [cmd.lower(), ["calls", stats.calls, "histogram_usec", buckets]]
+        return connection.sendall(encode_reply(reply))
+
+    def _latency_doctor(self):
+        monitor = self.latency_monitor
+        if not monitor.threshold:
+            return ("I'm sorry, Dave, I can't do that. Latency monitoring is disabled in this Redis instance. "
+                    "You may use \"CONFIG SET latency-monitor-threshold <milliseconds>.\" if you want to enable it.\n")
+        events = {event: monitor.history(event) for event, *_ in monitor.latest()}
+        if not events:
+            return ("Dave, no latency spike was observed during the lifetime of this Redis instance, not in the "
+                    "slightest bit. I honestly think you ought to sleep tonight.\n")
+        lines = ["Dave, I have observed latency spikes in this Redis instance. You don't mind talking about it, "
+                 "do you Dave?", ""]
+        for number, (event, samples) in enumerate(sorted(events.items()), 1):
+            values = [ms for _, ms in samples]
+            average = sum(values) / len(values)
+            deviation = sum(abs(ms - average) for ms in values) / len(values)
+            period = (samples[-1][0] - samples[0][0]) / (len(samples) - 1) if len(samples) > 1 else 0
+            lines.append(f"{number}. {event}: {len(values)} latency spikes (average {average:.0f}ms, mean deviation "
+                         f"{deviation:.0f}ms, period {period:.2f} sec). Worst all time event "
+                         f"{monitor.events[event].max}ms.")
+        lines += ["", "I have a few advices for you:", ""]
+        lines += [f"- {LATENCY_ADVICE[event]}" for event in sorted(events) if event in LATENCY_ADVICE]
+        return "\n".join(lines) + "\n"
+
+    def handle_latency(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'LATENCY' command\r\n")
+        subcommand = command[0].upper()
+        if subcommand == b"HISTOGRAM":
+            return self._latency_histogram(connection, command[1:])
+        if subcommand == b"LATEST" and len(command) == 1:
+            return connection.sendall(encode_reply(self.latency_monitor.latest()))
+        if subcommand == b"HISTORY" and len(command) == 2:
+            return connection.sendall(encode_reply(self.latency_monitor.history(command[1].decode(errors="replace"))))
+        if subcommand == b"RESET":
+            events = [arg.decode(errors="replace") for arg in command[1:]] or None
+            return connection.sendall(encode_integer(self.latency_monitor.reset(events)))
+        if subcommand == b"DOCTOR" and len(command) == 1:
+            return connection.sendall(encode_bulk(self._latency_doctor()))
+        return connection.sendall(f"-ERR unknown subcommand '{command[0].decode(errors='replace')}'\r\n".encode())
+
+    def handle_slowlog(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SLOWLOG' command\r\n")
+        subcommand = command[0].upper()
+        if subcommand == b"GET" and len(command) <= 2:
+            try:
+                count = int(command[1]) if len(command) == 2 else 10
+            except ValueError:
+                return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+            if count < -1:
+                return connection.sendall(b"-ERR count should be greater than or equal to -1\r\n")
+            return connection.sendall(encode_reply(self.slowlog.get(count)))
+        if subcommand == b"LEN" and len(command) == 1:
+            return connection.sendall(encode_integer(len(self.slowlog.entries)))
+        if subcommand == b"RESET" and len(command) == 1:
+            self.slowlog.reset()
+            return connection.sendall(OK)
+        return connection.sendall(f"-ERR unknown subcommand or wrong number of arguments for "
+                                  f"'{command[0].decode(errors='replace')}'\r\n".encode())
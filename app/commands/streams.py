@@ -0,0 +1,373 @@
+import time
+
+from app.stores.stream_store import ClaimOptions, StreamError, now_ms, parse_id, parse_range_id
+from app.stores.string_store import parse_int
+from app.utils.resp import (EMPTY_ARRAY, NULL_ARRAY, NULL_BULK, OK, encode_array, encode_array_chunks,
+                            encode_array_header, encode_bulk, encode_integer, encode_reply)
+
+DOLLAR_IN_XREADGROUP = ("The $ ID is meaningless in the context of XREADGROUP: you want to read the history of this "
+                        "consumer by specifying a proper ID, or use the > ID to get new messages. The $ ID would just "
+                        "return an empty result set.")
+GT_IN_XREAD = "The > ID can be specified only when calling XREADGROUP using the GROUP <group> <consumer> option."
+
+
+def encode_entries(entries):
+    """[id, [field, value, ...]] per entry; an entry deleted while pending has no fields."""
+    return [[entry["id"], None if entry["fields"] is None else
+             [item for pair in entry["fields"].items() for item in pair]] for entry in entries]
+
+
+def encode_entry(entry):
+    return encode_array([entry["id"], [item for pair in entry["fields"].items() for item in pair]])
+
+
+def error_reply(error):
+    return f"-{getattr(error, 'code', 'ERR')} {error}\r\n".encode()
+
+
+def parse_read_args(args, command):
+    """XREAD / XREADGROUP options: (count or None, block seconds or None, noack, {key: id argument})."""
+    count = block = None
+    noack = False
+    i = 0
+    while i < len(args):
+        option = args[i].upper()
+        if option == b"STREAMS":
+            streams = args[i + 1:]
+            if not streams or len(streams) % 2:
+                wanted = ">" if command == "XREADGROUP" else "$"
+                raise ValueError(f"Unbalanced '{command.lower()}' list of streams: for each stream key an ID or "
+                                 f"'{wanted}' must be specified.")
+            half = len(streams) // 2
+            return count, block, noack, dict(zip(streams[:half], streams[half:]))
+        if option == b"NOACK" and command == "XREADGROUP":
+            noack = True
+            i += 1
+        elif option in (b"COUNT", b"BLOCK") and i + 1 < len(args):
+            value = parse_int(args[i + 1])
+            if option == b"COUNT":
+                if value is None:
+                    raise ValueError("value is not an integer or out of range")
+                count = value if value > 0 else None
+            else:
+                if value is None:
+                    raise ValueError("timeout is not an integer or out of range")
+                if value < 0:
+                    raise ValueError("timeout is negative")
+                block = value / 1000.0
+            i += 2
+        else:
+            raise ValueError("syntax error")
+    raise ValueError("syntax error")
+
+
+def parse_trim(args, node_max_entries):
+    """
+    MAXLEN|MINID [=|~] threshold [LIMIT count] at the start of args, as
+    ((threshold, by_id, approx, limit), arguments used). An approximate
+    trim without LIMIT removes at most 100 blocks' worth of entries, as in Redis.
+    """
+    by_id = args[0].upper() == b"MINID"
+    i = 1
+    approx = i < len(args) and args[i] == b"~"
+    if i < len(args) and args[i] in (b"=", b"~"):
+        i += 1
+    if i >= len(args):
+        raise ValueError("syntax error")
+    if by_id:
+        threshold = parse_id(args[i])
+    else:
+        threshold = parse_int(args[i])
+        if threshold is None:
+            raise ValueError("value is not an integer or out of range")
+        if threshold < 0:
+            raise ValueError("The MAXLEN argument must be >= 0.")
+    i += 1
+    limit = 100 * node_max_entries if approx else 0
+    if i + 1 < len(args) and args[i].upper() == b"LIMIT":
+        if not approx:
+            raise ValueError("syntax error, LIMIT cannot be used without the special ~ option")
+        limit = parse_int(args[i + 1])
+        if limit is None or limit < 0:
+            raise ValueError("The LIMIT argument must be >= 0.")
+        i += 2
+    return (threshold, by_id, approx, limit), i
+
+
+def parse_claim_options(args, options):
+    """XCLAIM's trailing IDLE, TIME, RETRYCOUNT, FORCE, JUSTID and LASTID options, set on options."""
+    i = 0
+    while i < len(args):
+        option = args[i].upper()
+        if option in (b"FORCE", b"JUSTID"):
+            setattr(options, option.decode().lower(), True)
+            i += 1
+            continue
+        if option not in (b"IDLE", b"TIME", b"RETRYCOUNT", b"LASTID") or i + 1 >= len(args):
+            raise ValueError(f"Unrecognized XCLAIM option '{args[i].decode(errors='replace')}'")
+        if option == b"LASTID":
+            options.last_id = parse_id(args[i + 1])
+        else:
+            value = parse_int(args[i + 1])
+            if value is None:
+                raise ValueError(f"Invalid {option.decode()} option argument for XCLAIM")
+            if option == b"IDLE":
+                options.delivery_time = now_ms() - value
+            elif option == b"TIME":
+                options.delivery_time = value
+            else:
+                options.retry_count = value
+        i += 2
+    return options
+
+
+def parse_min_idle(arg, command):
+    value = parse_int(arg)
+    if value is None:
+        raise ValueError(f"Invalid min-idle-time argument for {command}")
+    return ClaimOptions(max(value, 0))
+
+
+class StreamCommandsMixin:
+    def handle_xadd(self, connection, command):
+        if len(command) < 4:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XADD' command\r\n")
+        key, args = command[0], command[1:]
+        nomkstream, trim = False, None
+        try:
+            while args and args[0].upper() in (b"NOMKSTREAM", b"MAXLEN", b"MINID"):
+                if args[0].upper() == b"NOMKSTREAM":
+                    nomkstream, args = True, args[1:]
+                else:
+                    trim, used = parse_trim(args, self.stream_store.node_max_entries)
+                    args = args[used:]
+            if len(args) < 3 or len(args) % 2 == 0:
+                return connection.sendall(b"-ERR wrong number of arguments for 'XADD' command\r\n")
+            fields = {args[i]: args[i + 1] for i in range(1, len(args), 2)}
+            new_id, length = self.stream_store.xadd(key, args[0], fields, trim, nomkstream)
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        if new_id is None:
+            return connection.sendall(NULL_BULK)
+        # Replicas would generate IDs of their own for "*", and consumer groups refer to entries by ID;
+        # approximate trimming depends on block boundaries, so replicas trim to the exact resulting length
+        if not self.replica_of:
+            self.propagate_to_replicas(["XADD", key, *(["MAXLEN", "=", length] if trim else []), new_id, *args[1:]])
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_bulk(new_id))
+        return None
+
+    def handle_xtrim(self, connection, command):
+        if len(command) < 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XTRIM' command\r\n")
+        try:
+            if command[1].upper() not in (b"MAXLEN", b"MINID"):
+                raise ValueError("syntax error")
+            trim, used = parse_trim(command[1:], self.stream_store.node_max_entries)
+            if used != len(command) - 1:
+                raise ValueError("syntax error")
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        removed, length = self.stream_store.xtrim(command[0], trim)
+        if removed and not self.replica_of:
+            self.propagate_to_replicas(["XTRIM", command[0], "MAXLEN", "=", length])
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(removed))
+        return None
+
+    def handle_xlen(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XLEN' command\r\n")
+        return connection.sendall(encode_integer(self.stream_store.xlen(command[0])))
+
+    def handle_xrange(self, connection, command):
+        if len(command) != 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XRANGE' command\r\n")
+        try:
+            start, end = parse_range_id(command[1]), parse_range_id(command[2], end=True)
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        count, entries = self.stream_store.xrange_view(command[0], start, end)
+        for chunk in encode_array_chunks(entries, count, encode_entry):
+            connection.sendall(chunk)
+        return None
+
+    def _propagate_stream_effects(self, effects):
+        # Reads and claims depend on the clock and on who asked, so replicas get the group changes they made instead
+        if not self.replica_of:
+            for effect in effects:
+                self.propagate_to_replicas(effect)
+
+    def _blocking_read(self, connection, block, read, empty_reply):
+        """
+        Reply with read()'s results, or wait for them as BLOCK asks (0 is
+        forever). XADD wakes the waiting clients at once, which then read again.
+        """
+        deadline = time.monotonic() + block if block else None
+        while True:
+            seen = self.stream_store.appends
+            try:
+                results = read()
+            except ValueError as e:
+                return connection.sendall(error_reply(e))
+            if results:
+                return connection.sendall(encode_array([[key, encode_entries(entries)] for key, entries in results]))
+            if block is None:
+                return connection.sendall(empty_reply)
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return connection.sendall(NULL_ARRAY)
+            self.stream_store.wait_for_append(seen, remaining)
+
+    def handle_xread(self, connection, command):
+        try:
+            count, block, _, streams = parse_read_args(command, "XREAD")
+            for key, stream_id in streams.items():
+                if stream_id == b">":
+                    raise ValueError(GT_IN_XREAD)
+                # "$" is resolved once, so a blocked client waits for entries added after it asked
+                streams[key] = parse_id(self.stream_store.get_last_id(key) if stream_id == b"$" else stream_id)
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        return self._blocking_read(connection, block, lambda: self.stream_store.xread(streams, count), EMPTY_ARRAY)
+
+    def handle_xreadgroup(self, connection, command):
+        if len(command) < 3 or command[0].upper() != b"GROUP":
+            return connection.sendall(b"-ERR Missing GROUP option for XREADGROUP\r\n")
+        group, consumer = command[1], command[2]
+        try:
+            count, block, noack, streams = parse_read_args(command[3:], "XREADGROUP")
+            for key, stream_id in streams.items():
+                if stream_id == b"$":
+                    raise ValueError(DOLLAR_IN_XREADGROUP)
+                streams[key] = ">" if stream_id == b">" else parse_id(stream_id)
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+
+        def read():
+            results, effects = self.stream_store.read_group(group, consumer, streams, count, noack)
+            self._propagate_stream_effects(effects)
+            return results
+
+        return self._blocking_read(connection, block, read, NULL_ARRAY)
+
+    def handle_xgroup(self, connection, command):
+        subcommand = command[0].upper().decode(errors="replace") if command else ""
+        arity = {"CREATE": (4, 5), "SETID": (4, 4), "DESTROY": (3, 3), "CREATECONSUMER": (4, 4),
+                 "DELCONSUMER": (4, 4)}.get(subcommand)
+        if arity is None:
+            return connection.sendall(f"-ERR unknown subcommand '{subcommand}'. Try XGROUP HELP.\r\n".encode())
+        if not arity[0] <= len(command) <= arity[1]:
+            return connection.sendall(f"-ERR wrong number of arguments for 'XGROUP|{subcommand}' command\r\n".encode())
+        key, group = command[1], command[2]
+        try:
+            if subcommand == "CREATE":
+                if len(command) == 5 and command[4].upper() != b"MKSTREAM":
+                    raise ValueError("syntax error")
+                self.stream_store.create_group(key, group, command[3], mkstream=len(command) == 5)
+                reply = OK
+            elif subcommand == "SETID":
+                self.stream_store.set_group_id(key, group, command[3])
+                reply = OK
+            elif subcommand == "DESTROY":
+                reply = encode_integer(int(self.stream_store.destroy_group(key, group)))
+            elif subcommand == "CREATECONSUMER":
+                reply = encode_integer(int(self.stream_store.create_consumer(key, group, command[3])))
+            else:
+                reply = encode_integer(self.stream_store.delete_consumer(key, group, command[3]))
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        if connection != self.master_connection_socket:
+            return connection.sendall(reply)
+        return None
+
+    def handle_xack(self, connection, command):
+        if len(command) < 3:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XACK' command\r\n")
+        try:
+            ids = [parse_id(arg) for arg in command[2:]]
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        acked = self.stream_store.ack(command[0], command[1], ids)
+        if connection != self.master_connection_socket:
+            return connection.sendall(encode_integer(acked))
+        return None
+
+    def handle_xpending(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XPENDING' command\r\n")
+        key, group, args = command[0], command[1], command[2:]
+        try:
+            if not args:
+                total, first, last, consumers = self.stream_store.pending_summary(key, group)
+                reply = encode_array_header(4) + encode_integer(total) + encode_bulk(first) + encode_bulk(last)
+                reply += encode_array([[name, b"%d" % n] for name, n in consumers]) if consumers else NULL_ARRAY
+                return connection.sendall(reply)
+            min_idle = 0
+            if args[0].upper() == b"IDLE" and len(args) > 1:
+                min_idle = parse_int(args[1])
+                if min_idle is None:
+                    raise ValueError("value is not an integer or out of range")
+                args = args[2:]
+            if len(args) not in (3, 4):
+                raise ValueError("syntax error")
+            count = parse_int(args[2])
+            if count is None:
+                raise ValueError("value is not an integer or out of range")
+            bounds = (parse_range_id(args[0]), parse_range_id(args[1], end=True), max(count, 0))
+            consumer = args[3] if len(args) == 4 else None
+            rows = self.stream_store.pending_range(key, group, bounds, consumer, min_idle)
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        return connection.sendall(encode_reply(rows))
+
+    def handle_xclaim(self, connection, command):
+        if len(command) < 5:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XCLAIM' command\r\n")
+        key, group, consumer = command[0], command[1], command[2]
+        try:
+            options = parse_min_idle(command[3], "XCLAIM")
+            ids = []
+            for arg in command[4:]:
+                try:
+                    ids.append(parse_id(arg))
+                except StreamError:
+                    # The IDs end where the options begin
+                    if not ids:
+                        raise
+                    break
+            parse_claim_options(command[4 + len(ids):], options)
+            claimed, effects = self.stream_store.claim(key, group, consumer, ids, options)
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        self._propagate_stream_effects(effects)
+        if connection == self.master_connection_socket:
+            return None
+        return connection.sendall(encode_array(claimed if options.justid else encode_entries(claimed)))
+
+    def handle_xautoclaim(self, connection, command):
+        if len(command) < 5:
+            return connection.sendall(b"-ERR wrong number of arguments for 'XAUTOCLAIM' command\r\n")
+        key, group, consumer = command[0], command[1], command[2]
+        try:
+            options = parse_min_idle(command[3], "XAUTOCLAIM")
+            start = parse_range_id(command[4])
+            args = [arg.upper() for arg in command[5:]]
+            options.justid = b"JUSTID" in args
+            if options.justid:
+                args.remove(b"JUSTID")
+            if args:
+                count = parse_int(args[1]) if len(args) == 2 and args[0] == b"COUNT" else None
+                if count is None:
+                    raise ValueError("syntax error")
+                if not 0 < count <= (1 << 63) // 10:
+                    raise ValueError("COUNT must be > 0")
+                options.count = count
+            (cursor, claimed, deleted), effects = self.stream_store.autoclaim(key, group, consumer, start, options)
+        except ValueError as e:
+            return connection.sendall(error_reply(e))
+        self._propagate_stream_effects(effects)
+        if connection == self.master_connection_socket:
+            return None
+        return connection.sendall(encode_array([cursor, claimed if options.justid else encode_entries(claimed),
+                                                deleted]))
@@ -0,0 +1,118 @@
+import math
+
+from app.stores.string_store import parse_float
+from app.utils.resp import OK, NULL_BULK, encode_array, encode_bulk, encode_integer, encode_null
+
+
+class StringCommandsMixin:
+    def handle_set(self, connection, command):
+        if len(command) < 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'SET' command\r\n")
+        args = command
+        key = args[0]
+        value = args[1]
+        px = None
+        if len(args) > 2 and args[2].upper() == b"PX":
+            if len(args) < 4:
+                return connection.sendall(b"-ERR syntax error\r\n")
+            px = int(args[3])
+
+        self.string_store.set(key, value, px)
+        if connection != self.master_connection_socket:
+            return connection.sendall(OK)
+        return None
+
+    def handle_get(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'GET' command\r\n")
+        key = command[0]
+        value = self.string_store.get(key)
+        if value is None:
+            self.stats["keyspace_misses"] += 1
+            return connection.sendall(encode_null(connection.resp))
+        self.stats["keyspace_hits"] += 1
+        return connection.sendall(encode_bulk(value))
+
+    def handle_mget(self, connection, command):
+        if len(command) < 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'MGET' command\r\n")
+        values = self.string_store.mget(command)
+        misses = values.count(None)
+        self.stats["keyspace_hits"] += len(values) - misses
+        self.stats["keyspace_misses"] += misses
+        return connection.sendall(encode_array(values))
+
+    def _parse_pairs(self, command):
+        if len(command) < 2 or len(command) % 2 != 0:
+            return None
+        return [(command[i], command[i + 1]) for i in range(0, len(command), 2)]
+
+    def handle_mset(self, connection, command):
+        pairs = self._parse_pairs(command)
+        if pairs is None:
+            return connection.sendall(b"-ERR wrong number of arguments for 'MSET' command\r\n")
+        self.string_store.mset(pairs)
+        if connection != self.master_connection_socket:
+            return connection.sendall(OK)
+        return None
+
+    def handle_msetnx(self, connection, command):
+        pairs = self._parse_pairs(command)
+        if pairs is None:
+            return connection.sendall(b"-ERR wrong number of arguments for 'MSETNX' command\r\n")
+        keys = [key for key, _ in pairs]
+        if any(store.existing(keys) for store in self.stores if store is not self.string_store):
+            return connection.sendall(encode_integer(0))
+        applied = self.string_store.msetnx(pairs)
+        return connection.sendall(encode_integer(int(applied)))
+
+    def _send_incrby(self, connection, key, increment):
+        try:
+            value = self.string_store.incrby(key, increment)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        return connection.sendall(encode_integer(value))
+
+    def _parse_increment(self, connection, name, command):
+        if len(command) != 2:
+            connection.sendall(f"-ERR wrong number of arguments for '{name}' command\r\n".encode())
+            return None
+        try:
+            return int(command[1])
+        except ValueError:
+            connection.sendall(b"-ERR value is not an integer or out of range\r\n")
+            return None
+
+    def handle_incr(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'INCR' command\r\n")
+        return self._send_incrby(connection, command[0], 1)
+
+    def handle_decr(self, connection, command):
+        if len(command) != 1:
+            return connection.sendall(b"-ERR wrong number of arguments for 'DECR' command\r\n")
+        return self._send_incrby(connection, command[0], -1)
+
+    def handle_incrby(self, connection, command):
+        increment = self._parse_increment(connection, "INCRBY", command)
+        if increment is None:
+            return None
+        return self._send_incrby(connection, command[0], increment)
+
+    def handle_decrby(self, connection, command):
+        decrement = self._parse_increment(connection, "DECRBY", command)
+        if decrement is None:
+            return None
+        return self._send_incrby(connection, command[0], -decrement)
+
+    def handle_incrbyfloat(self, connection, command):
+        if len(command) != 2:
+            return connection.sendall(b"-ERR wrong number of arguments for 'INCRBYFLOAT' command\r\n")
+        increment = parse_float(command[1])
+        if increment is None or math.isnan(increment) or math.isinf(increment):
+            return connection.sendall(b"-ERR value is not a valid float\r\n")
+        try:
+            value = self.string_store.incrbyfloat(command[0], increment)
+        except ValueError as e:
+            return connection.sendall(f"-ERR {e}\r\n".encode())
+        return connection.sendall(encode_bulk(value))
@@ -0,0 +1,72 @@
+from contextlib import ExitStack
+
+from app.utils.resp import OK, encode_array_header
+from app.utils.slots import KEY_SPECS, KEYLESS_COMMANDS, command_keys
+
+
+class TransactionCommandsMixin:
+    def handle_multi(self, connection):
+        conn_id = id(connection)
+        with self.connections_lock:
+            self.connections[conn_id] = {'in_transaction': True, 'commands': []}
+        return connection.sendall(OK)
+
+    def handle_exec(self, connection):
+        conn_id = id(connection)
+        with self.connections_lock:
+            if conn_id not in self.connections or not self.connections[conn_id].get('in_transaction'):
+                return connection.sendall(b"-ERR EXEC without MULTI\r\n")
+
+            commands = self.connections[conn_id]['commands']
+            del self.connections[conn_id]
+
+        if any(command[0].upper() in self.denyoom_commands for command in commands):
+            self.evictor.free_memory(self._propagate_eviction)
+        connection.sendall(encode_array_header(len(commands)))
+        with self._transaction_locks(commands):
+            for command in commands:
+                try:
+                    self.execute_command(connection, command, evict=False)
+                except (ValueError, IndexError, TypeError) as e:
+                    connection.sendall(f"-ERR {str(e)}\r\n".encode())
+                    continue
+                if not self.replica_of and command[0].upper() in self.write_commands:
+                    self.propagate_to_replicas(command)
+        return None
+
+    def _transaction_locks(self, commands):
+        """
+        Write-lock every stripe the queued commands touch, store by store in
+        ascending stripe order, so the block runs without interleaving and
+        can't deadlock with other multi-stripe operations. A command whose
+        keys aren't known up front locks the whole keyspace.
+        """
+        keys = []
+        lock_all = False
+        for command in commands:
+            cmd = command[0].upper()
+            if cmd in KEY_SPECS or cmd == "XREAD":
+                keys += command_keys(cmd, command[1:])
+            elif cmd not in KEYLESS_COMMANDS:
+                lock_all = True
+        stack = ExitStack()
+        for store in self.stores:
+            stack.enter_context(store.locks.write_all() if lock_all else store.locks.write_many(keys))
+        return stack
+
+    def queue_command(self, connection, command):
+        conn_id = id(connection)
+        with self.connections_lock:
+            if conn_id in self.connections and self.connections[conn_id].get('in_transaction'):
+                self.connections[conn_id]['commands'].append(command)
+                connection.sendall(b"+QUEUED\r\n")
+                return True
+        return False
+
+    def handle_discard(self, connection):
+        conn_id = id(connection)
+        with self.connections_lock:
+            if conn_id not in self.connections or not self.connections[conn_id].get('in_transaction'):
+                return connection.sendall(b"-ERR DISCARD without MULTI\r\n")
+            del self.connections[conn_id]
+        return connection.sendall(OK)
@@ -0,0 +1,251 @@
+import collections
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from app.parsers.command_parser import ProtocolError, QueryBuffer, QueryBufferLimitError
+from app.utils.logger import VERBOSE, log
+from app.utils.stats import peer_address
+
+
+class Client:
+    """
+    A connection in io-threads mode. Handlers call sendall() exactly as on a
+    socket, but the reply is only appended to an output buffer; the owning
+    I/O worker writes it out, so socket writes stay off the executor thread
+    and replies to a pipeline leave in as few send() calls as possible.
+    """
+
+    def __init__(self, sock, worker, query=None):
+        self.sock = sock
+        self.worker = worker
+        self.query = query if query is not None else QueryBuffer(config=worker.executor.server.config)
+        self.output = bytearray()
+        self.output_lock = threading.Lock()
+        self.events = 0
+        self.pending = collections.deque()
+        self.blocked = False
+        self.closed = False
+        self.error_replies = 0
+        self.soft_limit_since = None
+        self.id = 0
+        self.name = b""
+        self.resp = 2
+
+    def sendall(self, data):
+        if data[:1] == b"-":
+            self.error_replies += 1
+        with self.output_lock:
+            if self.closed:
+                raise BrokenPipeError("client connection closed")
+            was_empty = not self.output
+            self.output += data
+            if len(self.output) > self.worker.executor.output_check_floor and self._over_output_limit():
+                log.warning("Client %s scheduled to be closed ASAP for overcoming of output buffer limits.",
+                            peer_address(self).decode())
+                self.output.clear()
+                self.closed = True
+                self.worker.schedule("disconnect", self)
+                return
+        if was_empty:
+            self.worker.schedule("write", self)
+
+    def _over_output_limit(self):
+        """client-output-buffer-limit: past the hard limit, or over the soft one for too long, the client is cut."""
+        executor = self.worker.executor
+        hard, soft, seconds = executor.output_buffer_limits.get(executor.client_class(self), (0, 0, 0))
+        pending = len(self.output)
+        if hard and pending > hard:
+            return True
+        if soft and pending > soft:
+            now = time.monotonic()
+            if self.soft_limit_since is None:
+                self.soft_limit_since = now
+            return now - self.soft_limit_since > seconds
+        self.soft_limit_since = None
+        return False
+
+    def close(self):
+        self.closed = True
+        self.worker.schedule("close", self)
+
+
+class IOWorker(threading.Thread):
+    """Reads and parses requests for its clients and writes their buffered replies."""
+
+    def __init__(self, executor, on_disconnect):
+        super().__init__(daemon=True)
+        self.executor = executor
+        self.on_disconnect = on_disconnect
+        self.selector = selectors.DefaultSelector()
+        self.inbox = queue.SimpleQueue()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+
+    def schedule(self, action, client):
+        """Queue add/write/close/disconnect for the worker thread; the selector is only touched from there."""
+        self.inbox.put((action, client))
+        try:
+            self.wakeup_w.send(b"\0")
+        except BlockingIOError:
+            pass  # Wakeup already pending
+
+    def run(self):
+        while True:
+            for key, events in self.selector.select():
+                if key.fileobj is self.wakeup_r:
+                    self._drain_inbox()
+                    continue
+                client = key.data
+                if events & selectors.EVENT_WRITE:
+                    self._write(client)
+                if events & selectors.EVENT_READ and not client.closed:
+                    self._read(client)
+
+    def _drain_inbox(self):
+        try:
+            while self.wakeup_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while not self.inbox.empty():
+            action, client = self.inbox.get()
+            if action == "add":
+                self._add(client)
+            elif action == "write":
+                self._write(client)
+            elif action == "disconnect":
+                if client.events:
+                    self._disconnect(client)
+            else:
+                self._close(client)
+
+    def _set_events(self, client, events):
+        if client.closed or client.events == events:
+            return
+        if client.events:
+            self.selector.modify(client.sock, events, client)
+        else:
+            self.selector.register(client.sock, events, client)
+        client.events = events
+
+    def _add(self, client):
+        client.sock.setblocking(False)
+        self._set_events(client, selectors.EVENT_READ)
+        if len(client.query):
+            self._parse(client)
+
+    def _read(self, client):
+        try:
+            received = client.query.read_from(client.sock)
+        except BlockingIOError:
+            return
+        except QueryBufferLimitError as e:
+            log.warning("Closing client that reached max query buffer length: %s", e)
+            received = 0
+        except OSError:
+            received = 0
+        if not received:
+            self._disconnect(client)
+            return
+        self._parse(client)
+
+    def _parse(self, client):
+        try:
+            commands = client.query.parse()
+        except ProtocolError as e:
+            self.executor.server.reject_input(client, e)
+            self._disconnect(client)
+            return
+        if commands:
+            self.executor.submit(client, commands)
+
+    def _write(self, client):
+        with client.output_lock:
+            if client.output and client.events:
+                try:
+                    sent = client.sock.send(client.output)
+                except BlockingIOError:
+                    sent = 0
+                except OSError:
+                    client.output.clear()
+                    sent = 0
+                del client.output[:sent]
+            remaining = bool(client.output)
+            if not remaining:
+                client.soft_limit_since = None
+        self._set_events(client, selectors.EVENT_READ | selectors.EVENT_WRITE if remaining else selectors.EVENT_READ)
+
+    def _disconnect(self, client):
+        self._close(client)
+        self.on_disconnect(client)
+
+    def _close(self, client):
+        if client.events:
+            self._write(client)  # Best effort flush of a final error reply
+            self.selector.unregister(client.sock)
+            client.events = 0
+            client.sock.close()
+        client.closed = True
+
+
+class CommandExecutor(threading.Thread):
+    """
+    Executes every client's commands on a single thread, in arrival order per
+    client. A blocking command (BLPOP, XREAD or XREADGROUP BLOCK, WAIT) runs
+    on a helper thread instead, and its client's later commands wait until it
+    returns.
+    """
+
+    def __init__(self, server):
+        super().__init__(daemon=True)
+        self.server = server
+        self.queue = queue.SimpleQueue()
+        self.output_buffer_limits = {}
+        self.output_check_floor = 0
+        self.set_output_buffer_limits(server.config["client-output-buffer-limit"])
+
+    def set_output_buffer_limits(self, limits):
+        """Per client class (hard, soft, soft seconds); replies only get checked once a buffer passes the floor."""
+        self.output_buffer_limits = limits
+        self.output_check_floor = min((limit for hard, soft, _ in limits.values() for limit in (hard, soft) if limit),
+                                      default=float("inf"))
+
+    def client_class(self, client):
+        if client in self.server.replicas:
+            return "replica"
+        if client in self.server.subscriptions:
+            return "pubsub"
+        return "normal"
+
+    def submit(self, client, commands):
+        self.queue.put((client, commands))
+
+    def run(self):
+        while True:
+            client, commands = self.queue.get()
+            client.pending.extend(commands)
+            while client.pending and not client.blocked and not client.closed:
+                command, command_bytes = client.pending.popleft()
+                if self.server.is_blocking_command(client, command):
+                    client.blocked = True
+                    threading.Thread(target=self._run_blocking, args=(client, command, command_bytes),
+                                     daemon=True).start()
+                    break
+                self._run(client, command, command_bytes)
+
+    def _run(self, client, command, command_bytes):
+        try:
+            self.server.dispatch(client, command, command_bytes)
+        except (OSError, ValueError, IndexError, TypeError) as e:
+            log.log(VERBOSE, "Error in handle_connection: %s", e)
+            self.server.cleanup_connection(client)
+
+    def _run_blocking(self, client, command, command_bytes):
+        self._run(client, command, command_bytes)
+        client.blocked = False
+        self.submit(client, [])
@@ -1,15 +1,30 @@
 import argparse
+import os
+
 from app.server import Server
+from app.utils.config import CONFIG_PARAMS, NO_EFFECT, load_config, without_effect
+from app.utils.logger import log, setup_logging
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--port", type=int, default=6379, help="Port to listen on")
-    parser.add_argument("--replicaof", type=str, help="Replication source in host port format")
-    parser.add_argument("--dir", type=str, help="Directory for persistence files")
-    parser.add_argument("--dbfilename", type=str, help="RDB filename")
-    args = parser.parse_args()
+    parser.add_argument("config_file", nargs="?", help="redis.conf style configuration file")
+    # Every configuration parameter is also a flag; flags override the config file
+    for name, param in CONFIG_PARAMS.items():
+        parser.add_argument(f"--{name}", type=str, help=f"{param.help} (default: {param.default or 'none'})")
+    options = parser.parse_args()
+    overrides = {name: getattr(options, name.replace("-", "_")) for name in CONFIG_PARAMS}
+    try:
+        config = load_config(options.config_file,
+                             {name: value for name, value in overrides.items() if value is not None})
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
 
+    args = argparse.Namespace(**{name.replace("-", "_"): value for name, value in config.items()})
+    args.config_file = os.path.abspath(options.config_file) if options.config_file else None
+    setup_logging(args.loglevel, args.logfile)
+    for name in without_effect(config):
+        log.warning("%s %s", name, NO_EFFECT)
     server = Server(args)
     server.start()
 
@@ -1,78 +1,143 @@
-# pylint: disable=too-few-public-methods
-class CommandParser:
-
-    def _parse_bulk_string(self, buffer, s_len):
-        if len(buffer) < s_len + 2:  # +2 for \r\n
-            return None, buffer, 0  # Not enough data
-
+READ_SIZE = 16 * 1024
+BIG_ARG = 32 * 1024  # Bulk arguments this long get a buffer sized to read all of them at once
+INLINE_MAX = 64 * 1024  # Longest *<count> or $<length> line
+MAX_MULTIBULK = (1 << 31) - 1
+
+
+class ProtocolError(ValueError):
+    """A malformed request: the client is sent `-ERR Protocol error: <message>` and disconnected."""
+
+
+class QueryBufferLimitError(ValueError):
+    """A client's pending input passed client-query-buffer-limit; it is disconnected without a reply."""
+
+
+class QueryBuffer:
+    """
+    A client's input, after Redis's query buffer: a bytearray that reads go
+    straight into with recv_into, reused from one read to the next, and the
+    RESP request being assembled from it. Arguments are returned as raw bytes
+    so binary values survive untouched; only the command name is decoded.
+
+    Parsing keeps its place inside a partly received command (arguments so
+    far, how many are left, the announced length of the next one), so a
+    command spread over many reads, such as an RPUSH with 100k arguments, is
+    parsed once as it arrives instead of from its start after every read.
+    Once a bulk argument of BIG_ARG bytes or more is announced the buffer is
+    grown to hold all of it and the next reads ask for the rest at once.
+
+    `config` supplies proto-max-bulk-len and client-query-buffer-limit; the
+    master link passes None, as in Redis its stream is not limited.
+    """
+
+    __slots__ = ("buf", "pos", "end", "config", "args", "args_left", "bulk_len", "frame_bytes")
+
+    def __init__(self, data=b"", config=None):
+        self.buf = bytearray(data)
+        self.pos = 0
+        self.end = len(data)
+        self.config = config
+        self.args = []
+        self.args_left = 0  # Arguments still to come of the command in progress, 0 between commands
+        self.bulk_len = -1  # Length of the next argument once its $ line is read
+        self.frame_bytes = 0  # Bytes of the command in progress consumed so far, for the replication offset
+
+    def __len__(self):
+        """Bytes held for the command in progress and the unparsed input after it."""
+        return self.frame_bytes + self.end - self.pos
+
+    def _reserve(self, size):
+        """Room for `size` more bytes after the data, dropping the parsed bytes in front of it first."""
+        if self.end + size <= len(self.buf):
+            return
+        if self.pos:
+            del self.buf[:self.pos]
+            self.end -= self.pos
+            self.pos = 0
+        if self.end + size > len(self.buf):
+            self.buf.extend(bytes(self.end + size - len(self.buf)))
+
+    def read_from(self, sock):
+        """One recv_into the free space after the data; returns the bytes read, 0 once the peer has closed."""
+        size = READ_SIZE
+        if self.bulk_len >= BIG_ARG:
+            size = max(size, self.bulk_len + 2 - (self.end - self.pos))
+        self._reserve(size)
+        with memoryview(self.buf)[self.end:] as free:
+            n = sock.recv_into(free, size)
+        self.end += n
+        if self.config and len(self) > self.config["client-query-buffer-limit"]:
+            raise QueryBufferLimitError(f"query buffer of {len(self)} bytes over client-query-buffer-limit")
+        return n
+
+    def _header(self, pos):
+        """The position of the \\r\\n ending the *<count> / $<length> line at pos, or -1 if it is still to come."""
+        crlf = self.buf.find(b"\r\n", pos, self.end)
+        if crlf == -1 and self.end - pos > INLINE_MAX:
+            raise ProtocolError("too big mbulk count string" if not self.args_left else "too big bulk count string")
+        return crlf
+
+    def _start_command(self, pos, crlf):
+        """Take in the *<count> line at pos; any other line is skipped, as inline commands are not supported."""
+        if self.buf[pos] != 0x2A:  # *
+            return
         try:
-            bulk_str = buffer[:s_len].decode('utf-8')
-            remaining_buffer = buffer[s_len + 2:]  # +2 for \r\n
-            bytes_processed = s_len + 2
-            return bulk_str, remaining_buffer, bytes_processed
-        except UnicodeDecodeError:
-            # If we can't decode it, it might be binary data (RDB file)
-            print("Skipping binary data (likely RDB)")
-            remaining_buffer = buffer[s_len + 2:]
-            return None, remaining_buffer, s_len + 2
-
-    def _parse_array(self, buffer, num_args):
-        elements = []
-        current_buffer = buffer
-        total_bytes = 0
-
-        for _ in range(num_args):
-            element, current_buffer, bytes_processed = self._parse_stream(current_buffer)
-            if element is None and bytes_processed == 0:
-                return None, buffer, 0  # Not enough data
-            total_bytes += bytes_processed
-            if element is not None:
-                elements.append(element)
-
-        if not elements:
-            return None, current_buffer, total_bytes
-
-        return elements, current_buffer, total_bytes
-
-    def _parse_stream(self, buffer):
-        if not buffer:
-            return None, buffer, 0
-
-        # Find the first \r\n
-        crlf_pos = buffer.find(b'\r\n')
-        if crlf_pos == -1:
-            return None, buffer, 0  # Not enough data
-
-        header = buffer[:crlf_pos].decode()
-        remaining_buffer = buffer[crlf_pos + 2:]
-        cmd_type = header[0]
-        header_bytes = len(header) + 2
-
-        if cmd_type == '*':
-            num_args = int(header[1:])
-            result, remaining_buffer, bytes_processed = self._parse_array(remaining_buffer, num_args)
-            return result, remaining_buffer, header_bytes + bytes_processed
-        if cmd_type == '$':
-            s_len = int(header[1:])
-            if s_len >= 0:
-                result, remaining_buffer, bytes_processed = self._parse_bulk_string(remaining_buffer, s_len)
-                return result, remaining_buffer, header_bytes + bytes_processed
-            return None, remaining_buffer, header_bytes  # Null bulk string
-        return None, remaining_buffer, header_bytes
-
-    def parse_commands(self, buffer):
+            count = int(self.buf[pos + 1:crlf])
+        except ValueError:
+            count = MAX_MULTIBULK + 1
+        if count > MAX_MULTIBULK:
+            raise ProtocolError("invalid multibulk length")
+        if count > 0:  # An empty multibulk is ignored
+            self.args_left = count
+            self.frame_bytes = crlf + 2 - pos
+
+    def _bulk_length(self, pos, crlf):
+        if self.buf[pos] != 0x24:  # $
+            raise ProtocolError(f"expected '$', got '{chr(self.buf[pos])}'")
+        try:
+            length = int(self.buf[pos + 1:crlf])
+        except ValueError:
+            length = -1
+        if length < 0 or (self.config and length > self.config["proto-max-bulk-len"]):
+            raise ProtocolError("invalid bulk length")
+        return length
+
+    def parse(self):
+        """The commands completed by the input so far, as (arguments, bytes they took), consuming them."""
         commands = []
-        current_buffer = buffer
-
-        while current_buffer:
-            command, new_buffer, bytes_processed = self._parse_stream(current_buffer)
-
-            if bytes_processed == 0:
-                break  # Not enough data to parse a full command
-
-            if command is not None and isinstance(command, list) and len(command) > 0:
-                commands.append((command, bytes_processed))
-
-            current_buffer = new_buffer
-
-        return commands, current_buffer
+        buf, pos, end = self.buf, self.pos, self.end
+        while pos < end:
+            if not self.args_left:
+                crlf = self._header(pos)
+                if crlf == -1:
+                    break
+                self._start_command(pos, crlf)
+                pos = crlf + 2
+                continue
+            if self.bulk_len < 0:
+                crlf = self._header(pos)
+                if crlf == -1:
+                    break
+                self.bulk_len = self._bulk_length(pos, crlf)
+                self.frame_bytes += crlf + 2 - pos
+                pos = crlf + 2
+            following = pos + self.bulk_len + 2  # +2 for \r\n
+            if following > end:
+                break
+            self.args.append(bytes(buf[pos:following - 2]))
+            self.frame_bytes += following - pos
+            pos = following
+            self.bulk_len = -1
+            self.args_left -= 1
+            if not self.args_left:
+                command = self.args
+                command[0] = command[0].decode("utf-8", "replace")
+                commands.append((command, self.frame_bytes))
+                self.args = []
+                self.frame_bytes = 0
+        if pos == end:
+            pos = self.end = 0
+            if len(buf) > BIG_ARG and self.bulk_len < BIG_ARG:
+                self.buf = bytearray()  # Give back the room a big argument or pipeline needed
+        self.pos = pos
+        return commands
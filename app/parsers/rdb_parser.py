@@ -1,6 +1,62 @@
+import itertools
+import multiprocessing
 import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.logger import VERBOSE, log
+
+CHUNK_ENTRIES = 50000
+# Files smaller than this are decoded in-process: starting a spawned pool costs more than it saves
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+INT_ENCODING_SIZES = {0: 1, 1: 2, 2: 4}
+LISTPACK_HEADER_SIZE = 6
+LISTPACK_END = 0xFF
+LISTPACK_INT_SIZES = {0xF1: 2, 0xF2: 3, 0xF3: 4, 0xF4: 8}
+
+
+def backlen_size(entry_size):
+    """Bytes of the backward length a listpack stores after an entry of `entry_size` bytes."""
+    if entry_size < 128:
+        return 1
+    if entry_size < 16384:
+        return 2
+    if entry_size < 2097152:
+        return 3
+    return 4 if entry_size < 268435456 else 5
+
+
+def decode_listpack(blob):
+    """The elements of a Redis listpack, how RDB 10+ stores small hashes, as bytes."""
+    items = []
+    pos = LISTPACK_HEADER_SIZE
+    while blob[pos] != LISTPACK_END:
+        byte = blob[pos]
+        if byte < 0x80:  # 7-bit unsigned int
+            items.append(b"%d" % byte)
+            size = 1
+        elif byte < 0xC0:  # string up to 63 bytes
+            size = 1 + (byte & 0x3F)
+            items.append(bytes(blob[pos + 1:pos + size]))
+        elif byte < 0xE0:  # 13-bit signed int
+            value = ((byte & 0x1F) << 8) | blob[pos + 1]
+            items.append(b"%d" % (value - (1 << 13) if value >= 1 << 12 else value))
+            size = 2
+        elif byte < 0xF0:  # string up to 4095 bytes
+            size = 2 + (((byte & 0x0F) << 8) | blob[pos + 1])
+            items.append(bytes(blob[pos + 2:pos + size]))
+        elif byte == 0xF0:  # 32-bit string length
+            size = 5 + int.from_bytes(blob[pos + 1:pos + 5], 'little')
+            items.append(bytes(blob[pos + 5:pos + size]))
+        elif byte in LISTPACK_INT_SIZES:
+            width = LISTPACK_INT_SIZES[byte]
+            items.append(b"%d" % int.from_bytes(blob[pos + 1:pos + 1 + width], 'little', signed=True))
+            size = 1 + width
+        else:
+            raise ValueError(f"Invalid listpack entry encoding {byte:#x}")
+        pos += size + backlen_size(size)
+    return items
+
 
-# pylint: disable=too-few-public-methods
 class RDBParser:
     HEADER_MAGIC = b"\x52\x45\x44\x49\x53\x30\x30\x31\x31"  # "REDIS0001"
     META_START = 0xFA
@@ -11,13 +67,21 @@ class RDBParser:
     INT_START = 0x01
     EXPIRE_TIME = 0xFD
     EXPIRE_TIME_MS = 0xFC
+    TYPE_STRING = 0
+    TYPE_SET = 2
+    TYPE_HASH = 4
+    TYPE_SET_INTSET = 11
+    TYPE_HASH_LISTPACK = 16
+    TYPE_SET_LISTPACK = 20
 
-    def __init__(self, path):
-        try:
-            with open(path, 'rb') as f:
-                self.content = f.read()
-        except FileNotFoundError:
-            self.content = None
+    def __init__(self, path=None, content=None):
+        self.content = content
+        if path is not None:
+            try:
+                with open(path, 'rb') as f:
+                    self.content = f.read()
+            except FileNotFoundError:
+                self.content = None
         self.pointer = 0
 
     def _read(self, length):
@@ -42,61 +106,243 @@ class RDBParser:
             return int.from_bytes(self._read(4), 'big')
         return first_byte
 
+    def _read_string_header(self):
+        """(length, None) for a raw string, or (None, encoding) for an integer-encoded one."""
+        first_byte = self._read_byte()
+        if (first_byte & 0xC0) >> 6 == 0b11:
+            return None, first_byte & 0x3F
+        self.pointer -= 1
+        return self._read_length(), None
+
     def _read_string(self):
-        length_or_type = self._read_length()
+        length, encoding_type = self._read_string_header()
 
-        if (length_or_type & 0xC0) >> 6 == 0b11:
-            encoding_type = length_or_type & 0x3F
+        if encoding_type is not None:
             if encoding_type == 0:  # int8
-                return str(int.from_bytes(self._read(1), 'little'))
+                return b"%d" % int.from_bytes(self._read(1), 'little')
             if encoding_type == 1:  # int16
-                return str(int.from_bytes(self._read(2), 'little'))
+                return b"%d" % int.from_bytes(self._read(2), 'little')
             if encoding_type == 2:  # int32
-                return str(int.from_bytes(self._read(4), 'little'))
+                return b"%d" % int.from_bytes(self._read(4), 'little')
+            raise ValueError(f"Unsupported RDB string encoding {encoding_type}")
 
-        length = length_or_type
-        return self._read(length).decode()
-
-    def parse(self):
-        if not self.content:
-            return {}
+        return self._read(length)
 
-        # Check header
+    def _read_header(self):
         magic = self._read(len(self.HEADER_MAGIC))
         if magic != self.HEADER_MAGIC:
             raise ValueError("Invalid RDB file: incorrect header magic")
 
+    def _skip_metadata(self, opcode):
+        """Consume a non-key opcode; returns the expiry it sets, if any."""
+        if opcode == self.META_START:
+            self._read_string()  # aux key
+            self._read_string()  # aux value
+        elif opcode == self.DB_START:
+            self._read_length()  # db number
+        elif opcode == self.HASH_START:
+            self._read_length()  # db_hash_table_size
+            self._read_length()  # expiry_hash_table_size
+        elif opcode == self.EXPIRE_TIME:
+            return int.from_bytes(self._read(4), 'little') * 1000
+        elif opcode == self.EXPIRE_TIME_MS:
+            return int.from_bytes(self._read(8), 'little')
+        return None
+
+    def _string_end(self, pos):
+        """Offset just past the string encoded at `pos`, read without copying it."""
+        first_byte = self.content[pos]
+        encoding_type = first_byte >> 6
+        if encoding_type == 0b00:
+            return pos + 1 + (first_byte & 0x3F)
+        if encoding_type == 0b01:
+            return pos + 2 + (((first_byte & 0x3F) << 8) | self.content[pos + 1])
+        if encoding_type == 0b10:
+            return pos + 5 + int.from_bytes(self.content[pos + 1:pos + 5], 'big')
+        return pos + 1 + INT_ENCODING_SIZES.get(first_byte & 0x3F, 0)
+
+    def _value_at(self, value_type, pos):
+        """(value, offset past it) for a non-string value: hashes decode to a dict of field -> value, sets to a set."""
+        if value_type == self.TYPE_SET:
+            self.pointer = pos
+            size = self._read_length()
+            pos = self.pointer
+            members = set()
+            for _ in range(size):
+                member, pos = self._string_at(pos)
+                members.add(member)
+            return members, pos
+        if value_type == self.TYPE_SET_INTSET:
+            blob, pos = self._string_at(pos)
+            width = int.from_bytes(blob[0:4], 'little')
+            count = int.from_bytes(blob[4:8], 'little')
+            return {b"%d" % int.from_bytes(blob[i:i + width], 'little', signed=True)
+                    for i in range(8, 8 + count * width, width)}, pos
+        if value_type == self.TYPE_SET_LISTPACK:
+            blob, pos = self._string_at(pos)
+            return set(decode_listpack(blob)), pos
+        if value_type == self.TYPE_HASH:
+            self.pointer = pos
+            size = self._read_length()
+            pos = self.pointer
+            fields = {}
+            for _ in range(size):
+                field, pos = self._string_at(pos)
+                fields[field], pos = self._string_at(pos)
+            return fields, pos
+        if value_type == self.TYPE_HASH_LISTPACK:
+            blob, pos = self._string_at(pos)
+            items = decode_listpack(blob)
+            return dict(zip(items[::2], items[1::2])), pos
+        raise ValueError(f"Unsupported RDB value type {value_type}")
+
+    def _value_end(self, value_type, pos):
+        if value_type in (self.TYPE_SET, self.TYPE_HASH):
+            self.pointer = pos
+            size = self._read_length()
+            pos = self.pointer
+            for _ in range(size if value_type == self.TYPE_SET else size * 2):
+                pos = self._string_end(pos)
+            return pos
+        return self._string_end(pos)
+
+    def split(self, chunk_entries=CHUNK_ENTRIES):
+        """
+        Cut the file into (start, end) byte ranges of about `chunk_entries`
+        keys each, every one starting at an entry boundary so the ranges
+        decode independently. Key/value entries are stepped over by their
+        length prefixes alone, which is much cheaper than decoding them.
+        Ranges are yielded as they are found, so decoding can start early.
+        """
+        self.pointer = 0
+        self._read_header()
+        content = self.content
+        size = len(content)
+        start = pos = self.pointer
+        entries = 0
+        while pos < size:
+            opcode = content[pos]
+            if opcode == self.EOF:
+                pos += 1
+                break
+            if entries >= chunk_entries and opcode not in (self.EXPIRE_TIME, self.EXPIRE_TIME_MS):
+                yield start, pos
+                start, entries = pos, 0
+            if opcode == self.EXPIRE_TIME:
+                pos += 5
+            elif opcode == self.EXPIRE_TIME_MS:
+                pos += 9
+            elif opcode in (self.META_START, self.DB_START, self.HASH_START):
+                self.pointer = pos + 1
+                self._skip_metadata(opcode)
+                pos = self.pointer
+            else:
+                pos = self._value_end(opcode, self._string_end(pos + 1))
+                entries += 1
+        if pos > size:
+            raise EOFError("Unexpected end of file")
+        yield start, pos
+
+    def _string_at(self, pos):
+        """(value, offset past it) for the string encoded at `pos`; the hot path of parse_entries."""
+        content = self.content
+        first_byte = content[pos]
+        encoding_type = first_byte >> 6
+        if encoding_type == 0b00:
+            end = pos + 1 + (first_byte & 0x3F)
+            return content[pos + 1:end], end
+        if encoding_type == 0b01:
+            end = pos + 2 + (((first_byte & 0x3F) << 8) | content[pos + 1])
+            return content[pos + 2:end], end
+        if encoding_type == 0b10:
+            end = pos + 5 + int.from_bytes(content[pos + 1:pos + 5], 'big')
+            return content[pos + 5:end], end
+        self.pointer = pos
+        value = self._read_string()
+        return value, self.pointer
+
+    def parse_entries(self, end, max_entries=None):
+        """
+        Decode entries from the current position up to byte `end`, or until
+        `max_entries` keys have been read. Reaching EOF moves the position to `end`.
+        String values decode to bytes, hashes to a dict and sets to a set.
+        """
         data = {}
         expiry_ms = None
+        now_ms = int(time.time() * 1000)
+        entries = 0
+        content = self.content
+        string_at = self._string_at
+        metadata = (self.META_START, self.DB_START, self.HASH_START, self.EXPIRE_TIME, self.EXPIRE_TIME_MS)
 
-        while self.pointer < len(self.content):
-            opcode = self._read_byte()
-
-            if opcode == self.META_START:
-                self._read_string()  # aux key
-                self._read_string()  # aux value
-            elif opcode == self.DB_START:
-                self._read_length()  # db number
-            elif opcode == self.HASH_START:
-                self._read_length()  # db_hash_table_size
-                self._read_length()  # expiry_hash_table_size
-            elif opcode == self.EXPIRE_TIME:
-                expiry_time = int.from_bytes(self._read(4), 'little')
-                expiry_ms = expiry_time * 1000
-                continue
-            elif opcode == self.EXPIRE_TIME_MS:
-                expiry_ms = int.from_bytes(self._read(8), 'little')
-                continue
-            elif opcode == self.EOF:
+        pos = self.pointer
+        while pos < end and entries != max_entries:
+            opcode = content[pos]
+            if opcode == self.EOF:
+                pos = end
                 break
+            if opcode in metadata:
+                self.pointer = pos + 1
+                expiry_ms = self._skip_metadata(opcode)
+                pos = self.pointer
+                continue
+            key, pos = string_at(pos + 1)
+            if opcode == self.TYPE_STRING:
+                value, pos = string_at(pos)
             else:
-                # value_type = opcode
-                key = self._read_string()
-                value = self._read_string()
+                value, pos = self._value_at(opcode, pos)
+            entries += 1
 
-                if expiry_ms is None or (expiry_ms > int(time.time() * 1000)):
-                    data[key] = value
+            if expiry_ms is None or expiry_ms > now_ms:
+                data[key] = value
+            expiry_ms = None
+        if pos > len(content):
+            raise EOFError("Unexpected end of file")
+        self.pointer = pos
+        return data
 
-                expiry_ms = None
-        print(f"RDB parsing completed. Parsed {len(data)} keys.")
+    def parse(self):
+        if not self.content:
+            return {}
+        self.pointer = 0
+        self._read_header()
+        data = self.parse_entries(len(self.content))
+        log.log(VERBOSE, "RDB parsing completed. Parsed %d keys.", len(data))
         return data
+
+
+def parse_range(path, start, end):
+    """Process pool task: decode one byte range of the file."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        parser = RDBParser(content=f.read(end - start))
+    return parser.parse_entries(end - start)
+
+
+def load_chunks(path, workers=1, chunk_entries=CHUNK_ENTRIES):
+    """
+    Yield (keys, bytes decoded so far, total bytes) for the file in order.
+    With several workers, a file of at least PARALLEL_MIN_BYTES that splits
+    into more than one chunk is decoded in parallel by a pool of spawned
+    processes (forking a threaded server is unsafe), the chunks merged here
+    as each one finishes, in file order. Anything else is decoded in-process.
+    """
+    parser = RDBParser(path)
+    if not parser.content:
+        return
+    total = len(parser.content)
+    ranges = parser.split(chunk_entries) if workers > 1 and total >= PARALLEL_MIN_BYTES else iter(())
+    first = list(itertools.islice(ranges, 2))
+    if len(first) < 2:
+        parser.pointer = 0
+        parser._read_header()  # pylint: disable=protected-access
+        while parser.pointer < total:
+            yield parser.parse_entries(total, chunk_entries), parser.pointer, total
+        return
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Submitting while splitting lets the workers decode early chunks as later ones are found
+        futures = [(end, pool.submit(parse_range, path, start, end))
+                   for start, end in itertools.chain(first, ranges)]
+        del parser
+        for end, future in futures:
+            yield future.result(), end, total
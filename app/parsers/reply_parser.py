@@ -0,0 +1,34 @@
+class ReplyError(Exception):
+    """An error reply (-ERR ..., -MOVED ...) received from another node."""
+
+
+def read_reply(reader):
+    """
+    Read one RESP2 reply from a buffered binary stream such as
+    socket.makefile("rb"). Error replies are returned as ReplyError instances
+    rather than raised, so a pipeline of replies can be drained in order.
+    """
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed while reading reply")
+    reply_type, payload = line[:1], line[1:-2]
+    if reply_type == b"+":
+        return payload
+    if reply_type == b"-":
+        return ReplyError(payload.decode(errors="replace"))
+    if reply_type == b":":
+        return int(payload)
+    if reply_type == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("connection closed while reading reply")
+        return data[:-2]
+    if reply_type == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(reader) for _ in range(length)]
+    raise ValueError(f"unexpected reply type {reply_type!r}")
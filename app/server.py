@@ -1,33 +1,100 @@
+import itertools
 import socket
 import threading
 import time
 
-from app.parsers.command_parser import CommandParser
-from app.parsers.rdb_parser import RDBParser
+from app.commands.admin import AdminCommandsMixin
+from app.commands.bitmaps import BitmapCommandsMixin
+from app.commands.client import ClientCommandsMixin
+from app.commands.cluster import ClusterCommandsMixin
+from app.commands.config import ConfigCommandsMixin
+from app.commands.connection import ConnectionCommandsMixin
+from app.commands.debug import DebugCommandsMixin
+from app.commands.geo import GeoCommandsMixin
+from app.commands.hashes import HashCommandsMixin
+from app.commands.hyperloglog import HyperLogLogCommandsMixin
+from app.commands.keyspace import KeyspaceCommandsMixin
+from app.commands.lists import ListCommandsMixin
+from app.commands.persistence import LOADING_ERROR, LOADING_OK_COMMANDS, PersistenceCommandsMixin
+from app.commands.pubsub import PubSubCommandsMixin
+from app.commands.replication import ReplicationCommandsMixin
+from app.commands.sets import SetCommandsMixin
+from app.commands.sorted_sets import SortedSetCommandsMixin
+from app.commands.stats import StatsCommandsMixin
+from app.commands.streams import StreamCommandsMixin
+from app.commands.strings import StringCommandsMixin
+from app.commands.transactions import TransactionCommandsMixin
+from app.io_threads import Client, CommandExecutor, IOWorker
+from app.parsers.command_parser import ProtocolError, QueryBuffer, QueryBufferLimitError
+from app.stores.hash_store import HashStore
 from app.stores.list_store import ListStore
+from app.stores.set_store import SetStore
 from app.stores.stream_store import StreamStore
 from app.stores.string_store import StringStore
 from app.stores.sorted_set_store import SortedSetStore
-from app.utils.geohash import encode as encode_geohash, decode as decode_geohash, haversine
-
-
-class Server:
-    EMPTY_RDB_FILE = "524544495330303131fa0972656469732d76657205372e" \
-    "322e30fa0a72656469732d62697473c040fa056374696d65c26d08bc65fa087" \
-    "57365642d6d656dc2b0c41000fa08616f662d62617365c000fff06e3bfec0ff5aa2"
+from app.utils.cluster import ClusterState, MigrateConnections
+from app.utils.config import CONFIG_PARAMS
+from app.utils.eviction import Evictor
+from app.utils.lazyfree import LazyFree
+from app.utils.logger import NOTICE, VERBOSE, log
+from app.utils.slots import KEY_SPECS, command_keys
+from app.utils.stats import ClientSocket, LatencyMonitor, SlowLog
+from app.utils.tracking import Tracking
+
+# Active expire cycle sizing at active-expire-effort 1, as in Redis; each effort step above adds to them
+ACTIVE_EXPIRE_KEYS_PER_LOOP = 20
+ACTIVE_EXPIRE_ACCEPTABLE_STALE = 10
+ACTIVE_EXPIRE_CYCLE_PERC = 25
+
+
+# pylint: disable=too-many-ancestors
+class Server(ConnectionCommandsMixin, StringCommandsMixin, KeyspaceCommandsMixin, ListCommandsMixin,
+             StreamCommandsMixin, SortedSetCommandsMixin, HashCommandsMixin, SetCommandsMixin, GeoCommandsMixin,
+             HyperLogLogCommandsMixin, BitmapCommandsMixin, PubSubCommandsMixin, TransactionCommandsMixin,
+             ReplicationCommandsMixin, AdminCommandsMixin, ClusterCommandsMixin, StatsCommandsMixin,
+             DebugCommandsMixin, PersistenceCommandsMixin, ConfigCommandsMixin, ClientCommandsMixin):
 
     def __init__(self, args):
         self.args = args
-        self.command_parser = CommandParser()
-        self.string_store = StringStore()
-        self.list_store = ListStore()
-        self.stream_store = StreamStore()
-        self.sorted_set_store = SortedSetStore()
+        # Live values of every configuration parameter, changed by CONFIG SET
+        self.config = {name: getattr(args, name.replace("-", "_")) for name in CONFIG_PARAMS}
+        self.config_file = getattr(args, "config_file", None)
+        self.string_store = StringStore(args.lock_stripes, args.lock_shared_reads)
+        self.string_store.hll_sparse_max_bytes = args.hll_sparse_max_bytes
+        self.list_store = ListStore(args.lock_stripes, args.lock_shared_reads)
+        self.stream_store = StreamStore(args.lock_stripes, args.lock_shared_reads)
+        self.stream_store.node_max_entries = args.stream_node_max_entries
+        self.stream_store.node_max_bytes = args.stream_node_max_bytes
+        self.sorted_set_store = SortedSetStore(args.lock_stripes, args.lock_shared_reads)
+        self.hash_store = HashStore(args.lock_stripes, args.lock_shared_reads)
+        self.hash_store.max_listpack_entries = args.hash_max_listpack_entries
+        self.hash_store.max_listpack_value = args.hash_max_listpack_value
+        self.set_store = SetStore(args.lock_stripes, args.lock_shared_reads)
+        self.set_store.max_intset_entries = args.set_max_intset_entries
+        self.set_store.max_listpack_entries = args.set_max_listpack_entries
+        self.set_store.max_listpack_value = args.set_max_listpack_value
+        self.stores = (self.string_store, self.list_store, self.stream_store, self.sorted_set_store, self.hash_store,
+                       self.set_store)
+        self.type_stores = {"string": self.string_store, "list": self.list_store, "stream": self.stream_store,
+                            "zset": self.sorted_set_store, "hash": self.hash_store, "set": self.set_store}
 
         self.connections = {}
         self.connections_lock = threading.Lock()
+        self.connected_clients = 0
+        self.start_time = time.time()
+        self.used_memory_peak = 0
+        self.stats = {"total_connections_received": 0, "total_commands_processed": 0,
+                      "keyspace_hits": 0, "keyspace_misses": 0}
+        self.command_stats = {}
+        self.slowlog = SlowLog(args.slowlog_log_slower_than, args.slowlog_max_len)
+        self.latency_monitor = LatencyMonitor(args.latency_monitor_threshold)
+        self.monitors = set()
+        self.monitors_lock = threading.Lock()
         self.subscriptions = {}
         self.subscriptions_lock = threading.Lock()
+        self.clients_by_id = {}
+        self.client_ids = itertools.count(1)
+        self.tracking = Tracking(self.clients_by_id, self.subscriptions)
 
         self.master_connection_socket = None
         self.replica_of = args.replicaof
@@ -38,67 +105,149 @@ class Server:
         self.master_repl_offset = 0
         self.master_repl_offset_lock = threading.Lock()
         self.replica_offset = 0
-        self.write_commands = {"SET", "DEL", "INCR", "DECR", "RPUSH", "LPUSH", "LPOP", "XADD", "ZADD"}
+        self.write_commands = {"SET", "DEL", "INCR", "DECR", "RPUSH", "LPUSH", "LPOP", "ZADD",
+                               "MSET", "MSETNX", "UNLINK", "INCRBY", "DECRBY", "INCRBYFLOAT", "ZREM", "GEOADD",
+                               "HSET", "HDEL", "HINCRBY", "SADD", "SREM", "SINTERSTORE", "SUNIONSTORE",
+                               "SDIFFSTORE", "PFADD", "PFMERGE", "SETBIT", "BITOP", "BITFIELD", "XGROUP", "XACK",
+                               "FLUSHALL", "FLUSHDB"}
+        # Writes that can grow the dataset and are refused when eviction can't make room
+        # XADD isn't listed above because it propagates itself, with the ID it generated
+        self.denyoom_commands = (self.write_commands | {"XADD"}) - {"DEL", "UNLINK", "LPOP", "ZREM", "HDEL", "SREM",
+                                                                    "FLUSHALL", "FLUSHDB"}
+        # Commands that change the keys they name, whose client-side cached copies are invalidated
+        self.keyspace_writes = self.write_commands | {"XADD", "XTRIM", "SPOP", "BLPOP", "XREADGROUP", "XCLAIM",
+                                                      "XAUTOCLAIM"}
+        self.evictor = Evictor(self.stores, self.string_store, args.maxmemory,
+                               args.maxmemory_policy, args.maxmemory_samples)
+        self.evictor.latency_monitor = self.latency_monitor
+        self.evictor.lazy = args.lazyfree_lazy_eviction
+        self.string_store.latency_monitor = self.latency_monitor
+        self.string_store.lazy_expire = args.lazyfree_lazy_expire
+        self.string_store.on_expire = self.tracking.invalidate
+        self.lazyfree = LazyFree()
+        for store in self.stores:
+            store.lazyfree = self.lazyfree
+
+        self.io_threads = args.io_threads
+        self.executor = None
+        self.cluster = None
+        self.asking_clients = set()
+        self.migrate_connections = MigrateConnections()
+        if args.cluster_enabled:
+            self.cluster = ClusterState(args.cluster_announce_ip, args.port)
+            for store in self.stores:
+                store.enable_slot_index()
 
         self.dir = args.dir
         self.dbfilename = args.dbfilename
+        self.loading = None
+        self.rdb_last_load_keys_loaded = 0
 
         self.command_handlers = {
             "PING": self.handle_ping, "ECHO": self.handle_echo, "SET": self.handle_set,
             "GET": self.handle_get, "RPUSH": self.handle_rpush, "LRANGE": self.handle_lrange,
             "LPUSH": self.handle_lpush, "LLEN": self.handle_llen, "LPOP": self.handle_lpop,
             "BLPOP": self.handle_blpop, "TYPE": self.handle_type, "XADD": self.handle_xadd,
-            "XRANGE": self.handle_xrange, "XREAD": self.handle_xread, "INCR": self.handle_incr,
+            "XRANGE": self.handle_xrange, "XREAD": self.handle_xread, "XREADGROUP": self.handle_xreadgroup,
+            "XGROUP": self.handle_xgroup, "XACK": self.handle_xack, "XPENDING": self.handle_xpending,
+            "XCLAIM": self.handle_xclaim, "XAUTOCLAIM": self.handle_xautoclaim, "XTRIM": self.handle_xtrim,
+            "XLEN": self.handle_xlen, "INCR": self.handle_incr,
             "INFO": self.handle_info, "REPLCONF": self.handle_replconf, "PSYNC": self.handle_psync,
             "WAIT": self.handle_wait, "CONFIG": self.handle_config, "KEYS": self.handle_keys,
             "SUBSCRIBE": self.handle_subscribe, "PUBLISH": self.handle_publish, "ZADD": self.handle_zadd,
             "ZRANK": self.handle_zrank, "ZRANGE": self.handle_zrange, "ZCARD": self.handle_zcard,
             "ZSCORE": self.handle_zscore, "ZREM": self.handle_zrem, "GEOADD": self.handle_geoadd,
             "GEOPOS": self.handle_geopos, "GEODIST": self.handle_geodist, "GEOSEARCH": self.handle_geosearch,
+            "MGET": self.handle_mget, "MSET": self.handle_mset, "MSETNX": self.handle_msetnx,
+            "DEL": self.handle_del, "UNLINK": self.handle_unlink, "EXISTS": self.handle_exists,
+            "INCRBY": self.handle_incrby, "DECR": self.handle_decr,
+            "DECRBY": self.handle_decrby, "INCRBYFLOAT": self.handle_incrbyfloat, "OBJECT": self.handle_object,
+            "SCAN": self.handle_scan, "ZSCAN": self.handle_zscan, "MEMORY": self.handle_memory,
+            "DBSIZE": self.handle_dbsize, "TOUCH": self.handle_touch, "CLUSTER": self.handle_cluster,
+            "ASKING": self.handle_asking, "MIGRATE": self.handle_migrate, "SLOWLOG": self.handle_slowlog,
+            "LATENCY": self.handle_latency, "MONITOR": self.handle_monitor, "DEBUG": self.handle_debug,
+            "HSET": self.handle_hset, "HGET": self.handle_hget, "HMGET": self.handle_hmget, "HDEL": self.handle_hdel,
+            "HGETALL": self.handle_hgetall, "HINCRBY": self.handle_hincrby, "HLEN": self.handle_hlen,
+            "HEXISTS": self.handle_hexists, "HSCAN": self.handle_hscan,
+            "SADD": self.handle_sadd, "SREM": self.handle_srem, "SISMEMBER": self.handle_sismember,
+            "SMISMEMBER": self.handle_smismember, "SMEMBERS": self.handle_smembers, "SCARD": self.handle_scard,
+            "SPOP": self.handle_spop, "SRANDMEMBER": self.handle_srandmember, "SINTER": self.handle_sinter,
+            "SUNION": self.handle_sunion, "SDIFF": self.handle_sdiff, "SINTERSTORE": self.handle_sinterstore,
+            "SUNIONSTORE": self.handle_sunionstore, "SDIFFSTORE": self.handle_sdiffstore,
+            "SINTERCARD": self.handle_sintercard, "SSCAN": self.handle_sscan,
+            "PFADD": self.handle_pfadd, "PFCOUNT": self.handle_pfcount, "PFMERGE": self.handle_pfmerge,
+            "SETBIT": self.handle_setbit, "GETBIT": self.handle_getbit, "BITCOUNT": self.handle_bitcount,
+            "BITPOS": self.handle_bitpos, "BITOP": self.handle_bitop, "BITFIELD": self.handle_bitfield,
+            "BITFIELD_RO": self.handle_bitfield_ro, "FLUSHALL": self.handle_flushall, "FLUSHDB": self.handle_flushdb,
+            "HELLO": self.handle_hello, "CLIENT": self.handle_client,
         }
 
     def start(self):
+        self.lazyfree.start()
+        workers = []
+        if self.io_threads > 1:
+            self.executor = CommandExecutor(self)
+            workers = [IOWorker(self.executor, self.cleanup_connection) for _ in range(self.io_threads)]
+            for thread in [self.executor] + workers:
+                thread.start()
+
         if self.replica_of:
             master_host, master_port = self.replica_of.split()
             result = self.connect_to_master(master_host, int(master_port), self.args.port)
             if result and result[0]:
-                self.master_connection_socket, remaining_buffer = result
-                print(f"Connected to master at {master_host}:{master_port}")
-                threading.Thread(target=self.handle_connection,
-                                 args=(self.master_connection_socket, remaining_buffer)).start()
+                master_socket, remaining_buffer = result
+                log.log(NOTICE, "Connected to master at %s:%s", master_host, master_port)
+                if workers:
+                    self.master_connection_socket = Client(master_socket, workers[0], QueryBuffer(remaining_buffer))
+                    self._add_client(self.master_connection_socket)
+                else:
+                    self.master_connection_socket = master_socket
+                    threading.Thread(target=self.handle_connection,
+                                     args=(master_socket, remaining_buffer)).start()
             else:
-                print(f"Failed to connect to master at {master_host}:{master_port}")
+                log.warning("Failed to connect to master at %s:%s", master_host, master_port)
 
-        if self.dir and self.dbfilename:
-            rdb_path = f"{self.dir}/{self.dbfilename}"
-            rdb_parser = RDBParser(rdb_path)
-            rdb_data = rdb_parser.parse()
-            self.string_store.load_from_rdb(rdb_data)
-            print(f"Loaded {len(rdb_data)} keys from RDB file")
+        if self.cluster:
+            threading.Thread(target=self.cluster.gossip_loop, daemon=True).start()
+        threading.Thread(target=self.server_cron, name="cron", daemon=True).start()
 
+        # Listen before loading the dataset so clients get -LOADING rather than connection refused
         server_socket = socket.create_server(("localhost", int(self.args.port)), reuse_port=True)
-        print(f"Server listening on port {self.args.port}")
+        log.log(NOTICE, "Server listening on port %s", self.args.port)
+        if self.dir and self.dbfilename:
+            self.start_loading(f"{self.dir}/{self.dbfilename}")
+        accepted = 0
         while True:
             connection, _ = server_socket.accept()
-            thread = threading.Thread(target=self.handle_connection, args=(connection,))
-            thread.start()
+            connection = ClientSocket(fileno=connection.detach())
+            # Like Redis: a reply written right after another must not wait on the client's delayed ACK
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.stats["total_connections_received"] += 1
+            if workers:
+                # Spread clients over the I/O workers round-robin, like Redis assigns them to io-threads
+                client = Client(connection, workers[accepted % len(workers)])
+                self._register_client(client)
+                self._add_client(client)
+                accepted += 1
+            else:
+                self._register_client(connection)
+                thread = threading.Thread(target=self.handle_connection, args=(connection,))
+                thread.start()
 
-    def _handle_master_command(self, connection, command, cmd, command_bytes):
-        if cmd == "REPLCONF" and len(command) > 1 and command[1].upper() == "GETACK":
-            offset_str = str(self.replica_offset)
-            response = f"*3\r\n$8\r\nREPLCONF\r\n$3\r\nACK\r\n${len(offset_str)}\r\n{offset_str}\r\n"
-            connection.sendall(response.encode())
-        else:
-            self.execute_command(connection, command)
-        self.replica_offset += command_bytes
+    def _register_client(self, connection):
+        """Give a client its CLIENT ID; the master link has none."""
+        connection.id = next(self.client_ids)
+        self.clients_by_id[connection.id] = connection
+
+    def _add_client(self, client):
+        with self.connections_lock:
+            self.connected_clients += 1
+        client.worker.schedule("add", client)
 
     def _handle_client_command(self, connection, command, cmd):
-        if cmd == "MULTI":
-            self.handle_multi(connection)
-        elif cmd == "EXEC":
-            self.handle_exec(connection)
-        elif cmd == "DISCARD":
-            self.handle_discard(connection)
+        if cmd in ("MULTI", "EXEC", "DISCARD"):
+            handler = getattr(self, f"handle_{cmd.lower()}")
+            self.call_handler(connection, cmd, command, lambda conn, _args: handler(conn))
         elif self.queue_command(connection, command):
             pass
         else:
@@ -106,36 +255,68 @@ class Server:
             if not self.replica_of and cmd in self.write_commands:
                 self.propagate_to_replicas(command)
 
+    def dispatch(self, connection, command, command_bytes):
+        log.debug("Received command: %s", command)
+        cmd = command[0].upper() if command else None
+
+        if connection == self.master_connection_socket:
+            self._handle_master_command(connection, command, cmd, command_bytes)
+        elif connection in self.subscriptions:
+            self._handle_subscription_command(connection, command, cmd)
+        else:
+            self._handle_client_command(connection, command, cmd)
+
+    def is_blocking_command(self, connection, command):
+        """
+        Whether a command may wait on other clients, or (DEBUG PROFILE) needs
+        to watch the executor run, so the io-threads executor must not run it inline.
+        """
+        cmd = command[0].upper()
+        if cmd == "EXEC":
+            queued = self.connections.get(id(connection), {}).get("commands", [])
+            return any(self.is_blocking_command(connection, queued_command) for queued_command in queued)
+        if cmd in ("XREAD", "XREADGROUP"):
+            return any(arg.upper() == b"BLOCK" for arg in command[1:])
+        if cmd == "DEBUG":
+            return len(command) > 1 and command[1].upper() == b"PROFILE"
+        return cmd in ("BLPOP", "WAIT")
+
     def handle_connection(self, connection, initial_buffer=b""):
-        buffer = initial_buffer
+        query = QueryBuffer(initial_buffer, None if connection == self.master_connection_socket else self.config)
+        with self.connections_lock:
+            self.connected_clients += 1
         try:
             while True:
-                commands_with_bytes, remaining_buffer = self.command_parser.parse_commands(buffer)
+                commands_with_bytes = query.parse()
 
                 if not commands_with_bytes:
-                    data = connection.recv(1024)
-                    if not data:
+                    if not query.read_from(connection):
                         break
-                    buffer += data
                     continue
 
                 for command, command_bytes in commands_with_bytes:
-                    print(f"Received command: {command}")
-                    cmd = command[0].upper() if command else None
-
-                    if connection == self.master_connection_socket:
-                        self._handle_master_command(connection, command, cmd, command_bytes)
-                    else:
-                        self._handle_client_command(connection, command, cmd)
-                buffer = remaining_buffer
+                    self.dispatch(connection, command, command_bytes)
+        except ProtocolError as e:
+            self.reject_input(connection, e)
+        except QueryBufferLimitError as e:
+            log.warning("Closing client that reached max query buffer length: %s", e)
         except (OSError, ValueError, IndexError, TypeError) as e:
-            print(f"Error in handle_connection: {e}")
+            log.log(VERBOSE, "Error in handle_connection: %s", e)
         finally:
             self.cleanup_connection(connection)
 
+    def reject_input(self, connection, error):
+        """Reply to a malformed request before the connection is dropped, as Redis does."""
+        log.log(VERBOSE, "Protocol error from client: %s", error)
+        try:
+            connection.sendall(f"-ERR Protocol error: {error}\r\n".encode())
+        except OSError:
+            pass
+
     def cleanup_connection(self, connection):
         conn_id = id(connection)
         with self.connections_lock:
+            self.connected_clients -= 1
             if conn_id in self.connections:
                 del self.connections[conn_id]
         with self.replicas_lock:
@@ -147,714 +328,64 @@ class Server:
         with self.subscriptions_lock:
             if connection in self.subscriptions:
                 del self.subscriptions[connection]
+        self.asking_clients.discard(connection)
+        client_id = getattr(connection, "id", 0)
+        if client_id:
+            self.clients_by_id.pop(client_id, None)
+            self.tracking.disable(client_id)
+        if connection in self.monitors:
+            with self.monitors_lock:
+                self.monitors.discard(connection)
         connection.close()
 
-    def execute_command(self, connection, command):
+    def execute_command(self, connection, command, evict=True):
         cmd = command[0].upper() if command else None
         handler = self.command_handlers.get(cmd)
-        if handler:
-            if cmd == "SUBSCRIBE":
-                handler(connection, command[1:])
-                self.enter_subscription_mode(connection)
+        self.stats["total_commands_processed"] += 1
+        if handler is None:
+            return connection.sendall(b"-ERR unknown command\r\n")
+        if self.loading is not None and cmd not in LOADING_OK_COMMANDS and connection != self.master_connection_socket:
+            self.reject_call(cmd)
+            return connection.sendall(LOADING_ERROR)
+        if self.cluster and connection != self.master_connection_socket:
+            redirect = self.cluster_redirect(connection, cmd, command[1:])
+            if redirect:
+                self.reject_call(cmd)
+                return connection.sendall(redirect)
+        if cmd in self.denyoom_commands and connection != self.master_connection_socket:
+            # Inside EXEC the stripes are already held, so eviction ran before the block instead
+            if evict:
+                has_room = self.evictor.free_memory(self._propagate_eviction)
             else:
-                handler(connection, command[1:])
+                has_room = not self.evictor.over_limit()
+            if not has_room:
+                self.reject_call(cmd)
+                return connection.sendall(b"-OOM command not allowed when used memory > 'maxmemory'.\r\n")
+        if self.string_store.expires and cmd in KEY_SPECS:
+            self.string_store.expire_if_needed(command_keys(cmd, command[1:]))
+        if self.tracking.clients:
+            self.call_tracked(connection, cmd, command, handler)
         else:
-            connection.sendall(b"-ERR unknown command\r\n")
-
-    def _perform_handshake(self, master_socket, replica_port):
-        # Handshake steps
-        ping_command = b"*1\r\n$4\r\nPING\r\n"
-        master_socket.sendall(ping_command)
-        response = master_socket.recv(1024)
-        if response != b"+PONG\r\n":
-            print("Failed to receive PONG from master")
-            return False
-
-        replconf_command = "*3\r\n$8\r\nREPLCONF\r\n$14\r\nlistening-port\r\n" \
-                          f"${len(str(replica_port))}\r\n{replica_port}\r\n"
-        master_socket.sendall(replconf_command.encode())
-        response = master_socket.recv(1024)
-        if response != b"+OK\r\n":
-            print("Failed to receive OK from master for REPLCONF")
-            return False
-
-        replconf_command = b"*3\r\n$8\r\nREPLCONF\r\n$4\r\ncapa\r\n$6\r\npsync2\r\n"
-        master_socket.sendall(replconf_command)
-        response = master_socket.recv(1024)
-        if response != b"+OK\r\n":
-            print("Failed to receive OK from master for REPLCONF capa")
-            return False
-
-        psync_command = b"*3\r\n$5\r\nPSYNC\r\n$1\r\n?\r\n$2\r\n-1\r\n"
-        master_socket.sendall(psync_command)
-        return True
-
-    def _receive_rdb_file(self, master_socket):
-        buffer = b""
-
-        def read_line():
-            nonlocal buffer
-            while True:
-                crlf_pos = buffer.find(b"\r\n")
-                if crlf_pos != -1:
-                    line = buffer[:crlf_pos]
-                    buffer = buffer[crlf_pos + 2:]
-                    return line
-                chunk = master_socket.recv(4096)
-                if not chunk:
-                    return b""
-                buffer += chunk
-
-        # Read +FULLRESYNC line
-        fullresync_line = read_line()
-        if not fullresync_line.startswith(b"+FULLRESYNC"):
-            print("Failed to receive FULLRESYNC from master")
-            return None
-
-        # Read RDB file length header ($<length>)
-        rdb_header = read_line()
-        if not rdb_header.startswith(b"$"):
-            print("Failed to receive RDB header")
-            return None
-
-        rdb_length = int(rdb_header[1:])
-        print(f"RDB file length: {rdb_length}")
-
-        # Read the exact RDB file content
-        while len(buffer) < rdb_length:
-            chunk = master_socket.recv(min(4096, rdb_length - len(buffer)))
-            if not chunk:
-                break
-            buffer += chunk
-
-        # Remove RDB data from buffer
-        remaining_buffer = buffer[rdb_length:]
-        print("RDB file consumed completely")
-        return remaining_buffer
-
-
-    def connect_to_master(self, host, port, replica_port):
-        try:
-            master_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            master_socket.connect((host, port))
-
-            if not self._perform_handshake(master_socket, replica_port):
-                master_socket.close()
-                return None, b""
-
-            buffer = self._receive_rdb_file(master_socket)
-            if buffer is None:
-                master_socket.close()
-                return None, b""
-
-            print(f"Connected to master at {host}:{port}")
-            return master_socket, buffer  # Return remaining buffer
-        except OSError as e:
-            print(f"Failed to connect to master at {host}:{port}: {e}")
-            return None, b""
-
-    def handle_ping(self, connection, command):
-        if len(command) != 0:
-            return connection.sendall(b"-ERR wrong number of arguments for 'PING' command\r\n")
-        if connection == self.master_connection_socket:
-            return None
-        with self.subscriptions_lock:
-            is_subscribed = connection in self.subscriptions and self.subscriptions[connection]
-        if is_subscribed:
-            return connection.sendall(b"*2\r\n$4\r\npong\r\n$0\r\n\r\n")
-        return connection.sendall(b"+PONG\r\n")
-
-    def handle_echo(self, connection, command):
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'ECHO' command\r\n")
-        message = command[0]
-        response = f"${len(message)}\r\n{message}\r\n"
-        return connection.sendall(response.encode())
-
-    def handle_set(self, connection, command):
-        if len(command) < 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'SET' command\r\n")
-        args = command
-        key = args[0]
-        value = args[1]
-        px = None
-        if len(args) > 2 and args[2].upper() == "PX":
-            if len(args) < 4:
-                return connection.sendall(b"-ERR syntax error\r\n")
-            px = int(args[3])
-
-        self.string_store.set(key, value, px)
-        if connection != self.master_connection_socket:
-            return connection.sendall(b"+OK\r\n")
+            self.call_handler(connection, cmd, command, handler)
         return None
 
-    def handle_get(self, connection, command):
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'GET' command\r\n")
-        key = command[0]
-        value = self.string_store.get(key)
-        if value is None:
-            return connection.sendall(b"$-1\r\n")
-        return connection.sendall(f"${len(value)}\r\n{value}\r\n".encode())
-
-    def handle_rpush(self, connection, command):
-        if len(command) < 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'RPUSH' command\r\n")
-        key, values = command[0], command[1:]
-        count = self.list_store.rpush(key, values)
-        return connection.sendall(f":{count}\r\n".encode())
-
-    def handle_lrange(self, connection, command):
-        if len(command) != 3:
-            return connection.sendall(b"-ERR wrong number of arguments for 'LRANGE' command\r\n")
-        key, start, end = command[0], command[1], command[2]
-        try:
-            start, end = int(start), int(end)
-        except ValueError:
-            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
-
-        items = self.list_store.lrange(key, start, end)
-        response = f"*{len(items)}\r\n"
-        for item in items:
-            response += f"${len(item)}\r\n{item}\r\n"
-        return connection.sendall(response.encode())
-
-    def handle_lpush(self, connection, command):
-        if len(command) < 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'LPUSH' command\r\n")
-        key, values = command[0], command[1:]
-        count = self.list_store.lpush(key, values)
-        return connection.sendall(f":{count}\r\n".encode())
-
-    def handle_llen(self, connection, command):
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'LLEN' command\r\n")
-        key = command[0]
-        count = self.list_store.llen(key)
-        return connection.sendall(f":{count}\r\n".encode())
-
-    def handle_lpop(self, connection, command):
-        if len(command) < 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'LPOP' command\r\n")
-        key = command[0]
-        count = 1
-        if len(command) > 1:
-            try:
-                count = int(command[1])
-            except ValueError:
-                return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
-
-        items = self.list_store.lpop(key, count)
-        if not items:
-            return connection.sendall(b"$-1\r\n")
-        if len(items) == 1:
-            response = f"${len(items[0])}\r\n{items[0]}\r\n"
-        else:
-            response = f"*{len(items)}\r\n"
-            for item in items:
-                response += f"${len(item)}\r\n{item}\r\n"
-        return connection.sendall(response.encode())
-
-    def handle_blpop(self, connection, command):
-        if len(command) != 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'BLPOP' command\r\n")
-        key, timeout = command[0], command[1]
-        timeout = float(timeout)
-        start_time = time.time() if timeout > 0 else None
-
+    def server_cron(self):
+        """
+        Background work run `hz` times a second; hz and active-expire-effort
+        are re-read every round, so CONFIG SET takes effect on the next one.
+        The active expire cycle reclaims expired keys that no command reads.
+        """
         while True:
-            popped = self.list_store.lpop(key, 1)
-            if popped:
-                value = popped[0]
-                response = f"*2\r\n${len(key)}\r\n{key}\r\n${len(value)}\r\n{value}\r\n"
-                return connection.sendall(response.encode())
-
-            if timeout is not None and start_time and (time.time() - start_time) >= timeout:
-                return connection.sendall(b"*-1\r\n")
-            threading.Event().wait(0.1)
-
-    def handle_type(self, connection, command):
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'TYPE' command\r\n")
-        key = command[0]
-        if self.string_store.get(key) is not None:
-            return connection.sendall(b"+string\r\n")
-        if self.list_store.exists(key):
-            return connection.sendall(b"+list\r\n")
-        if self.stream_store.exists(key):
-            return connection.sendall(b"+stream\r\n")
-        if self.sorted_set_store.exists(key):
-            return connection.sendall(b"+zset\r\n")
-
-        return connection.sendall(b"+none\r\n")
-
-    def handle_xadd(self, connection, command):
-        if len(command) < 3:
-            return connection.sendall(b"-ERR wrong number of arguments for 'XADD' command\r\n")
-        key, stream_id, args = command[0], command[1], command[2:]
-        if len(args) % 2 != 0:
-            return connection.sendall(b"-ERR wrong number of arguments for 'XADD' command\r\n")
-
-        fields_dict = {args[i]: args[i + 1] for i in range(0, len(args), 2)}
-        try:
-            new_id = self.stream_store.xadd(key, stream_id, fields_dict)
-            return connection.sendall(f"${len(new_id)}\r\n{new_id}\r\n".encode())
-        except ValueError as e:
-            return connection.sendall(f"-ERR {str(e)}\r\n".encode())
-
-    def handle_xrange(self, connection, command):
-        if len(command) != 3:
-            return connection.sendall(b"-ERR wrong number of arguments for 'XRANGE' command\r\n")
-        key, start, end = command[0], command[1], command[2]
-        entries = self.stream_store.xrange(key, start, end)
-        if not entries:
-            return connection.sendall(b"*0\r\n")
-
-        response = f"*{len(entries)}\r\n"
-        for entry in entries:
-            response += f"*2\r\n${len(entry['id'])}\r\n{entry['id']}\r\n"
-            fields = entry["fields"]
-            response += f"*{len(fields) * 2}\r\n"
-            for field, value in fields.items():
-                response += f"${len(field)}\r\n{field}\r\n${len(value)}\r\n{value}\r\n"
-
-        return connection.sendall(response.encode())
-
-    def handle_xread(self, connection, command):
-        block = None
-        if command[0].upper() == "BLOCK":
-            try:
-                block = int(command[1]) / 1000.0
-                command = command[2:]
-            except ValueError:
-                connection.sendall(b"-ERR invalid BLOCK value\r\n")
-        command = command[1:]
-        if len(command) < 2 or len(command) % 2 != 0:
-            return connection.sendall(b"-ERR wrong number of arguments for 'XREAD' command\r\n")
-        # num_streams = len(command) // 2
-        start_time = time.time() if block is not None else None
-
-        streams_to_read = {command[i]: command[i + len(command) // 2] for i in range(len(command) // 2)}
-        for key, stream_id in streams_to_read.items():
-            if stream_id == "$":
-                streams_to_read[key] = self.stream_store.get_last_id(key)
-
-        while True:
-            results = self.stream_store.xread(streams_to_read)
-            if results:
-                response = f"*{len(results)}\r\n"
-                for key, entries in results:
-                    response += f"*2\r\n${len(key)}\r\n{key}\r\n*{len(entries)}\r\n"
-                    for entry in entries:
-                        response += f"*2\r\n${len(entry['id'])}\r\n{entry['id']}\r\n"
-                        fields = entry["fields"]
-                        response += f"*{len(fields) * 2}\r\n"
-                        for field, value in fields.items():
-                            response += f"${len(field)}\r\n{field}\r\n${len(value)}\r\n{value}\r\n"
-                return connection.sendall(response.encode())
-
-            if block is None:
-                return connection.sendall(b"*0\r\n")
-
-            if 0 < block <= (time.time() - start_time) and start_time:
-                return connection.sendall(b"*-1\r\n")
-
-            threading.Event().wait(0.1)
-
-    def handle_incr(self, connection, command):
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'INCR' command\r\n")
-        key = command[0]
-        try:
-            value = self.string_store.incr(key)
-        except ValueError:
-            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
-        if value is not None:
-            return connection.sendall(f":{value}\r\n".encode())
-        return connection.sendall(b"$-1\r\n")
-
-    def handle_multi(self, connection):
-        conn_id = id(connection)
-        with self.connections_lock:
-            self.connections[conn_id] = {'in_transaction': True, 'commands': []}
-        return connection.sendall(b"+OK\r\n")
-
-    def handle_exec(self, connection):
-        conn_id = id(connection)
-        with self.connections_lock:
-            if conn_id not in self.connections or not self.connections[conn_id].get('in_transaction'):
-                return connection.sendall(b"-ERR EXEC without MULTI\r\n")
-
-            commands = self.connections[conn_id]['commands']
-            del self.connections[conn_id]
-
-        connection.sendall(f"*{len(commands)}\r\n".encode())
-        for command in commands:
-            try:
-                self.execute_command(connection, command)
-            except (ValueError, IndexError, TypeError) as e:
-                connection.sendall(f"-ERR {str(e)}\r\n".encode())
-        return None
-
-    def queue_command(self, connection, command):
-        conn_id = id(connection)
-        with self.connections_lock:
-            if conn_id in self.connections and self.connections[conn_id].get('in_transaction'):
-                self.connections[conn_id]['commands'].append(command)
-                connection.sendall(b"+QUEUED\r\n")
-                return True
-        return False
-
-    def handle_discard(self, connection):
-        conn_id = id(connection)
-        with self.connections_lock:
-            if conn_id not in self.connections or not self.connections[conn_id].get('in_transaction'):
-                return connection.sendall(b"-ERR DISCARD without MULTI\r\n")
-            del self.connections[conn_id]
-        return connection.sendall(b"+OK\r\n")
-
-    def handle_info(self, connection, command):
-        section = command[0].upper() if len(command) > 0 else None
-        if section == "REPLICATION":
-            role = "slave" if self.replica_of else "master"
-            response = f"role:{role}\r\n"
-            response += "master_replid:8371b4fb1155b71f4a04d3e1bc3e18c4a990aeeb\r\n"
-            response += f"master_repl_offset:{self.master_repl_offset}\r\n"
-            return connection.sendall(f"${len(response)}\r\n{response}\r\n".encode())
-        return connection.sendall(b"-ERR unsupported INFO section\r\n")
-
-    def handle_psync(self, connection, command):
-        if len(command) != 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'PSYNC' command\r\n")
-        connection.sendall(b"+FULLRESYNC 8371b4fb1155b71f4a04d3e1bc3e18c4a990aeeb 0\r\n")
-        rdb_file_encoded = bytes.fromhex(Server.EMPTY_RDB_FILE)
-        connection.sendall(f"${len(rdb_file_encoded)}\r\n".encode() + rdb_file_encoded)
-
-        with self.replicas_lock:
-            self.replicas.append(connection)
-        return None
-
-    def propagate_to_replicas(self, command_array):
-        encoded_command = f"*{len(command_array)}\r\n"
-        for arg in command_array:
-            encoded_command += f"${len(arg)}\r\n{arg}\r\n"
-
-        encoded_bytes = encoded_command.encode()
-        with self.master_repl_offset_lock:
-            self.master_repl_offset += len(encoded_bytes)
-
-        with self.replicas_lock:
-            current_replicas = list(self.replicas)
-
-        for replica in current_replicas:
-            try:
-                replica.sendall(encoded_bytes)
-            except OSError as e:
-                print(f"Failed to propagate to replica {replica}: {e}")
-                with self.replicas_lock:
-                    if replica in self.replicas:
-                        self.replicas.remove(replica)
-                with self.replica_offsets_lock:
-                    if replica in self.replica_offsets:
-                        del self.replica_offsets[replica]
-
-    def handle_replconf(self, connection, command):
-        if len(command) >= 1 and command[0].upper() == "GETACK":
-            offset_str = str(self.replica_offset)
-            connection.sendall(f"*3\r\n$8\r\nREPLCONF\r\n$3\r\nACK\r\n${len(offset_str)}\r\n{offset_str}\r\n".encode())
-        elif len(command) >= 2 and command[0].upper() == "ACK":
-            with self.replica_offsets_lock:
-                self.replica_offsets[connection] = int(command[1])
-        else:
-            connection.sendall(b"+OK\r\n")
-
-    def handle_wait(self, connection, command):
-        if len(command) != 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'WAIT' command\r\n")
-        num_replicas, timeout = command[0], command[1]
-        try:
-            num_replicas = int(num_replicas)
-            timeout = int(timeout)
-        except ValueError:
-            return connection.sendall(b"-ERR invalid WAIT arguments\r\n")
-
-        with self.master_repl_offset_lock:
-            current_master_offset = self.master_repl_offset
-
-        if current_master_offset == 0:
-            with self.replicas_lock:
-                num_connected_replicas = len(self.replicas)
-            return connection.sendall(f":{num_connected_replicas}\r\n".encode())
-
-        getack_command = ["REPLCONF", "GETACK", "*"]
-        self.propagate_to_replicas(getack_command)
-
-        start_time = time.time()
-        acked_replicas = 0
-
-        while True:
-            with self.replica_offsets_lock:
-                current_acks = sum(1 for offset in self.replica_offsets.values() if offset >= current_master_offset)
-            if current_acks >= num_replicas:
-                acked_replicas = current_acks
-                break
-
-            if (time.time() - start_time) * 1000 >= timeout and timeout != 0:
-                with self.replica_offsets_lock:
-                    acked_replicas = sum(
-                        1 for offset in self.replica_offsets.values() if offset >= current_master_offset)
-                break
-
-            threading.Event().wait(0.01)
-
-        return connection.sendall(f":{acked_replicas}\r\n".encode())
-
-    def handle_config(self, connection, command):
-        if len(command) < 2 or command[0].upper() != "GET":
-            return connection.sendall(b"-ERR syntax error\r\n")
-
-        param = command[1]
-        if param == "dir":
-            response = f"*2\r\n$3\r\ndir\r\n${len(self.dir)}\r\n{self.dir}\r\n"
-            return connection.sendall(response.encode())
-        if param == "dbfilename":
-            response = f"*2\r\n$10\r\ndbfilename\r\n${len(self.dbfilename)}\r\n{self.dbfilename}\r\n"
-            return connection.sendall(response.encode())
-        return connection.sendall(b"-ERR unknown CONFIG GET parameter\r\n")
-
-    def handle_keys(self, connection, command):
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'KEYS' command\r\n")
-        pattern = command[0]
-        if pattern == "*":
-            keys = self.string_store.keys()
-            response = f"*{len(keys)}\r\n"
-            for key in keys:
-                response += f"${len(key)}\r\n{key}\r\n"
-            return connection.sendall(response.encode())
-        return connection.sendall(b"*0\r\n")
-
-    def handle_subscribe(self, connection, command):
-        print(command)
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'SUBSCRIBE' command\r\n")
-        channel = command[0]
-        print(f"Subscribing to channel: {channel}")
-        with self.subscriptions_lock:
-            if connection not in self.subscriptions:
-                self.subscriptions[connection] = set()
-            if channel not in self.subscriptions[connection]:
-                self.subscriptions[connection].add(channel)
-        response = f"*3\r\n$9\r\nsubscribe\r\n${len(channel)}\r\n" \
-                   f"{channel}\r\n:{len(self.subscriptions[connection])}\r\n"
-        return connection.sendall(response.encode())
-
-    def handle_unsubscribe(self, connection, channel):
-        if not channel:
-            return connection.sendall(b"-ERR wrong number of arguments for 'UNSUBSCRIBE' command\r\n")
-        with self.subscriptions_lock:
-            if connection in self.subscriptions and channel in self.subscriptions[connection]:
-                self.subscriptions[connection].remove(channel)
-                response = f"*3\r\n$11\r\nunsubscribe\r\n${len(channel)}\r\n{channel}\r\n:" \
-                           f"{len(self.subscriptions[connection])}\r\n"
-                connection.sendall(response.encode())
-            if not self.subscriptions[connection]:
-                del self.subscriptions[connection]
-            return None
-
-    def _handle_subscription_command(self, connection, command, cmd):
-        if cmd == "SUBSCRIBE":
-            self.handle_subscribe(connection, command[1:])
-        elif cmd == "UNSUBSCRIBE" and len(command) == 2:
-            self.handle_unsubscribe(connection, command[1])
-        elif cmd == "PING":
-            self.handle_ping(connection, command[1:])
-        elif cmd in ("PSUBSCRIBE", "PUNSUBSCRIBE"):
-            raise NotImplementedError
-        elif cmd == "QUIT":
-            return
-        else:
-            response = f"-ERR Can't execute '{cmd.lower()}' in subscribed mode\r\n"
-            connection.sendall(response.encode())
-
-    def enter_subscription_mode(self, connection):
-        while True:
-            try:
-                data = connection.recv(1024)
-                if not data:
-                    break  # Connection closed
-                # Ignore any commands while in subscription mode
-                commands_with_bytes, _ = self.command_parser.parse_commands(data)
-
-                # If no full commands could be parsed, we need more data
-                if not commands_with_bytes:
-                    continue
-                for command, _ in commands_with_bytes:
-                    cmd = command[0].upper() if command else None
-                    self._handle_subscription_command(connection, command, cmd)
-            except (OSError, ValueError, IndexError) as e:
-                print(f"Error in subscription mode: {e}")
-                break
-        with self.subscriptions_lock:
-            if connection in self.subscriptions:
-                del self.subscriptions[connection]
-        with self.replicas_lock:
-            if connection in self.replicas:
-                self.replicas.remove(connection)
-        with self.replica_offsets_lock:
-            if connection in self.replica_offsets:
-                del self.replica_offsets[connection]
-        connection.close()
-
-    def handle_publish(self, connection, command):
-        if len(command) != 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'PUBLISH' command\r\n")
-        channel, message = command[0], command[1]
-        subscriber_count = 0
-        with self.subscriptions_lock:
-            for conn, channels in self.subscriptions.items():
-                if channel in channels:
-                    response = f"*3\r\n$7\r\nmessage\r\n${len(channel)}\r\n{channel}\r\n" \
-                               f"${len(message)}\r\n{message}\r\n"
-                    try:
-                        conn.sendall(response.encode())
-                        subscriber_count += 1
-                    except OSError:
-                        pass  # Ignore failures to send
-        return connection.sendall(f":{subscriber_count}\r\n".encode())
-
-    def handle_zadd(self, connection, command):
-        if len(command) < 3:
-            return connection.sendall(b"-ERR wrong number of arguments for 'ZADD' command\r\n")
-        key, args = command[0], command[1:]
-        try:
-            added_count = self.sorted_set_store.zadd(key, args)
-            return connection.sendall(f":{added_count}\r\n".encode())
-        except ValueError as e:
-            return connection.sendall(f"-ERR {str(e)}\r\n".encode())
-
-    def handle_zrank(self, connection, command):
-        if len(command) != 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'ZRANK' command\r\n")
-        key, member = command[0], command[1]
-        rank = self.sorted_set_store.zrank(key, member)
-        if rank is not None:
-            return connection.sendall(f":{rank}\r\n".encode())
-        return connection.sendall(b"$-1\r\n")
-
-    def handle_zrange(self, connection, command):
-        if len(command) != 3:
-            return connection.sendall(b"-ERR wrong number of arguments for 'ZRANGE' command\r\n")
-        key, start, end = command[0], command[1], command[2]
-
-        try:
-            start = int(start)
-            end = int(end)
-        except ValueError:
-            return connection.sendall(b"-ERR value is not an integer or out of range\r\n")
-
-        members = self.sorted_set_store.zrange(key, start, end)
-        response = f"*{len(members)}\r\n"
-        for member in members:
-            response += f"${len(member)}\r\n{member}\r\n"
-        return connection.sendall(response.encode())
-
-    def handle_zcard(self, connection, command):
-        if len(command) != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'ZCARD' command\r\n")
-        key = command[0]
-        cardinality = self.sorted_set_store.zcard(key)
-        return connection.sendall(f":{cardinality}\r\n".encode())
-
-    def handle_zscore(self, connection, command):
-        if len(command) != 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'ZSCORE' command\r\n")
-        key, member = command[0], command[1]
-        score = self.sorted_set_store.zscore(key, member)
-        if score is not None:
-            return connection.sendall(f"${len(str(score))}\r\n{score}\r\n".encode())
-        return connection.sendall(b"$-1\r\n")
-
-    def handle_zrem(self, connection, command):
-        if len(command) != 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'ZREM' command\r\n")
-        key, member = command[0], command[1]
-        removed_count = self.sorted_set_store.zrem(key, member)
-        return connection.sendall(f":{removed_count}\r\n".encode())
-
-    def handle_geoadd(self, connection, command):
-        if len(command) < 4 or len(command) % 3 != 1:
-            return connection.sendall(b"-ERR wrong number of arguments for 'GEOADD' command\r\n")
-
-        key = command[0]
-        locations = command[1:]
-        added_count = 0
-        for i in range(0, len(locations), 3):
-            try:
-                longitude = float(locations[i])
-                latitude = float(locations[i + 1])
-                location = locations[i + 2]
-                if not -180 <= longitude <= 180 or not -85.05112878 <= latitude <= 85.05112878:
-                    raise ValueError
-            except (ValueError, IndexError):
-                return connection.sendall(
-                    f"-ERR invalid longitude, latitude pair for '{locations[i + 2]}'\r\n".encode())
-
-            score = encode_geohash(longitude, latitude)
-            added_count += self.sorted_set_store.zadd(key, [str(score), location])
-
-        return connection.sendall(f":{added_count}\r\n".encode())
-
-    def handle_geopos(self, connection, command):
-        if len(command) < 2:
-            return connection.sendall(b"-ERR wrong number of arguments for 'GEOPOS' command\r\n")
-        key, locations = command[0], command[1:]
-        response = f"*{len(locations)}\r\n"
-        for loc in locations:
-            score = self.sorted_set_store.zscore(key, loc)
-            if score is None:
-                response += "*-1\r\n"
-            else:
-                longitude, latitude = decode_geohash(int(score))
-                response += f"*2\r\n${len(str(longitude))}\r\n{longitude}\r\n${len(str(latitude))}\r\n{latitude}\r\n"
-
-        return connection.sendall(response.encode())
-
-    def handle_geodist(self, connection, command):
-        if len(command) != 3:
-            return connection.sendall(b"-ERR wrong number of arguments for 'GEODIST' command\r\n")
-        key, loc1, loc2 = command[0], command[1], command[2]
-        score1 = self.sorted_set_store.zscore(key, loc1)
-        score2 = self.sorted_set_store.zscore(key, loc2)
-
-        if score1 is None or score2 is None:
-            return connection.sendall(b"$-1\r\n")
-
-        lon1, lat1 = decode_geohash(int(score1))
-        lon2, lat2 = decode_geohash(int(score2))
-
-        distance = haversine(lon1, lat1, lon2, lat2)
-
-        return connection.sendall(f"${len(str(distance))}\r\n{distance}\r\n".encode())
-
-    def handle_geosearch(self, connection, command):
-        if len(command) < 7 or command[1].upper() != 'FROMLONLAT' or command[4].upper() != 'BYRADIUS':
-            return connection.sendall(b"-ERR syntax error\r\n")
-
-        key = command[0]
-        try:
-            longitude = float(command[2])
-            latitude = float(command[3])
-            radius = float(command[5])
-            unit = command[6].upper()
-        except ValueError:
-            return connection.sendall(b"-ERR invalid number formats\r\n")
-
-        try:
-            results = self.sorted_set_store.geosearch(key, longitude, latitude, radius, unit)
-            response = f"*{len(results)}\r\n"
-            for location in results:
-                response += f"${len(location)}\r\n{location}\r\n"
-            return connection.sendall(response.encode())
-        except ValueError as e:
-            return connection.sendall(f"-ERR {e}\r\n".encode())
+            period = 1.0 / self.config["hz"]
+            effort = self.config["active-expire-effort"] - 1
+            if self.loading is None:
+                self.string_store.active_expire_cycle(
+                    ACTIVE_EXPIRE_KEYS_PER_LOOP + ACTIVE_EXPIRE_KEYS_PER_LOOP // 4 * effort,
+                    ACTIVE_EXPIRE_ACCEPTABLE_STALE - effort,
+                    period * (ACTIVE_EXPIRE_CYCLE_PERC + 2 * effort) / 100)
+            time.sleep(period)
+
+    def _propagate_eviction(self, key):
+        if not self.replica_of:
+            self.propagate_to_replicas(["DEL", key])
+        self.tracking.invalidate([key])
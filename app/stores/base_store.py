@@ -0,0 +1,179 @@
+import itertools
+
+from app.utils.eviction import lfu_touch, lru_clock
+from app.utils.lazyfree import LAZYFREE_THRESHOLD
+from app.utils.locks import DEFAULT_STRIPES, StripedLock
+from app.utils.memory import key_overhead
+from app.utils.scan_dict import ScanDict
+from app.utils.slots import SlotDict
+
+
+class BaseStore:
+    """
+    Shared keyspace handling for the typed stores. The data dict is guarded
+    by striped locks keyed by hash, so commands on unrelated keys proceed in
+    parallel (reads of one stripe too with `shared_reads`); methods take
+    `locks.read(key)` or
+    `locks.write(key)`, and the *_many/*_all variants for several keys.
+    Every store keeps an approximate byte count per key in `sizes` and a
+    running total per stripe in `memory`, adjusted by deltas under that
+    stripe's write lock, so memory reporting never has to walk the dataset.
+    `access` holds one packed int per key: an LRU clock, or an LFU counter
+    when `lfu` is set. Deleted values are handed to `lazyfree`, when the
+    server has set one, if the caller asks for lazy freeing.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES, shared_reads=False):
+        self.data = ScanDict()
+        self.locks = StripedLock(stripes, shared_reads)
+        self.sizes = {}
+        self.memory = [0] * stripes
+        self.access = {}
+        self.lfu = False
+        self.lazyfree = None
+
+    @property
+    def used_memory(self):
+        return sum(self.memory)
+
+    def _touch(self, key):
+        if self.lfu:
+            self.access[key] = lfu_touch(self.access.get(key))
+        else:
+            self.access[key] = lru_clock()
+
+    def touch(self, keys):
+        with self.locks.read_many(keys):
+            found = {key for key in keys if key in self.data}
+            for key in found:
+                self._touch(key)
+            return found
+
+    def access_value(self, key):
+        with self.locks.read(key):
+            return self.access.get(key) if key in self.data else None
+
+    def sample(self, count):
+        return [(key, self.access.get(key, 0)) for key in self.data.sample(count)]
+
+    def exists(self, key):
+        with self.locks.read(key):
+            return key in self.data
+
+    def existing(self, keys):
+        with self.locks.read_many(keys):
+            return {key for key in keys if key in self.data}
+
+    def delete_many(self, keys, lazy=False):
+        deleted = set()
+        with self.locks.write_many(keys):
+            for key in keys:
+                if key in self.data:
+                    self._free(self._remove(key), lazy)
+                    deleted.add(key)
+        return deleted
+
+    def flush(self, lazy=False):
+        """FLUSHALL: empty the store; lazy frees the old contents in the background, otherwise here and now."""
+        with self.locks.write_all():
+            data, *rest = self._clear()
+        if lazy and self.lazyfree is not None:
+            self.lazyfree.free_values(data)
+            self.lazyfree.free(tuple(rest))
+
+    def _clear(self):
+        """Swap in an empty keyspace; returns the old data dict followed by the per-key tables that went with it."""
+        old = (self.data, self.sizes, self.access)
+        self.data = type(self.data)()
+        self.sizes = {}
+        self.access = {}
+        self.memory = [0] * len(self.memory)
+        return old
+
+    def _free_effort(self, held):
+        """Roughly how many objects freeing a removed value takes, as Redis counts allocations."""
+        return self._footprint(held)[2]
+
+    def _free(self, held, lazy):
+        """Hand what a removed key held to the lazyfree thread if asked to and it is big enough to be worth it."""
+        if lazy and self.lazyfree is not None and self._free_effort(held) > LAZYFREE_THRESHOLD:
+            self.lazyfree.free(held)
+
+    def _key_memory(self, key):
+        return self.sizes.get(key, 0)
+
+    def _account(self, key, delta):
+        self.memory[hash(key) & self.locks.mask] += delta
+
+    def _grow(self, key, delta):
+        self.sizes[key] = self.sizes.get(key, 0) + delta
+        self._account(key, delta)
+
+    def _remove(self, key):
+        """Take key out of the keyspace; returns its value for the caller to free."""
+        self._account(key, -self._key_memory(key))
+        self.sizes.pop(key, None)
+        self.access.pop(key, None)
+        value = self.data[key]
+        del self.data[key]
+        return value
+
+    def _footprint(self, value):
+        """Return (base_bytes, element_sizes_iterable, element_count) for a stored value."""
+        raise NotImplementedError
+
+    def memory_usage(self, key, samples=None):
+        """
+        Approximate bytes used by key. Without samples the incrementally
+        tracked figure is returned; with samples the value is re-measured from
+        that many elements and extrapolated (0 walks every element).
+        """
+        with self.locks.read(key):
+            if key not in self.data:
+                return None
+            if samples is None:
+                return self._key_memory(key)
+            base, element_sizes, count = self._footprint(self.data[key])
+            if samples == 0 or count <= samples:
+                elements = sum(element_sizes)
+            else:
+                sampled = list(itertools.islice(element_sizes, samples))
+                elements = sum(sampled) * count // len(sampled)
+            return key_overhead(key) + base + elements
+
+    def enable_slot_index(self):
+        with self.locks.write_all():
+            self.data = SlotDict(self.data)
+
+    def keys_in_slot(self, slot, count):
+        return self.data.keys_in_slot(slot, count)
+
+    def count_in_slot(self, slot):
+        return self.data.count_in_slot(slot)
+
+    def _rebuild_commands(self, key):
+        """Commands that recreate key on another node, used by MIGRATE."""
+        raise NotImplementedError
+
+    def migrate(self, keys, transfer, copy=False):
+        """
+        Hand keys held by this store to another node. transfer() receives
+        {key: rebuild_commands} and raises if the target refuses them; the keys
+        are only dropped afterwards, and the lock is held throughout so no
+        write can land between the copy and the delete.
+        """
+        with self.locks.write_many(keys):
+            present = [key for key in keys if key in self.data]
+            if present:
+                transfer({key: self._rebuild_commands(key) for key in present})
+                if not copy:
+                    for key in present:
+                        self._remove(key)
+            return present
+
+    def memory_stats(self):
+        return len(self.data), self.used_memory
+
+    def lock_stats(self):
+        """(acquired, contended) per lock stripe."""
+        return self.locks.stats()
@@ -0,0 +1,239 @@
+from app.stores.base_store import BaseStore
+from app.stores.string_store import INT64_MAX, INT64_MIN, parse_int
+from app.utils.listpack import Listpack
+from app.utils.locks import DEFAULT_STRIPES
+from app.utils.memory import DICT_ENTRY, EMPTY_DICT, EMPTY_LIST, key_overhead, sizeof
+from app.utils.scan_dict import ScanDict, scan
+
+HASH_MAX_LISTPACK_ENTRIES = 128
+HASH_MAX_LISTPACK_VALUE = 64
+HASHTABLE_BASE = EMPTY_DICT + EMPTY_LIST
+FIELD_OVERHEAD = DICT_ENTRY + 8  # dict entry plus its ScanDict bucket slot
+
+
+def field_size(field, value):
+    return FIELD_OVERHEAD + sizeof(field) + sizeof(value)
+
+
+class HashStore(BaseStore):
+    """
+    Hashes start out as a Listpack of alternating fields and values and
+    become a ScanDict once they pass hash-max-listpack-entries fields or get
+    a field or value longer than hash-max-listpack-value bytes, like Redis'
+    listpack -> hashtable conversion. The conversion is one way.
+
+    A listpack knows its own size, so like a string key it keeps no entry in
+    `sizes`: its memory is worked out from `nbytes` when it is needed. Only
+    hashtable-encoded hashes carry a running byte count there.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES, shared_reads=False):
+        super().__init__(stripes, shared_reads)
+        self.max_listpack_entries = HASH_MAX_LISTPACK_ENTRIES
+        self.max_listpack_value = HASH_MAX_LISTPACK_VALUE
+
+    def _fits_listpack(self, pairs, fields):
+        limit = self.max_listpack_value
+        return fields <= self.max_listpack_entries and all(
+            len(field) <= limit and len(value) <= limit for field, value in pairs)
+
+    def _new_hash(self, pairs):
+        if self._fits_listpack(pairs, len(pairs)):
+            return Listpack(item for pair in pairs for item in pair)
+        return ScanDict(pairs)
+
+    def _hash_size(self, value):
+        if isinstance(value, Listpack):
+            return value.nbytes
+        return HASHTABLE_BASE + sum(field_size(field, item) for field, item in value.items())
+
+    def _key_memory(self, key):
+        value = self.data[key]
+        if isinstance(value, Listpack):
+            return key_overhead(key) + value.nbytes
+        return self.sizes.get(key, 0)
+
+    def _grow(self, key, delta):
+        if isinstance(self.data.get(key), Listpack):
+            self._account(key, delta)
+        else:
+            super()._grow(key, delta)
+
+    def _convert(self, key, listpack):
+        table = ScanDict(zip(*[iter(listpack)] * 2))
+        self.data[key] = table
+        self.sizes[key] = key_overhead(key) + listpack.nbytes  # What was accounted while it was a listpack
+        self._grow(key, self._hash_size(table) - listpack.nbytes)
+        return table
+
+    def _set_fields(self, key, pairs):
+        """HSET under the key's write lock; returns how many fields are new."""
+        value = self.data.get(key)
+        self._touch(key)
+        if value is None:
+            pairs = list(dict(pairs).items())
+            value = self.data[key] = self._new_hash(pairs)
+            self._grow(key, key_overhead(key) + self._hash_size(value))
+            return len(pairs)
+        if isinstance(value, Listpack) and not self._fits_listpack(pairs, len(value) // 2):
+            value = self._convert(key, value)
+        if isinstance(value, Listpack):
+            before = value.nbytes
+            new = []
+            for field, item in dict(pairs).items():
+                pos = value.find(field, skip=1)
+                if pos < 0:
+                    new += (field, item)
+                else:
+                    value.replace(value.next(pos), item)
+            value.extend(new)
+            added = len(new) // 2
+            self._grow(key, value.nbytes - before)
+            if len(value) // 2 > self.max_listpack_entries:
+                self._convert(key, value)
+            return added
+        added = delta = 0
+        for field, item in pairs:
+            old = value.get(field)
+            if old is None:
+                added += 1
+                delta += field_size(field, item)
+            else:
+                delta += sizeof(item) - sizeof(old)
+            value[field] = item
+        self._grow(key, delta)
+        return added
+
+    @staticmethod
+    def _get_field(value, field):
+        if isinstance(value, Listpack):
+            pos = value.find(field, skip=1)
+            return None if pos < 0 else value.get(value.next(pos))
+        return value.get(field)
+
+    def hset(self, key, pairs):
+        with self.locks.write(key):
+            return self._set_fields(key, pairs)
+
+    def hget(self, key, field):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return None
+            self._touch(key)
+            return self._get_field(value, field)
+
+    def hmget(self, key, fields):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return [None] * len(fields)
+            self._touch(key)
+            return [self._get_field(value, field) for field in fields]
+
+    def hdel(self, key, fields):
+        with self.locks.write(key):
+            value = self.data.get(key)
+            if value is None:
+                return 0
+            deleted = 0
+            if isinstance(value, Listpack):
+                before = value.nbytes
+                for field in fields:
+                    pos = value.find(field, skip=1)
+                    if pos >= 0:
+                        value.delete(pos, 2)
+                        deleted += 1
+                delta = value.nbytes - before
+            else:
+                delta = 0
+                for field in fields:
+                    item = value.pop(field, None)
+                    if item is not None:
+                        deleted += 1
+                        delta -= field_size(field, item)
+            self._grow(key, delta)
+            if not value:
+                self._remove(key)
+            return deleted
+
+    def hgetall(self, key):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return []
+            self._touch(key)
+            if isinstance(value, Listpack):
+                return list(value)
+            return [item for pair in value.items() for item in pair]
+
+    def hincrby(self, key, field, increment):
+        with self.locks.write(key):
+            value = self.data.get(key)
+            current = 0
+            if value is not None:
+                old = self._get_field(value, field)
+                if old is not None:
+                    current = parse_int(old)
+                    if current is None:
+                        raise ValueError("hash value is not an integer")
+            result = current + increment
+            if not INT64_MIN <= result <= INT64_MAX:
+                raise ValueError("increment or decrement would overflow")
+            self._set_fields(key, [(field, b"%d" % result)])
+            return result
+
+    def hlen(self, key):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return 0
+            return len(value) // 2 if isinstance(value, Listpack) else len(value)
+
+    def hexists(self, key, field):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            return value is not None and self._get_field(value, field) is not None
+
+    def hscan(self, key, cursor, count):
+        """A listpack-encoded hash is returned whole with cursor 0, as Redis does for small encodings."""
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return 0, []
+            if isinstance(value, Listpack):
+                return 0, list(zip(*[iter(value)] * 2))
+            cursor, fields = scan([value], cursor, count)
+            return cursor, [(field, value[field]) for field in fields]
+
+    def encoding(self, key):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return None
+            return "listpack" if isinstance(value, Listpack) else "hashtable"
+
+    def _footprint(self, value):
+        if isinstance(value, Listpack):
+            return value.nbytes, (), 0
+        return HASHTABLE_BASE, (field_size(field, item) for field, item in value.items()), len(value)
+
+    def _rebuild_commands(self, key):
+        value = self.data[key]
+        items = list(value) if isinstance(value, Listpack) else [item for pair in value.items() for item in pair]
+        return [["HSET", key, *items]]
+
+    def load_from_rdb(self, hashes, replace=True):
+        """Add hashes decoded from an RDB file, each in the encoding its size calls for."""
+        with self.locks.write_all():
+            if replace:
+                self.data.clear()
+                self.sizes = {}
+                self.memory = [0] * len(self.memory)
+                self.access = {}
+            for key, fields in hashes.items():
+                if key in self.data:
+                    self._remove(key)
+                value = self.data[key] = self._new_hash(list(fields.items()))
+                self._grow(key, key_overhead(key) + self._hash_size(value))
+                self._touch(key)
@@ -1,44 +1,67 @@
-import threading
+from app.stores.base_store import BaseStore
+from app.utils.memory import EMPTY_LIST, LIST_SLOT, key_overhead, sizeof
 
 
-class ListStore:
-    def __init__(self):
-        self.data = {}
-        self.lock = threading.Lock()
+LISTPACK_MAX_ENTRIES = 128
+
+
+def element_size(value):
+    return LIST_SLOT + sizeof(value)
+
+
+class ListStore(BaseStore):
+    def _get_or_create(self, key):
+        if key not in self.data:
+            self.data[key] = []
+            self._grow(key, key_overhead(key) + EMPTY_LIST)
+        self._touch(key)
+        return self.data[key]
+
+    def _footprint(self, value):
+        return EMPTY_LIST, (element_size(item) for item in value), len(value)
+
+    def _rebuild_commands(self, key):
+        return [["RPUSH", key, *self.data[key]]]
 
     def lpush(self, key, values):
-        with self.lock:
-            if key not in self.data:
-                self.data[key] = []
+        with self.locks.write(key):
+            lst = self._get_or_create(key)
             for value in values:
-                self.data[key].insert(0, value)
-            return len(self.data[key])
+                lst.insert(0, value)
+            self._grow(key, sum(element_size(value) for value in values))
+            return len(lst)
 
     def rpush(self, key, values):
-        with self.lock:
-            if key not in self.data:
-                self.data[key] = []
-            for value in values:
-                self.data[key].append(value)
-            return len(self.data[key])
+        with self.locks.write(key):
+            lst = self._get_or_create(key)
+            lst.extend(values)
+            self._grow(key, sum(element_size(value) for value in values))
+            return len(lst)
 
     def lpop(self, key, count=1):
-        with self.lock:
+        with self.locks.write(key):
             if key not in self.data or not self.data[key]:
                 return None
 
-            popped_items = []
-            for _ in range(min(count, len(self.data[key]))):
-                popped_items.append(self.data[key].pop(0))
+            lst = self.data[key]
+            self._touch(key)
+            count = max(count, 0)
+            popped_items = lst[:count]
+            del lst[:count]
+            if lst:
+                self._grow(key, -sum(element_size(item) for item in popped_items))
+            else:
+                self._remove(key)
 
             return popped_items
 
     def lrange(self, key, start, end):
-        with self.lock:
+        with self.locks.read(key):
             if key not in self.data:
                 return []
 
             lst = self.data[key]
+            self._touch(key)
             if start < 0:
                 start = len(lst) + start
             if end < 0:
@@ -50,9 +73,11 @@ class ListStore:
             return lst[start:end + 1]
 
     def llen(self, key):
-        with self.lock:
+        with self.locks.read(key):
             return len(self.data.get(key, []))
 
-    def exists(self, key):
-        with self.lock:
-            return key in self.data
+    def encoding(self, key):
+        with self.locks.read(key):
+            if key not in self.data:
+                return None
+            return "listpack" if len(self.data[key]) <= LISTPACK_MAX_ENTRIES else "quicklist"
@@ -0,0 +1,352 @@
+import random
+
+from app.stores.base_store import BaseStore
+from app.stores.string_store import parse_int
+from app.utils.intset import IntSet
+from app.utils.listpack import Listpack
+from app.utils.locks import DEFAULT_STRIPES
+from app.utils.memory import DICT_ENTRY, EMPTY_DICT, EMPTY_LIST, key_overhead, sizeof
+from app.utils.scan_dict import ScanDict, scan
+
+SET_MAX_INTSET_ENTRIES = 512
+SET_MAX_LISTPACK_ENTRIES = 128
+SET_MAX_LISTPACK_VALUE = 64
+HASHTABLE_BASE = EMPTY_DICT + EMPTY_LIST
+MEMBER_OVERHEAD = DICT_ENTRY + 8  # dict entry plus its ScanDict bucket slot
+
+
+def member_size(member):
+    return MEMBER_OVERHEAD + sizeof(member)
+
+
+def _members(value):
+    """Members of a set in any encoding, as bytes."""
+    if isinstance(value, IntSet):
+        return (b"%d" % n for n in value)
+    return iter(value)
+
+
+def _contains(value, member):
+    if isinstance(value, IntSet):
+        n = parse_int(member)
+        return n is not None and n in value
+    if isinstance(value, Listpack):
+        return value.find(member) >= 0
+    return member in value
+
+
+def _lookup(value):
+    """Something answering `member in` at C speed: the table itself, or a set built from a small encoding."""
+    if isinstance(value, ScanDict):
+        return value
+    return set(_members(value))
+
+
+class SetStore(BaseStore):
+    """
+    Sets of integers start out as an IntSet, and other small sets as a
+    Listpack of members; both become a ScanDict (members mapped to None)
+    past the set-max-intset-entries / set-max-listpack-* thresholds, like
+    Redis' intset -> listpack -> hashtable conversions. Conversions are one way.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES, shared_reads=False):
+        super().__init__(stripes, shared_reads)
+        self.max_intset_entries = SET_MAX_INTSET_ENTRIES
+        self.max_listpack_entries = SET_MAX_LISTPACK_ENTRIES
+        self.max_listpack_value = SET_MAX_LISTPACK_VALUE
+
+    def _fits_listpack(self, members, size):
+        limit = self.max_listpack_value
+        return size <= self.max_listpack_entries and all(len(member) <= limit for member in members)
+
+    def _new_set(self, members):
+        """A set in the most compact encoding that fits `members`, which must be distinct."""
+        integers = [parse_int(member) for member in members]
+        if len(members) <= self.max_intset_entries and None not in integers:
+            return IntSet(integers)
+        if self._fits_listpack(members, len(members)):
+            return Listpack(members)
+        return ScanDict(dict.fromkeys(members))
+
+    @staticmethod
+    def _set_size(value):
+        if isinstance(value, (IntSet, Listpack)):
+            return value.nbytes
+        return HASHTABLE_BASE + sum(member_size(member) for member in value)
+
+    def _replace(self, key, value):
+        """Store `value` under key in place of the current one, with its memory re-accounted."""
+        old = self.data.get(key)
+        if old is None:
+            self._grow(key, key_overhead(key))
+        else:
+            self._grow(key, -self._set_size(old))
+        self.data[key] = value
+        self._grow(key, self._set_size(value))
+        return value
+
+    def _add_members(self, key, members):
+        """SADD under the key's write lock; returns how many members are new."""
+        members = list(dict.fromkeys(members))
+        value = self.data.get(key)
+        self._touch(key)
+        if value is None:
+            self._replace(key, self._new_set(members))
+            return len(members)
+        if isinstance(value, IntSet):
+            integers = [parse_int(member) for member in members]
+            new = [member for member, n in zip(members, integers) if n is None or n not in value]
+            if None in integers or len(value) + len(new) > self.max_intset_entries:
+                current = list(_members(value))
+                if self._fits_listpack(current + new, len(current) + len(new)):
+                    self._replace(key, Listpack(current + new))
+                else:
+                    self._replace(key, ScanDict(dict.fromkeys(current + new)))
+                return len(new)
+            before = value.nbytes
+            for n in integers:
+                value.add(n)
+            self._grow(key, value.nbytes - before)
+            return len(new)
+        if isinstance(value, Listpack):
+            new = [member for member in members if value.find(member) < 0]
+            if not self._fits_listpack(new, len(value) + len(new)):
+                self._replace(key, ScanDict(dict.fromkeys([*value, *new])))
+                return len(new)
+            before = value.nbytes
+            value.extend(new)
+            self._grow(key, value.nbytes - before)
+            return len(new)
+        added = delta = 0
+        for member in members:
+            if member not in value:
+                value[member] = None
+                added += 1
+                delta += member_size(member)
+        self._grow(key, delta)
+        return added
+
+    def _remove_members(self, key, value, members):
+        """Remove members from the set under key, dropping the key once it's empty; returns how many went."""
+        if isinstance(value, (IntSet, Listpack)):
+            before = value.nbytes
+            removed = 0
+            for member in members:
+                if isinstance(value, IntSet):
+                    n = parse_int(member)
+                    if n is not None and value.remove(n):
+                        removed += 1
+                    continue
+                pos = value.find(member)
+                if pos >= 0:
+                    value.delete(pos)
+                    removed += 1
+            delta = value.nbytes - before
+        else:
+            removed = delta = 0
+            for member in members:
+                if member in value:
+                    del value[member]
+                    removed += 1
+                    delta -= member_size(member)
+        if not value:
+            self._remove(key)
+        else:
+            self._grow(key, delta)
+        return removed
+
+    @staticmethod
+    def _random_members(value, count, distinct=True):
+        """`count` members picked at random; with distinct, at most one of each and at most len(value)."""
+        if isinstance(value, ScanDict):
+            if not distinct:
+                return [(value.sample(1) or [next(iter(value))])[0] for _ in range(count)]
+            picked = dict.fromkeys(value.sample(count))
+            # sample() reads a run of buckets, which can come up short on a sparse table
+            for member in value:
+                if len(picked) >= count:
+                    break
+                picked.setdefault(member)
+            return list(picked)
+        members = list(_members(value))
+        if not distinct:
+            return [random.choice(members) for _ in range(count)]
+        return random.sample(members, min(count, len(members)))
+
+    def sadd(self, key, members):
+        with self.locks.write(key):
+            return self._add_members(key, members)
+
+    def srem(self, key, members):
+        with self.locks.write(key):
+            value = self.data.get(key)
+            if value is None:
+                return 0
+            return self._remove_members(key, value, members)
+
+    def sismember(self, key, member):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return False
+            self._touch(key)
+            return _contains(value, member)
+
+    def smismember(self, key, members):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return [False] * len(members)
+            self._touch(key)
+            return [_contains(value, member) for member in members]
+
+    def smembers(self, key):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return []
+            self._touch(key)
+            return list(_members(value))
+
+    def scard(self, key):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            return 0 if value is None else len(value)
+
+    def spop(self, key, count=1):
+        """Remove and return up to `count` random members."""
+        with self.locks.write(key):
+            value = self.data.get(key)
+            if value is None:
+                return []
+            popped = list(_members(value)) if count >= len(value) else self._random_members(value, count)
+            self._remove_members(key, value, popped)
+            return popped
+
+    def srandmember(self, key, count):
+        """Up to `count` distinct random members, or exactly -count with repeats allowed when count is negative."""
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None or count == 0:
+                return []
+            self._touch(key)
+            if count < 0:
+                return self._random_members(value, -count, distinct=False)
+            return self._random_members(value, count)
+
+    def _intersect(self, keys, limit=0):
+        """
+        Members common to every set. Candidates start as the smallest set and
+        are filtered by the others in ascending size, so the work is bounded
+        by the smallest set and usually shrinks with every set visited; the
+        result is truncated to `limit` members if one is given.
+        """
+        values = [self.data.get(key) for key in keys]
+        if any(value is None for value in values):
+            return []
+        values.sort(key=len)
+        smallest, others = values[0], values[1:]
+        if isinstance(smallest, IntSet) and all(isinstance(value, IntSet) for value in others):
+            # All integers: filter the smallest array with the others' bisect lookups, without formatting
+            # members; it is sorted, so the result comes out in order
+            integers = list(smallest)
+            for value in others:
+                if not integers:
+                    break
+                integers = [n for n in integers if n in value]
+            return [b"%d" % n for n in (integers[:limit] if limit else integers)]
+        candidates = list(_members(smallest))
+        for value in others:
+            if not candidates:
+                break
+            lookup = _lookup(value)
+            candidates = [member for member in candidates if member in lookup]
+        return candidates[:limit] if limit else candidates
+
+    def _union(self, keys):
+        members = {}
+        for key in keys:
+            value = self.data.get(key)
+            if value is not None:
+                members.update(dict.fromkeys(_members(value)))
+        return list(members)
+
+    def _difference(self, keys):
+        first = self.data.get(keys[0])
+        if first is None:
+            return []
+        members = list(_members(first))
+        for value in map(self.data.get, keys[1:]):
+            if value is not None and members:
+                lookup = _lookup(value)
+                members = [member for member in members if member not in lookup]
+        return members
+
+    def _combine(self, op, keys):
+        if op == "inter":
+            return self._intersect(keys)
+        if op == "union":
+            return self._union(keys)
+        return self._difference(keys)
+
+    def combine(self, op, keys):
+        """SINTER, SUNION or SDIFF (op is "inter", "union" or "diff") of the sets at keys."""
+        with self.locks.read_many(keys):
+            return self._combine(op, keys)
+
+    def combine_store(self, op, destination, keys):
+        """The *STORE variants: the result replaces destination, which is deleted if it's empty."""
+        with self.locks.write_many([destination, *keys]):
+            members = self._combine(op, keys)
+            if destination in self.data:
+                self._remove(destination)
+            if members:
+                self._replace(destination, self._new_set(members))
+                self._touch(destination)
+            return len(members)
+
+    def sintercard(self, keys, limit=0):
+        with self.locks.read_many(keys):
+            return len(self._intersect(keys, limit))
+
+    def sscan(self, key, cursor, count):
+        """An intset or listpack-encoded set is returned whole with cursor 0, as Redis does for small encodings."""
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return 0, []
+            if not isinstance(value, ScanDict):
+                return 0, list(_members(value))
+            return scan([value], cursor, count)
+
+    def encoding(self, key):
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return None
+            if isinstance(value, IntSet):
+                return "intset"
+            return "listpack" if isinstance(value, Listpack) else "hashtable"
+
+    def _footprint(self, value):
+        if isinstance(value, (IntSet, Listpack)):
+            return value.nbytes, (), 0
+        return HASHTABLE_BASE, (member_size(member) for member in value), len(value)
+
+    def _rebuild_commands(self, key):
+        return [["SADD", key, *_members(self.data[key])]]
+
+    def load_from_rdb(self, sets, replace=True):
+        """Add sets decoded from an RDB file, each in the encoding its members call for."""
+        with self.locks.write_all():
+            if replace:
+                self.data.clear()
+                self.sizes = {}
+                self.memory = [0] * len(self.memory)
+                self.access = {}
+            for key, members in sets.items():
+                if key in self.data:
+                    self._remove(key)
+                self._replace(key, self._new_set(list(members)))
+                self._touch(key)
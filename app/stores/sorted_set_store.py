@@ -1,12 +1,23 @@
 import bisect
-import threading
+from app.stores.base_store import BaseStore
+from app.utils.memory import DICT_ENTRY, EMPTY_DICT, EMPTY_LIST, FLOAT_SIZE, LIST_SLOT, TUPLE_PAIR, key_overhead, sizeof
 from app.utils.geohash import haversine, decode as decode_geohash
+from app.utils.scan_dict import ScanDict, scan
+
+LISTPACK_MAX_ENTRIES = 128
+SORTED_SET_BASE = sizeof(object()) + EMPTY_LIST + EMPTY_DICT
+# (score, member) tuple in the ordered list plus the member -> score dict entry
+MEMBER_OVERHEAD = TUPLE_PAIR + LIST_SLOT + DICT_ENTRY + 8 + FLOAT_SIZE
+
+
+def member_size(member):
+    return MEMBER_OVERHEAD + sizeof(member)
 
 
 class _SortedSet:
     def __init__(self):
         self.members = []
-        self.scores = {}
+        self.scores = ScanDict()
 
     def add(self, score, member):
         if member in self.scores:
@@ -39,70 +50,75 @@ class _SortedSet:
         return None
 
 
-class SortedSetStore:
-    def __init__(self):
-        self.data = {}
-        self.lock = threading.Lock()
-
+class SortedSetStore(BaseStore):
     def zadd(self, key, args):
         if len(args) % 2 != 0:
             raise ValueError("wrong number of arguments for 'ZADD' command")
 
+        try:
+            pairs = [(float(args[i]), args[i + 1]) for i in range(0, len(args), 2)]
+        except ValueError as e:
+            raise ValueError("score is not a valid float") from e
+
         added_count = 0
-        with self.lock:
+        with self.locks.write(key):
             if key not in self.data:
                 self.data[key] = _SortedSet()
+                self._grow(key, key_overhead(key) + SORTED_SET_BASE)
             zset = self.data[key]
-
-            for i in range(0, len(args), 2):
-                try:
-                    score = float(args[i])
-                    member = args[i + 1]
-                    added_count += zset.add(score, member)
-                except ValueError as e:
-                    raise ValueError("score is not a valid float") from e
+            self._touch(key)
+
+            added_bytes = 0
+            for score, member in pairs:
+                if zset.add(score, member):
+                    added_count += 1
+                    added_bytes += member_size(member)
+            self._grow(key, added_bytes)
         return added_count
 
     def zrank(self, key, member):
-        with self.lock:
+        with self.locks.read(key):
             if key not in self.data:
                 return None
             zset = self.data[key]
+            self._touch(key)
             return zset.rank(member)
 
     def zrange(self, key, start, end):
-        with self.lock:
+        with self.locks.read(key):
             if key not in self.data:
                 return []
             zset = self.data[key]
-            members = [member for score, member in zset.members]
+            self._touch(key)
+            size = len(zset.members)
 
             if start < 0:
-                start = len(members) + start
+                start = size + start
             if end < 0:
-                end = len(members) + end
+                end = size + end
 
-            start = max(0, min(start, len(members)))
-            end = max(-1, min(end, len(members) - 1))
+            start = max(0, min(start, size))
+            end = max(-1, min(end, size - 1))
 
-            return members[start:end + 1]
+            return [member for _, member in zset.members[start:end + 1]]
 
     def zcard(self, key):
-        with self.lock:
+        with self.locks.read(key):
             if key not in self.data:
                 return 0
             zset = self.data[key]
             return len(zset.members)
 
     def zscore(self, key, member):
-        with self.lock:
+        with self.locks.read(key):
             if key not in self.data:
                 return None
             zset = self.data[key]
+            self._touch(key)
             return zset.scores.get(member, None)
 
     def zrem(self, key, member):
-        with self.lock:
+        with self.locks.write(key):
             if key not in self.data:
                 return 0
             zset = self.data[key]
@@ -115,12 +131,35 @@ class SortedSetStore:
             if index < len(zset.members) and zset.members[index] == entry:
                 zset.members.pop(index)
                 del zset.scores[member]
+                if zset.members:
+                    self._grow(key, -member_size(member))
+                else:
+                    self._remove(key)
                 return 1
             return 0
 
-    def exists(self, key):
-        with self.lock:
-            return key in self.data
+    def _footprint(self, value):
+        return SORTED_SET_BASE, (member_size(member) for member in value.scores), len(value.scores)
+
+    def _rebuild_commands(self, key):
+        args = []
+        for score, member in self.data[key].members:
+            args += [repr(score), member]
+        return [["ZADD", key, *args]]
+
+    def zscan(self, key, cursor, count):
+        with self.locks.read(key):
+            if key not in self.data:
+                return 0, []
+            scores = self.data[key].scores
+            cursor, members = scan([scores], cursor, count)
+            return cursor, [(member, scores[member]) for member in members]
+
+    def encoding(self, key):
+        with self.locks.read(key):
+            if key not in self.data:
+                return None
+            return "listpack" if len(self.data[key].members) <= LISTPACK_MAX_ENTRIES else "skiplist"
 
     def geosearch(self, key, center_lon, center_lat, radius, unit):
         unit_conversions = {
@@ -135,7 +174,7 @@ class SortedSetStore:
         radius_in_meters = radius * unit_conversions[unit.lower()]
 
         matching_locations = []
-        with self.lock:
+        with self.locks.read(key):
             if key not in self.data:
                 return []
 
@@ -1,135 +1,656 @@
-import time
+import bisect
 import threading
+import time
+from app.stores.base_store import BaseStore
+from app.utils.locks import DEFAULT_STRIPES
+from app.utils.memory import DICT_ENTRY, EMPTY_DICT, EMPTY_LIST, LIST_SLOT, TUPLE_PAIR, key_overhead, sizeof
+from app.utils.stream_blocks import MAX_ID, MIN_ID, STREAM_NODE_MAX_BYTES, STREAM_NODE_MAX_ENTRIES, Stream
+
+INVALID_ID = "Invalid stream ID specified as stream command argument"
+
+
+class StreamError(ValueError):
+    """A stream command failure; `code` is the error reply's prefix (ERR, NOGROUP, BUSYGROUP)."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def id_tuple(stream_id):
+    """(ms, seq) of a stored "ms-seq" ID; tuples compare in stream order."""
+    ms, seq = stream_id.split("-")
+    return int(ms), int(seq)
+
+
+def format_id(stream_id):
+    return "%d-%d" % stream_id
+
+
+def parse_id(arg, default_seq=0):
+    """A command argument "ms-seq" or "ms" (seq taken as default_seq) as an (ms, seq) tuple."""
+    text = arg.decode(errors="replace") if isinstance(arg, bytes) else arg
+    ms, dash, seq = text.partition("-")
+    if not text.isascii() or not ms.isdigit() or (dash and not seq.isdigit()):
+        raise StreamError("ERR", INVALID_ID)
+    stream_id = (int(ms), int(seq) if dash else default_seq)
+    if max(stream_id) > MAX_ID[0]:
+        raise StreamError("ERR", INVALID_ID)
+    return stream_id
+
 
+def parse_range_id(arg, end=False):
+    """A range bound: "-" / "+", an ID, an "ms" prefix covering that whole millisecond, or "(" for exclusive."""
+    if arg in (b"-", b"+"):
+        return MIN_ID if arg == b"-" else MAX_ID
+    exclusive = arg[:1] == b"("
+    stream_id = parse_id(arg[1:] if exclusive else arg, MAX_ID[1] if end else 0)
+    if exclusive:
+        if stream_id == (MIN_ID if end else MAX_ID):
+            raise StreamError("ERR", "invalid start ID for the interval")
+        ms, seq = stream_id
+        if end:
+            stream_id = (ms, seq - 1) if seq else (ms - 1, MAX_ID[1])
+        else:
+            stream_id = (ms, seq + 1) if seq < MAX_ID[1] else (ms + 1, 0)
+    return stream_id
+
+
+def next_id(last_id, arg):
+    """The ID XADD gives a new entry for "*", "ms-*" or an explicit ID, checked against the stream's last one."""
+    text = arg.decode(errors="replace") if isinstance(arg, bytes) else arg
+    if text == "*":
+        ms = max(now_ms(), last_id[0])
+        return (ms, last_id[1] + 1) if ms == last_id[0] else (ms, 0)
+    if text.endswith("-*"):
+        ms = parse_id(text[:-2])[0]
+        new_id = (ms, last_id[1] + 1) if ms == last_id[0] else (ms, 0)
+    else:
+        new_id = parse_id(text)
+    if new_id == MIN_ID:
+        raise StreamError("ERR", "The ID specified in XADD must be greater than 0-0")
+    if new_id <= last_id or new_id[1] > MAX_ID[1]:
+        raise StreamError("ERR", "The ID specified in XADD is equal or smaller than the target stream top item")
+    return new_id
+
+
+class PendingIndex:
+    """
+    Pending entries by ID: a dict for lookups, plus a sorted list of the IDs
+    for ordered range scans. Deliveries arrive in ID order, so adding is
+    nearly always an append. Removing only drops the dict entry and leaves a
+    stale ID in the list for scans to skip, so acknowledging from the front
+    doesn't shift the list each time; it is compacted once stale IDs
+    outnumber live ones.
+    """
+
+    __slots__ = ("entries", "ids")
 
-class StreamStore:
     def __init__(self):
-        self.data = {}
-        self.lock = threading.Lock()
+        self.entries = {}
+        self.ids = []
 
-    def _parse_id(self, stream_id):
-        parts = stream_id.split("-")
-        if len(parts) != 2:
-            return None, None
-        try:
-            timestamp = int(parts[0])
-            sequence = int(parts[1]) if parts[1] != "*" else "*"
-            return timestamp, sequence
-        except ValueError:
-            return None, None
+    def __len__(self):
+        return len(self.entries)
 
-    def _compare_ids(self, id1, id2):
-        ts1, seq1 = self._parse_id(id1)
-        ts2, seq2 = self._parse_id(id2)
-        if ts1 < ts2:
-            return -1
-        if ts1 > ts2:
-            return 1
-        if seq1 < seq2:
-            return -1
-        if seq1 > seq2:
-            return 1
-        return 0
-
-    def _validate_id(self, key, stream_id):
-        new_ts, new_seq = self._parse_id(stream_id)
-        if new_ts is None or new_seq is None or new_ts < 0 or new_seq < 0:
-            return False
-        if new_ts == 0 and new_seq == 0:
-            return False
-        if key not in self.data or not self.data[key]:
-            return True
-        last_id = self.data[key][-1]["id"]
-        return self._compare_ids(stream_id, last_id) > 0
-
-    def _generate_id(self, key, stream_id):
-        ts, seq = self._parse_id(stream_id)
-        if ts is None:
-            return None
-
-        if seq == "*":
-            base_ts = ts if ts is not None else int(time.time() * 1000)
-            if key not in self.data or not self.data[key]:
-                seq_num = 1 if base_ts == 0 else 0
-                return f"{base_ts}-{seq_num}"
-
-            last_id = self.data[key][-1]["id"]
-            last_ts, last_seq = self._parse_id(last_id)
-            if base_ts > last_ts:
-                return f"{base_ts}-0"
-            # base_ts == last_ts
-            return f"{base_ts}-{last_seq + 1}"
-
-        return stream_id
-
-    def _is_invalid_id_parts(self, ts, seq):
-        if ts is None or seq is None:
-            return True
-        if ts < 0 or seq < 0:
-            return True
-        if ts == 0 and seq == 0:
-            return True
-        return False
-
-    def xadd(self, key, stream_id, fields_dict):
-        with self.lock:
-            # Validate and generate ID
-            if stream_id == "*":
-                new_id = self._generate_id(key, f"{int(time.time() * 1000)}-*")
-            elif stream_id.endswith("-*"):
-                new_id = self._generate_id(key, stream_id)
+    def __contains__(self, stream_id):
+        return stream_id in self.entries
+
+    def get(self, stream_id):
+        return self.entries.get(stream_id)
+
+    def add(self, stream_id, pending):
+        if stream_id not in self.entries:
+            ids = self.ids
+            if not ids or ids[-1] < stream_id:
+                ids.append(stream_id)
             else:
-                new_id = stream_id
+                pos = bisect.bisect_left(ids, stream_id)
+                if pos == len(ids) or ids[pos] != stream_id:  # else a stale copy is still listed
+                    ids.insert(pos, stream_id)
+        self.entries[stream_id] = pending
 
-            ts, seq = self._parse_id(new_id)
-            if self._is_invalid_id_parts(ts, seq):
-                raise ValueError("The ID specified in XADD must be greater than 0-0")
+    def remove(self, stream_id):
+        pending = self.entries.pop(stream_id, None)
+        if pending is not None and len(self.ids) > 2 * len(self.entries) + 64:
+            self.ids = [i for i in self.ids if i in self.entries]
+        return pending
 
-            if not self._validate_id(key, new_id):
-                raise ValueError("The ID specified in XADD is equal or smaller than the target stream top item")
+    def range(self, start=MIN_ID, end=MAX_ID):
+        """(id, pending) pairs from start to end inclusive, in ID order; safe against removals meanwhile."""
+        ids, entries = self.ids, self.entries
+        for i in range(bisect.bisect_left(ids, start), len(ids)):
+            stream_id = ids[i]
+            if stream_id > end:
+                return
+            pending = entries.get(stream_id)
+            if pending is not None:
+                yield stream_id, pending
 
-            if key not in self.data:
-                self.data[key] = []
+    def first(self):
+        return next(self.range(), (None, None))[0]
 
-            entry = {"id": new_id, "fields": fields_dict}
-            self.data[key].append(entry)
+    def last(self):
+        for stream_id in reversed(self.ids):
+            if stream_id in self.entries:
+                return stream_id
+        return None
 
-            return new_id
 
-    def xrange(self, key, start, end):
-        with self.lock:
-            if key not in self.data:
+class PendingEntry:
+    __slots__ = ("consumer", "delivery_time", "delivery_count")
+
+    def __init__(self, consumer, delivery_time, delivery_count):
+        self.consumer = consumer
+        self.delivery_time = delivery_time
+        self.delivery_count = delivery_count
+
+
+class Consumer:
+    __slots__ = ("name", "seen_time", "active_time", "pending")
+
+    def __init__(self, name, now):
+        self.name = name
+        self.seen_time = now
+        self.active_time = -1
+        self.pending = PendingIndex()
+
+
+class ConsumerGroup:
+    """A group's last delivered ID, its pending entries list, and its consumers, each with their own share of it."""
+
+    __slots__ = ("name", "last_id", "pending", "consumers")
+
+    def __init__(self, name, last_id):
+        self.name = name
+        self.last_id = last_id
+        self.pending = PendingIndex()
+        self.consumers = {}
+
+
+PENDING_SIZE = sizeof(PendingEntry(None, 0, 0)) + 2 * (DICT_ENTRY + LIST_SLOT) + TUPLE_PAIR
+INDEX_SIZE = sizeof(PendingIndex()) + EMPTY_DICT + EMPTY_LIST
+
+
+def consumer_size(name):
+    return sizeof(Consumer(name, 0)) + DICT_ENTRY + sizeof(name) + INDEX_SIZE
+
+
+def group_size(name):
+    return sizeof(ConsumerGroup(name, MIN_ID)) + DICT_ENTRY + sizeof(name) + TUPLE_PAIR + INDEX_SIZE + EMPTY_DICT
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def claim_command(key, group, stream_id, pending):
+    """An XCLAIM that gives a replica (or another node) the same pending entry: owner, delivery time and count."""
+    return ["XCLAIM", key, group.name, pending.consumer.name, "0", format_id(stream_id), "TIME", pending.delivery_time,
+            "RETRYCOUNT", pending.delivery_count, "FORCE", "JUSTID"]
+
+
+class ClaimOptions:
+    """XCLAIM / XAUTOCLAIM arguments besides the key, group, consumer and IDs."""
+
+    __slots__ = ("min_idle", "delivery_time", "retry_count", "force", "justid", "last_id", "count")
+
+    def __init__(self, min_idle=0):
+        self.min_idle = min_idle
+        self.delivery_time = None  # now, unless IDLE or TIME says otherwise
+        self.retry_count = None
+        self.force = False
+        self.justid = False
+        self.last_id = None
+        self.count = 100
+
+
+def _entry_id(entry):
+    return id_tuple(entry["id"])
+
+
+def _text(name):
+    return name.decode(errors="replace")
+
+
+class StreamStore(BaseStore):
+    """
+    Streams are Stream objects, entries packed into blocks of bytes (see
+    app.utils.stream_blocks) of at most stream-node-max-entries entries and
+    about stream-node-max-bytes bytes, node_max_* here. Consumer groups live
+    beside the data, in `groups` (key -> group name -> ConsumerGroup); each
+    group's pending entries are indexed by ID for the group and again per
+    consumer.
+    Every XADD bumps `appends` and wakes the clients blocked in XREAD or
+    XREADGROUP at once, as does deleting a stream or one of its groups.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES, shared_reads=False):
+        super().__init__(stripes, shared_reads)
+        self.node_max_entries = STREAM_NODE_MAX_ENTRIES
+        self.node_max_bytes = STREAM_NODE_MAX_BYTES
+        self.groups = {}
+        self.appended = threading.Condition()
+        self.appends = 0
+
+    def _notify(self):
+        with self.appended:
+            self.appends += 1
+            self.appended.notify_all()
+
+    def wait_for_append(self, seen, timeout=None):
+        """Wait until `appends` moves past `seen` (read before looking at the streams), or timeout seconds pass."""
+        with self.appended:
+            return self.appended.wait_for(lambda: self.appends != seen, timeout)
+
+    def _remove(self, key):
+        stream = super()._remove(key)
+        groups = self.groups.pop(key, None)
+        if not groups:
+            return stream
+        self._notify()  # Readers blocked in XREADGROUP on the key get their NOGROUP error
+        return stream, groups
+
+    def _clear(self):
+        old = super()._clear() + (self.groups,)
+        self.groups = {}
+        self._notify()
+        return old
+
+    def _free_effort(self, held):
+        if isinstance(held, tuple):
+            stream, groups = held
+            return len(stream.blocks) + sum(len(group.pending) for group in groups.values())
+        return len(held.blocks)
+
+    def xadd(self, key, stream_id, fields, trim=None, nomkstream=False):
+        """
+        Append an entry under stream_id ("*", "ms-*" or explicit), then trim
+        by `trim` (see xtrim). Returns (the new ID, the length afterwards), or
+        (None, 0) when nomkstream is set and the stream doesn't exist.
+        """
+        with self.locks.write(key):
+            stream = self.data.get(key)
+            if stream is None and nomkstream:
+                return None, 0
+            new_id = next_id(stream.last_id if stream is not None else MIN_ID, stream_id)
+            if stream is None:
+                stream = self.data[key] = Stream()
+                self._grow(key, key_overhead(key) + stream.nbytes)
+            before = stream.nbytes
+            stream.append(new_id, fields, self.node_max_entries, self.node_max_bytes)
+            if trim:
+                stream.trim(*trim)
+            self._grow(key, stream.nbytes - before)
+            self._touch(key)
+            self._notify()
+            return format_id(new_id), len(stream)
+
+    def xtrim(self, key, trim):
+        """
+        XTRIM with trim = (threshold, by_id, approx, limit): keep the newest
+        `threshold` entries, or (by_id) those from the `threshold` ID on;
+        approx only drops whole blocks, at most `limit` entries' worth if
+        limit isn't 0. Returns (entries removed, length afterwards).
+        """
+        with self.locks.write(key):
+            stream = self.data.get(key)
+            if stream is None:
+                return 0, 0
+            before = stream.nbytes
+            removed = stream.trim(*trim)
+            self._grow(key, stream.nbytes - before)
+            return removed, len(stream)
+
+    def xlen(self, key):
+        with self.locks.read(key):
+            stream = self.data.get(key)
+            return 0 if stream is None else len(stream)
+
+    def xrange(self, key, start, end, count=None):
+        """Entries with IDs from start to end inclusive, both (ms, seq) tuples."""
+        with self.locks.read(key):
+            stream = self.data.get(key)
+            if stream is None:
                 return []
-            stream = self.data[key]
-            if start == "-":
-                start = stream[0]["id"]
-            if end == "+":
-                end = stream[-1]["id"]
-            return [
-                entry for entry in stream
-                if self._compare_ids(start, entry["id"]) <= 0 and self._compare_ids(entry["id"], end) <= 0
-            ]
-
-    def xread(self, streams_to_read):
-        with self.lock:
+            self._touch(key)
+            return stream.range(start, end, count)
+
+    def xrange_view(self, key, start, end):
+        """XRANGE for a streamed reply: (entry count, iterator decoding the entries), read without the lock."""
+        with self.locks.read(key):
+            stream = self.data.get(key)
+            if stream is None:
+                return 0, iter(())
+            self._touch(key)
+            return stream.view(start, end)
+
+    def _entries_after(self, key, after, count=None):
+        """Up to `count` entries with IDs above `after`."""
+        if after == MAX_ID:
+            return []
+        ms, seq = after
+        return self.data[key].range((ms, seq + 1) if seq < MAX_ID[1] else (ms + 1, 0), MAX_ID, count)
+
+    def _find_entry(self, key, stream_id):
+        return self.data[key].get(stream_id)
+
+    def xread(self, streams_to_read, count=None):
+        """Entries after the given (ms, seq) ID of each stream, for the streams that have any."""
+        with self.locks.read_many(streams_to_read):
             results = []
             for key, start_id in streams_to_read.items():
                 if key not in self.data:
                     continue
-                entries = [
-                    entry for entry in self.data[key]
-                    if self._compare_ids(entry["id"], start_id) > 0
-                ]
+                entries = self._entries_after(key, start_id, count)
                 if entries:
                     results.append((key, entries))
             return results
 
     def get_last_id(self, key):
-        with self.lock:
-            if key in self.data and self.data[key]:
-                return self.data[key][-1]["id"]
-            return "0-0"
-
-    def exists(self, key):
-        with self.lock:
-            return key in self.data
+        with self.locks.read(key):
+            stream = self.data.get(key)
+            return format_id(stream.last_id if stream is not None else MIN_ID)
+
+    def _group(self, key, group):
+        return self.groups.get(key, {}).get(group)
+
+    def _require_group(self, key, group):
+        """The named group of an existing stream, or NOGROUP; XGROUP's own subcommands word it differently."""
+        found = self._group(key, group) if key in self.data else None
+        if found is None:
+            raise StreamError("NOGROUP", f"No such key '{_text(key)}' or consumer group '{_text(group)}'")
+        return found
+
+    def _xgroup_target(self, key, group):
+        if key not in self.data:
+            raise StreamError("ERR", "The XGROUP subcommand requires the key to exist. Note that for CREATE you may "
+                                     "want to use the MKSTREAM option to create an empty stream automatically.")
+        found = self._group(key, group)
+        if found is None:
+            raise StreamError("NOGROUP", f"No such consumer group '{_text(group)}' for key name '{_text(key)}'")
+        return found
+
+    def _resolve_id(self, key, arg):
+        """A group's starting ID argument: "$" means the stream's last entry."""
+        if arg == b"$":
+            stream = self.data.get(key)
+            return stream.last_id if stream is not None else MIN_ID
+        return parse_id(arg)
+
+    def _consumer(self, key, group, name, effects):
+        """The named consumer, created (and recorded in effects) on first use; either way it was just seen."""
+        consumer = group.consumers.get(name)
+        if consumer is None:
+            consumer = group.consumers[name] = Consumer(name, now_ms())
+            self._grow(key, consumer_size(name))
+            effects.append(["XGROUP", "CREATECONSUMER", key, group.name, name])
+        consumer.seen_time = now_ms()
+        return consumer
+
+    def _forget(self, key, group, stream_id):
+        """Drop an entry from the group's PEL and its consumer's."""
+        pending = group.pending.remove(stream_id)
+        if pending is not None:
+            pending.consumer.pending.remove(stream_id)
+            self._grow(key, -PENDING_SIZE)
+        return pending
+
+    def create_group(self, key, group, start, mkstream=False):
+        with self.locks.write(key):
+            last_id = self._resolve_id(key, start)
+            if key not in self.data:
+                if not mkstream:
+                    self._xgroup_target(key, group)
+                stream = self.data[key] = Stream()
+                self._grow(key, key_overhead(key) + stream.nbytes)
+                self._touch(key)
+            groups = self.groups.setdefault(key, {})
+            if group in groups:
+                raise StreamError("BUSYGROUP", "Consumer Group name already exists")
+            groups[group] = ConsumerGroup(group, last_id)
+            self._grow(key, group_size(group))
+
+    def set_group_id(self, key, group, start):
+        with self.locks.write(key):
+            self._xgroup_target(key, group).last_id = self._resolve_id(key, start)
+
+    def destroy_group(self, key, group):
+        with self.locks.write(key):
+            found = self._group(key, group)
+            if found is None:
+                if key not in self.data:
+                    self._xgroup_target(key, group)
+                return False
+            del self.groups[key][group]
+            self._grow(key, -group_size(group) - len(found.pending) * PENDING_SIZE -
+                       sum(consumer_size(name) for name in found.consumers))
+            self._notify()
+            return True
+
+    def create_consumer(self, key, group, consumer):
+        with self.locks.write(key):
+            effects = []
+            self._consumer(key, self._xgroup_target(key, group), consumer, effects)
+            return bool(effects)
+
+    def delete_consumer(self, key, group, consumer):
+        """Delete a consumer and its pending entries; returns how many it had."""
+        with self.locks.write(key):
+            found = self._xgroup_target(key, group)
+            member = found.consumers.pop(consumer, None)
+            if member is None:
+                return 0
+            pending = [stream_id for stream_id, _ in member.pending.range()]
+            for stream_id in pending:
+                self._forget(key, found, stream_id)
+            self._grow(key, -consumer_size(consumer))
+            return len(pending)
+
+    def _deliver(self, key, group, consumer, stream_id, now):
+        """Add a delivered entry to the PEL, taking it over if another consumer still had it pending."""
+        pending = group.pending.get(stream_id)
+        if pending is None:
+            pending = PendingEntry(consumer, now, 1)
+            group.pending.add(stream_id, pending)
+            self._grow(key, PENDING_SIZE)
+        else:
+            pending.consumer.pending.remove(stream_id)
+            pending.consumer, pending.delivery_time, pending.delivery_count = consumer, now, 1
+        consumer.pending.add(stream_id, pending)
+        return pending
+
+    def _read_new(self, key, group, consumer, count, noack):
+        """XREADGROUP ">": entries past the group's last delivered ID, now pending for consumer unless noack."""
+        entries = self._entries_after(key, group.last_id, count)
+        effects = []
+        if not entries:
+            return entries, effects
+        now = now_ms()
+        consumer.active_time = now
+        group.last_id = _entry_id(entries[-1])
+        effects.append(["XGROUP", "SETID", key, group.name, entries[-1]["id"]])
+        if not noack:
+            for entry in entries:
+                stream_id = _entry_id(entry)
+                pending = self._deliver(key, group, consumer, stream_id, now)
+                effects.append(claim_command(key, group, stream_id, pending))
+        self._touch(key)
+        return entries, effects
+
+    def _read_history(self, key, consumer, after, count):
+        """XREADGROUP with an ID: the consumer's own pending entries after it; deleted ones come back without fields."""
+        entries = []
+        for stream_id, _ in consumer.pending.range(after):
+            if stream_id == after:
+                continue
+            if count and len(entries) >= count:
+                break
+            entry = self._find_entry(key, stream_id)
+            entries.append(entry if entry is not None else {"id": format_id(stream_id), "fields": None})
+        return entries
+
+    def read_group(self, group, consumer, streams, count=None, noack=False):
+        """
+        XREADGROUP. `streams` maps each key to ">" for entries never delivered
+        to the group, or to an (ms, seq) ID to re-read the consumer's own
+        pending entries after it. Returns (results, effects): the (key,
+        entries) pairs to reply with, and commands that make the same group
+        changes on a replica, since a replica can't replay the read itself.
+        """
+        keys = list(streams)
+        with self.locks.write_many(keys):
+            groups = [self._group(key, group) if key in self.data else None for key in keys]
+            for key, found in zip(keys, groups):
+                if found is None:
+                    raise StreamError("NOGROUP", f"No such key '{_text(key)}' or consumer group '{_text(group)}' "
+                                                 "in XREADGROUP with GROUP option")
+            results, effects = [], []
+            for key, found in zip(keys, groups):
+                member = self._consumer(key, found, consumer, effects)
+                if streams[key] != ">":
+                    results.append((key, self._read_history(key, member, streams[key], count)))
+                    continue
+                entries, changes = self._read_new(key, found, member, count, noack)
+                effects.extend(changes)
+                if entries:
+                    results.append((key, entries))
+            return results, effects
+
+    def ack(self, key, group, ids):
+        with self.locks.write(key):
+            found = self._group(key, group)
+            if found is None:
+                return 0
+            return sum(self._forget(key, found, stream_id) is not None for stream_id in ids)
+
+    def pending_summary(self, key, group):
+        """XPENDING's summary: (count, lowest ID, highest ID, [(consumer, count), ...])."""
+        with self.locks.read(key):
+            found = self._require_group(key, group)
+            if not found.pending:
+                return 0, None, None, []
+            consumers = sorted((name, len(member.pending)) for name, member in found.consumers.items()
+                               if member.pending)
+            return len(found.pending), format_id(found.pending.first()), format_id(found.pending.last()), consumers
+
+    def pending_range(self, key, group, bounds, consumer=None, min_idle=0):
+        """XPENDING's extended form over bounds = (start, end, count): [id, consumer, idle ms, deliveries] rows."""
+        start, end, count = bounds
+        with self.locks.read(key):
+            found = self._require_group(key, group)
+            index = found.pending
+            if consumer is not None:
+                member = found.consumers.get(consumer)
+                index = member.pending if member is not None else PendingIndex()
+            now = now_ms()
+            rows = []
+            for stream_id, pending in index.range(start, end):
+                if len(rows) >= count:
+                    break
+                idle = now - pending.delivery_time
+                if idle >= min_idle:
+                    rows.append([format_id(stream_id), pending.consumer.name, idle, pending.delivery_count])
+            return rows
+
+    def _claim_one(self, key, group, consumer, stream_id, options):
+        """
+        Claim one ID for consumer: (entry, effect) if it was claimed, (None,
+        effect) if its entry is gone from the stream so it was dropped from
+        the PEL instead, (None, None) if it isn't pending (and not forced) or
+        hasn't been idle for options.min_idle.
+        """
+        pending = group.pending.get(stream_id)
+        if pending is None and not options.force:
+            return None, None
+        entry = self._find_entry(key, stream_id)
+        if entry is None:
+            if pending is None:
+                return None, None
+            self._forget(key, group, stream_id)
+            return None, ["XACK", key, group.name, format_id(stream_id)]
+        now = now_ms()
+        if pending is not None and now - pending.delivery_time < options.min_idle:
+            return None, None
+        if pending is None:
+            pending = PendingEntry(consumer, now, 1)
+            group.pending.add(stream_id, pending)
+            self._grow(key, PENDING_SIZE)
+        else:
+            pending.consumer.pending.remove(stream_id)
+            pending.consumer = consumer
+        consumer.pending.add(stream_id, pending)
+        pending.delivery_time = now if options.delivery_time is None else options.delivery_time
+        if options.retry_count is not None:
+            pending.delivery_count = options.retry_count
+        elif not options.justid:
+            pending.delivery_count += 1
+        if not options.justid:
+            consumer.active_time = now
+        return entry, claim_command(key, group, stream_id, pending)
+
+    def claim(self, key, group, consumer, ids, options):
+        """XCLAIM: (claimed entries, or their IDs with JUSTID; effects for replicas)."""
+        with self.locks.write(key):
+            found = self._require_group(key, group)
+            effects = []
+            member = self._consumer(key, found, consumer, effects)
+            claimed = []
+            for stream_id in ids:
+                entry, effect = self._claim_one(key, found, member, stream_id, options)
+                if effect:
+                    effects.append(effect)
+                if entry is not None:
+                    claimed.append(entry["id"] if options.justid else entry)
+            if options.last_id is not None and options.last_id > found.last_id:
+                found.last_id = options.last_id
+                effects.append(["XGROUP", "SETID", key, group, format_id(options.last_id)])
+            return claimed, effects
+
+    def autoclaim(self, key, group, consumer, start, options):
+        """
+        XAUTOCLAIM: claim up to options.count entries idle for at least
+        options.min_idle, scanning the PEL from start and looking at no more
+        than ten entries per wanted one. Returns ((next cursor, claimed,
+        deleted IDs), effects); the cursor is 0-0 once the scan reaches the end.
+        """
+        with self.locks.write(key):
+            found = self._require_group(key, group)
+            effects = []
+            member = self._consumer(key, found, consumer, effects)
+            claimed, deleted = [], []
+            attempts, wanted = options.count * 10, options.count
+            cursor = MIN_ID
+            for stream_id, _ in found.pending.range(start):
+                if not attempts or not wanted:
+                    cursor = stream_id
+                    break
+                attempts -= 1
+                entry, effect = self._claim_one(key, found, member, stream_id, options)
+                if effect:
+                    effects.append(effect)
+                if entry is not None:
+                    claimed.append(entry["id"] if options.justid else entry)
+                    wanted -= 1
+                elif effect:
+                    deleted.append(format_id(stream_id))
+            return (format_id(cursor), claimed, deleted), effects
+
+    def _footprint(self, value):
+        return value.nbytes, (), 0
+
+    def _rebuild_commands(self, key):
+        commands = []
+        for entry in self.data[key]:
+            fields = [item for pair in entry["fields"].items() for item in pair]
+            commands.append(["XADD", key, entry["id"], *fields])
+        for name, group in self.groups.get(key, {}).items():
+            commands.append(["XGROUP", "CREATE", key, name, format_id(group.last_id), "MKSTREAM"])
+            commands.extend(["XGROUP", "CREATECONSUMER", key, name, consumer] for consumer in group.consumers)
+            commands.extend(claim_command(key, group, stream_id, pending)
+                            for stream_id, pending in group.pending.range())
+        return commands
+
+    def encoding(self, key):
+        with self.locks.read(key):
+            return "stream" if key in self.data else None
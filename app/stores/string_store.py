@@ -1,42 +1,426 @@
-import threading
+import itertools
+import math
+import time
 
+from app.stores.base_store import BaseStore
+from app.utils import bitops, hyperloglog
+from app.utils.eviction import lfu_touch, lru_clock
+from app.utils.locks import DEFAULT_STRIPES
+from app.utils.memory import key_overhead, sizeof
+from app.utils.scan_dict import ScanDict
 
-class StringStore:
-    def __init__(self):
-        self.data = {}
-        self.lock = threading.Lock()
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+SHARED_INTEGERS_COUNT = 10000
+SHARED_INTEGERS = tuple(range(SHARED_INTEGERS_COUNT))
+EMBSTR_SIZE_LIMIT = 44
+MAX_INT_STRING_LENGTH = 20
+
+
+def shared_int(value):
+    """Return the shared object for small non-negative ints so equal counters don't each hold a copy."""
+    if 0 <= value < SHARED_INTEGERS_COUNT:
+        return SHARED_INTEGERS[value]
+    return value
+
+
+def parse_int(value):
+    """Parse a string the way Redis does for int encoding: no sign tricks, spaces or leading zeros."""
+    if not value or len(value) > MAX_INT_STRING_LENGTH:
+        return None
+    digits = value[1:] if value[:1] == b"-" else value
+    if not digits.isdigit() or (digits[:1] == b"0" and len(value) > 1):
+        return None
+    number = int(value)
+    if not INT64_MIN <= number <= INT64_MAX:
+        return None
+    return number
+
+
+def parse_float(value):
+    """
+    Parse a string the way Redis does for INCRBYFLOAT: float() would also
+    take surrounding whitespace and digit-group underscores (b" 1_0 ").
+    """
+    if isinstance(value, int):
+        return float(value)
+    if not value or value[:1].isspace() or value[-1:].isspace() or b"_" in value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def encode_value(value):
+    """Store integer-looking strings as native ints; everything else stays as the raw bytes."""
+    number = parse_int(value)
+    if number is None:
+        return value
+    return shared_int(number)
+
+
+def format_float(value):
+    if value.is_integer() and abs(value) < 1e17:
+        return b"%d" % value
+    return repr(value).encode()
+
+
+def decode_value(value):
+    if value is None or isinstance(value, bytes):
+        return value
+    if isinstance(value, bytearray):
+        return bytes(value)
+    return b"%d" % value
+
+
+def raw_value(value):
+    """Bytes-like contents of a value for reading in place: bitmaps aren't copied, a missing key reads as empty."""
+    if value is None:
+        return b""
+    return b"%d" % value if isinstance(value, int) else value
+
+
+def value_size(value):
+    if isinstance(value, int) and 0 <= value < SHARED_INTEGERS_COUNT:
+        return 0  # Shared objects are not owned by the key
+    return sizeof(value)
+
+
+class StringStore(BaseStore):
+    def __init__(self, stripes=DEFAULT_STRIPES, shared_reads=False):
+        super().__init__(stripes, shared_reads)
+        self.expires = ScanDict()
+        self.expired_keys = 0
+        self.expire_cycle_usec = 0
+        self.latency_monitor = None  # Set by the server to report expire-del spikes
+        self.lazy_expire = False  # lazyfree-lazy-expire
+        self.on_expire = None  # Set by the server, called with the keys expired to invalidate client-side caches
+        self.hll_sparse_max_bytes = hyperloglog.HLL_SPARSE_MAX_BYTES
+
+    def _store(self, key, value):
+        old = self.data.get(key, None)
+        if old is None:
+            self._account(key, key_overhead(key) + value_size(value))
+        else:
+            self._account(key, value_size(value) - value_size(old))
+        self.data[key] = value
+        self._touch(key)
+
+    def _key_memory(self, key):
+        return key_overhead(key) + value_size(self.data[key])
+
+    def _remove(self, key):
+        value = super()._remove(key)
+        self.expires.pop(key, None)
+        return value
+
+    def _clear(self):
+        old = super()._clear() + (self.expires,)
+        self.expires = ScanDict()
+        return old
+
+    def _footprint(self, value):
+        return value_size(value), (), 0
+
+    def _rebuild_commands(self, key):
+        value = decode_value(self.data[key])
+        deadline = self.expires.get(key)
+        if deadline is None:
+            return [["SET", key, value]]
+        remaining = int((deadline - time.time()) * 1000)
+        return [["SET", key, value, "PX", remaining]] if remaining > 0 else []
 
     def set(self, key, value, px=None):
-        with self.lock:
-            self.data[key] = value
-            if px is not None:
-                threading.Timer(px / 1000.0, self.delete, args=[key]).start()
+        with self.locks.write(key):
+            self._store(key, encode_value(value))
+            if px is None:
+                self.expires.pop(key, None)
+            else:
+                self.expires[key] = time.time() + px / 1000.0
+
+    def _expire(self, key, deadline):
+        start = time.perf_counter_ns()
+        with self.locks.write(key):
+            # A SET may have replaced the value or its TTL since the deadline was read
+            expired = self.expires.get(key) == deadline
+            if expired:
+                self._free(self._remove(key), self.lazy_expire)
+                self.expired_keys += 1
+        if self.latency_monitor is not None:
+            self.latency_monitor.observe("expire-del", (time.perf_counter_ns() - start) // 1000)
+        if expired and self.on_expire is not None:
+            self.on_expire([key])
+        return expired
+
+    def expire_if_needed(self, keys):
+        """Lazy expiry: delete those of `keys` whose deadline has passed, before a command sees them; returns them."""
+        expired = set()
+        if not self.expires:
+            return expired
+        now = time.time()
+        for key in keys:
+            deadline = self.expires.get(key)
+            if deadline is not None and deadline <= now and self._expire(key, deadline):
+                expired.add(key)
+        return expired
+
+    def active_expire_cycle(self, keys_per_loop, acceptable_stale, time_limit):
+        """
+        Active expiry for keys nobody reads: sample keys with a TTL, delete
+        the expired ones, and sample again while more than `acceptable_stale`
+        percent of the last sample had expired, for at most `time_limit`
+        seconds. Returns the number of keys deleted.
+        """
+        start = time.perf_counter()
+        deleted = 0
+        while self.expires:
+            now = time.time()
+            sampled = self.sample_volatile(keys_per_loop)
+            expired = [(key, deadline) for key, deadline in sampled if deadline <= now]
+            deleted += sum(self._expire(key, deadline) for key, deadline in expired)
+            if len(expired) * 100 <= len(sampled) * acceptable_stale or time.perf_counter() - start >= time_limit:
+                break
+        self.expire_cycle_usec += int((time.perf_counter() - start) * 1e6)
+        return deleted
 
     def get(self, key):
-        with self.lock:
-            return self.data.get(key, None)
-
-    def incr(self, key):
-        with self.lock:
-            if key not in self.data:
-                self.data[key] = "1"
-                return 1
-            try:
-                value = int(self.data[key])
-                value += 1
-                self.data[key] = str(value)
-                return value
-            except ValueError as e:
-                raise ValueError("Value is not an integer or out of range") from e
-
-    def keys(self):
-        with self.lock:
-            return list(self.data.keys())
-
-    def load_from_rdb(self, rdb_data):
-        with self.lock:
-            self.data = rdb_data
-
-    def delete(self, key):
-        with self.lock:
-            self.data.pop(key, None)
+        with self.locks.read(key):
+            value = self.data.get(key, None)
+            if value is not None:
+                self._touch(key)
+        return decode_value(value)
+
+    def mget(self, keys):
+        with self.locks.read_many(keys):
+            values = [self.data.get(key, None) for key in keys]
+            for key, value in zip(keys, values):
+                if value is not None:
+                    self._touch(key)
+        return [decode_value(value) for value in values]
+
+    def sample_volatile(self, count):
+        sampled = [(key, self.expires.get(key)) for key in self.expires.sample(count)]
+        return [(key, deadline) for key, deadline in sampled if deadline is not None]
+
+    def mset(self, pairs):
+        with self.locks.write_many([key for key, _ in pairs]):
+            for key, value in pairs:
+                self._store(key, encode_value(value))
+                self.expires.pop(key, None)
+
+    def msetnx(self, pairs):
+        with self.locks.write_many([key for key, _ in pairs]):
+            if any(key in self.data for key, _ in pairs):
+                return False
+            for key, value in pairs:
+                self._store(key, encode_value(value))
+            return True
+
+    def incrby(self, key, increment):
+        with self.locks.write(key):
+            value = self.data.get(key, 0)
+            if not isinstance(value, int):
+                value = parse_int(value)
+                if value is None:
+                    raise ValueError("value is not an integer or out of range")
+            value += increment
+            if not INT64_MIN <= value <= INT64_MAX:
+                raise ValueError("increment or decrement would overflow")
+            self._store(key, shared_int(value))
+            return value
+
+    def incrbyfloat(self, key, increment):
+        with self.locks.write(key):
+            value = parse_float(self.data.get(key, 0))
+            if value is None:
+                raise ValueError("value is not a valid float")
+            value += increment
+            if math.isnan(value) or math.isinf(value):
+                raise ValueError("increment would produce NaN or Infinity")
+            formatted = format_float(value)
+            self._store(key, encode_value(formatted))
+            return formatted
+
+    def pfadd(self, key, elements):
+        """Returns whether the HLL was created or any register changed, PFADD's reply."""
+        with self.locks.write(key):
+            value = self.data.get(key)
+            created = value is None
+            if created:
+                value = hyperloglog.empty_hll()
+            updated = hyperloglog.add(value, elements, self.hll_sparse_max_bytes)
+            if updated is None and not created:
+                return False
+            self._store(key, updated or value)
+            return True
+
+    def pfcount(self, keys):
+        """
+        One key: its cached cardinality, recomputed and written back into
+        the string when a write has made it stale. Several keys: the
+        cardinality of their union, never cached.
+        """
+        if len(keys) == 1:
+            key = keys[0]
+            with self.locks.write(key):
+                value = self.data.get(key)
+                if value is None:
+                    return 0
+                if not hyperloglog.is_hll(value):
+                    raise hyperloglog.InvalidHLLError("Key is not a valid HyperLogLog string value.")
+                count = hyperloglog.cached_cardinality(value)
+                if count is None:
+                    count = hyperloglog.estimate(hyperloglog.registers(value))
+                    self.data[key] = hyperloglog.with_cardinality(value, count)
+                self._touch(key)
+                return count
+        with self.locks.read_many(keys):
+            values = [value for value in map(self.data.get, keys) if value is not None]
+            return hyperloglog.estimate(hyperloglog.merge(hyperloglog.registers(value) for value in values))
+
+    def pfmerge(self, destination, keys):
+        """Register-wise max of the source HLLs and destination's own, stored at destination."""
+        with self.locks.write_many([destination, *keys]):
+            values = [value for value in map(self.data.get, [destination, *keys]) if value is not None]
+            merged = hyperloglog.merge(hyperloglog.registers(value) for value in values)
+            sparse = all(hyperloglog.encoding(value) == hyperloglog.HLL_SPARSE for value in values)
+            self._store(destination, hyperloglog.encode(merged, sparse, self.hll_sparse_max_bytes))
+
+    def _bitmap(self, key, size=0):
+        """
+        The value under key as a mutable bytearray of at least `size` bytes,
+        converting it in place on the first bit operation and zero-padding it
+        as needed, so later bit writes don't copy the whole string. Called
+        under the key's write lock.
+        """
+        value = self.data.get(key)
+        if not isinstance(value, bytearray):
+            value = bytearray(raw_value(value))
+            self._store(key, value)
+        if len(value) < size:
+            before = sizeof(value)
+            value.extend(bytes(size - len(value)))
+            self._account(key, sizeof(value) - before)
+        self._touch(key)
+        return value
+
+    def setbit(self, key, offset, bit):
+        """Returns the bit's previous value."""
+        with self.locks.write(key):
+            bitmap = self._bitmap(key, (offset >> 3) + 1)
+            old = bitops.get_bit(bitmap, offset)
+            if bit:
+                bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+            else:
+                bitmap[offset >> 3] &= ~(0x80 >> (offset & 7)) & 0xFF
+            return old
+
+    def getbit(self, key, offset):
+        with self.locks.read(key):
+            return bitops.get_bit(raw_value(self.data.get(key)), offset)
+
+    def bitcount(self, key, start=0, end=-1, bit_mode=False):
+        with self.locks.read(key):
+            data = raw_value(self.data.get(key))
+            length = len(data) * 8 if bit_mode else len(data)
+            start, end = bitops.normalize_range(start, end, length)
+            if start > end:
+                return 0
+            if not bit_mode:
+                start, end = start * 8, end * 8 + 7
+            return bitops.popcount(data, start, end)
+
+    def bitpos(self, key, bit, start=0, end=None, bit_mode=False):
+        """
+        First bit set to `bit` in the range, or -1. A search for a clear bit
+        with no explicit end that finds none returns the first bit past the
+        string, as if it were followed by zeros.
+        """
+        with self.locks.read(key):
+            value = self.data.get(key)
+            if value is None:
+                return 0 if bit == 0 else -1
+            data = raw_value(value)
+            length = len(data) * 8 if bit_mode else len(data)
+            first, last = bitops.normalize_range(start, -1 if end is None else end, length)
+            if first > last:
+                return -1
+            if not bit_mode:
+                first, last = first * 8, last * 8 + 7
+            position = bitops.find_bit(data, bit, first, last)
+            if position == -1 and bit == 0 and end is None:
+                return last + 1
+            return position
+
+    def bitop(self, operation, destination, keys):
+        """Store the result at destination, deleting it for an empty result; returns the result's length."""
+        with self.locks.write_many([destination, *keys]):
+            values = [raw_value(self.data.get(key)) for key in keys]
+            result = bitops.bitop(operation, values)
+            if result:
+                self._store(destination, result)
+            elif destination in self.data:
+                self._remove(destination)
+            return len(result)
+
+    def bitfield(self, key, operations):
+        """
+        Run BITFIELD operations in order: ("GET", signed, bits, offset) or
+        ("SET" | "INCRBY", signed, bits, offset, value, overflow). Replies
+        are the value read, the old value for SET, the new one for INCRBY,
+        or None where OVERFLOW FAIL stopped a write. The key is only created
+        or converted to a bitmap once a write stores a value.
+        """
+        writes = any(operation[0] != "GET" for operation in operations)
+        with (self.locks.write(key) if writes else self.locks.read(key)):
+            data = raw_value(self.data.get(key))
+            replies = []
+            for op, signed, bits, offset, *args in operations:
+                old = bitops.get_field(data, offset, bits, signed)
+                if op == "GET":
+                    replies.append(old)
+                    continue
+                argument, overflow = args
+                new = bitops.apply_overflow(old + argument if op == "INCRBY" else argument, bits, signed, overflow)
+                if new is not None:
+                    data = self._bitmap(key, ((offset + bits - 1) >> 3) + 1)
+                    bitops.set_field(data, offset, bits, new)
+                replies.append(old if op == "SET" and new is not None else new)
+            return replies
+
+    def encoding(self, key):
+        with self.locks.read(key):
+            value = self.data.get(key, None)
+        if value is None:
+            return None
+        if isinstance(value, int):
+            return "int"
+        # A string turned into a bitmap is edited in place, like a raw sds
+        return "embstr" if isinstance(value, bytes) and len(value) <= EMBSTR_SIZE_LIMIT else "raw"
+
+    def expire_stats(self):
+        with self.locks.read_all():
+            now = time.time()
+            ttls = [deadline - now for deadline in itertools.islice(self.expires.values(), 100)]
+            return len(self.expires), int(sum(ttls) * 1000 / len(ttls)) if ttls else 0
+
+    def load_from_rdb(self, rdb_data, replace=True):
+        """Add keys decoded from an RDB file; `replace` first empties the store, for the first chunk."""
+        with self.locks.write_all():
+            if replace:
+                self.data.clear()
+                self.memory = [0] * len(self.memory)
+                self.access = {}
+            # New keys go in as one batch: one bucket resize, one access stamp, per-stripe memory sums
+            fresh = {}
+            memory, mask = self.memory, self.locks.mask
+            for key, value in rdb_data.items():
+                value = encode_value(value)
+                if key in self.data:
+                    self._store(key, value)
+                    continue
+                fresh[key] = value
+                memory[hash(key) & mask] += key_overhead(key) + value_size(value)
+            self.data.insert_new(fresh)
+            self.access.update(dict.fromkeys(fresh, lfu_touch(None) if self.lfu else lru_clock()))
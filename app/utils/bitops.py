@@ -0,0 +1,122 @@
+"""
+Bit-level primitives for SETBIT, BITCOUNT, BITPOS, BITOP and BITFIELD.
+
+Bits are numbered from the most significant bit of the first byte, as in
+Redis. Whole ranges are turned into Python ints with int.from_bytes and
+handled by int.bit_count, shifts and bitwise operators, which run in C, so
+nothing loops in Python per byte. Long ranges are read in CHUNK_BYTES
+slices so a large bitmap is never copied into one huge int.
+"""
+from functools import reduce
+
+CHUNK_BYTES = 1 << 16
+MAX_BIT_OFFSET = (1 << 32) - 1  # bitmaps are limited to 512 MB, like proto-max-bulk-len
+BITOP_FUNCTIONS = {
+    "AND": lambda a, b: a & b,
+    "OR": lambda a, b: a | b,
+    "XOR": lambda a, b: a ^ b,
+}
+
+
+def normalize_range(start, end, length):
+    """Clamp a BITCOUNT / BITPOS start..end (inclusive, negatives from the end) the way Redis does."""
+    if start < 0:
+        start += length
+    if end < 0:
+        end += length
+    start = max(start, 0)
+    end = min(max(end, 0), length - 1)
+    return start, end
+
+
+def get_bit(data, offset):
+    byte = offset >> 3
+    if byte >= len(data):
+        return 0
+    return (data[byte] >> (7 - (offset & 7))) & 1
+
+
+def popcount(data, first, last):
+    """Set bits from bit `first` to bit `last`, inclusive."""
+    start, end = first >> 3, (last >> 3) + 1
+    view = memoryview(data)
+    count = sum(int.from_bytes(view[i:min(i + CHUNK_BYTES, end)], "big").bit_count()
+                for i in range(start, end, CHUNK_BYTES))
+    # Take back the bits of the first and last byte that fall outside the range
+    count -= (data[start] >> (8 - (first & 7))).bit_count()
+    count -= (data[end - 1] & ((1 << (7 - (last & 7))) - 1)).bit_count()
+    return count
+
+
+def find_bit(data, bit, first, last):
+    """Position of the first bit equal to `bit` between bits `first` and `last` inclusive, or -1."""
+    view = memoryview(data)
+    for chunk_start in range(first >> 3, (last >> 3) + 1, CHUNK_BYTES):
+        chunk = view[chunk_start:min(chunk_start + CHUNK_BYTES, (last >> 3) + 1)]
+        width = len(chunk) * 8
+        base = chunk_start * 8
+        low, high = max(first, base) - base, min(last, base + width - 1) - base
+        # Ones over the wanted bits of this chunk, counted from its most significant bit
+        mask = ((1 << (width - low)) - 1) ^ ((1 << (width - high - 1)) - 1)
+        n = int.from_bytes(chunk, "big")
+        n = (n if bit else ~n) & mask
+        if n:
+            return base + width - n.bit_length()
+    return -1
+
+
+def bitop(operation, values):
+    """BITOP AND/OR/XOR/NOT over whole strings; shorter inputs count as zero-padded."""
+    length = max((len(value) for value in values), default=0)
+    numbers = [int.from_bytes(value, "big") << (8 * (length - len(value))) for value in values]
+    if operation == "NOT":
+        result = numbers[0] ^ ((1 << (8 * length)) - 1)
+    else:
+        result = reduce(BITOP_FUNCTIONS[operation], numbers)
+    return result.to_bytes(length, "big")
+
+
+def get_field(data, offset, bits, signed):
+    """The `bits`-wide integer at bit `offset`; bits past the end of data read as zero."""
+    first, last = offset >> 3, (offset + bits - 1) >> 3
+    size = last - first + 1
+    n = int.from_bytes(bytes(data[first:last + 1]).ljust(size, b"\0"), "big")
+    n = (n >> (size * 8 - (offset & 7) - bits)) & ((1 << bits) - 1)
+    if signed and n >> (bits - 1):
+        n -= 1 << bits
+    return n
+
+
+def set_field(data, offset, bits, value):
+    """Write `value` as a `bits`-wide field at bit `offset` of a bytearray long enough to hold it."""
+    first, last = offset >> 3, (offset + bits - 1) >> 3
+    size = last - first + 1
+    shift = size * 8 - (offset & 7) - bits
+    mask = ((1 << bits) - 1) << shift
+    n = int.from_bytes(data[first:last + 1], "big")
+    n = (n & ~mask) | ((value << shift) & mask)
+    data[first:last + 1] = n.to_bytes(size, "big")
+
+
+def field_limits(bits, signed):
+    if signed:
+        return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    return 0, (1 << bits) - 1
+
+
+def apply_overflow(value, bits, signed, overflow):
+    """
+    Fit `value` into a field as BITFIELD's OVERFLOW mode says: WRAP takes it
+    modulo the width, SAT clamps it to the limits, FAIL returns None.
+    """
+    low, high = field_limits(bits, signed)
+    if low <= value <= high:
+        return value
+    if overflow == "FAIL":
+        return None
+    if overflow == "SAT":
+        return high if value > high else low
+    value &= (1 << bits) - 1
+    if signed and value >> (bits - 1):
+        value -= 1 << bits
+    return value
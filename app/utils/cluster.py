@@ -0,0 +1,315 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from app.parsers.reply_parser import ReplyError, read_reply
+from app.utils.resp import encode_array
+from app.utils.slots import CLUSTER_SLOTS
+
+GOSSIP_INTERVAL = 1.0
+GOSSIP_TIMEOUT = 2.0
+MIGRATE_SOCKET_IDLE = 10.0
+
+
+class ClusterNode:
+    def __init__(self, node_id, host, port, config_epoch=0):
+        self.node_id = node_id
+        self.host = host
+        self.port = port
+        self.config_epoch = config_epoch
+        self.link_state = "connected"
+        self.pong_received = 0
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+
+class MigrateConnections:
+    """
+    Connections to MIGRATE targets kept open between calls, like Redis's
+    migrate socket cache, so a reshard moving thousands of slots doesn't
+    connect once per slot. Each MIGRATE has a connection to itself for the
+    call. A connection that saw an error is closed rather than reused, and
+    one left idle for MIGRATE_SOCKET_IDLE seconds is closed when the cache
+    is next touched.
+    """
+
+    def __init__(self):
+        self.idle = {}  # (host, port) -> [(sock, reader, last used)]
+        self.lock = threading.Lock()
+
+    def _take(self, address, timeout):
+        with self.lock:
+            self._close_stale()
+            cached = self.idle.get(address)
+            if cached:
+                sock, reader, _ = cached.pop()
+                sock.settimeout(timeout)
+                return sock, reader
+        sock = socket.create_connection(address, timeout=timeout)
+        return sock, sock.makefile("rb")
+
+    def _close_stale(self):
+        cutoff = time.monotonic() - MIGRATE_SOCKET_IDLE
+        for address, cached in list(self.idle.items()):
+            for sock, _, last_used in cached:
+                if last_used < cutoff:
+                    sock.close()
+            cached[:] = [entry for entry in cached if entry[2] >= cutoff]
+            if not cached:
+                del self.idle[address]
+
+    @contextmanager
+    def connection(self, host, port, timeout):
+        """A (socket, reader) pair to host:port, cached again if the block finishes without an error."""
+        address = (host, port)
+        sock, reader = self._take(address, timeout)
+        try:
+            yield sock, reader
+        except BaseException:
+            sock.close()
+            raise
+        with self.lock:
+            self.idle.setdefault(address, []).append((sock, reader, time.monotonic()))
+
+
+def slot_ranges(slots):
+    """Collapse an ascending iterable of slots into (start, end) ranges."""
+    ranges = []
+    for slot in slots:
+        if ranges and ranges[-1][1] == slot - 1:
+            ranges[-1][1] = slot
+        else:
+            ranges.append([slot, slot])
+    return [tuple(r) for r in ranges]
+
+
+def parse_slot_ranges(tokens):
+    slots = []
+    for token in tokens:
+        if token.startswith("["):
+            continue  # migrating/importing annotation, not an ownership claim
+        start, _, end = token.partition("-")
+        slots.extend(range(int(start), int(end or start) + 1))
+    return slots
+
+
+class ClusterState:
+    """
+    This node's view of the cluster: known nodes, the owner of every hash
+    slot and the slots being migrated in or out. There is no separate cluster
+    bus; nodes exchange their CLUSTER NODES lines through CLUSTER HELLO on the
+    regular client port. Each node only reports its own slots, and a claim
+    wins over the current owner only with a higher config epoch, which is how
+    a finished migration supersedes the old owner everywhere.
+    """
+
+    def __init__(self, host, port):
+        self.myself = ClusterNode(os.urandom(20).hex(), host, port)
+        self.nodes = {self.myself.node_id: self.myself}
+        self.slots = [None] * CLUSTER_SLOTS
+        self.migrating = {}  # slot -> node the slot is moving to
+        self.importing = {}  # slot -> node the slot is moving from
+        self.current_epoch = 0
+        self.lock = threading.Lock()
+        self.broadcasting = False
+        self.broadcast_pending = False
+
+    def get_node(self, node_id):
+        node = self.nodes.get(node_id)
+        if node is None:
+            raise ValueError(f"Unknown node {node_id}")
+        return node
+
+    def owned_slots(self, node):
+        return [slot for slot, owner in enumerate(self.slots) if owner is node]
+
+    def slots_by_node(self):
+        """Contiguous slot ranges with their owner, as (start, end, node) in slot order."""
+        ranges = []
+        for slot, owner in enumerate(self.slots):
+            if owner is None:
+                continue
+            if ranges and ranges[-1][2] is owner and ranges[-1][1] == slot - 1:
+                ranges[-1][1] = slot
+            else:
+                ranges.append([slot, slot, owner])
+        return [tuple(r) for r in ranges]
+
+    def _bump_epoch(self):
+        self.current_epoch = max([self.current_epoch] + [node.config_epoch for node in self.nodes.values()]) + 1
+        self.myself.config_epoch = self.current_epoch
+
+    def add_slots(self, slots):
+        with self.lock:
+            for slot in slots:
+                if self.slots[slot] is not None:
+                    raise ValueError(f"Slot {slot} is already busy")
+            for slot in slots:
+                self.slots[slot] = self.myself
+                self.importing.pop(slot, None)
+
+    def del_slots(self, slots):
+        with self.lock:
+            for slot in slots:
+                if self.slots[slot] is None:
+                    raise ValueError(f"Slot {slot} is already unassigned")
+            for slot in slots:
+                self.slots[slot] = None
+                self.migrating.pop(slot, None)
+                self.importing.pop(slot, None)
+
+    def set_migrating(self, slot, node_id):
+        with self.lock:
+            if self.slots[slot] is not self.myself:
+                raise ValueError(f"I'm not the owner of hash slot {slot}")
+            node = self.get_node(node_id)
+            if node is self.myself:
+                raise ValueError("Can't MIGRATE to myself")
+            self.migrating[slot] = node
+
+    def set_importing(self, slot, node_id):
+        with self.lock:
+            if self.slots[slot] is self.myself:
+                raise ValueError(f"I'm already the owner of hash slot {slot}")
+            node = self.get_node(node_id)
+            if node is self.myself:
+                raise ValueError("Can't IMPORT from myself")
+            self.importing[slot] = node
+
+    def set_stable(self, slot):
+        with self.lock:
+            self.migrating.pop(slot, None)
+            self.importing.pop(slot, None)
+
+    def set_node(self, slot, node_id):
+        with self.lock:
+            node = self.get_node(node_id)
+            if node is not self.myself:
+                self.migrating.pop(slot, None)
+            elif self.importing.pop(slot, None) is not None:
+                # Finishing an import: claim the slot with an epoch newer than the old owner's
+                self._bump_epoch()
+            self.slots[slot] = node
+
+    def node_line(self, node):
+        flags = "myself,master" if node is self.myself else "master"
+        ranges = [f"{start}-{end}" if start != end else str(start)
+                  for start, end in slot_ranges(self.owned_slots(node))]
+        if node is self.myself:
+            ranges += [f"[{slot}->-{target.node_id}]" for slot, target in sorted(self.migrating.items())]
+            ranges += [f"[{slot}-<-{source.node_id}]" for slot, source in sorted(self.importing.items())]
+        link_state = "connected" if node is self.myself else node.link_state
+        fields = [node.node_id, f"{node.address}@{node.port}", flags, "-", "0", str(node.pong_received),
+                  str(node.config_epoch), link_state] + ranges
+        return " ".join(fields)
+
+    def describe(self):
+        with self.lock:
+            return "".join(self.node_line(node) + "\n" for node in self.nodes.values())
+
+    def apply_node_line(self, line, authoritative):
+        """
+        Merge one CLUSTER NODES line received from a peer. Address changes are
+        always taken, slot claims only when the line describes the peer that
+        sent it. Returns the node if it was not known before.
+        """
+        fields = line.split()
+        node_id, address, epoch = fields[0], fields[1].split("@")[0], int(fields[6])
+        host, _, port = address.rpartition(":")
+        with self.lock:
+            if node_id == self.myself.node_id:
+                return None
+            node = self.nodes.get(node_id)
+            is_new = node is None
+            if is_new:
+                node = self.nodes[node_id] = ClusterNode(node_id, host, int(port))
+            node.host, node.port = host, int(port)
+            if not authoritative:
+                return node if is_new else None
+
+            node.config_epoch = max(node.config_epoch, epoch)
+            node.pong_received = int(time.time() * 1000)
+            node.link_state = "connected"
+            self.current_epoch = max(self.current_epoch, epoch)
+            for slot in parse_slot_ranges(fields[8:]):
+                owner = self.slots[slot]
+                if owner is node or slot in self.importing:
+                    continue
+                if owner is None or owner.config_epoch < node.config_epoch:
+                    self.slots[slot] = node
+                    self.migrating.pop(slot, None)
+            return node if is_new else None
+
+    def hello(self, host, port):
+        """Exchange node lines with the node at host:port. Returns nodes learnt from its reply."""
+        request = encode_array(["CLUSTER", "HELLO", self.describe_myself()])
+        with socket.create_connection((host, port), timeout=GOSSIP_TIMEOUT) as sock:
+            sock.sendall(request)
+            reply = read_reply(sock.makefile("rb"))
+        if isinstance(reply, ReplyError):
+            raise reply
+        learnt = []
+        for line in reply.decode().splitlines():
+            node = self.apply_node_line(line, authoritative="myself" in line.split()[2])
+            if node is not None:
+                learnt.append(node)
+        return learnt
+
+    def describe_myself(self):
+        with self.lock:
+            return self.node_line(self.myself)
+
+    def gossip(self, nodes):
+        """Say hello to nodes, following up with every node they tell us about."""
+        pending = list(nodes)
+        seen = {node.node_id for node in pending}
+        while pending:
+            node = pending.pop()
+            try:
+                learnt = self.hello(node.host, node.port)
+            except (OSError, ReplyError, ValueError):
+                node.link_state = "disconnected"
+                continue
+            for new_node in learnt:
+                if new_node.node_id not in seen:
+                    seen.add(new_node.node_id)
+                    pending.append(new_node)
+
+    def meet(self, host, port):
+        learnt = self.hello(host, port)
+        self.gossip(learnt)
+
+    def peers(self):
+        with self.lock:
+            return [node for node in self.nodes.values() if node is not self.myself]
+
+    def broadcast(self):
+        """
+        Gossip this node's view to its peers in the background. Calls made while
+        a round is running fold into a single round after it, so a burst of
+        SETSLOTs costs one or two rounds rather than a thread each.
+        """
+        with self.lock:
+            self.broadcast_pending = True
+            if self.broadcasting:
+                return
+            self.broadcasting = True
+        threading.Thread(target=self._broadcast_rounds, daemon=True).start()
+
+    def _broadcast_rounds(self):
+        while True:
+            with self.lock:
+                if not self.broadcast_pending:
+                    self.broadcasting = False
+                    return
+                self.broadcast_pending = False
+            self.gossip(self.peers())
+
+    def gossip_loop(self):
+        while True:
+            time.sleep(GOSSIP_INTERVAL)
+            self.gossip(self.peers())
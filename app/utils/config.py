@@ -0,0 +1,309 @@
+import os
+import shlex
+
+from app.utils.eviction import EVICTION_POLICIES
+from app.utils.logger import LOG_LEVELS
+from app.utils.memory import parse_memory
+
+INT64_MAX = (1 << 63) - 1
+CLIENT_CLASSES = ("normal", "replica", "pubsub")
+REWRITE_SIGNATURE = "# Generated by CONFIG REWRITE"
+NO_EFFECT = "accepted for compatibility, has no effect: this server has no RDB writer or append-only file"
+
+
+def bounded_int(low, high=INT64_MAX):
+    def parse(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError("argument couldn't be parsed into an integer") from None
+        if not low <= number <= high:
+            raise ValueError(f"argument must be between {low} and {high} inclusive")
+        return number
+    return parse
+
+
+def power_of_two(value):
+    number = bounded_int(1, 1024)(value)
+    if number & (number - 1):
+        raise ValueError("argument must be a power of two")
+    return number
+
+
+def memory_at_least(low):
+    def parse(value):
+        number = parse_memory(value)
+        if number < low:
+            raise ValueError(f"argument must be at least {low}")
+        return number
+    return parse
+
+
+def one_of(*choices):
+    def parse(value):
+        value = value.lower()
+        if value not in choices:
+            raise ValueError(f"argument(s) must be one of the following: {', '.join(choices)}")
+        return value
+    return parse
+
+
+def yes_no(value):
+    value = value.lower()
+    if value not in ("yes", "no"):
+        raise ValueError("argument must be 'yes' or 'no'")
+    return value == "yes"
+
+
+def render_yes_no(value):
+    return "yes" if value else "no"
+
+
+def parse_save(value):
+    """`3600 1 300 100` -> [(3600, 1), (300, 100)]: snapshot after N seconds if M keys changed; "" disables."""
+    numbers = value.split()
+    if len(numbers) % 2 or not all(number.isdigit() for number in numbers):
+        raise ValueError("Invalid save parameters")
+    return [(int(numbers[i]), int(numbers[i + 1])) for i in range(0, len(numbers), 2)]
+
+
+def render_save(value):
+    return " ".join(f"{seconds} {changes}" for seconds, changes in value)
+
+
+def parse_output_buffer_limit(value):
+    """`<class> <hard> <soft> <soft seconds>` groups -> {class: (hard, soft, seconds)}, 0 meaning no limit."""
+    words = value.split()
+    if not words or len(words) % 4:
+        raise ValueError("Wrong number of arguments in buffer limit configuration.")
+    limits = {}
+    for i in range(0, len(words), 4):
+        client_class = "replica" if words[i].lower() == "slave" else words[i].lower()
+        if client_class not in CLIENT_CLASSES:
+            raise ValueError("Invalid client class specified in buffer limit configuration.")
+        try:
+            hard, soft = parse_memory(words[i + 1]), parse_memory(words[i + 2])
+            seconds = int(words[i + 3])
+        except ValueError:
+            raise ValueError("Error in hard, soft or soft_seconds setting in buffer limit configuration.") from None
+        limits[client_class] = (hard, soft, seconds)
+    return limits
+
+
+def render_output_buffer_limit(value):
+    return " ".join(f"{client_class} {hard} {soft} {seconds}" for client_class, (hard, soft, seconds) in value.items())
+
+
+def quote(text):
+    """Quote a string value for redis.conf when it is empty or has spaces or quotes in it."""
+    if text and not any(char in text for char in " \t\"'\\#"):
+        return text
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class ConfigParam:
+    """
+    One configuration parameter: how to parse its redis.conf / CONFIG SET
+    text and render it back, its default, and whether CONFIG SET may change
+    it at runtime. `repeatable` directives (save, client-output-buffer-limit)
+    accumulate over several lines of a config file. `no_effect` parameters
+    are only accepted so redis.conf files and clients that set them keep
+    working; nothing reads them.
+    """
+
+    __slots__ = ("parse", "default", "help", "mutable", "render", "repeatable", "no_effect")
+
+    def __init__(self, parse, default, help_text, mutable=True, render=str, repeatable=False, no_effect=False):
+        self.parse = parse
+        self.default = default
+        self.help = f"{help_text}; {NO_EFFECT}" if no_effect else help_text
+        self.mutable = mutable
+        self.render = render
+        self.repeatable = repeatable
+        self.no_effect = no_effect
+
+
+CONFIG_PARAMS = {
+    "port": ConfigParam(bounded_int(0, 65535), "6379", "Port to listen on", mutable=False),
+    "replicaof": ConfigParam(str, "", "Replication source in host port format", mutable=False),
+    "dir": ConfigParam(str, "", "Directory for persistence files"),
+    "dbfilename": ConfigParam(str, "", "RDB filename"),
+    "rdb-load-workers": ConfigParam(bounded_int(1, 256), "1",
+                                    "Processes decoding an RDB file of 8mb or more in parallel at startup",
+                                    mutable=False),
+    "save": ConfigParam(parse_save, "3600 1 300 100 60 10000", "Snapshot points as <seconds> <changes> pairs",
+                        render=render_save, repeatable=True, no_effect=True),
+    "appendonly": ConfigParam(yes_no, "no", "Keep an append-only file", render=render_yes_no, no_effect=True),
+    "appendfsync": ConfigParam(one_of("always", "everysec", "no"), "everysec", "When to fsync the append-only file",
+                               no_effect=True),
+    "maxmemory": ConfigParam(parse_memory, "0", "Memory limit for the dataset, e.g. 100mb"),
+    "maxmemory-policy": ConfigParam(one_of(*EVICTION_POLICIES), "noeviction", "Eviction policy"),
+    "maxmemory-samples": ConfigParam(bounded_int(1, 64), "5", "Keys sampled per eviction round"),
+    "lazyfree-lazy-eviction": ConfigParam(yes_no, "no", "Free evicted keys' values in the background",
+                                          render=render_yes_no),
+    "lazyfree-lazy-expire": ConfigParam(yes_no, "no", "Free expired keys' values in the background",
+                                        render=render_yes_no),
+    "lazyfree-lazy-user-del": ConfigParam(yes_no, "no", "Make DEL free values in the background like UNLINK",
+                                          render=render_yes_no),
+    "lazyfree-lazy-user-flush": ConfigParam(yes_no, "no", "Make FLUSHALL / FLUSHDB without a mode ASYNC",
+                                            render=render_yes_no),
+    "hash-max-listpack-entries": ConfigParam(bounded_int(0), "128",
+                                             "Most fields a hash keeps in the compact listpack encoding"),
+    "hash-max-listpack-value": ConfigParam(bounded_int(0), "64",
+                                           "Longest field or value, in bytes, a listpack-encoded hash may hold"),
+    "set-max-intset-entries": ConfigParam(bounded_int(0), "512",
+                                          "Most members a set of integers keeps in the intset encoding"),
+    "set-max-listpack-entries": ConfigParam(bounded_int(0), "128",
+                                            "Most members a set keeps in the compact listpack encoding"),
+    "set-max-listpack-value": ConfigParam(bounded_int(0), "64",
+                                          "Longest member, in bytes, a listpack-encoded set may hold"),
+    "stream-node-max-bytes": ConfigParam(parse_memory, "4096",
+                                         "Bytes of entries a stream block holds before a new one is started (0: any)"),
+    "stream-node-max-entries": ConfigParam(bounded_int(0), "100", "Most entries a stream block holds (0: any)"),
+    "hll-sparse-max-bytes": ConfigParam(bounded_int(0), "3000",
+                                        "Largest sparse HyperLogLog, in bytes, before it is converted to dense"),
+    "hz": ConfigParam(bounded_int(1, 500), "10", "Background task (active expiry) runs per second"),
+    "active-expire-effort": ConfigParam(bounded_int(1, 10), "1",
+                                        "Work spent reclaiming expired keys in the background, 1 to 10"),
+    "client-output-buffer-limit": ConfigParam(
+        parse_output_buffer_limit, "normal 0 0 0 replica 256mb 64mb 60 pubsub 32mb 8mb 60",
+        "Per client class <class> <hard> <soft> <soft seconds> reply buffer limits (io-threads mode)",
+        render=render_output_buffer_limit, repeatable=True),
+    "client-query-buffer-limit": ConfigParam(memory_at_least(1024 * 1024), "1gb",
+                                             "Pending input, in bytes, at which a client is disconnected"),
+    "proto-max-bulk-len": ConfigParam(memory_at_least(1024 * 1024), "512mb",
+                                      "Longest bulk argument, in bytes, a client may send"),
+    "tracking-table-max-keys": ConfigParam(bounded_int(0), "1000000",
+                                           "Keys remembered for client-side caching before the oldest are "
+                                           "invalidated (0: any)"),
+    "cluster-enabled": ConfigParam(yes_no, "no", "Run as a hash-slot cluster node", mutable=False,
+                                   render=render_yes_no),
+    "cluster-announce-ip": ConfigParam(str, "127.0.0.1", "Address this node advertises to clients and other nodes",
+                                       mutable=False),
+    "io-threads": ConfigParam(bounded_int(1, 128), "1",
+                              "I/O threads reading and writing sockets around a single command executor",
+                              mutable=False),
+    "lock-stripes": ConfigParam(power_of_two, "16", "Lock stripes per data type (a power of two)", mutable=False),
+    "lock-shared-reads": ConfigParam(yes_no, "no",
+                                     "Reader-writer stripes so reads share them; only faster on a free-threaded build",
+                                     mutable=False, render=render_yes_no),
+    "slowlog-log-slower-than": ConfigParam(bounded_int(-1), "10000",
+                                           "Log commands running at least this many microseconds (-1 disables)"),
+    "slowlog-max-len": ConfigParam(bounded_int(0), "128", "Entries kept in the slow log"),
+    "latency-monitor-threshold": ConfigParam(bounded_int(0), "0",
+                                             "Record latency events of at least this many milliseconds (0 disables)"),
+    "loglevel": ConfigParam(one_of(*LOG_LEVELS), "notice", "Log verbosity"),
+    "logfile": ConfigParam(str, "", "Log file; empty logs to stdout", mutable=False),
+}
+
+
+def parse_value(name, text, current=None):
+    """Parse `text` for parameter `name`; dict values (buffer limits) only replace the classes given."""
+    value = CONFIG_PARAMS[name].parse(text)
+    if isinstance(value, dict) and current:
+        value = {**current, **value}
+    return value
+
+
+def render_value(name, value):
+    return CONFIG_PARAMS[name].render(value)
+
+
+def is_default(name, value):
+    return render_value(name, value) == render_value(name, parse_value(name, CONFIG_PARAMS[name].default))
+
+
+def without_effect(config):
+    """Parameters set away from their default that the server accepts but ignores, to warn about."""
+    return [name for name, value in config.items() if CONFIG_PARAMS[name].no_effect and not is_default(name, value)]
+
+
+def read_config_file(path):
+    """
+    Directives of a redis.conf style file as {name: text}. Blank lines and
+    # comments are skipped, arguments may be quoted, and a later line for
+    the same directive wins unless the parameter is repeatable.
+    """
+    directives = {}
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                words = shlex.split(line)
+            except ValueError:
+                raise ValueError(f"Unbalanced quotes in configuration line {number}") from None
+            name = words[0].lower()
+            param = CONFIG_PARAMS.get(name)
+            if param is None or len(words) < 2:
+                raise ValueError(f"Bad directive or wrong number of arguments at line {number}: '{line}'")
+            text = " ".join(words[1:])
+            if param.repeatable and name in directives:
+                text = f"{directives[name]} {text}"
+            directives[name] = text
+    return directives
+
+
+def load_config(path=None, overrides=None):
+    """Every parameter's parsed value: defaults, then the file at `path`, then `overrides` from the command line."""
+    config = {name: param.parse(param.default) for name, param in CONFIG_PARAMS.items()}
+    directives = read_config_file(path) if path else {}
+    directives.update(overrides or {})
+    for name, text in directives.items():
+        try:
+            config[name] = parse_value(name, text, config[name])
+        except ValueError as e:
+            raise ValueError(f"Invalid argument for '{name}': {e}") from None
+    return config
+
+
+def rewrite_config_file(path, config):
+    """
+    Rewrite `path` in place for CONFIG REWRITE: each directive's first line
+    gets the current value and its repeats are dropped, comments and layout
+    are kept, and parameters the file didn't mention are appended only when
+    they differ from their default. Parameters without effect get a comment
+    line above them saying so. Written to a temporary file and renamed
+    over the original, so a crash never leaves half a config behind.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    output, seen = [], set()
+    for line in lines:
+        stripped = line.strip()
+        name = stripped.split(None, 1)[0].lower() if stripped and not stripped.startswith("#") else None
+        if name not in CONFIG_PARAMS:
+            output.append(line)
+        elif name not in seen:
+            seen.add(name)
+            directive = _config_lines(name, config[name])
+            if output and output[-1].strip() == directive[0]:
+                del directive[0]  # Marked by an earlier rewrite
+            output += directive
+    added = [line for name, value in config.items() if name not in seen and not is_default(name, value)
+             for line in _config_lines(name, value)]
+    if added:
+        if REWRITE_SIGNATURE not in output:
+            output.append(REWRITE_SIGNATURE)
+        output += added
+    temp = f"{path}.tmp-{os.getpid()}"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write("\n".join(output) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def _no_effect_comment(name):
+    return f"# {name}: {NO_EFFECT}"
+
+
+def _config_lines(name, value):
+    """A directive's line, after the comment marking it as without effect if it is one."""
+    text = render_value(name, value)
+    line = f"{name} {quote(text) if CONFIG_PARAMS[name].parse is str or not text else text}"
+    return [_no_effect_comment(name), line] if CONFIG_PARAMS[name].no_effect else [line]
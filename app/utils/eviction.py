@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+
+LRU_CLOCK_MAX = (1 << 24) - 1
+LFU_INIT_VAL = 5
+LFU_LOG_FACTOR = 10
+LFU_DECAY_TIME = 1  # minutes per counter decrement
+LFU_MINUTES_MAX = (1 << 16) - 1
+
+
+def lru_clock() -> int:
+    """24-bit seconds clock, the same width Redis packs into every object header."""
+    return int(time.time()) & LRU_CLOCK_MAX
+
+
+def idle_seconds(clock: int) -> int:
+    return (lru_clock() - clock) & LRU_CLOCK_MAX
+
+
+def lfu_minutes() -> int:
+    return int(time.time() // 60) & LFU_MINUTES_MAX
+
+
+def lfu_decayed_counter(value: int) -> int:
+    """Counter after applying one decrement per LFU_DECAY_TIME minutes since the last access."""
+    last_minutes, counter = value >> 8, value & 0xFF
+    elapsed = (lfu_minutes() - last_minutes) & LFU_MINUTES_MAX
+    return max(0, counter - elapsed // LFU_DECAY_TIME)
+
+
+def lfu_touch(value) -> int:
+    """
+    Morris-style logarithmic counter: the chance of incrementing shrinks as the
+    counter grows, so 8 bits cover millions of hits. Packed as
+    (minutes << 8) | counter like the 24-bit LFU field in Redis.
+    """
+    if value is None:
+        counter = LFU_INIT_VAL
+    else:
+        counter = lfu_decayed_counter(value)
+        if counter < 255:
+            base = max(0, counter - LFU_INIT_VAL)
+            if random.random() < 1.0 / (base * LFU_LOG_FACTOR + 1):
+                counter += 1
+    return (lfu_minutes() << 8) | counter
+
+
+EVICTION_POLICIES = ("noeviction", "allkeys-lru", "allkeys-lfu", "allkeys-random",
+                     "volatile-lru", "volatile-lfu", "volatile-random", "volatile-ttl")
+EVPOOL_SIZE = 16
+
+
+class Evictor:
+    """
+    Approximated LRU/LFU/TTL eviction in the style of Redis: instead of a
+    global ordering, each round samples a few keys per store, merges them
+    into a small pool of the best candidates seen so far and evicts the best
+    one. The pool carries good candidates across rounds, which keeps the
+    approximation close to true LRU at a fraction of the cost.
+    """
+
+    def __init__(self, stores, volatile_store, maxmemory=0, policy="noeviction", samples=5):
+        self.stores = stores
+        self.volatile_store = volatile_store
+        self.maxmemory = maxmemory
+        self.samples = samples
+        self.policy = "noeviction"
+        self.pool = []
+        self.evicted_keys = 0
+        self.lock = threading.Lock()
+        self.latency_monitor = None  # Set by the server to report eviction-cycle/eviction-del spikes
+        self.lazy = False  # lazyfree-lazy-eviction
+        self.set_policy(policy)
+
+    def set_policy(self, policy):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"invalid maxmemory-policy '{policy}'")
+        self.policy = policy
+        self.pool = []
+        for store in self.stores:
+            store.lfu = policy.endswith("-lfu")
+
+    def used_memory(self):
+        return sum(store.used_memory for store in self.stores)
+
+    def over_limit(self):
+        return 0 < self.maxmemory < self.used_memory()
+
+    def _score(self, value):
+        if self.policy.endswith("-lru"):
+            return idle_seconds(value)
+        if self.policy.endswith("-lfu"):
+            return 255 - lfu_decayed_counter(value)
+        return -value  # volatile-ttl: the sooner the deadline, the better the candidate
+
+    def _candidates(self):
+        if self.policy == "volatile-ttl":
+            return [(self.volatile_store, key, deadline) for key, deadline in
+                    self.volatile_store.sample_volatile(self.samples)]
+        if self.policy.startswith("volatile-"):
+            store = self.volatile_store
+            keys = [key for key, _ in store.sample_volatile(self.samples)]
+            return [(store, key, store.access_value(key) or 0) for key in keys]
+        return [(store, key, value) for store in self.stores for key, value in store.sample(self.samples)]
+
+    def _pick_random(self):
+        if self.policy == "volatile-random":
+            sampled = self.volatile_store.sample_volatile(1)
+            return (self.volatile_store, sampled[0][0]) if sampled else None
+        stores = [store for store in self.stores if store.data]
+        if not stores:
+            return None
+        store = random.choice(stores)
+        sampled = store.sample(1)
+        return (store, sampled[0][0]) if sampled else None
+
+    def _pick_from_pool(self):
+        for store, key, value in self._candidates():
+            self.pool.append((self._score(value), id(store), key, store))
+        # Keep only the best EVPOOL_SIZE candidates, one entry per key
+        best = {}
+        for entry in sorted(self.pool, key=lambda entry: entry[0]):
+            best[(entry[1], entry[2])] = entry
+        self.pool = sorted(best.values(), key=lambda entry: entry[0])[-EVPOOL_SIZE:]
+        while self.pool:
+            _, _, key, store = self.pool.pop()
+            if store.exists(key):
+                return store, key
+        return None
+
+    def free_memory(self, on_evict=None):
+        """Evict until under maxmemory. Returns False if the limit can't be met."""
+        if not self.over_limit():
+            return True
+        if self.policy == "noeviction":
+            return False
+        with self.lock:
+            start = time.perf_counter_ns()
+            try:
+                while self.over_limit():
+                    if self.policy.endswith("-random"):
+                        victim = self._pick_random()
+                    else:
+                        victim = self._pick_from_pool()
+                    if victim is None:
+                        return False
+                    store, key = victim
+                    delete_start = time.perf_counter_ns()
+                    if store.delete_many([key], self.lazy):
+                        self.evicted_keys += 1
+                        if on_evict:
+                            on_evict(key)
+                    self._observe("eviction-del", delete_start)
+            finally:
+                self._observe("eviction-cycle", start)
+        return True
+
+    def _observe(self, event, start):
+        if self.latency_monitor is not None:
+            self.latency_monitor.observe(event, (time.perf_counter_ns() - start) // 1000)
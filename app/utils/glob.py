@@ -0,0 +1,71 @@
+import functools
+import re
+
+
+def _translate_class(pattern, i):
+    """Translate a [...] class starting after the '['; returns (regex, next_index) or None if unclosed."""
+    n = len(pattern)
+    negate = i < n and pattern[i] == "^"
+    if negate:
+        i += 1
+    parts = []
+    while i < n and pattern[i] != "]":
+        char = pattern[i]
+        if char == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        elif i + 2 < n and pattern[i + 1] == "-" and pattern[i + 2] != "]":
+            low, high = sorted((char, pattern[i + 2]))
+            parts.append(f"{re.escape(low)}-{re.escape(high)}")
+            i += 3
+        else:
+            parts.append(re.escape(char))
+            i += 1
+    if i >= n:
+        return None
+    body = "".join(parts)
+    if not body:
+        return ("." if negate else "(?!)"), i + 1
+    return f"[{'^' if negate else ''}{body}]", i + 1
+
+
+@functools.lru_cache(maxsize=256)
+def compile_pattern(pattern):
+    """
+    Compile a Redis glob pattern (*, ?, [abc], [^a-z], \\x escapes) into a
+    matcher function. Results are cached so repeated SCAN calls with the same
+    MATCH argument only pay for the translation once. Byte patterns produce
+    byte matchers; they are translated through latin-1 so every byte maps to
+    exactly one character.
+    """
+    if isinstance(pattern, bytes):
+        return re.compile(_translate(pattern.decode("latin-1")).encode("latin-1"), re.DOTALL).fullmatch
+    return re.compile(_translate(pattern), re.DOTALL).fullmatch
+
+
+def _translate(pattern):
+    regex = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == "*":
+            while i + 1 < n and pattern[i + 1] == "*":
+                i += 1
+            regex.append(".*")
+        elif char == "?":
+            regex.append(".")
+        elif char == "[":
+            translated = _translate_class(pattern, i + 1)
+            if translated is None:
+                regex.append(re.escape(char))
+            else:
+                regex.append(translated[0])
+                i = translated[1]
+                continue
+        elif char == "\\" and i + 1 < n:
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        else:
+            regex.append(re.escape(char))
+        i += 1
+    return "".join(regex)
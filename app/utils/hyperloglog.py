@@ -0,0 +1,279 @@
+"""
+HyperLogLog cardinality estimation in Redis' own string format, so an HLL
+is an ordinary string value that GET, SET, RDB files and replication carry
+unchanged, and values are interchangeable with real Redis.
+
+Layout: "HYLL", an encoding byte (0 dense, 1 sparse), three unused bytes
+and an 8-byte little-endian cached cardinality whose top bit marks it
+stale, then the registers. Dense packs 16384 6-bit registers into 12 KB;
+sparse run-length encodes them, which keeps small counts to a few bytes.
+
+Registers are worked on as a bytes object of one byte per register. Viewed
+as one big integer it holds 16384 8-bit lanes, so the register-wise max of
+PFMERGE / multi-key PFCOUNT and the dense (un)packing are a handful of
+big-integer operations instead of a Python loop per register.
+"""
+import math
+import re
+import struct
+
+HLL_MAGIC = b"HYLL"
+HLL_DENSE = 0
+HLL_SPARSE = 1
+HLL_P = 14
+HLL_Q = 64 - HLL_P
+HLL_REGISTERS = 1 << HLL_P
+HLL_REGISTER_MASK = HLL_REGISTERS - 1
+HLL_HEADER_SIZE = 16
+HLL_DENSE_SIZE = HLL_HEADER_SIZE + HLL_REGISTERS * 6 // 8
+HLL_SPARSE_VAL_MAX_VALUE = 32
+HLL_SPARSE_MAX_BYTES = 3000
+HLL_ALPHA_INF = 0.721347520444481703680
+HLL_STALE = 0x80  # top bit of the last cached cardinality byte
+HASH_SEED = 0xADC83B19
+
+MASK64 = (1 << 64) - 1
+MURMUR_M = 0xC6A4A7935BD1E995
+MURMUR_R = 47
+
+
+def _lanes(pattern):
+    """`pattern`, a 32-bit mask, repeated over every group of four register lanes."""
+    return int.from_bytes(struct.pack("<I", pattern) * (HLL_REGISTERS // 4), "little")
+
+
+LANE_HIGH_BITS = int.from_bytes(b"\x80" * HLL_REGISTERS, "little")
+LANE_ALL_BITS = (1 << (HLL_REGISTERS * 8)) - 1
+PACK_PAIRS = (_lanes(0x003F003F), _lanes(0x3F003F00))
+PACK_HALVES = (_lanes(0x00000FFF), _lanes(0x0FFF0000))
+UNPACK_HALVES = (_lanes(0x00000FFF), _lanes(0x00FFF000))
+UNPACK_PAIRS = (_lanes(0x003F003F), _lanes(0x0FC00FC0))
+RUN = re.compile(rb"(.)\1*", re.S)
+
+
+class InvalidHLLError(ValueError):
+    """The value is not an HLL string, or is a corrupt one."""
+
+
+def murmurhash64a(data, seed=HASH_SEED):
+    """MurmurHash64A as Redis uses it for HLL, so registers match those Redis computes."""
+    length = len(data)
+    h = (seed ^ (length * MURMUR_M)) & MASK64
+    blocks = length - length % 8
+    for (k,) in struct.iter_unpack("<Q", data[:blocks]):
+        k = (k * MURMUR_M) & MASK64
+        k ^= k >> MURMUR_R
+        k = (k * MURMUR_M) & MASK64
+        h = ((h ^ k) * MURMUR_M) & MASK64
+    if blocks != length:
+        h = ((h ^ int.from_bytes(data[blocks:], "little")) * MURMUR_M) & MASK64
+    h ^= h >> MURMUR_R
+    h = (h * MURMUR_M) & MASK64
+    return h ^ (h >> MURMUR_R)
+
+
+def pattern_length(element):
+    """(register index, run of zeros + 1) for an element, as hllPatLen computes them."""
+    h = murmurhash64a(element)
+    index = h & HLL_REGISTER_MASK
+    h = (h >> HLL_P) | (1 << HLL_Q)
+    return index, (h & -h).bit_length()
+
+
+def is_hll(value):
+    return isinstance(value, (bytes, bytearray)) and len(value) >= HLL_HEADER_SIZE and value[:4] == HLL_MAGIC
+
+
+def _header(hll_encoding):
+    return HLL_MAGIC + bytes((hll_encoding, 0, 0, 0)) + bytes(7) + bytes((HLL_STALE,))
+
+
+def empty_hll():
+    """A new sparse HLL: a single XZERO opcode covering all registers."""
+    return _header(HLL_SPARSE) + (0x4000 | (HLL_REGISTERS - 1)).to_bytes(2, "big")
+
+
+def encoding(value):
+    return value[4]
+
+
+def cached_cardinality(value):
+    """The cached count, or None when a write made it stale."""
+    if value[15] & HLL_STALE:
+        return None
+    return int.from_bytes(value[8:16], "little")
+
+
+def with_cardinality(value, count):
+    return value[:8] + count.to_bytes(8, "little") + value[16:]
+
+
+def _unpack_dense(payload):
+    """12288 bytes of packed 6-bit registers -> 16384 bytes, one per register."""
+    if len(payload) != HLL_DENSE_SIZE - HLL_HEADER_SIZE:
+        raise InvalidHLLError("Corrupted HLL object detected")
+    # Each 3 packed bytes hold 4 registers; give every group its own 32-bit lane first
+    lanes = bytearray(HLL_REGISTERS)
+    for i in range(3):
+        lanes[i::4] = payload[i::3]
+    v = int.from_bytes(lanes, "little")
+    low, high = UNPACK_HALVES
+    x = (v & low) | ((v & high) << 4)
+    low, high = UNPACK_PAIRS
+    x = (x & low) | ((x & high) << 2)
+    return x.to_bytes(HLL_REGISTERS, "little")
+
+
+def _pack_dense(registers):
+    v = int.from_bytes(registers, "little")
+    low, high = PACK_PAIRS
+    x = (v & low) | ((v & high) >> 2)
+    low, high = PACK_HALVES
+    x = (x & low) | ((x & high) >> 4)
+    lanes = x.to_bytes(HLL_REGISTERS, "little")
+    payload = bytearray(HLL_DENSE_SIZE - HLL_HEADER_SIZE)
+    for i in range(3):
+        payload[i::3] = lanes[i::4]
+    return bytes(payload)
+
+
+def _decode_sparse(payload):
+    runs = []
+    total = 0
+    pos, size = 0, len(payload)
+    while pos < size:
+        op = payload[pos]
+        if op & 0x80:  # VAL: 1vvvvvxx
+            length = (op & 0x03) + 1
+            runs.append(bytes((((op >> 2) & 0x1F) + 1,)) * length)
+            pos += 1
+        elif op & 0x40:  # XZERO: 01xxxxxx yyyyyyyy
+            if pos + 1 >= size:
+                raise InvalidHLLError("Corrupted HLL object detected")
+            length = (((op & 0x3F) << 8) | payload[pos + 1]) + 1
+            runs.append(bytes(length))
+            pos += 2
+        else:  # ZERO: 00xxxxxx
+            length = (op & 0x3F) + 1
+            runs.append(bytes(length))
+            pos += 1
+        total += length
+    if total != HLL_REGISTERS:
+        raise InvalidHLLError("Corrupted HLL object detected")
+    return b"".join(runs)
+
+
+def _encode_sparse(registers):
+    out = bytearray()
+    for run in RUN.finditer(registers):
+        value, length = registers[run.start()], run.end() - run.start()
+        if value == 0:
+            while length > 64:
+                chunk = min(length, 0x4000)
+                out += (0x4000 | (chunk - 1)).to_bytes(2, "big")
+                length -= chunk
+            if length:
+                out.append(length - 1)
+            continue
+        if value > HLL_SPARSE_VAL_MAX_VALUE:
+            return None
+        op = 0x80 | ((value - 1) << 2)
+        while length:
+            chunk = min(length, 4)
+            out.append(op | (chunk - 1))
+            length -= chunk
+    return bytes(out)
+
+
+def registers(value):
+    """The 16384 registers of an HLL string as bytes, one per register."""
+    if not is_hll(value):
+        raise InvalidHLLError("Key is not a valid HyperLogLog string value.")
+    if encoding(value) == HLL_DENSE:
+        return _unpack_dense(value[HLL_HEADER_SIZE:])
+    if encoding(value) == HLL_SPARSE:
+        return _decode_sparse(value[HLL_HEADER_SIZE:])
+    raise InvalidHLLError("Key is not a valid HyperLogLog string value.")
+
+
+def encode(regs, sparse=True, sparse_max_bytes=HLL_SPARSE_MAX_BYTES):
+    """
+    An HLL string for `regs` with a stale cache: sparse if asked for and the
+    registers allow it (every value fits a VAL opcode and the encoding stays
+    within sparse_max_bytes), dense otherwise.
+    """
+    if sparse:
+        payload = _encode_sparse(regs)
+        if payload is not None and len(payload) <= sparse_max_bytes:
+            return _header(HLL_SPARSE) + payload
+    return _header(HLL_DENSE) + _pack_dense(regs)
+
+
+def add(value, elements, sparse_max_bytes=HLL_SPARSE_MAX_BYTES):
+    """PFADD: the updated HLL string, or None if no register changed."""
+    regs = bytearray(registers(value))
+    changed = False
+    for element in elements:
+        index, count = pattern_length(element)
+        if count > regs[index]:
+            regs[index] = count
+            changed = True
+    if not changed:
+        return None
+    return encode(bytes(regs), encoding(value) == HLL_SPARSE, sparse_max_bytes)
+
+
+def merge(all_registers):
+    """Register-wise max of several register sets, eight bits per lane across the whole set at once."""
+    result = None
+    for regs in all_registers:
+        b = int.from_bytes(regs, "little")
+        if result is None:
+            result = b
+            continue
+        # A lane's high bit survives the subtraction exactly where result >= b; registers are below 64
+        keep = (((result | LANE_HIGH_BITS) - b) & LANE_HIGH_BITS) >> 7
+        keep *= 0xFF
+        result = (result & keep) | (b & (keep ^ LANE_ALL_BITS))
+    return bytes(HLL_REGISTERS) if result is None else result.to_bytes(HLL_REGISTERS, "little")
+
+
+def _sigma(x):
+    if x == 1.0:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if previous == z:
+            return z
+
+
+def _tau(x):
+    if x in (0.0, 1.0):
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if previous == z:
+            return z / 3
+
+
+def estimate(regs):
+    """Cardinality from the register histogram, with the improved estimator Redis uses (Ertl, 2017)."""
+    m = HLL_REGISTERS
+    histogram = [0] * (HLL_Q + 2)
+    # Only a dozen or so distinct values occur, so count just those
+    for v in set(regs):
+        histogram[v] = regs.count(v)
+    z = m * _tau((m - histogram[HLL_Q + 1]) / m)
+    for j in range(HLL_Q, 0, -1):
+        z += histogram[j]
+        z *= 0.5
+    z += m * _sigma(histogram[0] / m)
+    return round(HLL_ALPHA_INF * m * m / z)
@@ -0,0 +1,70 @@
+import bisect
+import sys
+from array import array
+
+# Element widths an IntSet moves through as wider integers arrive, like Redis' INTSET_ENC_INT16/32/64
+INTSET_TYPECODES = ("h", "i", "q")
+EMPTY_INTSET = sys.getsizeof(array("h"))
+
+
+def typecode_for(n):
+    for typecode in INTSET_TYPECODES:
+        bits = array(typecode).itemsize * 8
+        if -(1 << (bits - 1)) <= n < 1 << (bits - 1):
+            return typecode
+    raise OverflowError(f"{n} does not fit in 64 bits")
+
+
+class IntSet:
+    """
+    A set of 64-bit integers kept sorted in a packed array, in the spirit of
+    Redis' intset: two to eight bytes per member and no object per member,
+    with membership by binary search. The array starts at 16-bit elements and
+    is upgraded to 32 or 64 bits when a member needs it; it never narrows.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, integers=()):
+        integers = sorted(set(integers))
+        typecode = INTSET_TYPECODES[0]
+        if integers:
+            typecode = max(typecode_for(integers[0]), typecode_for(integers[-1]), key=INTSET_TYPECODES.index)
+        self.values = array(typecode, integers)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __contains__(self, n):
+        values = self.values
+        i = bisect.bisect_left(values, n)
+        return i < len(values) and values[i] == n
+
+    @property
+    def nbytes(self):
+        return EMPTY_INTSET + len(self.values) * self.values.itemsize
+
+    def add(self, n):
+        values = self.values
+        i = bisect.bisect_left(values, n)
+        if i < len(values) and values[i] == n:
+            return False
+        typecode = typecode_for(n)
+        if INTSET_TYPECODES.index(typecode) > INTSET_TYPECODES.index(values.typecode):
+            values = self.values = array(typecode, values)
+        values.insert(i, n)
+        return True
+
+    def remove(self, n):
+        values = self.values
+        i = bisect.bisect_left(values, n)
+        if i < len(values) and values[i] == n:
+            del values[i]
+            return True
+        return False
@@ -0,0 +1,92 @@
+"""
+Background freeing of deleted values, after Redis's lazyfree.c.
+
+Dropping the last reference to a list or hash of a million elements frees
+every element in one deallocation call, under the store lock of whatever
+command did it. UNLINK, FLUSHALL ASYNC and the lazyfree-lazy-* settings
+instead detach the value from the keyspace and queue it here. A background
+thread takes it apart FREE_STEP elements at a time. Each step is a short
+piece of work, so the interpreter can switch to client threads between
+steps rather than stalling them all until the last element is gone.
+
+Values of LAZYFREE_THRESHOLD elements or fewer are not worth a hand-off and
+are freed on the spot, as in Redis.
+"""
+import queue
+import threading
+
+LAZYFREE_THRESHOLD = 64
+FREE_STEP = 1024
+
+
+def _parts(value):
+    """The attributes of an object value (a sorted set's members and scores, a stream's blocks)."""
+    if hasattr(value, "__dict__"):
+        return list(vars(value).values())
+    return [getattr(value, name, None) for name in getattr(type(value), "__slots__", ())]
+
+
+def release(value):
+    """Empty value, and the containers it holds as attributes or tuple items, FREE_STEP elements at a time."""
+    if isinstance(value, list):
+        while value:
+            del value[-FREE_STEP:]
+    elif isinstance(value, dict):
+        while value:
+            for _ in range(min(FREE_STEP, len(value))):
+                dict.popitem(value)  # Past any subclass bookkeeping: the buckets of a ScanDict go with its attributes
+    elif isinstance(value, set):
+        while value:
+            for _ in range(min(FREE_STEP, len(value))):
+                value.pop()
+    elif isinstance(value, tuple):
+        for part in value:
+            release(part)
+        return
+    for part in _parts(value):
+        release(part)
+
+
+class LazyFree(threading.Thread):
+    """
+    The thread values are handed to for freeing. `pending_objects` and
+    `freed_objects` back INFO's lazyfree_pending_objects and
+    lazyfreed_objects.
+    """
+
+    def __init__(self):
+        super().__init__(name="lazyfree", daemon=True)
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.pending_objects = 0
+        self.freed_objects = 0
+
+    def free(self, value):
+        with self.lock:
+            self.pending_objects += 1
+        self.queue.put((value, False))
+
+    def free_values(self, mapping):
+        """Free every value of a keyspace dict taken out by FLUSHALL ASYNC, each counted as one object."""
+        with self.lock:
+            self.pending_objects += len(mapping)
+        self.queue.put((mapping, True))
+
+    def _freed(self, count):
+        with self.lock:
+            self.pending_objects -= count
+            self.freed_objects += count
+
+    def run(self):
+        while True:
+            value, each = self.queue.get()
+            if not each:
+                release(value)
+                self._freed(1)
+                continue
+            while value:
+                count = min(FREE_STEP, len(value))
+                for _ in range(count):
+                    release(dict.popitem(value)[1])
+                self._freed(count)
+            release(value)
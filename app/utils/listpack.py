@@ -0,0 +1,127 @@
+import sys
+
+EMPTY_LISTPACK = sys.getsizeof(b"")
+
+
+def encode_length(n):
+    """Varint length prefix: one byte below 128, seven bits per byte above."""
+    if n < 0x80:
+        return bytes((n,))
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+class Listpack:
+    """
+    Strings packed back to back in a single bytes object, each behind a
+    varint length prefix, in the spirit of Redis' listpack. No object exists
+    per element, so a small hash or set costs its payload plus a byte or two
+    per entry instead of a dict slot and a bytes object each; the price is
+    that lookups walk the buffer, which is why collections only use it below
+    the *-max-listpack-entries / *-max-listpack-value thresholds.
+
+    The buffer is immutable bytes rather than a bytearray: its header is 24
+    bytes smaller and it is never over-allocated. A change builds a new one,
+    as Redis reallocates its listpack, which at these sizes is a short copy.
+
+    Entries are addressed by the byte offset of their length prefix.
+    """
+
+    __slots__ = ("blob", "count")
+
+    def __init__(self, entries=()):
+        # Joined up front so the buffer is allocated at its exact size
+        parts = []
+        for entry in entries:
+            parts += (encode_length(len(entry)), entry)
+        self.blob = b"".join(parts)
+        self.count = len(parts) // 2
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return EMPTY_LISTPACK + len(self.blob)
+
+    def _span(self, pos):
+        """(start, end) of the payload of the entry at `pos`."""
+        blob = self.blob
+        n = blob[pos]
+        if n < 0x80:
+            return pos + 1, pos + 1 + n
+        n &= 0x7F
+        shift = 7
+        pos += 1
+        while blob[pos] & 0x80:
+            n |= (blob[pos] & 0x7F) << shift
+            shift += 7
+            pos += 1
+        n |= blob[pos] << shift
+        return pos + 1, pos + 1 + n
+
+    def next(self, pos):
+        return self._span(pos)[1]
+
+    def get(self, pos):
+        start, end = self._span(pos)
+        return self.blob[start:end]
+
+    def __iter__(self):
+        blob, span = self.blob, self._span
+        pos, size = 0, len(blob)
+        while pos < size:
+            n = blob[pos]
+            if n < 0x80:
+                start, pos = pos + 1, pos + 1 + n
+            else:
+                start, pos = span(pos)
+            yield blob[start:pos]
+
+    def find(self, entry, skip=0):
+        """
+        Offset of the first entry equal to `entry`, or -1. `skip` entries
+        after each candidate are stepped over unread, so with skip=1 only the
+        fields of a field/value sequence are compared.
+        """
+        blob, span = self.blob, self._span
+        pos, size, length = 0, len(blob), len(entry)
+        while pos < size:
+            # Most entries have a one-byte length prefix; skip the call into _span for them
+            n = blob[pos]
+            if n < 0x80:
+                start, end = pos + 1, pos + 1 + n
+            else:
+                start, end = span(pos)
+            if end - start == length and blob[start:end] == entry:
+                return pos
+            for _ in range(skip):
+                end = span(end)[1]
+            pos = end
+        return -1
+
+    def append(self, entry):
+        self.extend((entry,))
+
+    def extend(self, entries):
+        """Append several entries with a single copy of the buffer."""
+        parts = [self.blob]
+        for entry in entries:
+            parts += (encode_length(len(entry)), entry)
+        self.blob = b"".join(parts)
+        self.count += len(parts) // 2
+
+    def replace(self, pos, entry):
+        blob = self.blob
+        self.blob = b"".join((blob[:pos], encode_length(len(entry)), entry, blob[self.next(pos):]))
+
+    def delete(self, pos, count=1):
+        end = pos
+        for _ in range(count):
+            end = self.next(end)
+        self.blob = self.blob[:pos] + self.blob[end:]
+        self.count -= count
@@ -0,0 +1,71 @@
+"""
+Leveled server log written from a background thread.
+
+Call sites use %-style arguments (`log.debug("Received command: %s", command)`)
+so a message below the configured level costs only the level check, and
+one that passes is handed to a queue unformatted: formatting and the write
+to stdout or `logfile` both happen on the listener thread, never on the
+thread serving a client. Levels follow Redis: debug, verbose, notice, warning.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+VERBOSE = 15
+NOTICE = 25
+LOG_LEVELS = {"debug": logging.DEBUG, "verbose": VERBOSE, "notice": NOTICE, "warning": logging.WARNING}
+# The per-line level marks from Redis' log format
+LEVEL_MARKS = {logging.DEBUG: ".", VERBOSE: "-", NOTICE: "*", logging.WARNING: "#", logging.ERROR: "#"}
+
+logging.addLevelName(VERBOSE, "VERBOSE")
+logging.addLevelName(NOTICE, "NOTICE")
+
+log = logging.getLogger("redis")
+log.setLevel(NOTICE)
+log.propagate = False
+
+
+class RedisFormatter(logging.Formatter):
+    """`pid:M 19 Oct 2026 10:00:00.123 * message`, the layout of Redis' own log lines."""
+
+    def format(self, record):
+        timestamp = self.formatTime(record, "%d %b %Y %H:%M:%S")
+        line = f"{os.getpid()}:M {timestamp}.{int(record.msecs):03d} {LEVEL_MARKS.get(record.levelno, '*')} " \
+               f"{record.getMessage()}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue the record as-is; the stock handler formats it in the caller's thread first."""
+
+    def prepare(self, record):
+        return record
+
+
+class _State:
+    listener = None
+
+
+def setup_logging(loglevel="notice", logfile=""):
+    """Route the server log through a queue to stdout, or to `logfile` when one is given."""
+    set_loglevel(loglevel)
+    if _State.listener is not None:
+        _State.listener.stop()
+    target = logging.FileHandler(logfile) if logfile else logging.StreamHandler(sys.stdout)
+    target.setFormatter(RedisFormatter())
+    records = queue.SimpleQueue()
+    log.handlers = [DeferredQueueHandler(records)]
+    _State.listener = logging.handlers.QueueListener(records, target)
+    _State.listener.start()
+    atexit.register(_State.listener.stop)
+
+
+def set_loglevel(name):
+    if name not in LOG_LEVELS:
+        raise ValueError(f"argument(s) must be one of the following: {', '.join(LOG_LEVELS)}")
+    log.setLevel(LOG_LEVELS[name])
@@ -0,0 +1,52 @@
+import os
+import resource
+import sys
+
+# Rough CPython costs used by the incremental accounting. They don't need to
+# be exact, only stable, so that per-write deltas add and subtract cleanly.
+DICT_ENTRY = 48
+KEY_OVERHEAD = DICT_ENTRY + 8  # keyspace dict entry plus its ScanDict bucket slot
+LIST_SLOT = 8
+EMPTY_LIST = sys.getsizeof([])
+FLOAT_SIZE = sys.getsizeof(0.0)
+TUPLE_PAIR = sys.getsizeof((0, 0))
+EMPTY_DICT = sys.getsizeof({})
+
+
+def sizeof(value) -> int:
+    return sys.getsizeof(value)
+
+
+def key_overhead(key) -> int:
+    return KEY_OVERHEAD + sys.getsizeof(key)
+
+
+def process_rss() -> int:
+    """Resident set size of this process, from /proc where available."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is the peak rather than the current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+MEMORY_UNITS = {"b": 1, "k": 1000, "kb": 1024, "m": 1000 ** 2, "mb": 1024 ** 2, "g": 1000 ** 3, "gb": 1024 ** 3}
+
+
+def parse_memory(value: str) -> int:
+    """Parse a redis.conf style memory amount such as 100mb or 1g."""
+    value = value.strip().lower()
+    digits = value.rstrip("bkmg")
+    unit = value[len(digits):] or "b"
+    if unit not in MEMORY_UNITS or not digits.isdigit():
+        raise ValueError(f"argument must be a memory value: '{value}'")
+    return int(digits) * MEMORY_UNITS[unit]
+
+
+def format_bytes(n: int) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if abs(n) < 1024 or unit == "G":
+            return f"{n}{unit}" if unit == "B" else f"{n:.2f}{unit}"
+        n /= 1024
+    return f"{n:.2f}G"
@@ -0,0 +1,41 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, hz=100):
+    """
+    Statistical profile of every other thread in the process: `hz` times a
+    second, walk each thread's current frame stack and count it. Returns
+    Counter({"thread;outer (file.py:1);inner (file.py:9)": samples}), the
+    collapsed format flame graph tools read. Sampling only reads frame
+    objects, so the profiled threads are never stopped or traced.
+    """
+    counts = collections.Counter()
+    me = threading.get_ident()
+    interval = 1.0 / hz
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts):
+    """One `stack count` line per distinct stack, most frequent first."""
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
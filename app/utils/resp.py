@@ -0,0 +1,130 @@
+OK = b"+OK\r\n"
+PONG = b"+PONG\r\n"
+NULL_BULK = b"$-1\r\n"
+NULL_ARRAY = b"*-1\r\n"
+EMPTY_ARRAY = b"*0\r\n"
+NULL = b"_\r\n"  # RESP3
+REPLY_CHUNK_BYTES = 16 * 1024
+
+
+def to_bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return str(value).encode()
+
+
+def encode_bulk(value) -> bytes:
+    if value is None:
+        return NULL_BULK
+    value = to_bytes(value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def encode_integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+def encode_simple(value) -> bytes:
+    return b"+%s\r\n" % to_bytes(value)
+
+
+def encode_error(message) -> bytes:
+    return b"-%s\r\n" % to_bytes(message)
+
+
+def encode_array_header(length: int) -> bytes:
+    return b"*%d\r\n" % length
+
+
+def encode_map_header(pairs: int) -> bytes:
+    return b"%%%d\r\n" % pairs
+
+
+def encode_set_header(length: int) -> bytes:
+    return b"~%d\r\n" % length
+
+
+def encode_push_header(length: int) -> bytes:
+    return b">%d\r\n" % length
+
+
+def encode_double(value) -> bytes:
+    return b",%s\r\n" % to_bytes(value)
+
+
+def encode_null(resp=2) -> bytes:
+    return NULL if resp == 3 else NULL_BULK
+
+
+def encode_map(items, resp=2) -> bytes:
+    """A map reply from [name, value, name, value, ...]: a RESP3 map, or that flat array for RESP2."""
+    header = encode_map_header(len(items) // 2) if resp == 3 else encode_array_header(len(items))
+    return header + b"".join(encode_bulk(item) for item in items)
+
+
+def encode_set(items, resp=2) -> bytes:
+    """A set reply: a RESP3 set, or an array for RESP2."""
+    header = encode_set_header(len(items)) if resp == 3 else encode_array_header(len(items))
+    return header + b"".join(encode_bulk(item) for item in items)
+
+
+def to_push(frame: bytes) -> bytes:
+    """The out-of-band RESP3 push carrying the same items as the array `frame` (pub/sub messages)."""
+    return b">" + frame[1:]
+
+
+def encode_array(items) -> bytes:
+    """Encode a (possibly nested) sequence; lists/tuples become arrays, everything else bulk strings."""
+    parts = [encode_array_header(len(items))]
+    for item in items:
+        if isinstance(item, (list, tuple)):
+            parts.append(encode_array(item))
+        else:
+            parts.append(encode_bulk(item))
+    return b"".join(parts)
+
+
+def encode_array_chunks(items, count=None, encode=encode_bulk):
+    """
+    An array reply in pieces of about REPLY_CHUNK_BYTES, for replies too big
+    to build whole: the header, then the items encoded as they are read.
+    `count` must be given when items is an iterator.
+    """
+    parts = [encode_array_header(len(items) if count is None else count)]
+    size = 0
+    for item in items:
+        part = encode(item)
+        parts.append(part)
+        size += len(part)
+        if size >= REPLY_CHUNK_BYTES:
+            yield b"".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b"".join(parts)
+
+
+def encode_reply(value, resp=2) -> bytes:
+    """
+    Encode by Python type: ints become integers, sequences arrays, None a null, the rest bulk strings.
+    For a RESP3 client (`resp` 3) dicts become maps, sets sets and floats doubles; RESP2 gets flat arrays
+    and bulk strings instead.
+    """
+    if value is None:
+        return NULL if resp == 3 else NULL_BULK
+    if isinstance(value, int):
+        return encode_integer(value)
+    if isinstance(value, float) and resp == 3:
+        return encode_double(value)
+    if isinstance(value, dict):
+        header = encode_map_header(len(value)) if resp == 3 else encode_array_header(2 * len(value))
+        return header + b"".join(encode_reply(name, resp) + encode_reply(item, resp) for name, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        is_set = resp == 3 and isinstance(value, (set, frozenset))
+        header = encode_set_header(len(value)) if is_set else encode_array_header(len(value))
+        return header + b"".join(encode_reply(item, resp) for item in value)
+    return encode_bulk(value)
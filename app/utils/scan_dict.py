@@ -0,0 +1,170 @@
+import random
+import threading
+
+MASK64 = (1 << 64) - 1
+MIN_BITS = 2
+MAX_LOAD = 8
+
+
+def reverse_bits(v: int) -> int:
+    return int(f"{v:064b}"[::-1], 2)
+
+
+def next_cursor(cursor: int, mask: int) -> int:
+    """
+    Advance a reverse-binary cursor over a table of size mask + 1.
+    Incrementing the reversed bits means buckets that split or merge on
+    resize are always visited together, so no key present for the whole
+    iteration is ever skipped.
+    """
+    cursor |= ~mask & MASK64
+    cursor = reverse_bits(cursor)
+    cursor = (cursor + 1) & MASK64
+    return reverse_bits(cursor)
+
+
+class ScanDict(dict):
+    """
+    A dict that additionally keeps its keys in power-of-two hash buckets so
+    that SCAN-style cursors stay valid while the dict grows and shrinks.
+    Callers serialise operations on the same key (the store stripe locks do);
+    the internal lock only keeps inserts and deletes of different keys from
+    corrupting the bucket table.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._bits = MIN_BITS
+        self._buckets = [[] for _ in range(1 << MIN_BITS)]
+        self.update(*args, **kwargs)
+
+    @property
+    def mask(self):
+        return len(self._buckets) - 1
+
+    def _resize(self, bits):
+        self._bits = bits
+        self._buckets = [[] for _ in range(1 << bits)]
+        mask = self.mask
+        for key in dict.keys(self):
+            self._buckets[hash(key) & mask].append(key)
+
+    def _add_key(self, key):
+        self._buckets[hash(key) & self.mask].append(key)
+        if len(self) > len(self._buckets) * MAX_LOAD:
+            self._resize(self._bits + 1)
+
+    def _remove_key(self, key):
+        self._buckets[hash(key) & self.mask].remove(key)
+        if self._bits > MIN_BITS and len(self) < len(self._buckets):
+            self._resize(self._bits - 1)
+
+    def __setitem__(self, key, value):
+        if key in self:
+            dict.__setitem__(self, key, value)
+            return
+        with self._lock:
+            dict.__setitem__(self, key, value)
+            self._add_key(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            dict.__delitem__(self, key)
+            self._remove_key(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return dict.pop(self, key, *default)
+        with self._lock:
+            value = dict.pop(self, key)
+            self._remove_key(key)
+        return value
+
+    def popitem(self):
+        with self._lock:
+            key, value = dict.popitem(self)
+            self._remove_key(key)
+        return key, value
+
+    def insert_new(self, items):
+        """
+        Bulk insert of keys that aren't present yet, such as a chunk of an
+        RDB file: the bucket table is resized at most once for the batch.
+        """
+        with self._lock:
+            dict.update(self, items)
+            bits = self._bits
+            while len(self) > (1 << bits) * MAX_LOAD:
+                bits += 1
+            if bits != self._bits:
+                self._resize(bits)
+            else:
+                buckets, mask = self._buckets, self.mask
+                for key in items:
+                    buckets[hash(key) & mask].append(key)
+            self._index_new(items)
+
+    def _index_new(self, keys):
+        """Hook for subclasses keeping extra per-key indexes, called by insert_new."""
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        with self._lock:
+            dict.clear(self)
+            self._resize(MIN_BITS)
+
+    def bucket(self, index):
+        return self._buckets[index & self.mask]
+
+    def sample(self, count):
+        """
+        Return up to count keys from a run of buckets starting at a random one,
+        like dictGetSomeKeys: O(count) instead of materialising the key list.
+        """
+        if not self:
+            return []
+        keys = []
+        with self._lock:
+            index = random.getrandbits(self._bits)
+            for _ in range(min(len(self._buckets), count * 10)):
+                keys.extend(self._buckets[index])
+                if len(keys) >= count:
+                    break
+                index = (index + 1) & self.mask
+        return keys[:count]
+
+
+def scan(dicts, cursor, count):
+    """
+    Scan several ScanDicts as if they were one table sized like the largest
+    of them. Keys from smaller tables are only emitted for the cursor whose
+    low bits match their hash, so every key is returned once per full pass.
+    Returns (next_cursor, keys); a next_cursor of 0 means the pass is over.
+    """
+    dicts = [d for d in dicts if d]
+    if not dicts:
+        return 0, []
+
+    mask = max(d.mask for d in dicts)
+    keys = []
+    visited = 0
+    while True:
+        slot = cursor & mask
+        for d in dicts:
+            if d.mask == mask:
+                keys.extend(d.bucket(slot))
+            else:
+                keys.extend(key for key in d.bucket(slot) if hash(key) & mask == slot)
+        cursor = next_cursor(cursor, mask)
+        visited += 1
+        if cursor == 0 or len(keys) >= count or visited >= count * 10:
+            return cursor, keys
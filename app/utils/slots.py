@@ -0,0 +1,133 @@
+import itertools
+
+from app.utils.scan_dict import ScanDict
+
+CLUSTER_SLOTS = 16384
+
+
+def _crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data: bytes) -> int:
+    """CRC16-CCITT (XMODEM), the checksum Redis Cluster uses for key slots."""
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def key_hash_slot(key: bytes) -> int:
+    """
+    Slot of a key. If the key contains a non-empty {...} section only that
+    part is hashed, so related keys can be forced into the same slot.
+    """
+    start = key.find(b"{")
+    if start != -1:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return crc16(key) & (CLUSTER_SLOTS - 1)
+
+
+# (first, last, step) positions of the keys in a command's arguments, the
+# name excluded; a negative last counts from the end like the Redis command table
+KEY_SPECS = {
+    "GET": (0, 0, 1), "SET": (0, 0, 1), "INCR": (0, 0, 1), "DECR": (0, 0, 1), "INCRBY": (0, 0, 1),
+    "DECRBY": (0, 0, 1), "INCRBYFLOAT": (0, 0, 1), "TYPE": (0, 0, 1),
+    "RPUSH": (0, 0, 1), "LPUSH": (0, 0, 1), "LPOP": (0, 0, 1), "LRANGE": (0, 0, 1), "LLEN": (0, 0, 1),
+    "XADD": (0, 0, 1), "XRANGE": (0, 0, 1), "XACK": (0, 0, 1), "XPENDING": (0, 0, 1), "XCLAIM": (0, 0, 1),
+    "XAUTOCLAIM": (0, 0, 1), "XGROUP": (1, 1, 1), "XTRIM": (0, 0, 1), "XLEN": (0, 0, 1),
+    "ZADD": (0, 0, 1), "ZRANK": (0, 0, 1), "ZRANGE": (0, 0, 1), "ZCARD": (0, 0, 1), "ZSCORE": (0, 0, 1),
+    "ZREM": (0, 0, 1), "ZSCAN": (0, 0, 1),
+    "GEOADD": (0, 0, 1), "GEOPOS": (0, 0, 1), "GEODIST": (0, 0, 1), "GEOSEARCH": (0, 0, 1),
+    "MGET": (0, -1, 1), "DEL": (0, -1, 1), "UNLINK": (0, -1, 1), "EXISTS": (0, -1, 1), "TOUCH": (0, -1, 1),
+    "MSET": (0, -1, 2), "MSETNX": (0, -1, 2),
+    "BLPOP": (0, -2, 1),
+    "HSET": (0, 0, 1), "HGET": (0, 0, 1), "HMGET": (0, 0, 1), "HDEL": (0, 0, 1), "HGETALL": (0, 0, 1),
+    "HINCRBY": (0, 0, 1), "HLEN": (0, 0, 1), "HEXISTS": (0, 0, 1), "HSCAN": (0, 0, 1),
+    "SADD": (0, 0, 1), "SREM": (0, 0, 1), "SISMEMBER": (0, 0, 1), "SMISMEMBER": (0, 0, 1), "SMEMBERS": (0, 0, 1),
+    "SCARD": (0, 0, 1), "SPOP": (0, 0, 1), "SRANDMEMBER": (0, 0, 1), "SSCAN": (0, 0, 1),
+    "SINTER": (0, -1, 1), "SUNION": (0, -1, 1), "SDIFF": (0, -1, 1),
+    "SINTERSTORE": (0, -1, 1), "SUNIONSTORE": (0, -1, 1), "SDIFFSTORE": (0, -1, 1),
+    # The keys follow a numkeys argument; command_keys reads it
+    "SINTERCARD": (1, -1, 1),
+    "PFADD": (0, 0, 1), "PFCOUNT": (0, -1, 1), "PFMERGE": (0, -1, 1),
+    "SETBIT": (0, 0, 1), "GETBIT": (0, 0, 1), "BITCOUNT": (0, 0, 1), "BITPOS": (0, 0, 1),
+    "BITFIELD": (0, 0, 1), "BITFIELD_RO": (0, 0, 1), "BITOP": (1, -1, 1),
+    "OBJECT": (1, 1, 1),
+}
+
+# Commands that never touch the keyspace
+KEYLESS_COMMANDS = {"PING", "ECHO", "PUBLISH"}
+
+
+def command_keys(cmd, args):
+    """Keys referenced by a command, used to route it to the node serving their slot."""
+    if cmd in ("XREAD", "XREADGROUP"):
+        upper = [arg.upper() for arg in args]
+        if b"STREAMS" not in upper:
+            return []
+        streams = args[upper.index(b"STREAMS") + 1:]
+        return streams[:len(streams) // 2]
+    if cmd == "SINTERCARD":
+        numkeys = int(args[0]) if args and args[0].isdigit() else 0
+        return args[1:1 + numkeys]
+    if cmd == "MEMORY":
+        return args[1:2] if args and args[0].upper() == b"USAGE" else []
+    spec = KEY_SPECS.get(cmd)
+    if spec is None:
+        return []
+    first, last, step = spec
+    if last < 0:
+        last += len(args)
+    return args[first:last + 1:step]
+
+
+class SlotDict(ScanDict):
+    """
+    ScanDict that also indexes its keys by hash slot, so a node can list or
+    count the keys of one slot during resharding without walking the keyspace.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.slot_keys = {}
+        super().__init__(*args, **kwargs)
+
+    def _add_key(self, key):
+        super()._add_key(key)
+        self.slot_keys.setdefault(key_hash_slot(key), {})[key] = None
+
+    def _index_new(self, keys):
+        for key in keys:
+            self.slot_keys.setdefault(key_hash_slot(key), {})[key] = None
+
+    def _remove_key(self, key):
+        super()._remove_key(key)
+        slot = key_hash_slot(key)
+        keys = self.slot_keys[slot]
+        del keys[key]
+        if not keys:
+            del self.slot_keys[slot]
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self.slot_keys.clear()
+
+    def keys_in_slot(self, slot, count):
+        with self._lock:
+            return list(itertools.islice(self.slot_keys.get(slot, ()), count))
+
+    def count_in_slot(self, slot):
+        with self._lock:
+            return len(self.slot_keys.get(slot, ()))
@@ -0,0 +1,264 @@
+import collections
+import socket
+import threading
+import time
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+LATENCY_PERCENTILES = (50.0, 99.0, 99.9)
+SLOWLOG_MAX_ARGS = 32
+SLOWLOG_MAX_ARG_LENGTH = 128
+LATENCY_HISTORY_LEN = 160
+MONITOR_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\a": "\\a", "\b": "\\b"}
+
+
+def bucket_index(value):
+    """Log-linear bucket for a non-negative int: exact below 16, then 16 buckets per power of two (~6% wide)."""
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS + (shift << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_upper(index):
+    """Largest value that falls in bucket `index`."""
+    if index < SUB_BUCKETS:
+        return index
+    shift, offset = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+    return ((SUB_BUCKETS + offset + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of microsecond latencies. Recording is one index
+    computation and a list increment; percentiles are read back to within
+    the ~6% width of a bucket.
+    """
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        self.counts = []
+        self.total = 0
+
+    def record(self, usec):
+        index = usec if usec < SUB_BUCKETS else bucket_index(usec)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.total += 1
+
+    def percentile(self, percent):
+        if not self.total:
+            return 0
+        rank = max(1, int(self.total * percent / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return bucket_upper(index)
+        return bucket_upper(len(self.counts) - 1)
+
+    def power_of_two_buckets(self):
+        """[(upper bound, cumulative count)] per power-of-two usec bucket, as LATENCY HISTOGRAM reports them."""
+        buckets = []
+        seen = 0
+        bound = 1
+        for index, count in enumerate(self.counts):
+            upper = bucket_upper(index)
+            while upper >= bound:
+                if seen:
+                    buckets.append((bound, seen))
+                bound <<= 1
+            seen += count
+        if seen and (not buckets or buckets[-1][1] != seen):
+            buckets.append((bound, seen))
+        return buckets
+
+
+class CommandStats:
+    """
+    Per-command counters behind INFO commandstats and latencystats. Every
+    client thread running the command updates them, so they are changed
+    under `lock`: a bare `+=` from two threads can lose one of the updates.
+    """
+
+    __slots__ = ("calls", "usec", "rejected_calls", "failed_calls", "histogram", "lock")
+
+    def __init__(self):
+        self.calls = 0
+        self.usec = 0
+        self.rejected_calls = 0
+        self.failed_calls = 0
+        self.histogram = LatencyHistogram()
+        self.lock = threading.Lock()
+
+    def record(self, usec, failed):
+        with self.lock:
+            self.calls += 1
+            self.usec += usec
+            if failed:
+                self.failed_calls += 1
+            self.histogram.record(usec)
+
+    def count_call(self, failed):
+        """A call whose run time isn't recorded: a blocking command's includes its wait."""
+        with self.lock:
+            self.calls += 1
+            if failed:
+                self.failed_calls += 1
+
+    def reject(self):
+        with self.lock:
+            self.rejected_calls += 1
+
+
+def trim_arguments(command):
+    """Cap the argument count and length the way Redis does before keeping a command in the slow log."""
+    args = list(command[:SLOWLOG_MAX_ARGS])
+    if len(command) > SLOWLOG_MAX_ARGS:
+        args[-1] = b"... (%d more arguments)" % (len(command) - SLOWLOG_MAX_ARGS + 1)
+    for i, arg in enumerate(args):
+        if isinstance(arg, str):
+            arg = args[i] = arg.encode()
+        if len(arg) > SLOWLOG_MAX_ARG_LENGTH:
+            args[i] = arg[:SLOWLOG_MAX_ARG_LENGTH] + b"... (%d more bytes)" % (len(arg) - SLOWLOG_MAX_ARG_LENGTH)
+    return args
+
+
+class SlowLog:
+    """Ring buffer of the most recent commands that ran for at least `slower_than` usec (negative disables)."""
+
+    def __init__(self, slower_than=10000, max_len=128):
+        self.slower_than = slower_than
+        self.entries = collections.deque(maxlen=max_len)
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def add(self, command, usec, client):
+        with self.lock:
+            self.entries.appendleft([self.next_id, int(time.time()), usec, trim_arguments(command), client, b""])
+            self.next_id += 1
+
+    def get(self, count):
+        with self.lock:
+            entries = list(self.entries)
+        return entries if count < 0 else entries[:count]
+
+    def set_max_len(self, max_len):
+        with self.lock:
+            self.entries = collections.deque(self.entries, maxlen=max_len)
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def quote_argument(arg):
+    """Double-quoted with C-style escapes, as MONITOR prints each argument."""
+    if isinstance(arg, str):
+        arg = arg.encode()
+    out = ['"']
+    for byte in arg:
+        char = chr(byte)
+        if char in '\\"':
+            out.append("\\" + char)
+        elif char in MONITOR_ESCAPES:
+            out.append(MONITOR_ESCAPES[char])
+        elif 32 <= byte < 127:
+            out.append(char)
+        else:
+            out.append(f"\\x{byte:02x}")
+    out.append('"')
+    return "".join(out)
+
+
+def monitor_line(command, client):
+    """`1700000000.123456 [0 127.0.0.1:50000] "SET" "key" "value"`"""
+    return f"{time.time():.6f} [0 {client.decode()}] " + " ".join(quote_argument(arg) for arg in command)
+
+
+class ClientSocket(socket.socket):
+    """
+    A client connection that counts the error replies sent on it, so a
+    handler's failure can be detected, and carries the client's ID, name and
+    protocol version (2, or 3 after HELLO 3).
+    """
+
+    __slots__ = ("error_replies", "id", "name", "resp")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.error_replies = 0
+        self.id = 0
+        self.name = b""
+        self.resp = 2
+
+    def sendall(self, data, flags=0):
+        if data[:1] == b"-":
+            self.error_replies += 1
+        return super().sendall(data, flags)
+
+
+def peer_address(connection):
+    """ip:port of the client behind a socket or io-threads Client, for SLOWLOG entries."""
+    try:
+        host, port = getattr(connection, "sock", connection).getpeername()[:2]
+    except (OSError, AttributeError):
+        return b""
+    return f"{host}:{port}".encode()
+
+
+class LatencyEvent:
+    __slots__ = ("samples", "max")
+
+    def __init__(self):
+        self.samples = collections.deque(maxlen=LATENCY_HISTORY_LEN)
+        self.max = 0
+
+
+class LatencyMonitor:
+    """
+    Spikes at or above `threshold` ms (0 disables) per event class: the last
+    LATENCY_HISTORY_LEN samples, at most one per second keeping the worst,
+    and the all-time maximum. Backs LATENCY LATEST/HISTORY/DOCTOR.
+    """
+
+    def __init__(self, threshold=0):
+        self.threshold = threshold
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def observe(self, event, usec):
+        if self.threshold and usec >= self.threshold * 1000:
+            self.add_sample(event, usec // 1000)
+
+    def add_sample(self, event, ms):
+        now = int(time.time())
+        with self.lock:
+            entry = self.events.get(event)
+            if entry is None:
+                entry = self.events[event] = LatencyEvent()
+            if entry.samples and entry.samples[-1][0] == now:
+                entry.samples[-1] = (now, max(ms, entry.samples[-1][1]))
+            else:
+                entry.samples.append((now, ms))
+            entry.max = max(entry.max, ms)
+
+    def latest(self):
+        with self.lock:
+            return [[event, entry.samples[-1][0], entry.samples[-1][1], entry.max]
+                    for event, entry in self.events.items()]
+
+    def history(self, event):
+        with self.lock:
+            entry = self.events.get(event)
+            return [list(sample) for sample in entry.samples] if entry else []
+
+    def reset(self, events=None):
+        with self.lock:
+            names = list(self.events) if events is None else [event for event in events if event in self.events]
+            for event in names:
+                del self.events[event]
+            return len(names)
@@ -0,0 +1,284 @@
+"""
+Compact stream storage: entries packed into blocks of bytes, after the
+listpacks in a radix tree that Redis keeps streams in.
+
+A block holds up to stream-node-max-entries entries and about
+stream-node-max-bytes bytes. It remembers its first ID and the field names
+of its first entry (the master fields). Each entry is:
+
+    <entry length> <ms - first ms> <seq> <0 | field count + 1> [field names] <values>
+
+All numbers are varints, so an ID that follows its block's first one by
+less than 128 ms and has a small sequence number costs two bytes. An entry
+whose field names match the master fields, the usual case for telemetry,
+stores a 0 and none of the names. A value that is a canonical decimal
+integer is kept as a zigzag varint with the low bit set; other values are
+kept as their length shifted left one bit, then the bytes. The entry length
+lets a seek by ID step over entries without decoding their fields.
+
+Entries are only decoded, into {"id": "ms-seq", "fields": {...}} dicts,
+when a command reads them.
+"""
+import bisect
+import itertools
+import sys
+
+from app.utils.listpack import encode_length as encode_varint
+
+MIN_ID = (0, 0)
+MAX_ID = ((1 << 64) - 1, (1 << 64) - 1)
+STREAM_NODE_MAX_BYTES = 4096
+STREAM_NODE_MAX_ENTRIES = 100
+EMPTY_BLOB = sys.getsizeof(bytearray())
+
+
+def read_varint(buf, pos):
+    """(value, position after it) for the varint at pos."""
+    n = buf[pos]
+    if n < 0x80:
+        return n, pos + 1
+    n &= 0x7F
+    shift = 7
+    pos += 1
+    while buf[pos] & 0x80:
+        n |= (buf[pos] & 0x7F) << shift
+        shift += 7
+        pos += 1
+    return n | (buf[pos] << shift), pos + 1
+
+
+def pack_value(value):
+    """A value for an entry: integers as a tagged zigzag varint, anything else length-prefixed."""
+    if 0 < len(value) < 20 and (value.isdigit() or (value[:1] == b"-" and value[1:].isdigit())):
+        n = int(value)
+        if b"%d" % n == value:
+            zigzag = n << 1 if n >= 0 else (-n << 1) - 1
+            return encode_varint((zigzag << 1) | 1)
+    return encode_varint(len(value) << 1) + value
+
+
+def read_value(buf, pos):
+    n, pos = read_varint(buf, pos)
+    if n & 1:
+        zigzag = n >> 1
+        return b"%d" % (zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1)), pos
+    end = pos + (n >> 1)
+    return bytes(buf[pos:end]), end
+
+
+def _first_id(block):
+    return block.first_id
+
+
+def _entries(blocks, start, end):
+    for block in blocks:
+        yield from block.entries(start, end)
+
+
+class StreamBlock:
+    __slots__ = ("first_id", "last_id", "fields", "fields_size", "blob", "count")
+
+    def __init__(self, first_id, fields):
+        self.first_id = self.last_id = first_id
+        self.fields = tuple(fields)
+        self.fields_size = sys.getsizeof(self.fields) + sum(sys.getsizeof(field) for field in self.fields)
+        self.blob = bytearray()
+        self.count = 0
+
+    @property
+    def nbytes(self):
+        return BLOCK_BASE + self.fields_size + len(self.blob)
+
+    def encode(self, stream_id, fields):
+        ms, seq = stream_id
+        parts = [encode_varint(ms - self.first_id[0]), encode_varint(seq)]
+        if tuple(fields) == self.fields:
+            parts.append(b"\0")
+        else:
+            parts.append(encode_varint(len(fields) + 1))
+            for field in fields:
+                parts += (encode_varint(len(field)), field)
+        parts += map(pack_value, fields.values())
+        body = b"".join(parts)
+        return encode_varint(len(body)) + body
+
+    def append(self, stream_id, encoded):
+        self.blob += encoded
+        self.last_id = stream_id
+        self.count += 1
+
+    def ids(self):
+        """The entry IDs, read without decoding any fields."""
+        blob, first_ms = self.blob, self.first_id[0]
+        pos, size = 0, len(blob)
+        while pos < size:
+            length, pos = read_varint(blob, pos)
+            following = pos + length
+            delta, pos = read_varint(blob, pos)
+            seq, pos = read_varint(blob, pos)
+            yield first_ms + delta, seq
+            pos = following
+
+    def entries(self, start=MIN_ID, end=MAX_ID):
+        """Decoded entries with IDs from start to end inclusive."""
+        blob, first_ms, master = self.blob, self.first_id[0], self.fields
+        pos, size = 0, len(blob)
+        while pos < size:
+            length, pos = read_varint(blob, pos)
+            following = pos + length
+            delta, pos = read_varint(blob, pos)
+            seq, pos = read_varint(blob, pos)
+            stream_id = (first_ms + delta, seq)
+            if stream_id < start:
+                pos = following
+                continue
+            if stream_id > end:
+                return
+            names, pos = read_varint(blob, pos)
+            if names:
+                fields = []
+                for _ in range(names - 1):
+                    n, pos = read_varint(blob, pos)
+                    fields.append(bytes(blob[pos:pos + n]))
+                    pos += n
+            else:
+                fields = master
+            values = []
+            for _ in fields:
+                value, pos = read_value(blob, pos)
+                values.append(value)
+            yield {"id": "%d-%d" % stream_id, "fields": dict(zip(fields, values))}
+
+
+BLOCK_BASE = sys.getsizeof(StreamBlock(MIN_ID, ())) - sys.getsizeof(()) + EMPTY_BLOB + 8  # plus its list slot
+
+
+class Stream:
+    """
+    A stream's blocks in ID order, its length, and the last ID ever added,
+    which stays put when trimming empties the stream so new IDs keep growing.
+    `nbytes` is kept up to date on every change for memory accounting.
+    """
+
+    __slots__ = ("blocks", "length", "last_id", "nbytes")
+
+    def __init__(self):
+        self.blocks = []
+        self.length = 0
+        self.last_id = MIN_ID
+        self.nbytes = sys.getsizeof([]) + sys.getsizeof(self)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block.entries()
+
+    def append(self, stream_id, fields, max_entries=STREAM_NODE_MAX_ENTRIES, max_bytes=STREAM_NODE_MAX_BYTES):
+        """
+        Add an entry, whose ID must be above last_id, opening a new block when
+        the last one is full; a limit of 0 means no limit.
+        """
+        block = self.blocks[-1] if self.blocks else None
+        encoded = block.encode(stream_id, fields) if block is not None else None
+        if block is None or 0 < max_entries <= block.count or 0 < max_bytes < len(block.blob) + len(encoded):
+            block = StreamBlock(stream_id, fields)
+            encoded = block.encode(stream_id, fields)
+            self.blocks.append(block)
+            self.nbytes += block.nbytes
+        self.nbytes += len(encoded)
+        block.append(stream_id, encoded)
+        self.length += 1
+        self.last_id = stream_id
+
+    def _blocks_between(self, start, end):
+        """The blocks that may hold IDs from start to end; the first may end before start."""
+        blocks = self.blocks
+        first = max(bisect.bisect_right(blocks, start, key=_first_id) - 1, 0)
+        return blocks[first:bisect.bisect_right(blocks, end, key=_first_id)]
+
+    def range(self, start=MIN_ID, end=MAX_ID, count=None):
+        """Entries with IDs from start to end inclusive, at most count of them."""
+        entries = []
+        for block in self._blocks_between(start, end):
+            if block.last_id < start:
+                continue
+            for entry in block.entries(start, end):
+                entries.append(entry)
+                if len(entries) == count:
+                    return entries
+        return entries
+
+    def view(self, start=MIN_ID, end=MAX_ID):
+        """
+        (count, iterator) over the entries from start to end, for a reply
+        decoded after the caller has let go of the stream's lock. The blocks
+        are taken now and none is changed in place afterwards, apart from
+        appends to the last one, which land past the end capped here at
+        last_id; trimming drops blocks or swaps in a rebuilt first one.
+        """
+        end = min(end, self.last_id)
+        blocks = self._blocks_between(start, end)
+        count = 0
+        for block in blocks:
+            if start <= block.first_id and block.last_id <= end:
+                count += block.count
+            else:
+                count += sum(1 for stream_id in block.ids() if start <= stream_id <= end)
+        return count, _entries(blocks, start, end)
+
+    def get(self, stream_id):
+        entries = self.range(stream_id, stream_id, 1)
+        return entries[0] if entries else None
+
+    def first_id(self):
+        return self.blocks[0].first_id if self.blocks else None
+
+    def _drop_first_block(self):
+        block = self.blocks.pop(0)
+        self.length -= block.count
+        self.nbytes -= block.nbytes
+        return block.count
+
+    def _trim_first_block(self, keep_from):
+        """Rebuild the first block without its entries below keep_from; returns how many went."""
+        old = self.blocks[0]
+        ids = [stream_id for stream_id in old.ids() if stream_id >= keep_from]
+        if not ids:
+            return self._drop_first_block()
+        block = None
+        for stream_id, entry in zip(ids, old.entries(keep_from)):
+            if block is None:
+                block = StreamBlock(stream_id, entry["fields"])
+            block.append(stream_id, block.encode(stream_id, entry["fields"]))
+        self.blocks[0] = block
+        self.nbytes += block.nbytes - old.nbytes
+        self.length -= old.count - block.count
+        return old.count - block.count
+
+    def trim(self, threshold, by_id=False, approx=False, limit=0):
+        """
+        XTRIM: drop the oldest entries until at most `threshold` remain, or
+        (by_id) those with IDs below the `threshold` ID. Whole blocks go
+        first, which is all that approx (~) does, so it may leave a few
+        extra entries but never decodes anything; exact trimming then
+        rebuilds the first block without the rest. With approx, `limit`
+        (0 for none) caps the entries removed. Returns how many were.
+        """
+        removed = 0
+        while self.blocks:
+            block = self.blocks[0]
+            whole = block.last_id < threshold if by_id else self.length - block.count >= threshold
+            if not whole or (limit and removed + block.count > limit):
+                break
+            removed += self._drop_first_block()
+        if approx or not self.blocks:
+            return removed
+        if by_id:
+            if self.blocks[0].first_id < threshold:
+                removed += self._trim_first_block(threshold)
+        elif self.length > threshold:
+            surplus = self.length - threshold
+            removed += self._trim_first_block(next(itertools.islice(self.blocks[0].ids(), surplus, None)))
+        return removed
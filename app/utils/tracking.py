@@ -0,0 +1,194 @@
+"""
+Server-assisted client-side caching, after Redis's tracking.c.
+
+A client that turns on CLIENT TRACKING may keep the values it reads in a
+local cache; the server tells it when one of those keys changes, so it can
+drop the copy. In the default mode the keys each such client read are
+remembered in `table` (key -> client IDs) and a key's entry is consumed by
+the first write to it: one invalidation per read, however often the key is
+written afterwards. In BCAST mode nothing is remembered; the client gets an
+invalidation for every written key that starts with one of its prefixes.
+
+Invalidations go to the client itself as a RESP3 push, or with REDIRECT to
+another connection: a RESP3 one gets the push, a RESP2 one gets it as a
+message on the __redis__:invalidate channel if it is subscribed to it.
+
+Commands run on many threads, so a write can invalidate a key while a
+tracking client is still replying to a read of it, and the reply, holding
+the old value, would otherwise arrive after the invalidation and be cached
+for good. Invalidations that hit a client mid-read are therefore sent
+again once its reply is out.
+"""
+import threading
+
+from app.utils.resp import (NULL, NULL_BULK, encode_array, encode_array_header, encode_bulk, encode_integer,
+                            encode_push_header)
+
+INVALIDATE_CHANNEL = b"__redis__:invalidate"
+
+
+class TrackedClient:
+    """A client's CLIENT TRACKING options and its state between commands."""
+
+    __slots__ = ("connection", "redirect", "bcast", "prefixes", "optin", "optout", "noloop", "caching", "reading",
+                 "missed")
+
+    def __init__(self, connection, redirect=0, bcast=False, prefixes=(), optin=False, optout=False, noloop=False):
+        self.connection = connection
+        self.redirect = redirect  # ID of the client the invalidations go to, 0 for this one
+        self.bcast = bcast
+        self.prefixes = set(prefixes)
+        self.optin = optin
+        self.optout = optout
+        self.noloop = noloop
+        self.caching = None  # CLIENT CACHING yes/no, for the next command only
+        self.reading = 0  # Tracked reads in progress
+        self.missed = []  # Invalidations sent during those reads, to repeat once they have replied
+
+    def caches(self):
+        """Whether the keys of this client's next read are to be remembered."""
+        if self.bcast:
+            return False
+        if self.optin:
+            return self.caching is True
+        return not (self.optout and self.caching is False)
+
+
+class Tracking:
+    """
+    The invalidation table and the tracking clients. `connections` (client
+    ID -> connection) resolves REDIRECT targets and `subscriptions` tells
+    whether a RESP2 target listens on __redis__:invalidate; both are the
+    server's own dicts.
+    """
+
+    def __init__(self, connections, subscriptions):
+        self.connections = connections
+        self.subscriptions = subscriptions
+        self.lock = threading.Lock()
+        self.clients = {}  # Client ID -> TrackedClient
+        self.table = {}  # Key -> IDs of the clients that may have it cached
+        self.items = 0  # Client IDs across the table
+        self.prefixes = {}  # BCAST prefix -> IDs of the clients registered for it
+
+    def enable(self, client_id, tracked):
+        with self.lock:
+            self._drop_prefixes(client_id)
+            self.clients[client_id] = tracked
+            for prefix in tracked.prefixes:
+                self.prefixes.setdefault(prefix, set()).add(client_id)
+
+    def disable(self, client_id):
+        """Stop tracking for a client; its IDs left in the table are dropped as the keys get invalidated."""
+        with self.lock:
+            self._drop_prefixes(client_id)
+            if self.clients.pop(client_id, None) is not None and not self.clients:
+                self.table.clear()
+                self.items = 0
+
+    def _drop_prefixes(self, client_id):
+        tracked = self.clients.get(client_id)
+        for prefix in tracked.prefixes if tracked else ():
+            ids = self.prefixes[prefix]
+            ids.discard(client_id)
+            if not ids:
+                del self.prefixes[prefix]
+
+    def begin_read(self, client_id, tracked, keys, max_keys):
+        """
+        Start a tracked client's read of `keys`, remembering them if it
+        caches them. Past `max_keys` (tracking-table-max-keys, 0 for no
+        limit) the oldest keys are invalidated to make room.
+        """
+        evicted = {}
+        with self.lock:
+            tracked.reading += 1
+            if tracked.caches():
+                for key in keys:
+                    ids = self.table.get(key) or self.table.setdefault(key, set())
+                    if client_id not in ids:
+                        ids.add(client_id)
+                        self.items += 1
+                while max_keys and len(self.table) > max_keys:
+                    key = next(iter(self.table))
+                    for holder in self._pop(key):
+                        evicted.setdefault(holder, []).append(key)
+            deliveries = self._route(evicted, 0)
+        self._deliver(deliveries)
+
+    def end_read(self, tracked):
+        """Finish a tracked read once its reply is sent, repeating the invalidations it may have raced with."""
+        with self.lock:
+            tracked.reading -= 1
+            missed, tracked.missed = tracked.missed, []
+        self._deliver((tracked, keys) for keys in missed)
+
+    def invalidate(self, keys, writer_id=0):
+        """Tell the clients that may have cached any of `keys` that they changed; `writer_id` made the change."""
+        if not self.clients:
+            return
+        changed = {}
+        with self.lock:
+            for key in dict.fromkeys(keys):
+                for client_id in self._pop(key):
+                    changed.setdefault(client_id, []).append(key)
+                for prefix, ids in self.prefixes.items():
+                    if key.startswith(prefix):
+                        for client_id in ids:
+                            changed.setdefault(client_id, []).append(key)
+            deliveries = self._route(changed, writer_id)
+        self._deliver(deliveries)
+
+    def flush(self):
+        """FLUSHALL / FLUSHDB: every tracking client gets a null invalidation, meaning all of its keys."""
+        if not self.clients:
+            return
+        with self.lock:
+            self.table.clear()
+            self.items = 0
+            deliveries = [(tracked, None) for tracked in self.clients.values()]
+            for tracked, _ in deliveries:
+                if tracked.reading:
+                    tracked.missed.append(None)
+        self._deliver(deliveries)
+
+    def _pop(self, key):
+        ids = self.table.pop(key, ())
+        self.items -= len(ids)
+        return ids
+
+    def _route(self, changed, writer_id):
+        """(client, keys) messages for {client ID: keys}; called with the lock held."""
+        deliveries = []
+        for client_id, keys in changed.items():
+            tracked = self.clients.get(client_id)
+            if tracked is None or (tracked.noloop and client_id == writer_id):
+                continue
+            if tracked.reading:
+                tracked.missed.append(keys)
+            deliveries.append((tracked, keys))
+        return deliveries
+
+    def _deliver(self, deliveries):
+        for tracked, keys in deliveries:
+            try:
+                self._send(tracked, keys)
+            except OSError:
+                pass  # The client is going away; its cleanup disables tracking
+
+    def _send(self, tracked, keys):
+        """One invalidation message; `keys` None invalidates everything."""
+        target = tracked.connection
+        if tracked.redirect:
+            target = self.connections.get(tracked.redirect)
+            if target is None:
+                if getattr(tracked.connection, "resp", 2) == 3:
+                    tracked.connection.sendall(encode_push_header(2) + encode_bulk(b"tracking-redir-broken") +
+                                               encode_integer(tracked.redirect))
+                return
+        if getattr(target, "resp", 2) == 3:
+            target.sendall(encode_push_header(2) + encode_bulk(b"invalidate") +
+                           (NULL if keys is None else encode_array(keys)))
+        elif tracked.redirect and INVALIDATE_CHANNEL in self.subscriptions.get(target, ()):
+            target.sendall(encode_array_header(3) + encode_bulk(b"message") + encode_bulk(INVALIDATE_CHANNEL) +
+                           (NULL_BULK if keys is None else encode_array(keys)))
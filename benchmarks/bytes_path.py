@@ -0,0 +1,65 @@
+"""
+Cost of the request/reply path for large values, bytes end-to-end versus
+the previous decode-to-str / f-string / re-encode path.
+
+Each iteration parses a SET request and produces the GET reply for the same
+value, which is what the server does per round trip apart from socket I/O.
+
+    python -m benchmarks.bytes_path [--iterations N]
+"""
+import argparse
+import time
+
+from app.parsers.command_parser import QueryBuffer
+from app.utils.resp import encode_bulk
+
+
+def legacy_parse(buffer):
+    """The previous parser's per-argument work: slice, decode, and re-slice the remainder."""
+    args = []
+    crlf = buffer.find(b"\r\n")
+    count = int(buffer[1:crlf].decode())
+    buffer = buffer[crlf + 2:]
+    for _ in range(count):
+        crlf = buffer.find(b"\r\n")
+        length = int(buffer[1:crlf].decode())
+        buffer = buffer[crlf + 2:]
+        args.append(buffer[:length].decode("utf-8"))
+        buffer = buffer[length + 2:]
+    return args
+
+
+def legacy_reply(value):
+    return f"${len(value)}\r\n{value}\r\n".encode()
+
+
+def request(value):
+    return b"*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$%d\r\n%s\r\n" % (len(value), value)
+
+
+def run(parse, reply, payload, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        args = parse(payload)
+        reply(args[-1])
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    def parse_bytes(payload):
+        return QueryBuffer(payload).parse()[0][0]
+
+    print(f"{'value size':>12}{'legacy us/op':>16}{'bytes us/op':>16}{'speedup':>10}")
+    for size in (1024, 64 * 1024, 1024 * 1024, 8 * 1024 * 1024):
+        payload = request(b"x" * size)
+        legacy = run(legacy_parse, legacy_reply, payload, args.iterations)
+        current = run(parse_bytes, encode_bulk, payload, args.iterations)
+        print(f"{size:>12}{legacy * 1e6:>16.1f}{current * 1e6:>16.1f}{legacy / current:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
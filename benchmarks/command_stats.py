@@ -0,0 +1,95 @@
+"""
+Cost of command statistics on the GET/SET hot path: each command run
+through call_handler (timing, commandstats, latency histogram, slow log and
+latency-monitor checks) against its handler called directly, in-process so
+socket I/O doesn't drown the difference. Then --threads threads run SET
+through call_handler at once and the calls counted are checked against the
+calls made.
+
+    python -m benchmarks.command_stats [--iterations N] [--threads N]
+"""
+import argparse
+import threading
+import time
+
+from app.server import Server
+from app.utils.config import load_config
+
+
+class NullConnection:
+    id = 0
+    name = b""
+    resp = 2
+    error_replies = 0
+
+    def sendall(self, data):
+        pass
+
+
+def make_server():
+    args = argparse.Namespace(**{name.replace("-", "_"): value for name, value in load_config().items()})
+    return Server(args)
+
+
+def per_call(run, commands):
+    start = time.perf_counter()
+    for command in commands:
+        run(command)
+    return (time.perf_counter() - start) / len(commands) * 1e6
+
+
+def compare(server, connection, cmd, commands, runs):
+    """
+    Fastest us per call of `runs` runs of the bare handler and of call_handler,
+    alternating the two so a noisy stretch hits both alike.
+    """
+    handler = server.command_handlers[cmd]
+
+    def bare(command):
+        handler(connection, command[1:])
+
+    def timed(command):
+        server.call_handler(connection, cmd, command, handler)
+
+    results = [(per_call(bare, commands), per_call(timed, commands)) for _ in range(runs)]
+    return min(result[0] for result in results), min(result[1] for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    server = make_server()
+    connection = NullConnection()
+    workloads = {
+        "SET": [["SET", b"key:%d" % (i % 10000), b"value"] for i in range(args.iterations)],
+        "GET": [["GET", b"key:%d" % (i % 10000)] for i in range(args.iterations)],
+    }
+    print(f"{'command':<10}{'handler us':>12}{'with stats us':>16}{'overhead us':>14}")
+    for cmd, commands in workloads.items():
+        bare, timed = compare(server, connection, cmd, commands, args.runs)
+        print(f"{cmd:<10}{bare:>12.2f}{timed:>16.2f}{timed - bare:>14.2f}")
+
+    server.command_stats.clear()
+    handler = server.command_handlers["SET"]
+    commands = workloads["SET"]
+
+    def hammer():
+        for command in commands:
+            server.call_handler(connection, "SET", command, handler)
+
+    threads = [threading.Thread(target=hammer) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = server.command_stats["SET"]
+    print(f"\n{args.threads} threads: {args.threads * len(commands)} SET calls made, {stats.calls} counted, "
+          f"{stats.histogram.total} in the histogram")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+End-to-end load generator in the style of redis-benchmark.
+
+Spawns the server from app/main.py (or targets a running one with --host),
+drives it with --clients connections spread over --client-processes, each
+keeping one pipeline of --pipeline commands in flight, and reports ops/sec
+and latency percentiles per command as JSON, so runs from two commits can
+be compared with --compare.
+
+    python -m benchmarks.end_to_end [--tests set,get,lpush] [--clients 50] [--pipeline 1]
+        [--requests 100000] [--keyspace 10000] [--data-size 3] [--output results.json]
+
+Latency is measured per pipeline, from sending the batch to reading its
+last reply, and counted once for every request in it, like redis-benchmark.
+Keys are `key:<n>` with n drawn uniformly from --keyspace; with a keyspace
+of 0 every request uses the same key. XRANGE, ZRANGE and GEOSEARCH read
+fixed structures of --range-size elements, loaded before the run only when
+those tests are selected. A connection that waits --timeout seconds for a
+reply fails its test, which is reported with its error and makes the tool
+exit non-zero.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import selectors
+import socket
+import subprocess
+import sys
+import time
+
+from app.utils.resp import encode_array
+
+RAND = object()  # Placeholder replaced by a random key number per request
+
+# name -> command template; a list is joined into one argument, DATA is the value
+TESTS = {
+    "set": [b"SET", [b"key:", RAND], b"DATA"],
+    "get": [b"GET", [b"key:", RAND]],
+    "incr": [b"INCR", [b"counter:", RAND]],
+    "lpush": [b"LPUSH", b"mylist", b"DATA"],
+    "lpop": [b"LPOP", b"mylist"],
+    "xadd": [b"XADD", b"mystream", b"*", b"field", b"DATA"],
+    "xrange": [b"XRANGE", b"bench:stream", b"-", b"+"],
+    "zadd": [b"ZADD", b"myzset", RAND, [b"member:", RAND]],
+    "zrange": [b"ZRANGE", b"bench:zset", b"0", b"-1"],
+    "geosearch": [b"GEOSEARCH", b"bench:geo", b"FROMLONLAT", b"13.361389", b"38.115556",
+                  b"BYRADIUS", b"500", b"km"],
+    "publish": [b"PUBLISH", b"channel", b"DATA"],
+}
+
+
+# Read-only range test -> the command adding its i-th element before the run
+RANGE_SETUP = {
+    "xrange": lambda i: [b"XADD", b"bench:stream", b"*", b"field", b"%d" % i],
+    "zrange": lambda i: [b"ZADD", b"bench:zset", b"%d" % i, b"member:%d" % i],
+    "geosearch": lambda i: [b"GEOADD", b"bench:geo", b"%f" % (13 + i % 100 / 100), b"%f" % (38 + i // 100 / 100),
+                            b"place:%d" % i],
+}
+
+
+def setup_commands(names, range_size):
+    """Data the selected read-only range tests scan; none for the others."""
+    return [RANGE_SETUP[name](i) for name in names if name in RANGE_SETUP for i in range(range_size)]
+
+
+def build_command(template, keyspace, data):
+    parts = []
+    for part in template:
+        if part == b"DATA":
+            parts.append(data)
+        elif part is RAND:
+            parts.append(b"%d" % (random.randrange(keyspace) if keyspace else 0))
+        elif isinstance(part, list):
+            parts.append(b"".join(piece if isinstance(piece, bytes) else
+                                  b"%d" % (random.randrange(keyspace) if keyspace else 0) for piece in part))
+        else:
+            parts.append(part)
+    return encode_array(parts)
+
+
+def skip_reply(buffer, pos):
+    """Return the offset just past the reply starting at pos, or -1 if it isn't complete yet."""
+    end = buffer.find(b"\r\n", pos)
+    if end < 0:
+        return -1
+    kind = buffer[pos:pos + 1]
+    if kind in (b"+", b"-", b":"):
+        return end + 2
+    length = int(buffer[pos + 1:end])
+    if kind == b"$":
+        if length < 0:
+            return end + 2
+        return end + 4 + length if len(buffer) >= end + 4 + length else -1
+    pos = end + 2
+    for _ in range(max(length, 0)):
+        pos = skip_reply(buffer, pos)
+        if pos < 0:
+            return -1
+    return pos
+
+
+def drive(port, host, template, connections, requests, pipeline, keyspace, data, timeout):
+    """
+    Issue `requests` commands over `connections` sockets; returns per-request
+    latencies in seconds. Raises TimeoutError once no reply came for `timeout` seconds.
+    """
+    selector = selectors.DefaultSelector()
+    state = {}
+    latencies = []
+    issued = 0
+
+    def send_batch(sock):
+        nonlocal issued
+        batch = min(pipeline, requests - issued)
+        if batch <= 0:
+            return False
+        issued += batch
+        entry = state[sock]
+        entry[1:] = [batch, time.perf_counter(), batch]
+        sock.sendall(b"".join(build_command(template, keyspace, data) for _ in range(batch)))
+        return True
+
+    for _ in range(connections):
+        sock = socket.create_connection((host, port), timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        state[sock] = [bytearray(), 0, 0.0, 0]  # buffer, replies pending, batch start, batch size
+        selector.register(sock, selectors.EVENT_READ)
+        send_batch(sock)
+
+    active = len(state)
+    while active:
+        ready = selector.select(timeout)
+        if not ready:
+            raise TimeoutError(f"no reply within {timeout:g}s, {active} connection(s) still waiting")
+        for key, _ in ready:
+            sock = key.fileobj
+            entry = state[sock]
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            entry[0] += chunk
+            pos = 0
+            while entry[1]:
+                end = skip_reply(entry[0], pos)
+                if end < 0:
+                    break
+                pos = end
+                entry[1] -= 1
+            del entry[0][:pos]
+            if entry[1]:
+                continue
+            latencies.extend([time.perf_counter() - entry[2]] * entry[3])
+            if not send_batch(sock):
+                selector.unregister(sock)
+                sock.close()
+                active -= 1
+    return latencies
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_test(name, args):
+    per_process = args.requests // args.client_processes
+    connections = max(1, args.clients // args.client_processes)
+    data = b"x" * args.data_size
+    jobs = [(args.port, args.host, TESTS[name], connections, per_process, args.pipeline, args.keyspace, data,
+             args.timeout) for _ in range(args.client_processes)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(len(jobs)) as pool:
+        results = pool.starmap(drive, jobs)
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result)
+    to_ms = 1000.0
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "ops_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "avg": round(sum(latencies) / len(latencies) * to_ms, 3),
+            "p50": round(percentile(latencies, 0.50) * to_ms, 3),
+            "p99": round(percentile(latencies, 0.99) * to_ms, 3),
+            "p999": round(percentile(latencies, 0.999) * to_ms, 3),
+            "max": round(latencies[-1] * to_ms, 3),
+        },
+    }
+
+
+def wait_for_port(host, port):
+    for _ in range(200):
+        try:
+            socket.create_connection((host, port)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"server on port {port} did not start")
+
+
+def load_range_data(args, names):
+    commands = setup_commands(names, args.range_size)
+    if not commands:
+        return
+    with socket.create_connection((args.host, args.port), args.timeout) as sock:
+        sock.sendall(b"".join(encode_array(command) for command in commands))
+        buffer, pos, remaining = bytearray(), 0, len(commands)
+        while remaining:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("server closed the connection while loading range data")
+            buffer += chunk
+            while remaining and (end := skip_reply(buffer, pos)) >= 0:
+                pos, remaining = end, remaining - 1
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """Print per-test ops/sec and p99 changes against an earlier JSON report."""
+    print(f"{'test':>10}{'ops/sec':>12}{'change':>9}{'p99 ms':>10}{'change':>9}", file=sys.stderr)
+    for name, result in current["results"].items():
+        before = previous["results"].get(name)
+        if "error" in result:
+            print(f"{name:>10}  failed: {result['error']}", file=sys.stderr)
+            continue
+        if before is not None and "error" in before:
+            before = None
+        ops, p99 = result["ops_per_sec"], result["latency_ms"]["p99"]
+        if before is None:
+            print(f"{name:>10}{ops:>12.0f}{'':>9}{p99:>10.3f}", file=sys.stderr)
+            continue
+        ops_change = (ops / before["ops_per_sec"] - 1) * 100
+        p99_change = (p99 / before["latency_ms"]["p99"] - 1) * 100 if before["latency_ms"]["p99"] else 0.0
+        print(f"{name:>10}{ops:>12.0f}{ops_change:>+8.1f}%{p99:>10.3f}{p99_change:>+8.1f}%", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end throughput and latency benchmark")
+    parser.add_argument("--tests", default=",".join(TESTS), help="Comma-separated subset of: " + ", ".join(TESTS))
+    parser.add_argument("--clients", type=int, default=50, help="Parallel connections")
+    parser.add_argument("--client-processes", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=100000, help="Requests per test")
+    parser.add_argument("--pipeline", type=int, default=1, help="Commands in flight per connection")
+    parser.add_argument("--keyspace", type=int, default=10000, help="Distinct keys for SET/GET/INCR/ZADD (0 for one)")
+    parser.add_argument("--data-size", type=int, default=3, help="Value size in bytes")
+    parser.add_argument("--range-size", type=int, default=100, help="Elements read by XRANGE/ZRANGE/GEOSEARCH")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait for a reply before failing")
+    parser.add_argument("--port", type=int, default=6400)
+    parser.add_argument("--host", help="Benchmark a running server instead of spawning one")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter running the spawned server")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--compare", help="Earlier JSON report to print a comparison against")
+    args, server_args = parser.parse_known_args()
+    names = [name.strip().lower() for name in args.tests.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TESTS]
+    if unknown:
+        parser.error(f"unknown tests: {', '.join(unknown)}")
+
+    server = None
+    if args.host is None:
+        args.host = "localhost"
+        server = subprocess.Popen([args.python, "-m", "app.main", "--port", str(args.port), *server_args],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elif server_args:
+        parser.error(f"unrecognized arguments: {' '.join(server_args)}")
+    try:
+        wait_for_port(args.host, args.port)
+        try:
+            load_range_data(args, names)
+        except OSError as e:
+            parser.exit(1, f"loading range data failed: {type(e).__name__}: {e}\n")
+        results = {}
+        for name in names:
+            try:
+                results[name] = run_test(name, args)
+            except OSError as e:
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"{name}: failed: {results[name]['error']}", file=sys.stderr, flush=True)
+                continue
+            print(f"{name}: {results[name]['ops_per_sec']:.0f} ops/sec, "
+                  f"p50 {results[name]['latency_ms']['p50']} ms", file=sys.stderr, flush=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "commit": git_commit(),
+        "config": {"clients": args.clients, "client_processes": args.client_processes, "requests": args.requests,
+                   "pipeline": args.pipeline, "keyspace": args.keyspace, "data_size": args.data_size,
+                   "range_size": args.range_size, "server_args": server_args},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+    if any("error" in result for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
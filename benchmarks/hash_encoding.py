@@ -0,0 +1,81 @@
+"""
+Memory per object and single-field update cost for hashes.
+
+Compares three ways to keep a small record (a user profile of a few fields):
+a JSON blob in StringStore rewritten whole on every update, which is what
+callers did before there was a hash type; a HashStore hash in its listpack
+encoding; and the same hash forced into the hashtable encoding.
+
+    python -m benchmarks.hash_encoding [--objects N] [--fields F]
+"""
+import argparse
+import json
+import time
+
+from app.stores.hash_store import HashStore
+from app.stores.string_store import StringStore
+from benchmarks.string_encoding import measure
+
+
+def record(i, fields):
+    return {f"field{n}": f"value-{i}-{n}" for n in range(fields)}
+
+
+def build_json(objects, fields):
+    def build():
+        store = StringStore()
+        for i in range(objects):
+            store.set(f"user:{i}".encode(), json.dumps(record(i, fields)).encode())
+        return store
+    return build
+
+
+def build_hash(objects, fields, max_entries):
+    def build():
+        store = HashStore()
+        store.max_listpack_entries = max_entries
+        for i in range(objects):
+            store.hset(f"user:{i}".encode(), [(f.encode(), v.encode()) for f, v in record(i, fields).items()])
+        return store
+    return build
+
+
+def update_json(store, keys):
+    start = time.perf_counter()
+    for key in keys:
+        profile = json.loads(store.get(key))
+        profile["field0"] = "changed"
+        store.set(key, json.dumps(profile).encode())
+    return time.perf_counter() - start
+
+
+def update_hash(store, keys):
+    start = time.perf_counter()
+    for key in keys:
+        store.hset(key, [(b"field0", b"changed")])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=50000)
+    parser.add_argument("--fields", type=int, default=8)
+    args = parser.parse_args()
+
+    builds = {
+        "json string": build_json(args.objects, args.fields),
+        "hash listpack": build_hash(args.objects, args.fields, 128),
+        "hash hashtable": build_hash(args.objects, args.fields, 0),
+    }
+    updates = {"json string": update_json, "hash listpack": update_hash, "hash hashtable": update_hash}
+    keys = [f"user:{i}".encode() for i in range(args.objects)]
+    print(f"{args.objects} objects of {args.fields} fields")
+    print(f"{'encoding':<18}{'B/object':>12}{'updates/s':>14}")
+    for name, build in builds.items():
+        store, used = measure(build)
+        elapsed = updates[name](store, keys)
+        print(f"{name:<18}{used / args.objects:>12.1f}{args.objects / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
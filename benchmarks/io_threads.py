@@ -0,0 +1,120 @@
+"""
+Throughput of the thread-per-client model against io-threads mode under
+many pipelined clients.
+
+For each --io-threads value a server is started, then client processes
+drive --clients connections that each keep one pipeline of SET/GET pairs in
+flight. Run the server under a free-threaded build with --python, e.g.
+--python python3.13t, to see how both models behave without the GIL.
+
+In io-threads mode commands still run under the stores' striped locks.
+Expiry timers, blocking-command helpers and the lazyfree thread touch the
+stores off the executor thread, so the locks stay. Each client also has an
+output lock, shared with the worker that writes its replies. Neither lock
+is ever contended there; they only cost their bookkeeping. With the
+reader-writer stripes (--lock-shared-reads yes) a guard was about 3 us per
+command. With 2 io-threads, turning the guards into no-ops took this
+benchmark from 23.6k to 27.5k ops/s on a single core (3 runs each, CPython
+3.11). The default mutex stripes cost about 0.45 us a guard, like the
+output lock, and the same run gave 29.1k ops/s with them in place.
+Since client sockets set TCP_NODELAY, a pipeline's replies no longer wait
+on the client's delayed ACK: the thread-per-client model went from 18.2k to
+46.9k ops/s and 2 io-threads from 29.7k to 39.2k (3 runs each).
+
+    python -m benchmarks.io_threads [--io-threads 1 2 4] [--clients 50] [--pipeline 16]
+"""
+import argparse
+import multiprocessing
+import selectors
+import socket
+import subprocess
+import sys
+import time
+
+VALUE = b"x" * 32
+SET_REPLY = b"+OK\r\n"
+GET_REPLY = b"$%d\r\n%s\r\n" % (len(VALUE), VALUE)
+
+
+def pipeline_request(index, pipeline):
+    parts = []
+    for i in range(pipeline // 2):
+        key = b"key:%d:%d" % (index, i)
+        parts.append(b"*3\r\n$3\r\nSET\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n" % (len(key), key, len(VALUE), VALUE))
+        parts.append(b"*2\r\n$3\r\nGET\r\n$%d\r\n%s\r\n" % (len(key), key))
+    return b"".join(parts), (pipeline // 2) * (len(SET_REPLY) + len(GET_REPLY))
+
+
+def drive(port, first, connections, pipeline, duration):
+    """Keep one pipeline in flight per connection; returns the number of commands completed."""
+    selector = selectors.DefaultSelector()
+    state = {}
+    for index in range(first, first + connections):
+        sock = socket.create_connection(("localhost", port))
+        request, reply_size = pipeline_request(index, pipeline)
+        sock.sendall(request)
+        selector.register(sock, selectors.EVENT_READ)
+        state[sock] = [request, reply_size, 0]
+
+    completed = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=0.1):
+            sock = key.fileobj
+            entry = state[sock]
+            entry[2] += len(sock.recv(65536))
+            while entry[2] >= entry[1]:
+                entry[2] -= entry[1]
+                completed += pipeline // 2 * 2
+                sock.sendall(entry[0])
+    for sock in state:
+        sock.close()
+    return completed
+
+
+def wait_for_port(port):
+    for _ in range(200):
+        try:
+            socket.create_connection(("localhost", port)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"server on port {port} did not start")
+
+
+def run(args, io_threads):
+    server = subprocess.Popen([args.python, "-m", "app.main", "--port", str(args.port), "--io-threads", str(io_threads)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.port)
+        per_process = max(1, args.clients // args.client_processes)
+        jobs = [(args.port, i * per_process, per_process, args.pipeline, args.duration)
+                for i in range(args.client_processes)]
+        with multiprocessing.Pool(len(jobs)) as pool:
+            completed = sum(pool.starmap(drive, jobs))
+        return completed / args.duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--io-threads", type=int, nargs="+", default=[1, 2, 4],
+                        help="Values to compare; 1 is the thread-per-client model")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--client-processes", type=int, default=2)
+    parser.add_argument("--pipeline", type=int, default=16, help="Commands per pipeline (SET/GET pairs)")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=6400)
+    parser.add_argument("--python", default=sys.executable, help="Interpreter running the server")
+    args = parser.parse_args()
+
+    print(f"server: {args.python}, {args.clients} clients, pipeline {args.pipeline}")
+    print(f"{'io-threads':>12}{'ops/sec':>14}")
+    for io_threads in args.io_threads:
+        print(f"{io_threads:>12}{run(args, io_threads):>14.0f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+LPUSH throughput and latency on small lists while other threads LRANGE one
+huge list, with a single lock stripe (the old one-lock-per-store behaviour)
+against several, and optionally with reader-writer stripes.
+
+With one stripe every LPUSH waits behind each full-list LRANGE copy; with
+several they only meet when keys share a stripe. Under the GIL the threads
+still take turns on the interpreter, so the stripes cut the waits rather
+than adding parallelism; run with a free-threaded build (python3.13t) and
+--shared-reads to see reads of one stripe run side by side as well.
+
+CPython 3.11 on a single core, 4 writers and 2 readers, mean of 3 runs:
+  stripes  locks  LPUSH/sec  contended
+        1  mutex      54.3k       1306
+       16  mutex      64.4k        196
+        1     rw      60.0k         76
+       16     rw      56.8k          1
+
+    python -m benchmarks.lock_striping [--stripes 1 16] [--writers 4] [--readers 2] [--shared-reads]
+"""
+import argparse
+import threading
+import time
+
+from app.stores.list_store import ListStore
+
+
+def run(stripes, shared_reads, args):
+    store = ListStore(stripes, shared_reads)
+    store.rpush(b"big", [b"%d" % i for i in range(args.big)])
+    stop = threading.Event()
+    pushes = [0] * args.writers
+
+    def reader():
+        while not stop.is_set():
+            store.lrange(b"big", 0, -1)
+
+    def writer(index):
+        key = b"list:%d" % index
+        count = 0
+        while not stop.is_set():
+            store.lpush(key, [b"x"])
+            count += 1
+        pushes[index] = count
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    contended = sum(contended for _, contended in store.lock_stats())
+    return sum(pushes) / args.duration, contended
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stripes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--big", type=int, default=100000, help="Elements in the list being scanned")
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--shared-reads", action="store_true", help="Also run with reader-writer stripes")
+    args = parser.parse_args()
+
+    print(f"{'stripes':>8}{'locks':>8}{'LPUSH/sec':>12}{'contended':>12}")
+    for stripes in args.stripes:
+        for shared_reads in (False, True) if args.shared_reads else (False,):
+            rate, contended = run(stripes, shared_reads, args)
+            print(f"{stripes:>8}{'rw' if shared_reads else 'mutex':>8}{rate:>12.0f}{contended:>12}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Memory per member, membership checks and intersections for sets.
+
+Compares SetStore against emulating a set with SortedSetStore (every member
+scored 0, membership by ZSCORE, intersections by fetching both member lists
+with ZRANGE and intersecting them in the caller), which is what callers did
+before there was a set type. Three shapes cover the three set encodings:
+many small sets of integers (intset), many small sets of strings (listpack)
+and a few large sets of strings (hashtable).
+
+    python -m benchmarks.set_encoding [--scale N]
+"""
+import argparse
+import random
+import time
+
+from app.stores.set_store import SetStore
+from app.stores.sorted_set_store import SortedSetStore
+from benchmarks.string_encoding import measure
+
+
+def workloads(scale):
+    """(name, {key: members}) with members as bytes."""
+    rng = random.Random(42)
+    ints = {f"ids:{i}".encode(): [b"%d" % rng.randrange(10 ** 6) for _ in range(200)] for i in range(scale)}
+    tags = {f"tags:{i}".encode(): [f"tag-{rng.randrange(5000)}".encode() for _ in range(16)] for i in range(scale * 4)}
+    large = {f"big:{i}".encode(): [f"user:{rng.randrange(50000)}".encode() for _ in range(5000)]
+             for i in range(max(1, scale // 50))}
+    return [("small integer sets", ints), ("small string sets", tags), ("large string sets", large)]
+
+
+def build_set(sets):
+    def build():
+        store = SetStore()
+        for key, members in sets.items():
+            store.sadd(key, members)
+        return store
+    return build
+
+
+def build_zset(sets):
+    def build():
+        store = SortedSetStore()
+        for key, members in sets.items():
+            args = []
+            for member in members:
+                args += [b"0", member]
+            store.zadd(key, args)
+        return store
+    return build
+
+
+def membership_set(store, probes):
+    start = time.perf_counter()
+    for key, member in probes:
+        store.sismember(key, member)
+    return time.perf_counter() - start
+
+
+def membership_zset(store, probes):
+    start = time.perf_counter()
+    hits = 0
+    for key, member in probes:
+        hits += store.zscore(key, member) is not None
+    return time.perf_counter() - start
+
+
+def intersect_set(store, pairs):
+    start = time.perf_counter()
+    for first, second in pairs:
+        store.combine("inter", [first, second])
+    return time.perf_counter() - start
+
+
+def intersect_zset(store, pairs):
+    start = time.perf_counter()
+    common = 0
+    for first, second in pairs:
+        first_members = set(store.zrange(first, 0, -1))
+        common += sum(1 for member in store.zrange(second, 0, -1) if member in first_members)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=1000, help="sets per workload (x4 for small string sets)")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'workload':<22}{'store':<14}{'encoding':<11}{'B/member':>10}{'SISMEMBER/s':>14}{'SINTER/s':>11}")
+    for name, sets in workloads(args.scale):
+        keys = list(sets)
+        members = sum(len(set(value)) for value in sets.values())
+        probes = [(key, rng.choice(sets[key]) if rng.random() < 0.5 else b"absent")
+                  for key in rng.choices(keys, k=50000)]
+        pairs = [tuple(rng.sample(keys, 2)) if len(keys) > 1 else (keys[0], keys[0]) for _ in range(200)]
+        runs = (("SetStore", build_set, membership_set, intersect_set),
+                ("SortedSet", build_zset, membership_zset, intersect_zset))
+        for store_name, build, membership, intersect in runs:
+            store, used = measure(build(sets))
+            encoding = store.encoding(keys[0])
+            print(f"{name:<22}{store_name:<14}{encoding:<11}{used / members:>10.1f}"
+                  f"{len(probes) / membership(store, probes):>14,.0f}{len(pairs) / intersect(store, pairs):>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Memory per entry, append and range-read speed for streams.
+
+Compares StreamStore's block storage against a list of
+{"id": str, "fields": dict} entries, which is how streams were stored
+before. Two shapes: telemetry, where every entry repeats the same field
+names with numeric values, and events, whose field names vary from entry
+to entry and whose values are mostly text.
+
+    python -m benchmarks.stream_encoding [--entries N]
+"""
+import argparse
+import random
+import time
+
+from app.stores.stream_store import StreamStore
+from app.utils.stream_blocks import MAX_ID
+from benchmarks.string_encoding import measure
+
+
+def workloads(entries):
+    rng = random.Random(42)
+    telemetry = [{b"sensor": b"%d" % rng.randrange(64), b"temp": b"%d" % rng.randrange(-200, 400),
+                  b"humidity": b"%d" % rng.randrange(100), b"status": b"ok"} for _ in range(entries)]
+    kinds = [b"login", b"logout", b"purchase", b"view"]
+    events = []
+    for _ in range(entries):
+        fields = {b"type": rng.choice(kinds), b"user": f"user:{rng.randrange(10 ** 5)}".encode()}
+        if rng.random() < 0.5:
+            fields[b"path"] = f"/products/{rng.randrange(10 ** 4)}/reviews".encode()
+        events.append(fields)
+    return [("telemetry", telemetry), ("events", events)]
+
+
+def build_blocks(entries):
+    def build():
+        store = StreamStore()
+        for i, fields in enumerate(entries):
+            store.xadd(b"stream", b"%d-0" % (1700000000000 + i), fields)
+        return store
+    return build
+
+
+def build_dicts(entries):
+    def build():
+        stream = []
+        for i, fields in enumerate(entries):
+            stream.append({"id": f"{1700000000000 + i}-0", "fields": dict(fields)})
+        return stream
+    return build
+
+
+def read_blocks(store, reads, count):
+    start = time.perf_counter()
+    for first in reads:
+        store.xrange(b"stream", (1700000000000 + first, 0), MAX_ID, count)
+    return time.perf_counter() - start
+
+
+def read_dicts(stream, reads, count):
+    # The old XRANGE compared every entry's ID with the bounds (IDs here all have the same width)
+    start = time.perf_counter()
+    found = 0
+    for first in reads:
+        low = f"{1700000000000 + first}-0"
+        found += len([entry for entry in stream if entry["id"] >= low][:count])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100000, help="entries per stream")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    reads = [rng.randrange(args.entries) for _ in range(200)]
+    print(f"{'workload':<12}{'storage':<14}{'B/entry':>10}{'XADD/s':>12}{'XRANGE COUNT 100/s':>20}")
+    for name, entries in workloads(args.entries):
+        runs = (("blocks", build_blocks, read_blocks), ("dict/entry", build_dicts, read_dicts))
+        for storage, build, read in runs:
+            start = time.perf_counter()
+            holder, used = measure(build(entries))
+            elapsed = time.perf_counter() - start
+            print(f"{name:<12}{storage:<14}{used / len(entries):>10.1f}{len(entries) / elapsed:>12,.0f}"
+                  f"{len(reads) / read(holder, reads, 100):>20,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Memory-per-key and INCR throughput for StringStore value encodings.
+
+Compares the previous representation (every value kept as its raw bytes and
+INCR round-tripping through int() and back) against the encoded store, where
+integers are stored natively and small ones share a single object. Both go
+through the same public store API, so each pays the same per-key bookkeeping
+(keyspace entry, access clock, memory accounting); only the value differs.
+
+    python -m benchmarks.string_encoding [--keys N]
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.stores.string_store import StringStore
+
+
+class PlainStringStore(StringStore):
+    """The layout before integer encoding: whatever the store would encode is put back as bytes."""
+
+    def _store(self, key, value):
+        super()._store(key, b"%d" % value if isinstance(value, int) else value)
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    holder = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return holder, used
+
+
+def build(store_class, keys, value_of):
+    """Each value is made as SET receives it, a fresh bytes object per key, so its memory counts as the store's."""
+    def fill():
+        store = store_class()
+        for i, key in enumerate(keys):
+            store.set(key, value_of(i))
+        return store
+    return fill
+
+
+def incr(store, keys):
+    start = time.perf_counter()
+    for key in keys:
+        store.incrby(key, 1)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=200000)
+    args = parser.parse_args()
+
+    workloads = {
+        "small counters (0-99)": lambda i: b"%d" % (i % 100),
+        "large counters": lambda i: b"%d" % (10 ** 12 + i),
+        "short strings": lambda i: b"user-%d" % (i % 1000),
+    }
+    keys = [b"key:%d" % i for i in range(args.keys)]
+    print(f"{'workload':<24}{'plain B/key':>14}{'encoded B/key':>16}")
+    for name, value_of in workloads.items():
+        _, plain_bytes = measure(build(PlainStringStore, keys, value_of))
+        _, encoded_bytes = measure(build(StringStore, keys, value_of))
+        print(f"{name:<24}{plain_bytes / args.keys:>14.1f}{encoded_bytes / args.keys:>16.1f}")
+
+    plain_time = incr(build(PlainStringStore, keys, lambda _: b"0")(), keys)
+    encoded_time = incr(build(StringStore, keys, lambda _: b"0")(), keys)
+    print(f"\nINCR x{args.keys}: plain {args.keys / plain_time:,.0f} ops/s, "
+          f"encoded {args.keys / encoded_time:,.0f} ops/s")
+
+if __name__ == "__main__":
+    main()